@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
 import time
@@ -62,4 +63,47 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# --- CAMADA ASSÍNCRONA (rotas quentes do PDV) ---
+# Rotas 'def' rodam no threadpool do Starlette (40 threads) e cada uma segura
+# uma conexão síncrona; com muitos caixas bipando, a fila é o threadpool.
+# Rotas 'async def' usam esta engine (asyncpg) direto no event loop.
+# Mesmo banco, mesmos modelos: as duas camadas convivem.
+DRIVERS_ASSINCRONOS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite", # Dev/testes locais
+}
+
+
+def url_assincrona(url: str) -> str:
+    """postgresql://... -> postgresql+asyncpg://... (mesmo usuário, host e banco)."""
+    esquema, resto = url.split("://", 1)
+    return f"{DRIVERS_ASSINCRONOS.get(esquema, esquema)}://{resto}"
+
+
+# Não conecta na criação: a engine síncrona acima já esperou o banco subir
+async_engine = create_async_engine(
+    url_assincrona(SQLALCHEMY_DATABASE_URL),
+    pool_size=20,
+    max_overflow=10,
+    pool_pre_ping=True
+)
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    autoflush=False,
+    expire_on_commit=False # Objetos continuam legíveis depois do commit sem nova ida ao banco
+)
+
+
+async def get_async_db():
+    """
+    Dependência das rotas 'async def'. Lógica síncrona já existente (serviços
+    de estoque, caixa, catálogo...) roda por 'await db.run_sync(funcao, ...)':
+    a função recebe uma Session comum e o I/O continua assíncrono.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,8 +1,38 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .routers import products, financeiro, rotinas, clientes, configuracoes, usuarios, vendas, pdvs, fiscal, solicitacoes, historico, crediario, impressao, promocoes, auth, notas_entrada
+from .services.fila_fiscal import fila_emissao
+from .services.php_worker import pool_php
+from .services import numeracao_fiscal
+from .services.distribuicao_dfe import sincronizador_dfe
+from .services.barramento import barramento
+from . import migrations
+from .database import async_engine, engine
+from .websockets import manager
 
-app = FastAPI(title="Sinapse ERP API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Esquema antes de tudo (um worker por vez; falha aqui impede a subida)
+    migrations.aplicar(engine)
+    # Workers/jobs em threads avisam o WebSocket através deste loop
+    manager.loop = asyncio.get_running_loop()
+    # Eventos de todos os workers chegam ao manager deste processo
+    barramento.iniciar(manager)
+    fila_emissao.iniciar()
+    sincronizador_dfe.iniciar()
+    yield
+    sincronizador_dfe.parar()
+    fila_emissao.parar()
+    barramento.parar()
+    pool_php.encerrar()
+    numeracao_fiscal.liberar_blocos()
+    await async_engine.dispose()
+
+
+app = FastAPI(title="Sinapse ERP API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -10,6 +40,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Proximo-Cursor"], # Cursor da próxima página (utils/paginacao.py)
 )
 
 app.include_router(products.router)
@@ -0,0 +1,320 @@
+"""
+Ajustes de esquema para bancos já existentes.
+
+O 'create_all' só cria tabelas novas: não adiciona colunas nem índices em
+tabelas que já existem. Cada passo aqui é idempotente e roda logo depois
+do create_all.
+
+'aplicar' roda no startup do app (lifespan em app/main.py) ou à mão, antes
+de subir o servidor:
+
+    python -m app.migrations
+
+No PostgreSQL tudo roda sob um advisory lock: com vários workers do
+uvicorn, um migra e os outros esperam e depois só conferem. Passo que
+falha derruba a subida (servidor com esquema pela metade não sobe).
+"""
+import os
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+# Chave do pg_advisory_lock das migrações (qualquer bigint fixo do sistema)
+CHAVE_TRAVA = 7_460_601
+
+
+class ErroMigracao(RuntimeError):
+    pass
+
+
+def _coluna_existe(engine: Engine, tabela: str, coluna: str) -> bool:
+    return coluna in {c["name"] for c in inspect(engine).get_columns(tabela)}
+
+
+def _ja_aplicada(conn, nome: str) -> bool:
+    """Passo de uma vez só já registrado em 'migracoes_aplicadas'."""
+    return conn.execute(
+        text("SELECT 1 FROM migracoes_aplicadas WHERE nome = :nome"), {"nome": nome}
+    ).first() is not None
+
+
+def _marcar_aplicada(conn, nome: str):
+    """Registra o passo na mesma transação do trabalho: se falhar no meio, roda de novo."""
+    conn.execute(
+        text("INSERT INTO migracoes_aplicadas (nome, aplicada_em) VALUES (:nome, :agora)"),
+        {"nome": nome, "agora": datetime.utcnow()},
+    )
+
+
+def _indice_numeracao_fiscal(engine: Engine):
+    """
+    Índice ÚNICO (empresa, modelo, série, número): é ele que impede duas
+    notas com o mesmo número quando o alocador de numeração falha. Banco
+    com números já duplicados não sobe até a duplicidade ser corrigida.
+    """
+    existente = next(
+        (i for i in inspect(engine).get_indexes("notas_fiscais_saida") if i["name"] == "ix_nfs_numeracao"), None
+    )
+    if existente is not None and existente["unique"]:
+        return
+
+    with engine.begin() as conn:
+        duplicados = conn.execute(text(
+            "SELECT empresa_id, modelo, serie, numero, COUNT(*) FROM notas_fiscais_saida "
+            "WHERE numero IS NOT NULL "
+            "GROUP BY empresa_id, modelo, serie, numero HAVING COUNT(*) > 1 "
+            "ORDER BY empresa_id, modelo, serie, numero LIMIT 10"
+        )).all()
+        if duplicados:
+            exemplos = "; ".join(
+                f"empresa {empresa} modelo {modelo} série {serie} nº {numero} ({quantidade}x)"
+                for empresa, modelo, serie, numero, quantidade in duplicados
+            )
+            raise ErroMigracao(
+                "Numeração fiscal duplicada em notas_fiscais_saida, o índice único não pode ser criado. "
+                f"Corrija (ou inutilize) os números repetidos e suba de novo. Ex.: {exemplos}"
+            )
+        if existente is not None:
+            # Índice simples deixado por versões anteriores, que caíam nele quando havia duplicidade
+            conn.execute(text("DROP INDEX ix_nfs_numeracao"))
+        conn.execute(text(
+            "CREATE UNIQUE INDEX ix_nfs_numeracao "
+            "ON notas_fiscais_saida (empresa_id, modelo, serie, numero)"
+        ))
+
+
+def _venda_quantidade_itens(engine: Engine):
+    if _coluna_existe(engine, "vendas", "quantidade_itens"):
+        return
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE vendas ADD COLUMN quantidade_itens FLOAT NOT NULL DEFAULT 0"))
+        conn.execute(text(
+            "UPDATE vendas SET quantidade_itens = COALESCE("
+            "(SELECT SUM(quantidade) FROM venda_itens WHERE venda_itens.venda_id = vendas.id), 0)"
+        ))
+
+
+def _empresa_versao_config(engine: Engine):
+    if _coluna_existe(engine, "empresa_config", "versao_config"):
+        return
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE empresa_config ADD COLUMN versao_config INTEGER NOT NULL DEFAULT 1"))
+
+
+def _empresa_uf(engine: Engine):
+    """A UF vinha só da variável SEFAZ_UF: instalações que a definiram mantêm o valor."""
+    if _coluna_existe(engine, "empresa_config", "uf"):
+        return
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE empresa_config ADD COLUMN uf VARCHAR(2)"))
+        uf = os.getenv("SEFAZ_UF", "").strip().upper()
+        if uf:
+            conn.execute(text("UPDATE empresa_config SET uf = :uf"), {"uf": uf})
+
+
+def _estoque_fracionado(engine: Engine):
+    """
+    produtos.quantidade_estoque era INTEGER, mas o razão e a importação de
+    notas usam quantidade fracionada (2,5 kg entrava como 2 no saldo e 2,5
+    no razão). No PostgreSQL a coluna passa a NUMERIC(12, 3); no SQLite a
+    afinidade INTEGER já guarda 2,5 como está.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        tipo = conn.execute(text(
+            "SELECT data_type FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = 'produtos' AND column_name = 'quantidade_estoque'"
+        )).scalar()
+        if tipo == "numeric":
+            return
+        conn.execute(text("ALTER TABLE produtos ALTER COLUMN quantidade_estoque TYPE NUMERIC(12, 3)"))
+
+
+def _razao_estoque_historico(engine: Engine):
+    """
+    O histórico do produto passou a vir do razão 'movimentacoes_estoque'.
+    Na primeira subida, as vendas concluídas antigas entram como movimentos
+    de venda para o histórico não começar vazio (só uma vez: razão vazio).
+    """
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT 1 FROM movimentacoes_estoque LIMIT 1")).first():
+            return
+        conn.execute(text(
+            "INSERT INTO movimentacoes_estoque "
+            "(produto_id, tipo, quantidade, data_hora, venda_id, usuario_id, observacao) "
+            "SELECT vi.produto_id, 'venda', -vi.quantidade, v.data_hora, v.id, v.operador_id, 'Importado do histórico de vendas' "
+            "FROM venda_itens vi "
+            "JOIN vendas v ON v.id = vi.venda_id "
+            "JOIN produtos p ON p.id = vi.produto_id "
+            "WHERE v.status = 'concluida' AND vi.descricao_manual IS NULL"
+        ))
+
+
+def _sessoes_caixa_abertas(engine: Engine):
+    """
+    PDVs que já estavam abertos quando a sessão de caixa passou a existir
+    ganham a sessão do turno corrente, com os contadores tirados do histórico
+    desde a última abertura. As entradas/saídas de dinheiro das vendas já
+    estão nas movimentações (suprimento = pago em dinheiro, sangria = troco),
+    então entram em suprimentos/sangrias e não em total_vendas_dinheiro.
+    """
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO sessoes_caixa "
+            "(pdv_id, operador_id, status, aberta_em, valor_abertura, total_suprimentos, total_sangrias, "
+            " total_vendas_dinheiro, total_recebimentos, total_vendas, quantidade_vendas) "
+            "SELECT p.id, p.operador_atual_id, 'aberta', a.data_hora, a.valor, "
+            " COALESCE((SELECT SUM(m.valor) FROM movimentacoes_caixa m WHERE m.pdv_id = p.id "
+            "   AND m.tipo = 'suprimento' AND m.data_hora >= a.data_hora), 0), "
+            " COALESCE((SELECT SUM(m.valor) FROM movimentacoes_caixa m WHERE m.pdv_id = p.id "
+            "   AND m.tipo = 'sangria' AND m.data_hora >= a.data_hora), 0), "
+            " 0, 0, "
+            " COALESCE((SELECT SUM(v.valor_total) FROM vendas v WHERE v.pdv_id = p.id "
+            "   AND v.status = 'concluida' AND v.data_hora >= a.data_hora), 0), "
+            " (SELECT COUNT(*) FROM vendas v WHERE v.pdv_id = p.id "
+            "   AND v.status = 'concluida' AND v.data_hora >= a.data_hora) "
+            "FROM pdvs p "
+            "JOIN movimentacoes_caixa a ON a.pdv_id = p.id AND a.tipo = 'abertura' "
+            " AND a.id = (SELECT MAX(u.id) FROM movimentacoes_caixa u WHERE u.pdv_id = p.id AND u.tipo = 'abertura') "
+            "WHERE p.status = 'aberto' "
+            " AND NOT EXISTS (SELECT 1 FROM sessoes_caixa s WHERE s.pdv_id = p.id AND s.status = 'aberta')"
+        ))
+
+
+def _resumos_vendas(engine: Engine):
+    """
+    Carga inicial dos resumos dos dashboards, uma vez só (marcador em
+    'migracoes_aplicadas'). Depois disso cada venda concluída soma a sua
+    parte. Não dá para decidir pela tabela vazia: loja sem vendas com
+    operador, por exemplo, nunca tem linha no resumo por operador e a carga
+    inteira se repetia a cada subida.
+    """
+    from sqlalchemy.orm import Session
+    from .services import resumo_vendas
+
+    with engine.begin() as conn:
+        if _ja_aplicada(conn, "resumos_vendas"):
+            return
+        if conn.execute(text("SELECT 1 FROM vendas WHERE status = 'concluida' LIMIT 1")).first():
+            with Session(bind=conn) as db:
+                linhas_hora, linhas_produto, linhas_operador = resumo_vendas.reconstruir(db)
+                db.flush()
+            print(
+                f"📊 [Migração] Resumos de vendas: {linhas_hora} linhas por hora, "
+                f"{linhas_produto} por produto, {linhas_operador} por operador."
+            )
+        _marcar_aplicada(conn, "resumos_vendas")
+
+
+def _indices_relatorios(engine: Engine):
+    """Índices compostos (filtro + data) dos relatórios por período."""
+    from . import models
+
+    nomes = {
+        "ix_vendas_pdv_status_data", "ix_vendas_operador_status_data", "ix_vendas_status_data",
+        "ix_mov_caixa_pdv_tipo_data", "ix_mov_caixa_operador_data", "ix_nfs_status_autorizacao",
+    }
+    tabelas = (models.Venda.__table__, models.MovimentacaoCaixa.__table__, models.NotaFiscalSaida.__table__)
+    for tabela in tabelas:
+        for indice in tabela.indexes:
+            if indice.name in nomes:
+                indice.create(bind=engine, checkfirst=True)
+
+
+def _indices_paginacao(engine: Engine):
+    """Índices (chave de ordenação, id) das listagens paginadas por cursor."""
+    from . import models
+
+    nomes = {"ix_vendas_data_id", "ix_nfe_entrada_data_id"}
+    for tabela in (models.Venda.__table__, models.NotaFiscalEntrada.__table__):
+        for indice in tabela.indexes:
+            if indice.name in nomes:
+                indice.create(bind=engine, checkfirst=True)
+
+
+def _busca_produtos(engine: Engine):
+    """Índice de busca por texto dos produtos (tsvector + trigram). Só PostgreSQL."""
+    from .services import busca_produtos
+
+    busca_produtos.preparar(engine)
+
+
+def _armazem_documentos(engine: Engine):
+    """
+    XMLs das notas, certificado e logo saem das tabelas para o armazém de
+    documentos (zstd), uma vez só: o código já não grava nas colunas
+    antigas, e conferir que estão vazias a cada subida era varrer cinco
+    colunas grandes sem índice. O marcador só entra depois que tudo foi
+    movido (se cair no meio, a próxima subida continua de onde parou).
+    """
+    from sqlalchemy.orm import Session
+    from .services import armazem_documentos
+
+    with engine.connect() as conn:
+        if _ja_aplicada(conn, "armazem_documentos"):
+            return
+    with Session(bind=engine) as db:
+        movidos = armazem_documentos.migrar_legado(db)
+    for coluna, quantidade in movidos.items():
+        print(f"📦 [Migração] {coluna}: {quantidade} registros movidos para o armazém de documentos.")
+    with engine.begin() as conn:
+        _marcar_aplicada(conn, "armazem_documentos")
+
+
+MIGRACOES = [
+    ("índice da numeração fiscal", _indice_numeracao_fiscal),
+    ("vendas.quantidade_itens", _venda_quantidade_itens),
+    ("empresa_config.versao_config", _empresa_versao_config),
+    ("empresa_config.uf", _empresa_uf),
+    ("produtos.quantidade_estoque fracionada", _estoque_fracionado),
+    ("razão de estoque (histórico)", _razao_estoque_historico),
+    ("sessões de caixa dos PDVs abertos", _sessoes_caixa_abertas),
+    ("resumos de vendas dos dashboards", _resumos_vendas),
+    ("índices dos relatórios por período", _indices_relatorios),
+    ("índices das listagens paginadas", _indices_paginacao),
+    ("busca de produtos por texto", _busca_produtos),
+    ("armazém de documentos (XML, certificado, logo)", _armazem_documentos),
+]
+
+
+@contextmanager
+def _trava(engine: Engine):
+    """Um processo migra por vez (PostgreSQL). SQLite é de um processo só: sem trava."""
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect() as conn:
+        # Trava de sessão: vale até o unlock (ou até a conexão cair), fora das transações dos passos
+        conn.execute(text("SELECT pg_advisory_lock(:chave)"), {"chave": CHAVE_TRAVA})
+        conn.commit()
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:chave)"), {"chave": CHAVE_TRAVA})
+            conn.commit()
+
+
+def aplicar(engine: Engine):
+    """Cria as tabelas novas e roda os passos em ordem. Levanta ErroMigracao no primeiro que falhar."""
+    from . import models
+
+    with _trava(engine):
+        models.Base.metadata.create_all(bind=engine)
+        for descricao, passo in MIGRACOES:
+            try:
+                passo(engine)
+            except Exception as e:
+                print(f"❌ [Migração] Falha em '{descricao}': {e}")
+                if isinstance(e, ErroMigracao):
+                    raise
+                raise ErroMigracao(f"Migração '{descricao}' falhou: {e}") from e
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    aplicar(engine)
+    print("✅ [Migração] Banco atualizado.")
@@ -1,5 +1,5 @@
-from sqlalchemy import (Column, Integer, String, Date, Float, DateTime, ForeignKey, Boolean, Enum, LargeBinary, Text, Table)
-from sqlalchemy.orm import relationship
+from sqlalchemy import (Column, Integer, BigInteger, String, Date, Float, DateTime, ForeignKey, Boolean, Enum, LargeBinary, Numeric, Text, Table, Index, UniqueConstraint, text)
+from sqlalchemy.orm import relationship, deferred
 from .database import Base
 from datetime import datetime
 
@@ -78,7 +78,7 @@ class Produto(Base):
     codigo_barras = Column(String(50), unique=True, index=True)
     
     # --- Estoque e Venda ---
-    quantidade_estoque = Column(Integer, default=0)
+    quantidade_estoque = Column(Numeric(12, 3, asdecimal=False), default=0) # Fracionado (KG, L); float no Python
     unidade_medida = Column(String(20), default="UN") # Ex: UN, KG, CX
     estoque_minimo = Column(Integer, default=5)
     vencimento = Column(Date, nullable=True)
@@ -175,9 +175,19 @@ class Pdv(Base):
 
 class Venda(Base):
     __tablename__ = "vendas"
+    __table_args__ = (
+        # Relatórios filtram por faixa de data_hora (utils/periodos.py)
+        Index("ix_vendas_pdv_status_data", "pdv_id", "status", "data_hora"),
+        Index("ix_vendas_operador_status_data", "operador_id", "status", "data_hora"),
+        Index("ix_vendas_status_data", "status", "data_hora"),
+        # Paginação por cursor da listagem (utils/paginacao.py)
+        Index("ix_vendas_data_id", "data_hora", "id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     codigo_venda = Column(String(100), unique=True, index=True, nullable=True)
     valor_total = Column(Float, nullable=False, default=0.0)
+    # Total de unidades no carrinho; mantido por diferença junto com valor_total
+    quantidade_itens = Column(Float, nullable=False, default=0.0)
     data_hora = Column(DateTime, default=datetime.utcnow)
     status = Column(String(50), default="em_andamento", nullable=False) # em_andamento, concluida, cancelada
     forma_pagamento = Column(String(50), nullable=True, default="dinheiro")
@@ -212,8 +222,86 @@ class VendaItem(Base):
     venda = relationship("Venda", back_populates="itens")
     produto = relationship("Produto", back_populates="itens_vendidos")
 
+class MovimentacaoEstoque(Base):
+    """
+    Razão de estoque (append-only): toda alteração de 'quantidade_estoque'
+    gera uma linha aqui. Nunca atualizar/apagar; correções são novas linhas.
+    """
+    __tablename__ = "movimentacoes_estoque"
+    __table_args__ = (
+        Index("ix_mov_estoque_produto_data", "produto_id", "data_hora"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    produto_id = Column(Integer, ForeignKey("produtos.id", ondelete="CASCADE"), nullable=False)
+    tipo = Column(String(30), nullable=False) # venda, cancelamento_venda, entrada_nota, ajuste
+    quantidade = Column(Float, nullable=False) # Com sinal: saída negativa, entrada positiva
+    data_hora = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Origem (quando houver)
+    venda_id = Column(Integer, ForeignKey("vendas.id", ondelete="SET NULL"), nullable=True, index=True)
+    nota_entrada_id = Column(Integer, ForeignKey("notas_fiscais_entrada.id", ondelete="SET NULL"), nullable=True)
+    usuario_id = Column(Integer, ForeignKey("usuarios.id"), nullable=True)
+    observacao = Column(String(200), nullable=True)
+
+    produto = relationship("Produto")
+    usuario = relationship("Usuario")
+
+class SessaoCaixa(Base):
+    """
+    Turno de um PDV (abertura -> fechamento) com os totais mantidos por
+    diferença a cada venda/sangria/suprimento/recebimento. O dinheiro em
+    caixa sai daqui em O(1), sem somar as movimentações do turno.
+    """
+    __tablename__ = "sessoes_caixa"
+    __table_args__ = (
+        # No máximo uma sessão aberta por PDV
+        Index(
+            "ux_sessao_caixa_aberta", "pdv_id", unique=True,
+            postgresql_where=text("status = 'aberta'"),
+            sqlite_where=text("status = 'aberta'"),
+        ),
+        Index("ix_sessao_caixa_pdv_abertura", "pdv_id", "aberta_em"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    pdv_id = Column(Integer, ForeignKey("pdvs.id"), nullable=False)
+    operador_id = Column(Integer, ForeignKey("usuarios.id"), nullable=True)
+    aberta_por_id = Column(Integer, ForeignKey("usuarios.id"), nullable=True)
+    fechada_por_id = Column(Integer, ForeignKey("usuarios.id"), nullable=True)
+    status = Column(String(20), nullable=False, default="aberta") # aberta, fechada
+    aberta_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+    fechada_em = Column(DateTime, nullable=True)
+
+    # Contadores do turno
+    valor_abertura = Column(Float, nullable=False, default=0.0)
+    total_suprimentos = Column(Float, nullable=False, default=0.0)
+    total_sangrias = Column(Float, nullable=False, default=0.0)
+    total_vendas_dinheiro = Column(Float, nullable=False, default=0.0) # Já líquido do troco
+    total_recebimentos = Column(Float, nullable=False, default=0.0) # Crediário pago em dinheiro
+    total_vendas = Column(Float, nullable=False, default=0.0) # Todas as formas
+    quantidade_vendas = Column(Integer, nullable=False, default=0)
+
+    # Fechamento
+    valor_informado = Column(Float, nullable=True)
+    diferenca = Column(Float, nullable=True)
+
+    pdv = relationship("Pdv")
+    operador = relationship("Usuario", foreign_keys=[operador_id])
+
+    @property
+    def valor_em_caixa(self) -> float:
+        return (
+            self.valor_abertura + self.total_suprimentos + self.total_vendas_dinheiro
+            + self.total_recebimentos - self.total_sangrias
+        )
+
 class MovimentacaoCaixa(Base):
     __tablename__ = "movimentacoes_caixa"
+    __table_args__ = (
+        Index("ix_mov_caixa_pdv_tipo_data", "pdv_id", "tipo", "data_hora"),
+        Index("ix_mov_caixa_operador_data", "operador_id", "data_hora"),
+    )
 
     id = Column(Integer, primary_key=True)
     # Usando 'Enum' para garantir que o tipo seja sempre um dos valores permitidos
@@ -233,6 +321,10 @@ class MovimentacaoCaixa(Base):
     
 class NotaFiscalEntrada(Base):
     __tablename__ = "notas_fiscais_entrada"
+    __table_args__ = (
+        # Paginação por cursor da listagem (utils/paginacao.py)
+        Index("ix_nfe_entrada_data_id", "data_emissao", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     
@@ -247,12 +339,71 @@ class NotaFiscalEntrada(Base):
     valor_total = Column(Float, nullable=False)
     
     # Auditoria / Arquivo
-    xml_conteudo = Column(Text, nullable=True) # ✅ ADICIONADO (Bom para ter)
+    # Legado: o XML fica em documentos_armazenados (services/armazem_documentos).
+    # 'deferred': a coluna só é lida se acessada, nunca nas listagens.
+    xml_conteudo = deferred(Column(Text, nullable=True))
     
     # Relacionamentos
     fornecedor_id = Column(Integer, ForeignKey("fornecedores.id"))
     fornecedor = relationship("Fornecedor")
 
+class DocumentoDFe(Base):
+    """
+    Documento recebido na distribuição DF-e (services/distribuicao_dfe):
+    NF-e completa, resumo de NF-e ou evento emitido contra o nosso CNPJ.
+    """
+    __tablename__ = "documentos_dfe"
+    __table_args__ = (
+        # Preview por chave: procura a NF-e completa da chave no armazenamento local
+        Index("ix_documentos_dfe_chave_tipo", "chave_acesso", "tipo"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    nsu = Column(BigInteger, unique=True, nullable=False)
+    chave_acesso = Column(String(44), nullable=True)
+    schema = Column(String(50), nullable=False) # procNFe_v4.00.xsd, resNFe_v1.01.xsd, resEvento_v1.01.xsd...
+    tipo = Column(String(10), nullable=False) # nfe, resumo, evento, outro
+
+    emitente_cnpj = Column(String(14), nullable=True)
+    emitente_nome = Column(String(200), nullable=True)
+    valor_total = Column(Float, nullable=True)
+    data_emissao = Column(Date, nullable=True)
+
+    # XML compactado em gzip exatamente como veio no docZip (só lido no preview)
+    conteudo = deferred(Column(LargeBinary, nullable=False))
+    recebido_em = Column(DateTime, default=datetime.utcnow)
+
+class DocumentoArmazenado(Base):
+    """
+    Conteúdo grande (XML das notas, certificado, logo) fora das linhas que as
+    listagens leem, compactado em zstd. Um por (tabela, registro, campo).
+    Ver services/armazem_documentos.py
+    """
+    __tablename__ = "documentos_armazenados"
+    __table_args__ = (
+        UniqueConstraint("tabela", "registro_id", "campo", name="uq_documento_armazenado"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    tabela = Column(String(50), nullable=False) # notas_fiscais_entrada, notas_fiscais_saida...
+    registro_id = Column(Integer, nullable=False)
+    campo = Column(String(50), nullable=False) # Nome da coluna de origem (xml_conteudo, xml_retorno...)
+    formato = Column(String(10), nullable=False, default="zstd")
+    tamanho_original = Column(Integer, nullable=False)
+    conteudo = Column(LargeBinary, nullable=False)
+    atualizado_em = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SincronizacaoDFe(Base):
+    """Posição da distribuição DF-e por CNPJ (último NSU lido e quando consultar de novo)."""
+    __tablename__ = "sincronizacao_dfe"
+
+    cnpj = Column(String(14), primary_key=True)
+    ult_nsu = Column(BigInteger, nullable=False, default=0)
+    max_nsu = Column(BigInteger, nullable=False, default=0)
+    ultima_consulta = Column(DateTime, nullable=True)
+    proxima_consulta = Column(DateTime, nullable=True)
+    ultimo_status = Column(String(255), nullable=True)
+
 class NotaFiscalSaida(Base):
     __tablename__ = "notas_fiscais_saida"
     
@@ -280,14 +431,90 @@ class NotaFiscalSaida(Base):
     data_emissao = Column(DateTime, default=datetime.utcnow)
     data_hora_autorizacao = Column(DateTime, nullable=True)
     
-    # Arquivos
-    xml_envio = Column(Text, nullable=True)
-    xml_retorno = Column(Text, nullable=True)
+    # Arquivos (legado: ficam em documentos_armazenados; ver NotaFiscalEntrada.xml_conteudo)
+    xml_envio = deferred(Column(Text, nullable=True))
+    xml_retorno = deferred(Column(Text, nullable=True))
     
     # Navegação
     venda = relationship("Venda", back_populates="nota_fiscal_saida")
     empresa = relationship("Empresa")
 
+    __table_args__ = (
+        # Um número por (empresa, modelo, série); também serve de índice para a numeração
+        Index("ix_nfs_numeracao", "empresa_id", "modelo", "serie", "numero", unique=True),
+        Index("ix_nfs_status_autorizacao", "status_sefaz", "data_hora_autorizacao"),
+    )
+
+class SequenciaFiscal(Base):
+    """Próximo número livre por (empresa, modelo, série). Ver services/numeracao_fiscal.py"""
+    __tablename__ = "sequencias_fiscais"
+
+    id = Column(Integer, primary_key=True)
+    empresa_id = Column(Integer, ForeignKey("empresa_config.id"), nullable=False)
+    modelo = Column(String(2), nullable=False, default="65")
+    serie = Column(Integer, nullable=False, default=1)
+    proximo_numero = Column(Integer, nullable=False, default=1)
+    atualizado_em = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("empresa_id", "modelo", "serie", name="uq_sequencia_fiscal"),
+    )
+
+class BlocoNumeracao(Base):
+    """Bloco de números reservado por um processo e ainda em uso. Ver services/numeracao_fiscal.py"""
+    __tablename__ = "blocos_numeracao"
+
+    id = Column(Integer, primary_key=True)
+    empresa_id = Column(Integer, ForeignKey("empresa_config.id"), nullable=False)
+    modelo = Column(String(2), nullable=False, default="65")
+    serie = Column(Integer, nullable=False, default=1)
+    numero_inicial = Column(Integer, nullable=False)
+    numero_final = Column(Integer, nullable=False)
+    dono = Column(String(100), nullable=False) # host:pid do processo que reservou
+    reservado_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_blocos_numeracao_serie", "empresa_id", "modelo", "serie"),
+    )
+
+class NumeracaoInutilizada(Base):
+    """Faixas de números que não viraram nota e precisam ser inutilizadas na SEFAZ."""
+    __tablename__ = "numeracao_inutilizada"
+
+    id = Column(Integer, primary_key=True)
+    empresa_id = Column(Integer, ForeignKey("empresa_config.id"), nullable=False)
+    modelo = Column(String(2), nullable=False, default="65")
+    serie = Column(Integer, nullable=False, default=1)
+    numero_inicial = Column(Integer, nullable=False)
+    numero_final = Column(Integer, nullable=False)
+    motivo = Column(String(255), nullable=True)
+    status = Column(String(20), default="Pendente") # Pendente, Homologada
+    protocolo = Column(String(50), nullable=True)
+    data_registro = Column(DateTime, default=datetime.utcnow)
+
+class JobSegundoPlano(Base):
+    """Estado dos jobs em segundo plano (lotes fiscais, importações). Ver services/jobs.py"""
+    __tablename__ = "jobs_segundo_plano"
+
+    id = Column(String(32), primary_key=True)
+    tipo = Column(String(50), nullable=False, index=True)
+    status = Column(String(20), nullable=False, default="em_andamento") # em_andamento, concluido, erro
+    total = Column(Integer, nullable=False, default=0)
+    processadas = Column(Integer, nullable=False, default=0)
+    sucessos = Column(Integer, nullable=False, default=0)
+    falhas = Column(Integer, nullable=False, default=0)
+    mensagem = Column(Text, nullable=False, default="")
+    erros = Column(Text, nullable=False, default="[]") # Lista JSON (no máximo MAX_ERROS_POR_JOB)
+    criado_em = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+    finalizado_em = Column(DateTime, nullable=True)
+
+class MigracaoAplicada(Base):
+    """Passos de uma vez só de app/migrations.py (cargas iniciais) já executados neste banco."""
+    __tablename__ = "migracoes_aplicadas"
+
+    nome = Column(String(100), primary_key=True)
+    aplicada_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+
 class Configuracao(Base):
     __tablename__ = "configuracoes"
     id = Column(Integer, primary_key=True)
@@ -314,6 +541,46 @@ class Solicitacao(Base):
     operador = relationship("Usuario", foreign_keys=[operador_id])
     gerente = relationship("Usuario", foreign_keys=[gerente_id])
 
+class ResumoVendasHora(Base):
+    """Faturamento por dia/hora/PDV, mantido pela finalização (services/resumo_vendas.py)."""
+    __tablename__ = "resumo_vendas_hora"
+    __table_args__ = (
+        UniqueConstraint("data", "hora", "pdv_id", name="uq_resumo_vendas_hora"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    data = Column(Date, nullable=False, index=True)
+    hora = Column(Integer, nullable=False) # 0-23
+    pdv_id = Column(Integer, ForeignKey("pdvs.id"), nullable=False)
+    faturamento = Column(Float, nullable=False, default=0.0)
+    quantidade_vendas = Column(Integer, nullable=False, default=0)
+
+class ResumoVendasProduto(Base):
+    """Quantidade e faturamento por dia/produto, mantidos pela finalização."""
+    __tablename__ = "resumo_vendas_produto"
+    __table_args__ = (
+        UniqueConstraint("data", "produto_id", name="uq_resumo_vendas_produto"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    data = Column(Date, nullable=False, index=True)
+    produto_id = Column(Integer, ForeignKey("produtos.id", ondelete="CASCADE"), nullable=False)
+    quantidade = Column(Float, nullable=False, default=0.0)
+    faturamento = Column(Float, nullable=False, default=0.0)
+
+class ResumoVendasOperador(Base):
+    """Vendas e faturamento por dia/operador, mantidos pela finalização."""
+    __tablename__ = "resumo_vendas_operador"
+    __table_args__ = (
+        UniqueConstraint("data", "operador_id", name="uq_resumo_vendas_operador"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    data = Column(Date, nullable=False, index=True)
+    operador_id = Column(Integer, ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False)
+    faturamento = Column(Float, nullable=False, default=0.0)
+    quantidade_vendas = Column(Integer, nullable=False, default=0)
+
 class ResumoDiarioEstoque(Base):
     __tablename__ = "resumo_diario_estoque"
 
@@ -330,12 +597,14 @@ class ResumoDiarioEstoque(Base):
 class Empresa(Base):
     __tablename__ = "empresa_config"
     id = Column(Integer, primary_key=True)
+    # Incrementada a cada alteração; os processos revalidam a configuração em cache por ela
+    versao_config = Column(Integer, nullable=False, default=1, server_default="1")
     
     # Identidade
     nome_fantasia = Column(String(100), nullable=False, default="Minha Loja")
     razao_social = Column(String(100), nullable=True)
     cnpj = Column(String(20), nullable=True)
-    logo_data = Column(String, nullable=True)
+    logo_data = deferred(Column(String, nullable=True)) # Legado: em documentos_armazenados
     tipo_logo = Column(String(10), default="url")
     
     tema_preferido = Column(String(20), default="system") 
@@ -359,6 +628,7 @@ class Empresa(Base):
     regime_tributario = Column(String(20), default="simples")
     inscricao_estadual = Column(String(20), nullable=True)
     inscricao_municipal = Column(String(20), nullable=True)
+    uf = Column(String(2), nullable=True) # Autorizadora da SEFAZ (cUFAutor da distribuição DF-e)
     csc_id = Column(String(10), nullable=True) 
     csc_token = Column(String(100), nullable=True) 
 
@@ -414,7 +684,7 @@ class CertificadoDigital(Base):
     emissor = Column(String(100))
     data_validade = Column(DateTime)
     serial_number = Column(String(100))
-    arquivo_binario = Column(LargeBinary)
+    arquivo_binario = deferred(Column(LargeBinary)) # Legado: em documentos_armazenados
     ativo = Column(Boolean, default=True)
     empresa = relationship("Empresa", back_populates="certificados")
 
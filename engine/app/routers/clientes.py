@@ -1,8 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session, joinedload 
-from typing import List
+from sqlalchemy import func, or_
+from typing import List, Optional
 from .. import models, schemas
 from ..database import get_db
+from ..services import caixa
+from ..utils import periodos
+from ..utils.paginacao import Paginacao
 from datetime import date, datetime
 from ..utils.security import get_password_hash, verify_password
 
@@ -33,12 +37,44 @@ def _build_cliente_response(db_cliente: models.Cliente) -> schemas.Cliente:
         limite_disponivel=limite_disp # <-- Agora é sempre um número JSON-compatível
     )
 
+ORDENACOES_CLIENTES = {
+    "nome": models.Cliente.nome,
+    "saldo_devedor": func.coalesce(models.Cliente.saldo_devedor, 0.0),
+    "id": models.Cliente.id,
+}
+
+
+def consultar_clientes_lista(db: Session, busca: Optional[str] = None, status_conta: Optional[str] = None):
+    """
+    Projeção das listagens de clientes (aqui e em /crediario/clientes): só as
+    colunas que _build_cliente_response lê (sem senha, sem relacionamentos).
+    """
+    C = models.Cliente
+    query = db.query(
+        C.id, C.nome, C.cpf, C.telefone, C.email, C.limite_credito, C.saldo_devedor,
+        C.trust_mode, C.status_conta, C.dia_vencimento_fatura,
+    )
+    if busca:
+        query = query.filter(or_(C.nome.ilike(f"%{busca}%"), C.cpf == busca))
+    if status_conta:
+        query = query.filter(C.status_conta == status_conta)
+    return query
+
+
 @router.get("/", response_model=List[schemas.Cliente])
-def get_all_clientes(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    clientes = db.query(models.Cliente).offset(skip).limit(limit).all()
+def get_all_clientes(
+    busca: Optional[str] = None,
+    status_conta: Optional[str] = None,
+    pagina: Paginacao = Depends(),
+    db: Session = Depends(get_db)
+):
+    """Clientes paginados por cursor (padrão: por nome). 'busca': nome ou CPF exato."""
+    linhas = pagina.aplicar(
+        consultar_clientes_lista(db, busca, status_conta), ORDENACOES_CLIENTES, padrao="nome", chave_id=models.Cliente.id
+    )
     
     # Usa a função auxiliar para construir a resposta para cada cliente
-    return [_build_cliente_response(cliente) for cliente in clientes]
+    return [_build_cliente_response(linha) for linha in linhas]
 
 # --- Rota GET para Detalhes de UM Cliente ---
 @router.put("/{cliente_id}", response_model=schemas.Cliente)
@@ -188,7 +224,7 @@ def create_cliente_rapido(
     senha_hash_string = get_password_hash(request.senha)
 
     # 4. Regra de Negócio (Dia do Vencimento)
-    hoje = datetime.utcnow()
+    hoje = periodos.hoje_local(db)
     dia_do_cadastro = hoje.day 
 
     # 5. Cria o novo cliente no banco
@@ -307,6 +343,7 @@ def receber_pagamento_crediario(
                     operador_id=request.operador_id,
                 )
                 db.add(db_mov)
+                caixa.registrar(db, request.pdv_id, total_recebimentos=request.valor_pago)
                 
             # O 'with db.begin()' faz o COMMIT aqui
 
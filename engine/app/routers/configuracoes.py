@@ -3,6 +3,7 @@ from datetime import datetime, timedelta # Para simular validade
 from sqlalchemy.orm import Session,joinedload
 from .. import models, schemas
 from ..database import get_db
+from ..services import config_empresa, armazem_documentos
 from typing import List
 from cryptography.hazmat.primitives.serialization import pkcs12
 from cryptography.hazmat.backends import default_backend
@@ -20,7 +21,7 @@ def get_configuracoes_geral(db: Session = Depends(get_db)):
         db.commit()
         db.refresh(config)
         
-    return config
+    return config_empresa.com_logo(db, config)
 
 @router.put("/geral", response_model=schemas.EmpresaConfig)
 def update_configuracoes_geral(
@@ -35,16 +36,18 @@ def update_configuracoes_geral(
     # --- Mapeamento Manual (Segurança e Controle) ---
     config.nome_fantasia = settings.nome_fantasia
     config.cnpj = settings.cnpj
-    config.logo_data = settings.logo_data
+    armazem_documentos.gravar(db, models.Empresa.logo_data, config.id, settings.logo_data)
     config.tipo_logo = settings.tipo_logo
     
     config.tema_preferido = settings.tema_preferido
     config.cor_destaque = settings.cor_destaque
     config.fuso_horario = settings.fuso_horario
+    config_empresa.nova_versao(config)
     
     db.commit()
     db.refresh(config)
-    return config
+    config_empresa.invalidar()
+    return config_empresa.com_logo(db, config)
 
 @router.put("/operacional/regras", response_model=schemas.EmpresaConfig)
 def update_regras_operacionais(
@@ -57,9 +60,11 @@ def update_regras_operacionais(
     if "permitir_estoque_negativo" in regras:
         config.permitir_estoque_negativo = regras["permitir_estoque_negativo"]
         
+    config_empresa.nova_versao(config)
     db.commit()
     db.refresh(config)
-    return config
+    config_empresa.invalidar()
+    return config_empresa.com_logo(db, config)
 
 @router.get("/operacional/perfis", response_model=List[schemas.PerfilAbertura])
 def list_perfis_abertura(db: Session = Depends(get_db)):
@@ -138,18 +143,22 @@ def update_fiscal_rules(regras: dict, db: Session = Depends(get_db)):
     
     # Mapeamento dinâmico seguro
     campos_permitidos = [
-        "regime_tributario", "inscricao_estadual", "inscricao_municipal",
+        "regime_tributario", "inscricao_estadual", "inscricao_municipal", "uf",
         "csc_id", "csc_token", "padrao_ncm", "padrao_cfop_dentro",
         "padrao_cfop_fora", "padrao_csosn", "ambiente_sefaz", "tentativas_envio"
     ]
+    if regras.get("uf"):
+        regras["uf"] = regras["uf"].strip().upper()
     
     for campo in campos_permitidos:
         if campo in regras:
             setattr(config, campo, regras[campo])
             
+    config_empresa.nova_versao(config)
     db.commit()
     db.refresh(config)
-    return config
+    config_empresa.invalidar()
+    return config_empresa.com_logo(db, config)
 
 @router.post("/fiscal/certificado", response_model=schemas.CertificadoInfo)
 async def upload_certificado(
@@ -198,7 +207,6 @@ async def upload_certificado(
         empresa_id=1,
         nome_arquivo=file.filename,
         senha_arquivo=senha,     # Em produção, criptografar!
-        arquivo_binario=conteudo,
 
         # Dados extraídos
         titular=titular,
@@ -210,6 +218,9 @@ async def upload_certificado(
     )
 
     db.add(db_cert)
+    db.flush()
+    # O .pfx fica no armazém de documentos; a listagem de certificados não o carrega
+    armazem_documentos.gravar(db, models.CertificadoDigital.arquivo_binario, db_cert.id, conteudo)
     db.commit()
     db.refresh(db_cert)
 
@@ -222,6 +233,7 @@ def list_certificados(db: Session = Depends(get_db)):
 @router.delete("/fiscal/certificados/{id}", status_code=204)
 def delete_certificado(id: int, db: Session = Depends(get_db)):
     db.query(models.CertificadoDigital).filter(models.CertificadoDigital.id == id).delete()
+    armazem_documentos.apagar(db, models.CertificadoDigital, id)
     db.commit()
 
 @router.put("/conexoes", response_model=schemas.EmpresaConfig)
@@ -242,6 +254,8 @@ def update_conexoes_config(regras: dict, db: Session = Depends(get_db)):
         if campo in regras:
             setattr(config, campo, regras[campo])
             
+    config_empresa.nova_versao(config)
     db.commit()
     db.refresh(config)
-    return config
\ No newline at end of file
+    config_empresa.invalidar()
+    return config_empresa.com_logo(db, config)
\ No newline at end of file
@@ -1,10 +1,12 @@
 # app/routers/crediario.py
-from typing import List
+from typing import List, Optional
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from .. import models, schemas
 from ..database import get_db
+from ..utils.paginacao import Paginacao
+from .clientes import ORDENACOES_CLIENTES, consultar_clientes_lista
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from datetime import datetime
@@ -33,33 +35,42 @@ def get_crediario_summary(db: Session = Depends(get_db)):
 
 # --- Endpoint para a Tabela de Clientes ---
 @router.get("/clientes", response_model=List[schemas.ClienteCrediario]) # Usa seu schema ClienteCrediario
-def get_crediario_clientes(db: Session = Depends(get_db)):
-    clientes = db.query(models.Cliente).all()
-    
-    clientes_com_limite = []
-    for cliente in clientes:
-        # ✅ LÓGICA CORRIGIDA: Calcula o limite numérico. Não usa float('inf').
-        limite_disponivel_calculado = (cliente.limite_credito or 0.0) - (cliente.saldo_devedor or 0.0)
-        
-        # Cria o objeto do schema para a resposta
-        try:
-            cliente_schema = schemas.ClienteCrediario(
-                id=cliente.id,
-                nome=cliente.nome,
-                cpf=cliente.cpf,
-                telefone=cliente.telefone, # Adicionado (herda de ClienteBase)
-                email=cliente.email,       # Adicionado (herda de ClienteBase)
-                limite_credito=cliente.limite_credito,
-                saldo_devedor=cliente.saldo_devedor,
-                status_conta=cliente.status_conta,
-                
-                dia_vencimento_fatura=cliente.dia_vencimento_fatura, 
-                limite_disponivel=limite_disponivel_calculado,
-                trust_mode=cliente.trust_mode 
-            )
-            clientes_com_limite.append(cliente_schema)
-        except Exception as e:
-            print(f"Erro ao validar cliente ID {cliente.id} para schema ClienteCrediario: {e}")
-            
-    return clientes_com_limite
+def get_crediario_clientes(
+    busca: Optional[str] = None,
+    status_conta: Optional[str] = None,
+    pagina: Paginacao = Depends(),
+    db: Session = Depends(get_db)
+):
+    """Clientes do crediário com o limite disponível, paginados por cursor (padrão: por nome)."""
+    linhas = pagina.aplicar(
+        consultar_clientes_lista(db, busca, status_conta), ORDENACOES_CLIENTES, padrao="nome", chave_id=models.Cliente.id
+    )
+
+    return [_cliente_crediario(linha) for linha in linhas]
+
+
+@router.get("/clientes/{cliente_id}", response_model=schemas.ClienteCrediario)
+def get_crediario_cliente(cliente_id: int, db: Session = Depends(get_db)):
+    """Um cliente da lista (o painel lateral recarrega o selecionado sem trazer todas as páginas)."""
+    linha = consultar_clientes_lista(db).filter(models.Cliente.id == cliente_id).first()
+    if linha is None:
+        raise HTTPException(status_code=404, detail="Cliente não encontrado.")
+    return _cliente_crediario(linha)
+
+
+def _cliente_crediario(linha) -> schemas.ClienteCrediario:
+    return schemas.ClienteCrediario(
+        id=linha.id,
+        nome=linha.nome,
+        cpf=linha.cpf,
+        telefone=linha.telefone,
+        email=linha.email,
+        limite_credito=linha.limite_credito or 0.0,
+        saldo_devedor=linha.saldo_devedor or 0.0,
+        status_conta=linha.status_conta,
+        dia_vencimento_fatura=linha.dia_vencimento_fatura,
+        # Calcula o limite numérico. Não usa float('inf').
+        limite_disponivel=(linha.limite_credito or 0.0) - (linha.saldo_devedor or 0.0),
+        trust_mode=linha.trust_mode,
+    )
 
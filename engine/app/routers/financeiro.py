@@ -3,6 +3,8 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from .. import models, schemas
 from ..database import get_db
+from ..services import config_empresa
+from ..utils.paginacao import Paginacao
 
 router = APIRouter(prefix="/configuracoes/financeiro", tags=["Configurações Financeiras"])
 
@@ -49,16 +51,34 @@ def update_financeiro_rules(data: dict, db: Session = Depends(get_db)):
     if "crediario_multa" in data: config.crediario_multa = data["crediario_multa"]
     if "crediario_juros_mensal" in data: config.crediario_juros_mensal = data["crediario_juros_mensal"]
     if "crediario_dias_carencia" in data: config.crediario_dias_carencia = data["crediario_dias_carencia"]
+    config_empresa.nova_versao(config)
     
     db.commit()
     db.refresh(config)
-    return config
+    config_empresa.invalidar()
+    return config_empresa.com_logo(db, config)
 
-@router.get("/pix/overrides", response_model=List[schemas.Pdv])
-def list_pdv_pix_overrides(db: Session = Depends(get_db)):
-    """Lista todos os PDVs (para preencher o select ou mostrar a lista de exceções)."""
-    # Retorna todos, o front filtra ou mostra status
-    return db.query(models.Pdv).all()
+ORDENACOES_PDVS = {
+    "nome": models.Pdv.nome,
+    "id": models.Pdv.id,
+}
+
+@router.get("/pix/overrides", response_model=List[schemas.PdvPix])
+def list_pdv_pix_overrides(
+    somente_com_chave: bool = False,
+    pagina: Paginacao = Depends(),
+    db: Session = Depends(get_db)
+):
+    """
+    Lista os PDVs com a chave PIX específica de cada um (para preencher o
+    select ou mostrar a lista de exceções), paginados por cursor.
+    'somente_com_chave' devolve só as exceções.
+    """
+    P = models.Pdv
+    query = db.query(P.id, P.nome, P.status, P.pix_chave_especifica, P.pix_tipo_especifico)
+    if somente_com_chave:
+        query = query.filter(P.pix_chave_especifica.isnot(None))
+    return pagina.aplicar(query, ORDENACOES_PDVS, padrao="id", chave_id=P.id)
 
 @router.put("/pix/overrides/{pdv_id}", response_model=schemas.Pdv)
 def update_pdv_pix_override(
@@ -1,11 +1,14 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, extract, or_
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy.orm import Session
+from sqlalchemy import func, or_
 from .. import models, schemas
 from ..database import get_db
 from datetime import datetime, timedelta
-from ..services import fiscal_service 
+from ..services import fiscal_service, emissao_lote, jobs, numeracao_fiscal, config_empresa, armazem_documentos
+from ..utils import periodos
+from ..utils.paginacao import Paginacao
+from .vendas import ORDENACOES_VENDAS, consultar_vendas_lista, montar_vendas_lista
 
 router = APIRouter(prefix="/fiscal", tags=["Fiscal"])
 
@@ -16,12 +19,14 @@ def get_fiscal_summary(db: Session = Depends(get_db)):
     Retorna os dados consolidados para os painéis da página Fiscal.
     Fonte da verdade: NotaFiscalSaida e NotaFiscalEntrada.
     """
-    start_of_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0)
+    tz = periodos.fuso_da_loja(db)
+    mes_atual = periodos.mes(tz=tz)
+    start_of_month = periodos.hoje_local(tz).replace(day=1) # NotaFiscalEntrada.data_emissao é Date
     seven_days_ago = datetime.utcnow() - timedelta(days=7)
 
     # Total Comprado (Entrada)
     total_comprado = db.query(func.sum(models.NotaFiscalEntrada.valor_total)).filter(
-        models.NotaFiscalEntrada.data_emissao >= start_of_month.date()
+        models.NotaFiscalEntrada.data_emissao >= start_of_month
     ).scalar() or 0
 
     # Total Emitido (Saída Autorizada)
@@ -29,17 +34,23 @@ def get_fiscal_summary(db: Session = Depends(get_db)):
         .join(models.NotaFiscalSaida)\
         .filter(
             models.NotaFiscalSaida.status_sefaz.in_(['Autorizada', 'Emitida']),
-            models.NotaFiscalSaida.data_hora_autorizacao >= start_of_month
+            mes_atual.contem(models.NotaFiscalSaida.data_hora_autorizacao)
         ).scalar() or 0
     
-    # Gráfico Diário
+    # Gráfico Diário (agrupa por hora UTC no banco; o dia é o do fuso da loja)
+    dia_utc, hora_utc = periodos.hora_utc(models.NotaFiscalSaida.data_hora_autorizacao)
     daily_issuance_query = db.query(
-        extract('day', models.NotaFiscalSaida.data_hora_autorizacao).label('day'),
+        dia_utc, hora_utc,
         func.sum(models.Venda.valor_total).label('issuedValue')
     ).join(models.Venda).filter(
         models.NotaFiscalSaida.status_sefaz.in_(['Autorizada', 'Emitida']),
-        extract('month', models.NotaFiscalSaida.data_hora_autorizacao) == start_of_month.month
-    ).group_by('day').order_by('day').all()
+        mes_atual.contem(models.NotaFiscalSaida.data_hora_autorizacao)
+    ).group_by(dia_utc, hora_utc).all()
+
+    emitido_por_dia = {}
+    for dia, hora, valor in daily_issuance_query:
+        dia_local = periodos.hora_local(dia, hora, tz).day
+        emitido_por_dia[dia_local] = emitido_por_dia.get(dia_local, 0.0) + float(valor or 0)
 
     # Notas Rejeitadas
     rejected_count = db.query(func.count(models.NotaFiscalSaida.id)).filter(
@@ -62,8 +73,8 @@ def get_fiscal_summary(db: Session = Depends(get_db)):
         "total_comprado_mes": total_comprado,
         "total_emitido_mes": total_emitido,
         "resumo_diario": [
-            {"day": int(row.day), "issuedValue": float(row.issuedValue or 0)}
-            for row in daily_issuance_query
+            {"day": dia, "issuedValue": valor}
+            for dia, valor in sorted(emitido_por_dia.items())
         ],
         "notas_rejeitadas": rejected_count,
         "pendentes_antigas": old_pending_count
@@ -72,15 +83,15 @@ def get_fiscal_summary(db: Session = Depends(get_db)):
 # --- 2. CONFIGURAÇÕES (Mantido) ---
 @router.get("/config", response_model=schemas.FiscalConfigResponse)
 def get_fiscal_config(db: Session = Depends(get_db)):
-    config_empresa = db.query(models.Empresa).filter(models.Empresa.id == 1).first()
-    if not config_empresa:
+    empresa = config_empresa.obter(db)
+    if not empresa:
         # Default seguro se não houver empresa configurada
         return schemas.FiscalConfigResponse(strategy="coeficiente", goal_value=2.1, autopilot_enabled=False)
         
     return schemas.FiscalConfigResponse(
-        strategy=config_empresa.fiscal_strategy,
-        goal_value=config_empresa.fiscal_goal_value,
-        autopilot_enabled=config_empresa.fiscal_autopilot
+        strategy=empresa.fiscal_strategy,
+        goal_value=empresa.fiscal_goal_value,
+        autopilot_enabled=empresa.fiscal_autopilot
     )
 
 @router.post("/config", response_model=schemas.FiscalConfigResponse)
@@ -88,65 +99,61 @@ def update_fiscal_config(
     config_update: schemas.FiscalConfigUpdateRequest,
     db: Session = Depends(get_db)
 ):
-    config_empresa = db.query(models.Empresa).filter(models.Empresa.id == 1).first()
-    if not config_empresa:
+    empresa = db.query(models.Empresa).filter(models.Empresa.id == 1).first()
+    if not empresa:
         # Cria empresa se não existir (fallback)
-        config_empresa = models.Empresa(id=1)
-        db.add(config_empresa)
+        empresa = models.Empresa(id=1)
+        db.add(empresa)
 
-    config_empresa.fiscal_strategy = config_update.strategy
-    config_empresa.fiscal_goal_value = config_update.goal_value
-    config_empresa.fiscal_autopilot = config_update.autopilot_enabled
+    empresa.fiscal_strategy = config_update.strategy
+    empresa.fiscal_goal_value = config_update.goal_value
+    empresa.fiscal_autopilot = config_update.autopilot_enabled
+    config_empresa.nova_versao(empresa)
     
     db.commit()
-    db.refresh(config_empresa)
+    db.refresh(empresa)
+    config_empresa.invalidar()
     
     return schemas.FiscalConfigResponse(
-        strategy=config_empresa.fiscal_strategy,
-        goal_value=config_empresa.fiscal_goal_value,
-        autopilot_enabled=config_empresa.fiscal_autopilot
+        strategy=empresa.fiscal_strategy,
+        goal_value=empresa.fiscal_goal_value,
+        autopilot_enabled=empresa.fiscal_autopilot
     )
 
 # --- 3. LISTAGEM (Corrigida para Vendas) ---
-@router.get("/notas", response_model=List[schemas.Venda]) 
+@router.get("/notas", response_model=List[schemas.VendaLista]) 
 def list_notas_fiscais(
-    skip: int = 0, 
-    limit: int = 100, 
     status: str = None, 
+    pagina: Paginacao = Depends(),
     db: Session = Depends(get_db)
 ):
     """
-    Lista todas as Vendas (Left Join Notas).
+    Lista as Vendas com a situação da nota (Left Join Notas), paginadas por
+    cursor (padrão: mais recentes primeiro).
     """
-    query = db.query(models.Venda).options(
-        joinedload(models.Venda.nota_fiscal_saida)
-    ).order_by(models.Venda.data_hora.desc())
+    N = models.NotaFiscalSaida
+    query = consultar_vendas_lista(db)
     
     if status and status != "todos":
         if status == "nao_gerada":
-            query = query.filter(models.Venda.nota_fiscal_saida == None)
+            query = query.filter(N.id == None)
         elif status == "pendente":
-            query = query.outerjoin(models.NotaFiscalSaida).filter(
+            query = query.filter(
                 or_(
-                    models.NotaFiscalSaida.id == None,
-                    models.NotaFiscalSaida.status_sefaz.in_(['Pendente', 'Rejeitada', 'Erro'])
+                    N.id == None,
+                    N.status_sefaz.in_(['Pendente', 'Rejeitada', 'Erro'])
                 )
             )
         elif status == "autorizada":
-            query = query.join(models.NotaFiscalSaida).filter(
-                models.NotaFiscalSaida.status_sefaz.in_(['Autorizada', 'Emitida'])
-            )
+            query = query.filter(N.status_sefaz.in_(['Autorizada', 'Emitida']))
         elif status == "rejeitada":
-             query = query.join(models.NotaFiscalSaida).filter(
-                models.NotaFiscalSaida.status_sefaz == 'Rejeitada'
-            )
+            query = query.filter(N.status_sefaz == 'Rejeitada')
         elif status == "nao_declarar":
             # Assumindo que existe um status específico ou lógica para isso
-             query = query.join(models.NotaFiscalSaida).filter(
-                models.NotaFiscalSaida.status_sefaz == 'Nao_Declarar'
-            )
+            query = query.filter(N.status_sefaz == 'Nao_Declarar')
             
-    return query.offset(skip).limit(limit).all()
+    linhas = pagina.aplicar(query, ORDENACOES_VENDAS, padrao="-data_hora", chave_id=models.Venda.id)
+    return montar_vendas_lista(linhas)
 
 # --- 4. AÇÕES DE EMISSÃO ---
 
@@ -154,6 +161,7 @@ def list_notas_fiscais(
 def transmitir_nota_manual(nota_id: int, db: Session = Depends(get_db)):
     try:
         nota_atualizada = fiscal_service.transmitir_nota(nota_id, db)
+        fiscal_service.avisar_status(nota_atualizada)
         return {
             "status": nota_atualizada.status_sefaz,
             "mensagem": nota_atualizada.xmotivo,
@@ -164,6 +172,28 @@ def transmitir_nota_manual(nota_id: int, db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
+ARQUIVOS_NOTA_SAIDA = {
+    "retorno": models.NotaFiscalSaida.xml_retorno, # XML autorizado (protocolado)
+    "envio": models.NotaFiscalSaida.xml_envio, # XML assinado que a SEFAZ rejeitou
+}
+
+@router.get("/notas/{nota_id}/xml")
+def baixar_xml_nota(nota_id: int, arquivo: str = "retorno", db: Session = Depends(get_db)):
+    """Download do XML da nota (guardado no armazém de documentos, fora da listagem)."""
+    coluna = ARQUIVOS_NOTA_SAIDA.get(arquivo)
+    if coluna is None:
+        raise HTTPException(status_code=400, detail=f"Arquivo inválido. Use: {', '.join(ARQUIVOS_NOTA_SAIDA)}.")
+    nota = db.query(models.NotaFiscalSaida.chave_acesso).filter(models.NotaFiscalSaida.id == nota_id).first()
+    if nota is None:
+        raise HTTPException(status_code=404, detail="Nota fiscal não encontrada.")
+    xml = armazem_documentos.ler(db, coluna, nota_id)
+    if xml is None:
+        raise HTTPException(status_code=404, detail=f"A nota não tem XML de {arquivo}.")
+    return Response(
+        xml, media_type="application/xml",
+        headers={"Content-Disposition": f'attachment; filename="{nota.chave_acesso or nota_id}-{arquivo}.xml"'},
+    )
+
 @router.post("/vendas/{venda_id}/gerar-nota", response_model=schemas.NotaFiscalSaida)
 def gerar_nota_tardia(venda_id: int, db: Session = Depends(get_db)):
     """Cria uma nota para uma venda órfã."""
@@ -178,44 +208,21 @@ def gerar_nota_tardia(venda_id: int, db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao gerar nota: {e}")
 
-@router.post("/emitir/lote", response_model=schemas.ActionResponse)
-def trigger_emitir_lote(request_data: schemas.EmitirLoteRequest, db: Session = Depends(get_db)):
-    # Se o front manda IDs de VENDA (porque a tabela lista vendas), precisamos:
-    # 1. Gerar notas se não existirem
-    # 2. Transmitir notas
+@router.post("/emitir/lote", response_model=schemas.JobFiscalResponse, status_code=status.HTTP_202_ACCEPTED)
+def trigger_emitir_lote(request_data: schemas.EmitirLoteRequest):
+    # Se o front manda IDs de VENDA (porque a tabela lista vendas), o job:
+    # 1. Gera notas se não existirem
+    # 2. Transmite em paralelo (acompanhe em /fiscal/jobs/{job_id} ou pelo WebSocket)
     
     venda_ids = request_data.venda_ids
     if not venda_ids: raise HTTPException(status_code=400, detail="Nenhum ID fornecido.")
 
-    sucessos = 0
-    falhas = 0
-    
-    for v_id in venda_ids:
-        try:
-            # 1. Busca ou Cria Nota
-            nota = db.query(models.NotaFiscalSaida).filter(models.NotaFiscalSaida.venda_id == v_id).first()
-            if not nota:
-                nota = fiscal_service.inicializar_nota_para_venda(v_id, db)
-                db.add(nota)
-                db.commit()
-                db.refresh(nota)
-            
-            # 2. Transmite se necessário
-            if nota.status_sefaz not in ['Autorizada', 'Emitida', 'Cancelada']:
-                nota_atualizada = fiscal_service.transmitir_nota(nota.id, db)
-                if nota_atualizada.status_sefaz in ['Autorizada', 'Emitida']:
-                    sucessos += 1
-                else:
-                    falhas += 1
-            else:
-                # Já estava emitida
-                sucessos += 1
-
-        except Exception as e:
-            print(f"Erro lote venda {v_id}: {e}")
-            falhas += 1
-
-    return schemas.ActionResponse(message=f"Lote processado. {sucessos} OK, {falhas} Falhas.")
+    job = emissao_lote.iniciar_lote(
+        "emitir_lote",
+        emissao_lote.preparar_por_vendas(venda_ids),
+        descricao="Lote"
+    )
+    return job.como_dict()
 
 @router.post("/emitir-meta", response_model=schemas.ActionResponse)
 def trigger_emitir_meta(db: Session = Depends(get_db)):
@@ -233,17 +240,18 @@ def trigger_emitir_meta(db: Session = Depends(get_db)):
         return schemas.ActionResponse(message="O Piloto Automático está ativo. O sistema fará isso sozinho à noite.")
 
     # Calcula Totais (Mesma lógica do Dashboard)
-    start_of_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0)
+    tz = periodos.fuso_da_loja(db)
+    mes_atual = periodos.mes(tz=tz)
     
     total_comprado = db.query(func.sum(models.NotaFiscalEntrada.valor_total)).filter(
-        models.NotaFiscalEntrada.data_emissao >= start_of_month.date()
+        models.NotaFiscalEntrada.data_emissao >= periodos.hoje_local(tz).replace(day=1)
     ).scalar() or 0.0
 
     total_emitido = db.query(func.sum(models.Venda.valor_total))\
         .join(models.NotaFiscalSaida)\
         .filter(
             models.NotaFiscalSaida.status_sefaz.in_(['Autorizada', 'Emitida']),
-            models.NotaFiscalSaida.data_hora_autorizacao >= start_of_month
+            mes_atual.contem(models.NotaFiscalSaida.data_hora_autorizacao)
         ).scalar() or 0.0
 
     # 2. Calcula a Meta Alvo
@@ -302,6 +310,7 @@ def trigger_emitir_meta(db: Session = Depends(get_db)):
 
             # B. Transmite (Usa o serviço real)
             nota_atualizada = fiscal_service.transmitir_nota(nota.id, db)
+            fiscal_service.avisar_status(nota_atualizada)
 
             # C. Verifica Sucesso
             if nota_atualizada.status_sefaz.lower() in ['autorizada', 'emitida']:
@@ -326,84 +335,66 @@ def trigger_emitir_meta(db: Session = Depends(get_db)):
     return schemas.ActionResponse(message=msg_final)
 
 
-# ... (dentro de app/routers/fiscal.py)
-
-@router.post("/emitir/pendentes", response_model=schemas.ActionResponse)
+@router.post("/emitir/pendentes", response_model=schemas.JobFiscalResponse, status_code=status.HTTP_202_ACCEPTED)
 def trigger_emitir_pendentes(
-    tipo: str = "todas", # 'todas', 'nao_geradas', 'pendentes', 'rejeitadas'
-    db: Session = Depends(get_db)
+    tipo: str = "todas" # 'todas', 'nao_geradas', 'pendentes', 'rejeitadas'
 ):
     """
-    Processamento em Lote Cirúrgico.
+    Processamento em Lote Cirúrgico (job em segundo plano).
     O parâmetro 'tipo' define o alvo da operação.
     """
-    sucessos = 0
-    falhas = 0
-    erros_msg = []
-    notas_para_processar = []
+    if tipo not in ["todas", "nao_geradas", "pendentes", "rejeitadas"]:
+        raise HTTPException(status_code=400, detail=f"Tipo de lote inválido: '{tipo}'.")
 
-    print(f"--- LOTE INICIADO: Tipo '{tipo}' ---")
+    job = emissao_lote.iniciar_lote(
+        "emitir_pendentes",
+        emissao_lote.preparar_pendencias(tipo),
+        descricao=f"Operação '{tipo}'"
+    )
+    return job.como_dict()
 
-    # 1. ALVO: VENDAS SEM NOTA (Não Geradas)
-    if tipo in ["todas", "nao_geradas"]:
-        vendas_sem_nota = db.query(models.Venda).outerjoin(models.NotaFiscalSaida).filter(
-            models.NotaFiscalSaida.id == None,
-            models.Venda.status == 'concluida'
-        ).all()
-        
-        print(f"  > Gerando {len(vendas_sem_nota)} notas novas...")
-        
-        for venda in vendas_sem_nota:
-            try:
-                # Gera a nota e já adiciona na fila de transmissão
-                nova_nota = fiscal_service.inicializar_nota_para_venda(venda.id, db)
-                db.add(nova_nota)
-                db.commit() 
-                db.refresh(nova_nota)
-                notas_para_processar.append(nova_nota)
-            except Exception as e:
-                falhas += 1
-                print(f"  X Erro ao gerar nota venda {venda.id}: {e}")
 
-    # 2. ALVO: NOTAS EXISTENTES (Pendentes/Rejeitadas)
-    query_notas = db.query(models.NotaFiscalSaida)
-    
-    filtros_status = []
-    if tipo == "todas":
-        filtros_status = ['Pendente', 'Rejeitada', 'Erro', 'pendente', 'rejeitada', 'erro']
-    elif tipo == "pendentes":
-        filtros_status = ['Pendente', 'pendente']
-    elif tipo == "rejeitadas":
-        filtros_status = ['Rejeitada', 'Erro', 'rejeitada', 'erro']
-        
-    if filtros_status:
-        notas_existentes = query_notas.filter(
-            models.NotaFiscalSaida.status_sefaz.in_(filtros_status)
-        ).all()
-        notas_para_processar.extend(notas_existentes)
+@router.get("/jobs", response_model=List[schemas.JobFiscalResponse])
+def listar_jobs_fiscais():
+    return jobs.listar_jobs("emitir")
 
-    print(f"  > Total a transmitir: {len(notas_para_processar)}")
 
-    # 3. TRANSMISSÃO
-    if not notas_para_processar and falhas == 0:
-        return schemas.ActionResponse(message=f"Nenhuma pendência do tipo '{tipo}' encontrada.")
+@router.get("/jobs/{job_id}", response_model=schemas.JobFiscalResponse)
+def get_job_fiscal(job_id: str):
+    job = jobs.obter_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado (pode ter expirado).")
+    return job
 
-    for nota in notas_para_processar:
-        try:
-            # O motor é o mesmo: tenta enviar, assinar e validar
-            res = fiscal_service.transmitir_nota(nota.id, db)
-            
-            if res.status_sefaz.lower() in ['autorizada', 'emitida']:
-                sucessos += 1
-            else:
-                falhas += 1
-                if len(erros_msg) < 2: 
-                    erros_msg.append(f"Nota {nota.id}: {res.xmotivo}")
-        except Exception as e:
-            falhas += 1
-            print(f"  X Erro transmissão nota {nota.id}: {e}")
 
-    resumo = f"Operação '{tipo}' concluída. {sucessos} sucessos, {falhas} falhas."
-    if erros_msg: resumo += f" Ex: {erros_msg[0]}..."
-    
-    return schemas.ActionResponse(message=resumo)
\ No newline at end of file
+# --- 5. NUMERAÇÃO / INUTILIZAÇÃO ---
+
+def _empresa_id(db: Session) -> int:
+    config = config_empresa.obter(db)
+    return config.id if config else 1
+
+@router.get("/numeracao/lacunas", response_model=List[schemas.NumeracaoFaixa])
+def get_lacunas_numeracao(modelo: str = "65", serie: int = 1, db: Session = Depends(get_db)):
+    """Faixas de números pulados que ainda não foram registradas para inutilização."""
+    faixas = numeracao_fiscal.detectar_lacunas(db, _empresa_id(db), modelo, serie)
+    return [{"numero_inicial": ini, "numero_final": fim} for ini, fim in faixas]
+
+@router.get("/numeracao/inutilizadas", response_model=List[schemas.NumeracaoInutilizada])
+def listar_numeracao_inutilizada(db: Session = Depends(get_db)):
+    return db.query(models.NumeracaoInutilizada).order_by(
+        models.NumeracaoInutilizada.data_registro.desc()
+    ).all()
+
+@router.post("/numeracao/inutilizadas", response_model=schemas.NumeracaoInutilizada, status_code=status.HTTP_201_CREATED)
+def registrar_numeracao_inutilizada(request: schemas.NumeracaoInutilizarRequest, db: Session = Depends(get_db)):
+    if request.numero_inicial < 1 or request.numero_final < request.numero_inicial:
+        raise HTTPException(status_code=400, detail="Faixa de numeração inválida.")
+
+    try:
+        return numeracao_fiscal.registrar_inutilizacao(
+            db, _empresa_id(db), request.modelo, request.serie,
+            request.numero_inicial, request.numero_final, request.motivo
+        )
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=str(e))
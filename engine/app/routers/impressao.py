@@ -4,7 +4,7 @@ from .. import schemas
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session, joinedload
 from .. import models, database
-from ..services import printer_layout, printer_driver
+from ..services import printer_layout, printer_driver, config_empresa
 
 router = APIRouter(
     prefix="/impressao",  # O prefixo da nossa rota
@@ -64,7 +64,7 @@ def imprimir_cupom_venda(venda_id: int, db: Session = Depends(database.get_db)):
         raise HTTPException(status_code=404, detail="Venda não encontrada.")
     
     # 2. Busca Configurações da Empresa (para cabeçalho/rodapé)
-    empresa = db.query(models.Empresa).filter(models.Empresa.id == 1).first()
+    empresa = config_empresa.obter(db) # Foto em cache, sem o logo
     
     # 3. Gera o Layout (Bytes)
     cupom_bytes = printer_layout.gerar_layout_cupom(venda, empresa)
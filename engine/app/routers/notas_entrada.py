@@ -1,28 +1,102 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session, joinedload # Import joinedload
-from typing import List
+from typing import List, Optional
 from .. import models, schemas
 from ..database import get_db
+from ..services import distribuicao_dfe, armazem_documentos
+from ..services.distribuicao_dfe import sincronizador_dfe
+from ..utils.paginacao import Paginacao
 
 router = APIRouter(
     prefix="/notas-fiscais-entrada", # Mantendo sem /api, como você padronizou
     tags=["Notas Fiscais de Entrada"]
 )
 
+ORDENACOES_NOTAS_ENTRADA = {
+    "data_emissao": models.NotaFiscalEntrada.data_emissao,
+    "valor_total": models.NotaFiscalEntrada.valor_total,
+    "id": models.NotaFiscalEntrada.id,
+}
+
+ORDENACOES_DOCUMENTOS_DFE = {
+    "nsu": models.DocumentoDFe.nsu,
+}
+
 @router.get("/", response_model=List[schemas.NotaFiscalEntrada])
 def get_all_notas_entrada(
-    skip: int = 0, # Parâmetro opcional para paginação futura
-    limit: int = 100, # Limite padrão para evitar sobrecarga
+    fornecedor_id: Optional[int] = None,
+    pagina: Paginacao = Depends(),
+    db: Session = Depends(get_db)
+):
+    """
+    Lista as Notas Fiscais de Entrada registradas, paginadas por cursor
+    (padrão: emissão mais recente primeiro).
+    """
+    N = models.NotaFiscalEntrada
+    query = db.query(N.id, N.numero_nota, N.data_emissao, N.valor_total)
+    if fornecedor_id:
+        query = query.filter(N.fornecedor_id == fornecedor_id)
+    return pagina.aplicar(query, ORDENACOES_NOTAS_ENTRADA, padrao="-data_emissao", chave_id=N.id)
+
+@router.get("/{nota_id}/xml")
+def baixar_xml_nota_entrada(nota_id: int, db: Session = Depends(get_db)):
+    """Download do XML da nota (guardado no armazém de documentos, fora da listagem)."""
+    nota = db.query(models.NotaFiscalEntrada.chave_acesso).filter(models.NotaFiscalEntrada.id == nota_id).first()
+    if nota is None:
+        raise HTTPException(status_code=404, detail="Nota fiscal de entrada não encontrada.")
+    xml = armazem_documentos.ler(db, models.NotaFiscalEntrada.xml_conteudo, nota_id)
+    if xml is None:
+        raise HTTPException(status_code=404, detail="Nota lançada sem XML.")
+    return Response(
+        xml, media_type="application/xml",
+        headers={"Content-Disposition": f'attachment; filename="{nota.chave_acesso or nota_id}.xml"'},
+    )
+
+@router.get("/dfe/documentos", response_model=List[schemas.DocumentoDFe])
+def listar_documentos_dfe(
+    tipo: Optional[str] = None,
+    pendentes: bool = False,
+    pagina: Paginacao = Depends(),
     db: Session = Depends(get_db)
 ):
     """
-    Lista todas as Notas Fiscais de Entrada registradas,
-    incluindo os dados básicos do fornecedor.
+    Documentos recebidos pela distribuição DF-e (mais recentes primeiro).
+    'pendentes=true' mostra só as chaves que ainda não viraram nota de entrada.
+    """
+    D, N = models.DocumentoDFe, models.NotaFiscalEntrada
+    query = db.query(
+        D.id, D.nsu, D.chave_acesso, D.tipo, D.emitente_cnpj, D.emitente_nome,
+        D.valor_total, D.data_emissao, D.recebido_em, (N.id != None).label("importada"),
+    ).outerjoin(N, N.chave_acesso == D.chave_acesso)
+    if tipo:
+        query = query.filter(D.tipo == tipo)
+    if pendentes:
+        query = query.filter(N.id == None)
+    return pagina.aplicar(query, ORDENACOES_DOCUMENTOS_DFE, padrao="-nsu", chave_id=D.id)
+
+
+@router.get("/dfe/status", response_model=List[schemas.SincronizacaoDFeStatus])
+def status_sincronizacao_dfe(db: Session = Depends(get_db)):
+    return [
+        distribuicao_dfe.estado_como_dict(estado, sincronizacao_automatica=sincronizador_dfe.ativo)
+        for estado in db.query(models.SincronizacaoDFe).all()
+    ]
+
+
+@router.post("/dfe/sincronizar", response_model=schemas.SincronizacaoDFeStatus)
+def sincronizar_dfe(db: Session = Depends(get_db)):
+    """
+    Sincroniza agora (respeitando o intervalo mínimo da SEFAZ). Com o
+    worker ativo só o acorda; o resultado aparece em /dfe/status e no
+    WebSocket (tópico 'fiscal').
     """
-    notas = db.query(models.NotaFiscalEntrada).options(
-        joinedload(models.NotaFiscalEntrada.fornecedor) # Carrega o fornecedor junto
-    ).order_by(
-        models.NotaFiscalEntrada.data_emissao.desc() # Ordena pelas mais recentes
-    ).offset(skip).limit(limit).all()
-    
-    return notas
\ No newline at end of file
+    if sincronizador_dfe.ativo:
+        sincronizador_dfe.avisar()
+        return distribuicao_dfe.estado_como_dict(
+            None, mensagem="Sincronização solicitada.", sincronizacao_automatica=True
+        )
+    try:
+        return distribuicao_dfe.sincronizar(db)
+    except Exception as e:
+        print(f"❌ [DF-e] Falha na sincronização: {e}")
+        raise HTTPException(status_code=502, detail=f"Falha na distribuição DF-e: {e}")
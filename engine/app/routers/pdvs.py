@@ -1,10 +1,13 @@
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload,selectinload
-from sqlalchemy import func, extract, exists, cast, Date
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, aliased
+from sqlalchemy import func, exists
 from .. import models, schemas
-from ..database import get_db
-from datetime import datetime, date, timedelta
+from ..database import get_db, get_async_db
+from ..services import caixa
+from ..utils import periodos
+from datetime import datetime, timedelta
 
 router = APIRouter(prefix="/pdvs", tags=["PDVs"])
 
@@ -38,185 +41,140 @@ def get_pdv_summary(db: Session = Depends(get_db)):
     }
 
 
+def _consultar_sessoes(db: Session, *filtros, zerar_caixa_fechado: bool = False) -> List[schemas.PdvStatusDetalhado]:
+    """
+    Situação da sessão de cada PDV numa única consulta:
+      - sessão de caixa mais recente (ROW_NUMBER por PDV), com os contadores
+        do turno já materializados (ver services/caixa.py);
+      - primeiro alerta pendente (ROW_NUMBER por PDV).
+    Custo independe do tamanho do turno: nenhuma venda/movimentação é lida.
+    """
+    # Sessão mais recente de cada PDV (a aberta, se houver)
+    sessoes_ordenadas = db.query(
+        models.SessaoCaixa.id.label("id"),
+        models.SessaoCaixa.pdv_id.label("pdv_id"),
+        func.row_number().over(
+            partition_by=models.SessaoCaixa.pdv_id,
+            order_by=(models.SessaoCaixa.aberta_em.desc(), models.SessaoCaixa.id.desc())
+        ).label("ordem")
+    ).subquery()
+    ultima_sessao = db.query(sessoes_ordenadas.c.id, sessoes_ordenadas.c.pdv_id).filter(
+        sessoes_ordenadas.c.ordem == 1
+    ).subquery("ultima_sessao")
+    Sessao = aliased(models.SessaoCaixa)
+
+    # Primeiro alerta pendente
+    alertas_ordenados = db.query(
+        models.Solicitacao.id.label("id"),
+        models.Solicitacao.pdv_id.label("pdv_id"),
+        func.row_number().over(
+            partition_by=models.Solicitacao.pdv_id,
+            order_by=models.Solicitacao.id
+        ).label("ordem")
+    ).filter(models.Solicitacao.status == 'pendente').subquery()
+    primeiro_alerta = db.query(alertas_ordenados.c.id, alertas_ordenados.c.pdv_id).filter(
+        alertas_ordenados.c.ordem == 1
+    ).subquery("primeiro_alerta")
+    Alerta = aliased(models.Solicitacao)
+
+    linhas = db.query(
+        models.Pdv,
+        Sessao,
+        Alerta
+    ).options(
+        joinedload(models.Pdv.operador_atual)
+    ).outerjoin(ultima_sessao, ultima_sessao.c.pdv_id == models.Pdv.id)\
+     .outerjoin(Sessao, Sessao.id == ultima_sessao.c.id)\
+     .outerjoin(primeiro_alerta, primeiro_alerta.c.pdv_id == models.Pdv.id)\
+     .outerjoin(Alerta, Alerta.id == primeiro_alerta.c.id)\
+     .filter(*filtros)\
+     .order_by(models.Pdv.id)\
+     .all()
+
+    resultado = []
+    for pdv, sessao, alerta in linhas:
+        valor_em_caixa = sessao.valor_em_caixa if sessao and sessao.status == 'aberta' else 0.0
+        if zerar_caixa_fechado and pdv.status != 'aberto':
+            # Mostra o valor calculado APENAS se o caixa estiver aberto
+            valor_em_caixa = 0.0
+
+        resultado.append(schemas.PdvStatusDetalhado(
+            id=pdv.id,
+            nome=pdv.nome,
+            status=pdv.status,
+            operador_atual=pdv.operador_atual,
+            alerta_pendente=alerta,
+            valor_em_caixa=valor_em_caixa,
+            total_vendas_dia=sessao.quantidade_vendas if sessao else 0,
+            hora_abertura=sessao.aberta_em if sessao else None
+        ))
+    return resultado
+
+
 @router.get("/", response_model=List[schemas.PdvStatusDetalhado]) 
-def get_all_pdvs(status: Optional[str] = None, db: Session = Depends(get_db)):
+async def get_all_pdvs(status: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
     """
     Busca todos os PDVs com status detalhado, incluindo cálculos de faturamento
     do dia (ou desde a abertura), contagem de vendas e alertas pendentes.
-    Pode ser filtrado por status.
+    Pode ser filtrado por status. Uma consulta só, agregada no banco.
     """
-    today = date.today() # Usaremos 'today' como fallback se não houver abertura
-
-    # ✅ MUDANÇA 2: Query mais poderosa para buscar relacionamentos
-    query = db.query(models.Pdv).options(
-        joinedload(models.Pdv.operador_atual),
-        selectinload(models.Pdv.solicitacoes),      # Carrega TODAS
-        selectinload(models.Pdv.vendas),               # Carrega TODAS
-        selectinload(models.Pdv.movimentacoes_caixa) # Carrega TODAS
-    )
-
-    # Lógica de filtro do PDV (continua igual)
+    filtros = []
     if status and status != "todos":
         if status == "fechados":
-            query = query.filter(models.Pdv.status != "aberto")
+            filtros.append(models.Pdv.status != "aberto")
         else:
-            query = query.filter(models.Pdv.status == status)
-    
-    pdvs_from_db = query.all()
+            filtros.append(models.Pdv.status == status)
 
-    # ✅ MUDANÇA 3: A LÓGICA DE CÁLCULO (como na explicação anterior)
-    lista_pdvs_detalhada = []
-    for pdv in pdvs_from_db:
-        
-        # Encontra a ÚLTIMA abertura de caixa para ESTE PDV
-        ultima_abertura_mov = db.query(models.MovimentacaoCaixa)\
-            .filter(models.MovimentacaoCaixa.pdv_id == pdv.id, models.MovimentacaoCaixa.tipo == 'abertura')\
-            .order_by(models.MovimentacaoCaixa.data_hora.desc())\
-            .first()
-
-        valor_abertura = 0.0
-        hora_abertura_dt = None # Guardamos como datetime
-        movimentacoes_periodo = []
-        vendas_periodo = []
-        
-        # Define o período relevante: desde a última abertura OU apenas hoje
-        if ultima_abertura_mov:
-            valor_abertura = ultima_abertura_mov.valor
-            hora_abertura_dt = ultima_abertura_mov.data_hora
-            periodo_inicio = hora_abertura_dt
-        else:
-            # Se não houve abertura, consideramos o início do dia atual como referência
-            periodo_inicio = datetime.combine(today, datetime.min.time())
-
-        # Filtra movimentações e vendas DENTRO DO PERÍODO relevante
-        movimentacoes_periodo = [
-            m for m in pdv.movimentacoes_caixa 
-            if m.data_hora >= periodo_inicio
-        ]
-        vendas_periodo = [
-            v for v in pdv.vendas 
-            if v.data_hora >= periodo_inicio and v.status == 'concluida' 
-        ]
-
-        # Calcula totais DENTRO DO PERÍODO
-        suprimentos = sum(m.valor for m in movimentacoes_periodo if m.tipo == 'suprimento')
-        sangrias = sum(m.valor for m in movimentacoes_periodo if m.tipo == 'sangria')
-        
-        # ❗ ATENÇÃO: Assume que 'forma_pagamento' existe no modelo Venda!
-        entradas_dinheiro_vendas = sum(
-            v.valor_total for v in vendas_periodo 
-            if getattr(v, 'forma_pagamento', 'dinheiro') == 'dinheiro' # Usamos getattr para segurança
-        )
-        
-        # CÁLCULO FINAL
-        valor_em_caixa_calculado = valor_abertura + entradas_dinheiro_vendas + suprimentos - sangrias
-        
-        # Contagem de vendas no período
-        total_vendas_periodo = len(vendas_periodo) 
-        
-        # Acha o primeiro alerta PENDENTE (se houver)
-        alerta = next((s for s in pdv.solicitacoes if s.status == 'pendente'), None)
-
-        # Monta o objeto final usando o schema rico
-        pdv_detalhado = schemas.PdvStatusDetalhado(
-            id=pdv.id,
-            nome=pdv.nome,
-            status=pdv.status,
-            operador_atual=pdv.operador_atual,
-            alerta_pendente=alerta,
-            # Mostra o valor calculado APENAS se o caixa estiver aberto
-            valor_em_caixa=valor_em_caixa_calculado if pdv.status == 'aberto' else 0.0, 
-            total_vendas_dia=total_vendas_periodo, # Renomear schema ou variável se confuso
-            hora_abertura=hora_abertura_dt # Passa o datetime da abertura
-        )
-        lista_pdvs_detalhada.append(pdv_detalhado)
-            
-    return lista_pdvs_detalhada
+    return await db.run_sync(_consultar_sessoes, *filtros, zerar_caixa_fechado=True)
 
 
 @router.get("/{pdv_id}/revenue", response_model=List[schemas.ChartDataPoint])
 def get_pdv_revenue_data(pdv_id: int, range: str = "today", db: Session = Depends(get_db)):
     """
-    Calcula o faturamento para um PDV específico.
-    Versão Otimizada para PostgreSQL (usa to_char).
+    Calcula o faturamento para um PDV específico, no fuso da loja.
+    Filtra por faixa de data_hora (índice pdv_id, status, data_hora) e agrupa
+    por hora UTC no banco; a chave do gráfico ('HH:00' ou 'AAAA-MM-DD') é
+    montada aqui, no horário local.
     """
-        
-    query = db.query(models.Venda).filter(
-        models.Venda.pdv_id == pdv_id,
-        models.Venda.status == "concluida"
-    )
-    
-    end_date = datetime.utcnow()
-    
+    tz = periodos.fuso_da_loja(db)
+    hoje = periodos.hoje_local(tz)
+
     # --- LÓGICA DE INTERVALO E AGRUPAMENTO ---
-    
     if range == "today":
-        start_date = end_date.replace(hour=0, minute=0, second=0, microsecond=0)
-        query = query.filter(models.Venda.data_hora >= start_date)
-        
-        # ✅ POSTGRES: Agrupa por Hora ('HH24:00')
-        key_column = func.to_char(models.Venda.data_hora, 'HH24:00').label("key")
-        
-        result = (
-            query.with_entities(
-                key_column,
-                func.sum(models.Venda.valor_total).label("revenue")
-            )
-            .group_by(key_column)
-            .order_by(key_column)
-            .all()
-        )
-        
+        intervalo, formato = periodos.dia(hoje, tz), "%H:00"
     elif range == "yesterday":
-        yesterday = end_date - timedelta(days=1)
-        start_date = yesterday.replace(hour=0, minute=0, second=0, microsecond=0)
-        end_date = yesterday.replace(hour=23, minute=59, second=59, microsecond=999999)
-        
-        query = query.filter(models.Venda.data_hora.between(start_date, end_date))
-        
-        # ✅ POSTGRES: Agrupa por Hora ('HH24:00')
-        key_column = func.to_char(models.Venda.data_hora, 'HH24:00').label("key")
-        
-        result = (
-            query.with_entities(
-                key_column,
-                func.sum(models.Venda.valor_total).label("revenue")
-            )
-            .group_by(key_column)
-            .order_by(key_column)
-            .all()
-        )
-
+        intervalo, formato = periodos.dia(hoje - timedelta(days=1), tz), "%H:00"
     elif range == "7d":
-        start_date = end_date - timedelta(days=7)
-        query = query.filter(models.Venda.data_hora >= start_date)
-        
-        # ✅ POSTGRES: Agrupa por Dia ('YYYY-MM-DD')
-        # Usamos to_char para garantir que a chave seja uma string pronta para o gráfico
-        key_column = func.to_char(models.Venda.data_hora, 'YYYY-MM-DD').label("key")
-        
-        result = (
-            query.with_entities(
-                key_column,
-                func.sum(models.Venda.valor_total).label("revenue")
-            )
-            .group_by(key_column)
-            .order_by(key_column)
-            .all()
-        )
-
+        intervalo, formato = periodos.ultimos_dias(7, tz), "%Y-%m-%d"
     else:
         raise HTTPException(status_code=400, detail="Intervalo de tempo inválido")
-            
+
+    dia_utc, hora_utc = periodos.hora_utc(models.Venda.data_hora)
+    result = (
+        db.query(dia_utc, hora_utc, func.sum(models.Venda.valor_total))
+        .filter(
+            models.Venda.pdv_id == pdv_id,
+            models.Venda.status == "concluida",
+            intervalo.contem(models.Venda.data_hora)
+        )
+        .group_by(dia_utc, hora_utc)
+        .all()
+    )
+
+    faturamento = {}
+    for dia, hora, total in result:
+        chave = periodos.hora_local(dia, hora, tz).strftime(formato)
+        faturamento[chave] = faturamento.get(chave, 0.0) + float(total or 0)
+
     # Formata para o schema
-    return [schemas.ChartDataPoint(key=str(row.key), revenue=float(row.revenue or 0)) for row in result]
+    return [schemas.ChartDataPoint(key=chave, revenue=valor) for chave, valor in sorted(faturamento.items())]
 
 @router.get("/{pdv_id}/stats", response_model=schemas.PdvStats)
 def get_pdv_stats(pdv_id: int, db: Session = Depends(get_db)):
     """
     Calcula o Ticket Médio e o Início do Turno para um PDV específico HOJE.
     """
-    today = date.today()
+    hoje = periodos.hoje(db)
 
     # 1. Calcula o Ticket Médio para este PDV hoje
     stats_vendas = db.query(
@@ -225,7 +183,7 @@ def get_pdv_stats(pdv_id: int, db: Session = Depends(get_db)):
     ).filter(
         models.Venda.pdv_id == pdv_id,
         models.Venda.status == "concluida",
-        func.date(models.Venda.data_hora) == today
+        hoje.contem(models.Venda.data_hora)
     ).first()
 
     faturamento = stats_vendas.total_faturado or 0
@@ -238,7 +196,7 @@ def get_pdv_stats(pdv_id: int, db: Session = Depends(get_db)):
     ).filter(
         models.MovimentacaoCaixa.pdv_id == pdv_id,
         models.MovimentacaoCaixa.tipo == 'abertura',
-        func.date(models.MovimentacaoCaixa.data_hora) == today
+        hoje.contem(models.MovimentacaoCaixa.data_hora)
     ).scalar() # .scalar() pega o primeiro valor da primeira linha
 
     return {
@@ -354,6 +312,9 @@ def open_pdv(
             autorizado_por_id=request.admin_id # Quem autorizou
         )
         db.add(movimentacao)
+
+        # Abre o turno (contadores do caixa)
+        caixa.abrir_sessao(db, db_pdv.id, request.operador_id, request.valor_abertura, aberta_por_id=request.admin_id)
         
         # Atualiza o status e operador do PDV
         db_pdv.status = 'aberto'
@@ -361,25 +322,9 @@ def open_pdv(
         
         # O db.begin() cuida do commit/rollback
         
-    # Recarrega o PDV com os relacionamentos necessários para a resposta
-    # Usamos uma subquery para carregar os relacionamentos após a transação
-    updated_pdv = db.query(models.Pdv).options(
-        joinedload(models.Pdv.operador_atual),
-        selectinload(models.Pdv.solicitacoes),
-        selectinload(models.Pdv.vendas),
-        selectinload(models.Pdv.movimentacoes_caixa)
-    ).filter(models.Pdv.id == pdv_id).one() # Usamos .one() pois sabemos que ele existe
-
-    # Reconstruir a resposta detalhada (lógica similar ao GET /)
-    # (Poderíamos refatorar isso para uma função auxiliar no futuro)
-    # ... (código para calcular valor_em_caixa, etc. APÓS a abertura) ...
-    # Por simplicidade agora, vamos apenas retornar o PDV mapeado
-    # O frontend fará o refetchData de qualquer forma
-    
-    # Mapeia diretamente para o schema base PdvStatus, o frontend fará refetch para detalhes
-    # Nota: Precisamos carregar 'operador_atual' para isso funcionar
-    db.refresh(updated_pdv, ["operador_atual"]) 
-    return updated_pdv # Pydantic V2 com from_attributes=True deve mapear isso
+    # Resposta já com a sessão recém-aberta (mesma agregação do GET /)
+    updated_pdv = db.query(models.Pdv).filter(models.Pdv.id == pdv_id).one()
+    return _get_pdv_session_details_logic(updated_pdv, db)
 
 
 # ✅ NOVA ROTA: Fechar Caixa
@@ -436,6 +381,8 @@ def close_pdv(
             autorizado_por_id=request.admin_id # Quem autorizou
         )
         db.add(movimentacao)
+
+        caixa.fechar_sessao(db, db_pdv.id, fechada_por_id=request.admin_id, valor_informado=request.valor_fechamento)
         
         # Atualiza o status e remove o operador do PDV
         db_pdv.status = 'fechado'
@@ -451,100 +398,44 @@ def close_pdv(
 def _get_pdv_session_details_logic(pdv: models.Pdv, db: Session) -> schemas.PdvStatusDetalhado:
     """
     Função interna que calcula os detalhes da sessão para um PDV já buscado.
-    Usada por GET /{id}/session e GET /session-by-name/{nome}.
+    Usada pela abertura/fechamento (rotas síncronas); as rotas de consulta
+    chamam _consultar_sessoes direto pela sessão assíncrona.
     """
+    return _consultar_sessoes(db, models.Pdv.id == pdv.id)[0]
 
-    # 2. Lógica de Cálculo de Caixa (A mesma da sua rota GET /)
-    ultima_abertura = db.query(models.MovimentacaoCaixa)\
-        .filter(models.MovimentacaoCaixa.pdv_id == pdv.id, models.MovimentacaoCaixa.tipo == 'abertura')\
-        .order_by(models.MovimentacaoCaixa.data_hora.desc())\
-        .first()
-
-    valor_abertura = 0.0
-    hora_abertura_dt = None
-    periodo_inicio = datetime.combine(date.today(), datetime.min.time()) # Padrão
-
-    if ultima_abertura:
-        valor_abertura = ultima_abertura.valor
-        hora_abertura_dt = ultima_abertura.data_hora
-        periodo_inicio = hora_abertura_dt
-
-    # Filtra transações desde o início do período
-    # (Nota: pdv.vendas e pdv.movimentacoes_caixa precisam ser carregados)
-    # (Se esta função for lenta, otimizar com 'selectinload' na query chamadora)
-    movimentacoes_periodo = [m for m in pdv.movimentacoes_caixa if m.data_hora >= periodo_inicio]
-    vendas_periodo = [v for v in pdv.vendas if v.data_hora >= periodo_inicio and v.status == 'concluida']
-
-    suprimentos = sum(m.valor for m in movimentacoes_periodo if m.tipo == 'suprimento')
-    sangrias = sum(m.valor for m in movimentacoes_periodo if m.tipo == 'sangria')
-    
-    entradas_dinheiro_vendas = sum(
-        v.valor_total for v in vendas_periodo 
-        if getattr(v, 'forma_pagamento', 'dinheiro') == 'dinheiro'
-    )
-    
-    valor_em_caixa_calculado = valor_abertura + entradas_dinheiro_vendas + suprimentos - sangrias
-    total_vendas_dia = len(vendas_periodo) 
-    alerta = next((s for s in pdv.solicitacoes if s.status == 'pendente'), None)
-
-    # 3. Retorna o schema "rico"
-    return schemas.PdvStatusDetalhado(
-        id=pdv.id,
-        nome=pdv.nome,
-        status=pdv.status,
-        operador_atual=pdv.operador_atual,
-        alerta_pendente=alerta,
-        valor_em_caixa=valor_em_caixa_calculado,
-        total_vendas_dia=total_vendas_dia,
-        hora_abertura=hora_abertura_dt
-    )
-
-# --- Rota GET /{pdv_id}/session (Agora usa a função auxiliar) ---
+# --- Rota GET /{pdv_id}/session (assíncrona: o PDV consulta a cada poucos segundos) ---
 @router.get("/{pdv_id}/session", response_model=schemas.PdvStatusDetalhado) 
-def get_pdv_session_details(pdv_id: int, db: Session = Depends(get_db)):
+async def get_pdv_session_details(pdv_id: int, db: AsyncSession = Depends(get_async_db)):
     """Busca os detalhes da sessão atual de um PDV pelo ID."""
     
-    # Query otimizada para carregar tudo que a função auxiliar precisa
-    pdv = db.query(models.Pdv).options(
-        joinedload(models.Pdv.operador_atual),
-        selectinload(models.Pdv.solicitacoes),
-        selectinload(models.Pdv.vendas),
-        selectinload(models.Pdv.movimentacoes_caixa)
-    ).filter(models.Pdv.id == pdv_id).first()
-
-    if not pdv:
+    sessoes = await db.run_sync(_consultar_sessoes, models.Pdv.id == pdv_id)
+
+    if not sessoes:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="PDV não encontrado.")
         
-    # Chama a lógica centralizada
-    return _get_pdv_session_details_logic(pdv, db)
+    return sessoes[0]
 
 # --- ✅ SUA NOVA ROTA (BY NAME) ---
 @router.get("/session-by-name/{nome_pdv}", response_model=schemas.PdvStatusDetalhado)
-def get_pdv_session_by_name(nome_pdv: str, db: Session = Depends(get_db)):
+async def get_pdv_session_by_name(nome_pdv: str, db: AsyncSession = Depends(get_async_db)):
     """
     Busca os detalhes da sessão atual de um PDV pelo NOME DA MÁQUINA.
     Usado pela interface de Ponto de Venda para inicializar.
     """
     
-    # Query otimizada para carregar tudo
-    pdv = db.query(models.Pdv).options(
-        joinedload(models.Pdv.operador_atual),
-        selectinload(models.Pdv.solicitacoes),
-        selectinload(models.Pdv.vendas),
-        selectinload(models.Pdv.movimentacoes_caixa)
-    ).filter(
+    sessoes = await db.run_sync(
+        _consultar_sessoes,
         # Compara em minúsculas para evitar erros (Caixa 01 vs caixa 01)
-        func.lower(models.Pdv.nome) == func.lower(nome_pdv) 
-    ).first()
+        func.lower(models.Pdv.nome) == func.lower(nome_pdv)
+    )
 
-    if not pdv:
+    if not sessoes:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"PDV com nome '{nome_pdv}' não encontrado ou não cadastrado."
         )
         
-    # Chama a mesma lógica centralizada
-    return _get_pdv_session_details_logic(pdv, db)
+    return sessoes[0]
 
 @router.post("/{pdv_id}/suprimento", response_model=schemas.MovimentacaoCaixaRequest) # Use o schema de leitura existente
 def realizar_suprimento(
@@ -565,6 +456,7 @@ def realizar_suprimento(
         # (Idealmente adicionar 'observacao' ao modelo MovimentacaoCaixa)
     )
     db.add(mov)
+    caixa.registrar(db, pdv.id, total_suprimentos=request.valor)
     db.commit()
     db.refresh(mov)
     return mov
@@ -588,6 +480,7 @@ def realizar_sangria(
         valor=request.valor,
     )
     db.add(mov)
+    caixa.registrar(db, pdv.id, total_sangrias=request.valor)
     db.commit()
     db.refresh(mov)
     return mov
@@ -607,12 +500,10 @@ def fechar_caixa_cego(
     if not pdv or pdv.status != 'aberto':
          raise HTTPException(status_code=400, detail="PDV não está aberto para fechamento.")
 
-    # 1. Calcular o Valor Esperado (A Matemática do Sistema)
-    # (Reutilizamos a lógica da função interna _get_pdv_session_details_logic)
-    session_details = _get_pdv_session_details_logic(pdv, db)
-    valor_sistema = session_details.valor_em_caixa # O que o sistema acha que tem em dinheiro
-
+    # 1. Valor Esperado (A Matemática do Sistema): contadores da sessão, O(1)
     valor_informado = request.valor_informado_dinheiro
+    sessao = caixa.fechar_sessao(db, pdv.id, valor_informado=valor_informado)
+    valor_sistema = sessao.valor_em_caixa if sessao else 0.0 # O que o sistema acha que tem em dinheiro
     diferenca = valor_informado - valor_sistema
 
     # 2. Registrar o Fechamento
@@ -1,12 +1,16 @@
 # app/routers/products.py
-from typing import List, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
+import os
+import shutil
+import tempfile
+from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 from datetime import date, timedelta, datetime
 from .. import models, schemas
-from sqlalchemy import and_
-from ..database import get_db, engine
-from ..services import xml_service
+from sqlalchemy import and_, func, or_
+from ..database import get_db, get_async_db
+from ..services import xml_service, catalogo_cache, estoque, busca_produtos, importacao_nfe, importacao_lote_nfe, jobs, distribuicao_dfe, armazem_documentos
 from ..models import NotaFiscalEntrada # Certifique-se de importar
 from fastapi import UploadFile, File
 from sqlalchemy.exc import IntegrityError
@@ -16,9 +20,10 @@ from ..schemas import ImportarChaveRequest # Assumindo que o schema está defini
 from ..database import get_db # Função para obter a sessão do banco
 from ..services.xml_service import parse_nfe_xml 
 from ..utils import extrair_proc_nfe 
+from ..utils import periodos
+from ..utils.paginacao import Paginacao
 from ..import models, schemas
 
-models.Base.metadata.create_all(bind=engine)
 router = APIRouter(
     prefix="/produtos",
     tags=["Produtos"]
@@ -40,14 +45,62 @@ def get_certificado_ativo(db: Session) -> models.CertificadoDigital:
 def create_product(produto: schemas.ProdutoCreate, db: Session = Depends(get_db)):
     db_produto = models.Produto(**produto.dict())
     db.add(db_produto)
+    db.flush()
+    if db_produto.quantidade_estoque:
+        estoque.registrar_movimentos(db, [{
+            "produto_id": db_produto.id,
+            "tipo": estoque.TIPO_AJUSTE,
+            "quantidade": db_produto.quantidade_estoque,
+            "observacao": "Saldo inicial no cadastro",
+        }])
     db.commit()
     db.refresh(db_produto)
+    catalogo_cache.invalidar_codigos([db_produto.codigo_barras])
     return db_produto
 
-@router.get("/", response_model=List[schemas.Produto])
-def get_all_products(db: Session = Depends(get_db)):
-    produtos = db.query(models.Produto).all()
-    return produtos
+ORDENACOES_PRODUTOS = {
+    "nome": models.Produto.nome,
+    "preco_venda": models.Produto.preco_venda,
+    "quantidade_estoque": func.coalesce(models.Produto.quantidade_estoque, 0),
+    "id": models.Produto.id,
+}
+
+@router.get("/", response_model=List[schemas.ProdutoLista])
+def get_all_products(
+    busca: Optional[str] = None,
+    categoria: Optional[str] = None,
+    pagina: Paginacao = Depends(),
+    db: Session = Depends(get_db)
+):
+    """
+    Catálogo paginado por cursor (padrão: por nome). 'busca' procura no nome
+    ou o código de barras exato. Só colunas do produto (sem fornecedor/criador).
+    """
+    P = models.Produto
+    query = db.query(
+        P.id, P.nome, P.preco_venda, P.quantidade_estoque, P.codigo_barras,
+        P.categoria, P.preco_custo, P.unidade_medida, P.vencimento,
+    )
+    if busca:
+        query = query.filter(or_(P.nome.ilike(f"%{busca}%"), P.codigo_barras == busca))
+    if categoria:
+        query = query.filter(P.categoria == categoria)
+
+    return pagina.aplicar(query, ORDENACOES_PRODUTOS, padrao="nome", chave_id=P.id)
+
+@router.get("/busca", response_model=List[schemas.ProdutoBusca])
+def buscar_produtos(
+    q: str = Query(..., min_length=1, max_length=100),
+    limite: int = Query(busca_produtos.LIMITE_PADRAO, ge=1, le=busca_produtos.LIMITE_MAXIMO),
+    categoria: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Busca por texto no nome, categoria, código de barras e fornecedor
+    (prefixo por palavra, sem acento, tolera erro de digitação), ordenada
+    por relevância. Para o caixa achar o item sem código: "coca 2l".
+    """
+    return busca_produtos.buscar(db, q, limite=limite, categoria=categoria)
 
 @router.delete("/{produto_id}")
 def delete_produto(produto_id: int, db: Session = Depends(get_db)):
@@ -63,54 +116,39 @@ def delete_produto(produto_id: int, db: Session = Depends(get_db)):
             detail="Não é possível excluir este produto, pois ele já foi utilizado em uma venda."
         )
 
+    codigo_barras = db_produto.codigo_barras
     db.delete(db_produto)
     db.commit()
+    catalogo_cache.invalidar_codigos([codigo_barras])
     return {"ok": True, "message": "Produto excluído com sucesso"} 
 
 @router.get("/barcode/{codigo_barras}", response_model=schemas.ProdutoComPromocao)
-def get_produto_por_codigo_barras(codigo_barras: str, db: Session = Depends(get_db)):
+async def get_produto_por_codigo_barras(codigo_barras: str, db: AsyncSession = Depends(get_async_db)):
     """
-    Busca um produto, verifica promoções ativas e calcula o preço final.
+    Busca um produto e devolve o preço final com a promoção vencedora.
+    Usa o índice em memória (catalogo_cache): no caso comum só lê o saldo de
+    estoque (PK) e o preço já vem materializado pelo motor de promoções. Rota assíncrona:
+    o acerto no índice responde direto no event loop, sem passar pelo threadpool.
     """
-    now = datetime.utcnow()
+    def _buscar(sessao: Session):
+        registro = catalogo_cache.buscar_por_codigo(codigo_barras, sessao)
+        # O saldo não fica no índice: uma leitura da coluna pela PK
+        return registro, (catalogo_cache.dados_resposta(registro, sessao) if registro else None)
 
-    db_produto = db.query(models.Produto).options(
-        joinedload(models.Produto.promocoes).contains_eager(models.Promocao)
-    ).filter(
-        models.Produto.codigo_barras == codigo_barras
-    ).first()
+    registro, dados = await db.run_sync(_buscar)
     
-    if not db_produto:
+    if not registro:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Produto com código de barras '{codigo_barras}' não encontrado no estoque."
         )
 
-    promocoes_validas = [
-        p for p in db_produto.promocoes
-        if p.data_inicio <= now and (p.data_fim is None or p.data_fim >= now)
-    ]
-    
-    preco_final = db_produto.preco_venda
-    melhor_promocao = None
-    
-    for promo in promocoes_validas:
-        preco_promocional = db_produto.preco_venda
-        
-        if promo.tipo == 'percentual':
-            preco_promocional = db_produto.preco_venda * (1 - promo.valor / 100.0)
-        
-        elif promo.tipo == 'preco_fixo':
-            preco_promocional = promo.valor
-            
-        if preco_promocional < preco_final:
-            preco_final = preco_promocional
-            melhor_promocao = promo
+    preco = registro.preco_atual()
             
     return schemas.ProdutoComPromocao(
-        **db_produto.__dict__,
-        preco_final=preco_final,
-        promocao_ativa=melhor_promocao.nome if melhor_promocao else None
+        **dados,
+        preco_final=preco.preco_final,
+        promocao_ativa=preco.promocao_ativa
     )
 
 @router.put("/{produto_id}", response_model=schemas.Produto)
@@ -119,6 +157,9 @@ def update_produto(produto_id: int, produto_update: schemas.ProdutoUpdate, db: S
     if db_produto is None:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
 
+    codigo_anterior = db_produto.codigo_barras
+    estoque_anterior = db_produto.quantidade_estoque or 0
+
     # Pega os dados do update e converte para um dicionário
     update_data = produto_update.dict(exclude_unset=True)
     
@@ -126,14 +167,25 @@ def update_produto(produto_id: int, produto_update: schemas.ProdutoUpdate, db: S
     for key, value in update_data.items():
         setattr(db_produto, key, value)
 
+    # Acerto manual de saldo entra no razão como ajuste
+    diferenca = (db_produto.quantidade_estoque or 0) - estoque_anterior
+    if diferenca:
+        estoque.registrar_movimentos(db, [{
+            "produto_id": db_produto.id,
+            "tipo": estoque.TIPO_AJUSTE,
+            "quantidade": diferenca,
+            "observacao": "Ajuste manual no cadastro",
+        }])
+
     db.add(db_produto)
     db.commit()
     db.refresh(db_produto)
+    catalogo_cache.invalidar_codigos([codigo_anterior, db_produto.codigo_barras])
     return db_produto
 
 @router.get("/dashboard-stats/", response_model=schemas.DashboardStats)
 def get_dashboard_stats(db: Session = Depends(get_db)):
-    today = date.today()
+    today = periodos.hoje_local(db) # Vencimento conta no dia da loja
     seven_days_from_now = today + timedelta(days=7)
 
     low_stock_count = db.query(models.Produto).filter(
@@ -172,38 +224,39 @@ def get_stats_history(limit: int = 7, db: Session = Depends(get_db)):
     return list(reversed(history))
 
 @router.get("/{produto_id}/historico", response_model=List[schemas.ProdutoMovimentacao])
-def get_produto_historico(produto_id: int, db: Session = Depends(get_db)):
+def get_produto_historico(produto_id: int, limit: int = 200, db: Session = Depends(get_db)):
     """
-    Retorna o histórico de movimentações (vendas) de um produto específico.
+    Retorna o histórico de movimentações de estoque de um produto
+    (vendas, cancelamentos, entradas por nota e ajustes), lido do razão
+    'movimentacoes_estoque' pelo índice (produto_id, data_hora).
     """
-    
-    # Busca todos os itens de venda para este produto
-    vendas_itens = (
-        db.query(
-            models.VendaItem,
-            models.Usuario.nome.label("operador_nome"),
-            models.Venda.id.label("venda_id_str")
-        )
-        .join(models.Venda, models.VendaItem.venda_id == models.Venda.id)
-        .join(models.Usuario, models.Venda.operador_id == models.Usuario.id)
-        .filter(models.VendaItem.produto_id == produto_id)
-        .order_by(models.Venda.data_hora.desc())
+    movimentos = (
+        db.query(models.MovimentacaoEstoque, models.Usuario.nome)
+        .outerjoin(models.Usuario, models.MovimentacaoEstoque.usuario_id == models.Usuario.id)
+        .filter(models.MovimentacaoEstoque.produto_id == produto_id)
+        .order_by(models.MovimentacaoEstoque.data_hora.desc(), models.MovimentacaoEstoque.id.desc())
+        .limit(limit)
         .all()
     )
-    
+
     historico = []
-    for item, operador, venda_id in vendas_itens:
+    for mov, operador in movimentos:
+        if mov.venda_id:
+            nota = f"Venda #{mov.venda_id}"
+        elif mov.nota_entrada_id:
+            nota = f"Nota de entrada #{mov.nota_entrada_id}"
+        else:
+            nota = mov.observacao
+
         historico.append({
-            "id": item.id,
-            "data_hora": item.venda.data_hora,
-            "tipo": "venda",
-            "quantidade": -item.quantidade, # Venda é uma saída
-            "usuario": operador,
-            "nota": f"Venda #{venda_id}"
+            "id": mov.id,
+            "data_hora": mov.data_hora,
+            "tipo": mov.tipo,
+            "quantidade": mov.quantidade, # Já com sinal (saída negativa)
+            "usuario": operador or "Sistema",
+            "nota": nota
         })
     
-    # No futuro, você pode adicionar 'entradas' e 'ajustes' aqui
-    
     return historico
 
 @router.get("/barcode/{codigo_barras}", response_model=schemas.Produto)
@@ -249,10 +302,7 @@ async def preview_nfe_por_arquivo(
 def preview_nfe_por_chave(request: ImportarChaveRequest, db: Session = Depends(get_db)):
     chave = request.chave_acesso.strip()
 
-    # 1. Dados do Certificado
-    certificado_db = get_certificado_ativo(db)
-    
-    # 2. Verifica Duplicidade (Regra de Negócio do ERP)
+    # 1. Verifica Duplicidade (Regra de Negócio do ERP)
     nota_existe = db.query(models.NotaFiscalEntrada).filter(
         models.NotaFiscalEntrada.chave_acesso == chave
     ).first()
@@ -261,52 +311,23 @@ def preview_nfe_por_chave(request: ImportarChaveRequest, db: Session = Depends(g
     if nota_existe:
         aviso = f"A NF-e {chave} já foi importada anteriormente."
 
-    # 3. Chamada ao Serviço (Agora ele resolve tudo da SEFAZ)
-    dados_sefaz = consultar_nfe_por_chave(
-        chave_nfe=chave,
-        certificado_binario=certificado_db.arquivo_binario,
-        senha=certificado_db.senha_arquivo,
-        cnpj_empresa=certificado_db.empresa.cnpj,
-        producao=True
-    )
+    # 2. Nota já baixada pela sincronização da distribuição DF-e: sem ida à SEFAZ
+    dados_sefaz = distribuicao_dfe.consultar_local(db, chave)
+
+    # 3. Ainda não chegou: consulta a SEFAZ na hora (consulta + download)
+    if dados_sefaz is None:
+        certificado_db = get_certificado_ativo(db)
+        dados_sefaz = consultar_nfe_por_chave(
+            chave_nfe=chave,
+            certificado_binario=armazem_documentos.ler(db, models.CertificadoDigital.arquivo_binario, certificado_db.id),
+            senha=certificado_db.senha_arquivo,
+            cnpj_empresa=certificado_db.empresa.cnpj,
+            producao=True
+        )
 
     # 4. Cruzamento com Banco de Dados (Regra de Negócio do ERP)
-    # O service devolveu a lista bruta, agora enriquecemos com dados do nosso sistema
-    itens_processados = []
-    
-    for item_xml in dados_sefaz["produtos"]:
-        
-        ean = item_xml.get("ean")
-        if ean == "SEM GTIN": ean = ""
-        
-        # Tenta achar no banco
-        produto_db = None
-        if ean:
-            produto_db = db.query(models.Produto).filter(
-                models.Produto.codigo_barras == ean
-            ).first()
-            
-        # Monta objeto para o Frontend
-        novo_item = {
-            # Dados da Nota
-            "codigo_fornecedor": item_xml["codigo"],
-            "ean": ean,
-            "nome": item_xml["descricao"],
-            "ncm": item_xml["ncm"],
-            "cfop": item_xml["cfop"],
-            "unidade": item_xml["unidade"],
-            "quantidade": item_xml["quantidade"],
-            "valor_unitario": item_xml["valor_unitario"],
-            "valor_total": item_xml["valor_total"],
-            
-            # Dados do Sistema (Cruzamento)
-            "produto_existente_id": produto_db.id if produto_db else None,
-            "nome_sistema": produto_db.nome if produto_db else item_xml["descricao"],
-            
-            # Sugestão de Preço
-            "preco_venda_atual": float(produto_db.preco_venda) if produto_db else round(item_xml["valor_unitario"] * 1.5, 2)
-        }
-        itens_processados.append(novo_item)
+    # O service devolveu a lista bruta; uma consulta casa todos os EANs da nota
+    itens_processados = importacao_nfe.montar_itens_sefaz(db, dados_sefaz["produtos"])
 
     return {
         "data": {
@@ -336,7 +357,6 @@ def confirmar_entrada_nfe(
 ):
     header = dados_confirmados.get('header', {})
     itens = dados_confirmados.get('itens', [])
-    logs = []
     
     if not header or not itens:
         raise HTTPException(400, detail="Dados da nota incompletos.")
@@ -346,86 +366,14 @@ def confirmar_entrada_nfe(
             # =========================================
             # A. Salva a Nota Fiscal de Entrada
             # =========================================
-            try:
-                raw_date = header.get('data_emissao', '')
-                if raw_date and 'T' in raw_date:
-                    data_emissao = datetime.fromisoformat(raw_date.split('+')[0]).date()
-                elif raw_date:
-                    data_emissao = datetime.strptime(raw_date, "%Y-%m-%d").date()
-                else:
-                    data_emissao = datetime.now().date()
-            except:
-                data_emissao = datetime.now().date()
-
-            nova_nota = models.NotaFiscalEntrada(
-                numero_nota=str(header.get('numero_nota', '0')),
-                serie=str(header.get('serie', '1')),
-                chave_acesso=header.get('chave_acesso', ''),
-                data_emissao=data_emissao,
-                valor_total=float(header.get('valor_total_nota', header.get('valor_total', 0))),
-                xml_conteudo=dados_confirmados.get('xml_processado', "Importação via Sistema")
-            )
-            db.add(nova_nota)
-            db.flush() 
+            nova_nota = importacao_nfe.criar_nota(db, header, dados_confirmados.get('xml_processado'))
 
             # =========================================
-            # B. Processa Itens
+            # B. Itens: um casamento + um upsert em lote (+ razão)
             # =========================================
-            for item in itens:
-                ean = item.get('ean') or item.get('codigo_barras')
-                if ean == "SEM GTIN": ean = None
-                
-                produto = None
-                
-                # 1. Tenta pelo ID
-                if item.get('produto_existente_id'):
-                    produto = db.query(models.Produto).get(item['produto_existente_id'])
-                
-                # 2. Tenta pelo EAN
-                if not produto and ean:
-                    produto = db.query(models.Produto).filter(models.Produto.codigo_barras == ean).first()
-                
-                # Conversão de Valores
-                # ATENÇÃO: Convertendo para int() porque seu banco é Integer, mas o ideal seria Float no banco.
-                qtd_nota = float(item.get('quantidade', 0))
-                custo_nota = float(item.get('valor_unitario', 0))
-                
-                nome_final = item.get('nome_sistema') or item.get('nome') or item.get('descricao') or "Produto Sem Nome"
-
-                if produto:
-                    # --- ATUALIZAR ---
-                    # Se seu banco é Integer, precisamos somar como float e converter depois ou assumir perda decimal
-                    qtd_atual = float(produto.quantidade_estoque or 0)
-                    produto.quantidade_estoque = int(qtd_atual + qtd_nota) # Cast para Integer
-                    
-                    produto.preco_custo = custo_nota
-                    
-                    if item.get('nome_sistema'):
-                        produto.nome = nome_final
-                    if item.get('preco_venda_atual'):
-                        produto.preco_venda = float(item['preco_venda_atual'])
-                        
-                    db.add(produto)
-                    logs.append(f"✅ Atualizado: {produto.nome}")
-                else:
-                    # --- CRIAR NOVO ---
-                    novo_prod = models.Produto(
-                        nome=nome_final,
-                        codigo_barras=ean,
-                        quantidade_estoque=int(qtd_nota), # Cast para Integer conforme seu model
-                        preco_custo=custo_nota,
-                        preco_venda=float(item.get('preco_venda_atual', custo_nota * 1.5)),
-                        
-                        # --- CORREÇÃO AQUI ---
-                        unidade_medida=item.get('unidade', 'UN'), # Mudei de 'unidade' para 'unidade_medida'
-                        
-                        ncm=str(item.get('ncm', '')),
-                        cfop=str(item.get('cfop', '')),
-                        # cst=str(item.get('cst', '')), # Descomente se vier do XML
-                        categoria="Geral"
-                    )
-                    db.add(novo_prod)
-                    logs.append(f"🆕 Cadastrado: {novo_prod.nome}")
+            logs, codigos_afetados = importacao_nfe.confirmar(db, nova_nota, itens)
+
+        catalogo_cache.invalidar_codigos(codigos_afetados)
 
         return {
             "status": "sucesso",
@@ -443,32 +391,46 @@ def confirmar_entrada_nfe(
         print(f"Erro ao confirmar NFe: {e}")
         raise HTTPException(status_code=500, detail=f"Erro técnico ao salvar: {str(e)}")
         
+@router.post("/nfe/importar/lote", response_model=schemas.JobFiscalResponse, status_code=status.HTTP_202_ACCEPTED)
+def importar_nfe_lote(files: List[UploadFile] = File(...)):
+    """
+    Importa de uma vez os XMLs de entrada (procNFe/nfeProc) enviados em
+    .zip e/ou .xml. Devolve o job na hora; acompanhe em
+    /produtos/nfe/importar/lote/{job_id} ou pelo WebSocket (tópico 'fiscal').
+    """
+    invalidos = [f.filename for f in files if not (f.filename or "").lower().endswith((".xml", ".zip"))]
+    if invalidos:
+        raise HTTPException(400, detail=f"Envie apenas arquivos .xml ou .zip: {', '.join(invalidos)}")
+
+    # Os arquivos vão para o disco (o job roda depois da requisição e os ZIPs podem ser grandes)
+    pasta = tempfile.mkdtemp(prefix="sinapse-nfe-lote-")
+    caminhos = []
+    try:
+        for posicao, arquivo in enumerate(files):
+            caminho = os.path.join(pasta, f"{posicao:05d}_{os.path.basename(arquivo.filename)}")
+            with open(caminho, "wb") as destino:
+                shutil.copyfileobj(arquivo.file, destino)
+            caminhos.append(caminho)
+    except Exception:
+        shutil.rmtree(pasta, ignore_errors=True)
+        raise
+
+    job = importacao_lote_nfe.iniciar_importacao(pasta, caminhos)
+    return job.como_dict()
+
+
+@router.get("/nfe/importar/lote/{job_id}", response_model=schemas.JobFiscalResponse)
+def status_importacao_nfe_lote(job_id: str):
+    job = jobs.obter_job(job_id)
+    if not job or job["tipo"] != "importar_nfe_lote":
+        raise HTTPException(status_code=404, detail="Job não encontrado (pode ter expirado).")
+    return job
+
+
 def _enriquecer_dados_nfe(nfe_data: dict, db: Session):
     """
-    Percorre os itens da nota e verifica se já existem no banco.
-    Adiciona campos 'produto_existente_id', 'nome_sistema', etc.
+    Verifica quais itens da nota já existem no banco (uma consulta para a
+    nota inteira). Adiciona campos 'produto_existente_id', 'nome_sistema', etc.
     """
-    for item in nfe_data['itens']:
-        ean = item.get('codigo_barras')
-        
-        produto = None
-        if ean and ean != "SEM GTIN":
-             produto = db.query(models.Produto).filter(models.Produto.codigo_barras == ean).first()
-        
-        if produto:
-            # Encontrou! Prepara para mesclar
-            item['produto_existente_id'] = produto.id
-            item['nome_sistema'] = produto.nome # Usa o nome do nosso sistema (geralmente mais limpo)
-            item['estoque_atual'] = produto.quantidade_estoque
-            item['preco_venda_atual'] = produto.preco_venda
-            item['status_match'] = 'existente'
-        else:
-            # Não encontrou. Prepara para criar
-            item['produto_existente_id'] = None
-            item['nome_sistema'] = item['nome'] # Usa o nome da nota como sugestão
-            item['estoque_atual'] = 0
-            # Sugere preço de venda (Ex: Margem 80%)
-            item['preco_venda_atual'] = round(item['valor_unitario'] * 1.8, 2)
-            item['status_match'] = 'novo'
-            
+    importacao_nfe.enriquecer_itens_arquivo(db, nfe_data['itens'])
     return nfe_data
\ No newline at end of file
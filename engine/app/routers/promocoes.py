@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from typing import List
 from .. import models, schemas
 from ..database import get_db
+from ..services import catalogo_cache
 
 router = APIRouter(
     prefix="/promocoes",
@@ -39,5 +40,8 @@ def create_promocao(promocao: schemas.PromocaoCreate, db: Session = Depends(get_
     db.add(db_promocao)
     db.commit()
     db.refresh(db_promocao)
+
+    # Os produtos da promoção mudam de preço: tira do índice do PDV
+    catalogo_cache.invalidar_produtos(promocao.produto_ids)
     
     return db_promocao
\ No newline at end of file
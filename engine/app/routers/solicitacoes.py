@@ -1,10 +1,14 @@
 # app/routers/solicitacoes.py
 from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, status
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 from .. import models, schemas
-from ..database import get_db
-from ..websockets import manager
+from ..database import get_async_db
+from ..websockets import manager, topico_pdv
+from ..services.barramento import barramento
 from datetime import datetime
+from typing import Optional
 
 router = APIRouter(
     prefix="/solicitacoes",
@@ -13,18 +17,18 @@ router = APIRouter(
 
 # --- 1. O CANAL ÚNICO (WebSocket) ---
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(websocket: WebSocket, topicos: Optional[str] = None):
     """
     Canal global. Tanto PDVs quanto Gerentes se conectam aqui.
-    Eles apenas 'escutam'. As ações são feitas via rotas HTTP abaixo.
+    Cada um assina só o que interessa (?topicos=pdv:3 ou ?topicos=gerentes;
+    ver app/websockets.py). As ações são feitas via rotas HTTP abaixo; pelo
+    socket o cliente só assina/cancela tópicos.
     """
-    await manager.connect(websocket)
+    lista = None if topicos is None else [t.strip() for t in topicos.split(",") if t.strip()]
+    await manager.connect(websocket, lista)
     try:
         while True:
-            # Mantém a conexão viva e escuta mensagens (ping/pong)
-            # Se quiser que o front mande algo pelo socket, processaria aqui.
-            # Por enquanto, é apenas one-way (Server -> Client)
-            await websocket.receive_text()
+            manager.receber(websocket, await websocket.receive_text())
     except WebSocketDisconnect:
         manager.disconnect(websocket)
     except Exception as e:
@@ -35,30 +39,32 @@ async def websocket_endpoint(websocket: WebSocket):
 @router.post("/", response_model=schemas.Solicitacao)
 async def create_solicitacao(
     solicitacao: schemas.SolicitacaoCreate, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     PDV cria uma solicitação. Salva e avisa os gerentes.
+    (Sessão assíncrona: o commit não trava o event loop dos WebSockets.)
     """
     db_solicitacao = models.Solicitacao(**solicitacao.dict())
     db_solicitacao.status = "pendente" 
     db_solicitacao.data_hora_criacao = datetime.now()
     
     db.add(db_solicitacao)
-    db.commit()
-    db.refresh(db_solicitacao)
+    await db.commit()
 
     # Carrega dados extras (como antes)
-    detailed_solicitacao = db.query(models.Solicitacao).options(
-        joinedload(models.Solicitacao.pdv),
-        joinedload(models.Solicitacao.operador)
-    ).filter(models.Solicitacao.id == db_solicitacao.id).first()
+    detailed_solicitacao = (await db.execute(
+        select(models.Solicitacao).options(
+            joinedload(models.Solicitacao.pdv),
+            joinedload(models.Solicitacao.operador)
+        ).where(models.Solicitacao.id == db_solicitacao.id)
+    )).scalar_one()
 
     pdv_nome = detailed_solicitacao.pdv.nome if detailed_solicitacao.pdv else "Desconhecido"
     operador_nome = detailed_solicitacao.operador.nome if detailed_solicitacao.operador else "Desconhecido"
 
-    # 🔔 NOTIFICAÇÃO (CORRIGIDA)
-    await manager.broadcast({
+    # 🔔 NOTIFICAÇÃO (só para os painéis de gerente, em qualquer worker)
+    barramento.publicar(["gerentes"], {
         "type": "NOVA_SOLICITACAO",
         "payload": {
             "id": db_solicitacao.id,
@@ -82,13 +88,13 @@ async def create_solicitacao(
 async def resolve_solicitacao(
     solicitacao_id: int, 
     status_update: schemas.SolicitacaoUpdate, # Schema deve ter campo 'status' e opcional 'autorizado_por_id'
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Gerente aprova ou rejeita.
-    Atualiza o banco e avisa o PDV específico via broadcast global.
+    Atualiza o banco e avisa o PDV específico pelo tópico dele.
     """
-    db_solicitacao = db.query(models.Solicitacao).filter(models.Solicitacao.id == solicitacao_id).first()
+    db_solicitacao = await db.get(models.Solicitacao, solicitacao_id)
     if not db_solicitacao:
         raise HTTPException(status_code=404, detail="Solicitação não encontrada")
 
@@ -102,12 +108,11 @@ async def resolve_solicitacao(
     if status_update.autorizado_por_id:
         db_solicitacao.autorizado_por_id = status_update.autorizado_por_id
 
-    db.commit()
-    db.refresh(db_solicitacao)
+    await db.commit()
 
-    # 🔔 NOTIFICAÇÃO LEVE (Broadcast)
-    # "Ei PDVs, a solicitação ID X foi resolvida. Se for sua, atualize-se."
-    await manager.broadcast({
+    # 🔔 NOTIFICAÇÃO LEVE
+    # Vai só para o PDV dono da solicitação (e para os painéis tirarem o alerta)
+    barramento.publicar([topico_pdv(db_solicitacao.pdv_id), "gerentes"], {
         "type": "SOLICITACAO_CONCLUIDA",
         "payload": {
             "id": db_solicitacao.id,
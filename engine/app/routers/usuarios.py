@@ -1,100 +1,67 @@
 # app/routers/usuarios.py
 
-from typing import List
+from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import or_
 from .. import models, schemas
 from ..database import get_db
 from datetime import datetime, date, timedelta
+from ..services import desempenho
+from ..utils import periodos
+from ..utils.paginacao import Paginacao
 from ..utils.security import get_password_hash, verify_password, criar_token_acesso, ACCESS_TOKEN_EXPIRE_MINUTES
 
 router = APIRouter(prefix="/usuarios", tags=["Usuarios"])
 
-@router.get("/", response_model=List[schemas.Usuario])
-def get_all_usuarios(db: Session = Depends(get_db)):
-    return db.query(models.Usuario).all()
-
-
-def calcular_horas_trabalhadas(operador_id: int, db: Session) -> str:
-    """
-    Calcula o tempo total de operação do operador no dia de hoje,
-    somando os períodos entre 'abertura' e 'fechamento'.
-    """
-    today = date.today()
-
-    # Busca todas as movimentações do dia
-    movs = (
-        db.query(models.MovimentacaoCaixa)
-        .filter(
-            models.MovimentacaoCaixa.operador_id == operador_id,
-            func.date(models.MovimentacaoCaixa.data_hora) == today
-        )
-        .order_by(models.MovimentacaoCaixa.data_hora)
-        .all()
-    )
-
-    total_minutos = 0
-    last_open = None
+ORDENACOES_USUARIOS = {
+    "nome": models.Usuario.nome,
+    "id": models.Usuario.id,
+}
 
-    for mov in movs:
-        if mov.tipo == "abertura":
-            last_open = mov.data_hora
-        elif mov.tipo == "fechamento" and last_open:
-            total_minutos += (mov.data_hora - last_open).total_seconds() / 60
-            last_open = None
-
-    # Se ainda houver abertura sem fechamento
-    if last_open:
-        total_minutos += (datetime.now() - last_open).total_seconds() / 60
-
-    horas = int(total_minutos // 60)
-    minutos = int(total_minutos % 60)
-    return f"{horas}h {minutos}m"
+@router.get("/", response_model=List[schemas.Usuario])
+def get_all_usuarios(
+    busca: Optional[str] = None,
+    funcao: Optional[str] = None,
+    pagina: Paginacao = Depends(),
+    db: Session = Depends(get_db)
+):
+    """Usuários paginados por cursor (padrão: por nome). Nunca lê a senha."""
+    U = models.Usuario
+    query = db.query(U.id, U.nome, U.email, U.funcao, U.status)
+    if busca:
+        query = query.filter(or_(U.nome.ilike(f"%{busca}%"), U.email.ilike(f"%{busca}%")))
+    if funcao:
+        query = query.filter(U.funcao == funcao)
+    return pagina.aplicar(query, ORDENACOES_USUARIOS, padrao="nome", chave_id=U.id)
 
 
 @router.get("/performance", response_model=List[schemas.UsuarioPerformance])
-def get_operador_performance(db: Session = Depends(get_db)):
+def get_operador_performance(
+    inicio: Optional[date] = None,
+    fim: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
     """
-    Busca todos os usuários e calcula:
+    Busca todos os usuários e calcula, no período (padrão: hoje, no fuso da loja):
     - total de vendas
     - faturamento total
     - ticket médio
-    - horas trabalhadas hoje
+    - horas trabalhadas
+    Custo fixo (usuários + resumo de vendas + turnos), qualquer que seja o número de usuários.
     """
-    today = date.today()
-
-    # --- Estatísticas de vendas do dia ---
-    stats_query = (
-        db.query(
-            models.Venda.operador_id,
-            func.count(models.Venda.id).label("total_vendas"),
-            func.sum(models.Venda.valor_total).label("faturamento_total")
-        )
-        .filter(models.Venda.status == "concluida")
-        .group_by(models.Venda.operador_id)
-        .subquery()
-    )
+    hoje = periodos.hoje_local(db)
+    inicio = inicio or hoje
+    fim = fim or max(inicio, hoje)
+    if inicio > fim:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Data inicial maior que a final.")
 
-    usuarios_com_stats = (
-        db.query(
-            models.Usuario,
-            stats_query.c.total_vendas,
-            stats_query.c.faturamento_total
-        )
-        .outerjoin(stats_query, models.Usuario.id == stats_query.c.operador_id)
-        .all()
-    )
+    desempenho_por_operador = desempenho.por_operador(db, inicio, fim)
 
     resultados_performance = []
 
-    for usuario, total_vendas, faturamento_total in usuarios_com_stats:
-        faturamento = faturamento_total or 0
-        vendas = total_vendas or 0
-        ticket_medio = (faturamento / vendas) if vendas > 0 else 0
-
-        # Calcula horas trabalhadas corretamente
-        horas_trabalhadas_str = calcular_horas_trabalhadas(usuario.id, db)
+    for usuario in db.query(models.Usuario).all():
+        d = desempenho_por_operador.get(usuario.id) or desempenho.DesempenhoOperador(operador_id=usuario.id)
 
         resultados_performance.append(
             schemas.UsuarioPerformance(
@@ -103,10 +70,10 @@ def get_operador_performance(db: Session = Depends(get_db)):
                 funcao=usuario.funcao,
                 status=usuario.status,
                 email=usuario.email,
-                total_vendas=vendas,
-                faturamento_total=faturamento,
-                ticket_medio=ticket_medio,
-                horas_trabalhadas=horas_trabalhadas_str
+                total_vendas=d.total_vendas,
+                faturamento_total=d.faturamento,
+                ticket_medio=d.ticket_medio,
+                horas_trabalhadas=d.horas_trabalhadas
             )
         )
 
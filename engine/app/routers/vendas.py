@@ -1,40 +1,128 @@
 # app/routers/vendas.py
-from typing import List, Dict, Optional
-from datetime import date, datetime
+from typing import List, Dict, Optional, Union
+from datetime import date, datetime, timedelta, timezone
 from sqlalchemy import func
-from fastapi import APIRouter, Depends, HTTPException, status, Response
+from sqlalchemy.exc import IntegrityError
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload, selectinload
 from .. import models, schemas
 from ..utils.security import verify_password
-from ..database import get_db
-from ..services import fiscal_service
+from ..utils import periodos
+from ..utils.paginacao import Paginacao
+from ..database import get_db, get_async_db
+from ..services import fiscal_service, catalogo_cache, estoque, caixa, resumo_vendas, config_empresa
+from ..services.fila_fiscal import fila_emissao
+from ..services.barramento import barramento
+from ..websockets import topico_pdv
 
 router = APIRouter(prefix="/vendas", tags=["Vendas"])
 
+MODOS_RESPOSTA_ITEM = ("completo", "delta")
+UNIDADES_FRACIONAVEIS = ('KG', 'MT', 'LT', 'M', 'L')
+# Carrinho offline: horário do bip aceito para o preço (promoção da hora do bip)
+# só dentro desta janela; fora dela (relógio do PDV errado) vale o horário do servidor.
+JANELA_HORARIO_PDV = timedelta(hours=24)
+
+
+def _aplicar_delta_totais(venda: models.Venda, delta_valor: float, delta_quantidade: float):
+    """
+    Atualiza os totais da venda por diferença, sem SUM sobre os itens.
+    A expressão vira 'SET valor_total = valor_total + :delta' no UPDATE,
+    então dois lançamentos simultâneos no mesmo carrinho não se sobrescrevem.
+    """
+    venda.valor_total = models.Venda.valor_total + delta_valor
+    venda.quantidade_itens = models.Venda.quantidade_itens + delta_quantidade
+
+
+def _resposta_item(
+    db: Session,
+    venda: models.Venda,
+    modo: str,
+    item: Optional[models.VendaItem] = None,
+    item_removido_id: Optional[int] = None,
+    produto_dados: Optional[dict] = None,
+):
+    """
+    modo='completo': recarrega a venda inteira (itens + produtos), como sempre foi.
+    modo='delta': só a linha alterada e os totais (1 SELECT por PK, sem itens).
+    Devolve schemas prontos: nas rotas assíncronas (run_sync) a serialização
+    acontece fora da sessão e não pode mais disparar lazy load.
+    """
+    if modo == "delta":
+        item_resposta = None
+        if item is not None:
+            # Do índice de produtos quando disponível (evita carregar o produto)
+            produto = produto_dados
+            if produto is None and item.produto is not None:
+                produto = schemas.Produto.model_validate(item.produto)
+            item_resposta = schemas.VendaItem(
+                id=item.id,
+                produto_id=item.produto_id,
+                quantidade=item.quantidade,
+                preco_unitario_na_venda=item.preco_unitario_na_venda,
+                descricao_manual=item.descricao_manual,
+                produto=produto,
+            )
+        return schemas.VendaDelta(
+            venda_id=venda.id,
+            valor_total=venda.valor_total, # expirado no commit: relê só a linha da venda
+            quantidade_itens=venda.quantidade_itens,
+            item=item_resposta,
+            item_removido_id=item_removido_id,
+        )
+
+    return schemas.Venda.model_validate(db.query(models.Venda).options(
+        selectinload(models.Venda.itens).joinedload(models.VendaItem.produto)
+    ).filter(models.Venda.id == venda.id).first())
+
+
+def _validar_modo(modo: str):
+    if modo not in MODOS_RESPOSTA_ITEM:
+        raise HTTPException(status_code=400, detail=f"Modo de resposta inválido: '{modo}'. Use 'completo' ou 'delta'.")
+
+
 # --- ROTAS DE DASHBOARD ---
 
+DIAS_PADRAO_DASHBOARD = 30
+MAX_DIAS_DASHBOARD = 366
+
+
+def _intervalo_dashboard(db: Session, inicio: Optional[date], fim: Optional[date]):
+    """Padrão: últimos 30 dias até hoje (no fuso da loja). Limita o intervalo a um ano."""
+    fim = fim or periodos.hoje_local(db)
+    inicio = inicio or (fim - timedelta(days=DIAS_PADRAO_DASHBOARD - 1))
+    if inicio > fim:
+        raise HTTPException(status_code=400, detail="Data inicial maior que a final.")
+    if (fim - inicio).days >= MAX_DIAS_DASHBOARD:
+        raise HTTPException(status_code=400, detail=f"Intervalo máximo: {MAX_DIAS_DASHBOARD} dias.")
+    return inicio, fim
+
+
 @router.get("/resumo-diario-dinamico", response_model=List[schemas.ResumoDiario])
-def get_resumo_diario_dinamico(db: Session = Depends(get_db)):
+def get_resumo_diario_dinamico(
+    inicio: Optional[date] = None,
+    fim: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
     """
-    Retorna o faturamento agrupado por dia e por PDV.
-    (Versão PostgreSQL Compatible)
+    Retorna o faturamento agrupado por dia e por PDV no intervalo
+    (padrão: últimos 30 dias). Lê o resumo por hora, não as vendas.
     """
-    
-    campo_data = cast(models.Venda.data_hora, Date).label("sale_date")
+    inicio, fim = _intervalo_dashboard(db, inicio, fim)
+    R = models.ResumoVendasHora
 
     resultado_query = (
         db.query(
-            campo_data,
+            R.data.label("sale_date"),
             models.Pdv.id.label("pdv_id"),
             models.Pdv.nome.label("pdv_name"),
-            func.sum(models.Venda.valor_total).label("daily_total"),
+            func.sum(R.faturamento).label("daily_total"),
         )
-        .join(models.Pdv, models.Venda.pdv_id == models.Pdv.id)
-        .filter(models.Venda.status == "concluida")
-        
-        .group_by(campo_data, models.Pdv.id, models.Pdv.nome)
-        
-        .order_by(campo_data)
+        .join(models.Pdv, R.pdv_id == models.Pdv.id)
+        .filter(R.data >= inicio, R.data <= fim)
+        .group_by(R.data, models.Pdv.id, models.Pdv.nome)
+        .order_by(R.data)
         .all()
     )
 
@@ -55,18 +143,29 @@ def get_resumo_diario_dinamico(db: Session = Depends(get_db)):
     return list(dados_agrupados.values())
 
 @router.get("/top-produtos", response_model=List[schemas.ProdutoMaisVendido])
-def get_top_produtos(limit: int = 5, db: Session = Depends(get_db)):
+def get_top_produtos(
+    limit: int = 5,
+    inicio: Optional[date] = None,
+    fim: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
     """
-    Calcula e retorna os produtos mais vendidos por valor total.
+    Calcula e retorna os produtos mais vendidos por valor total no intervalo
+    (padrão: últimos 30 dias), a partir do resumo diário por produto.
     """
+    inicio, fim = _intervalo_dashboard(db, inicio, fim)
+    R = models.ResumoVendasProduto
+    total = func.sum(R.faturamento)
+
     top_produtos = (
         db.query(
             models.Produto.nome.label("name"),
-            func.sum(models.VendaItem.quantidade * models.VendaItem.preco_unitario_na_venda).label("totalSales")
+            total.label("totalSales")
         )
-        .join(models.Produto, models.VendaItem.produto_id == models.Produto.id)
-        .group_by(models.Produto.id)
-        .order_by(func.sum(models.VendaItem.quantidade * models.VendaItem.preco_unitario_na_venda).desc())
+        .join(models.Produto, R.produto_id == models.Produto.id)
+        .filter(R.data >= inicio, R.data <= fim)
+        .group_by(models.Produto.id, models.Produto.nome)
+        .order_by(total.desc())
         .limit(limit)
         .all()
     )
@@ -76,73 +175,118 @@ def get_top_produtos(limit: int = 5, db: Session = Depends(get_db)):
         
     return top_produtos
 
-# Certifique-se de ter esses imports no topo do arquivo app/routers/vendas.py
-from sqlalchemy import func, cast, Date # ✅ Importar cast e Date é essencial para Postgres
-
 @router.get("/resumo-hoje-por-hora", response_model=List[schemas.ResumoPorHora])
-def get_resumo_hoje_por_hora(db: Session = Depends(get_db)):
+def get_resumo_hoje_por_hora(dia: Optional[date] = None, db: Session = Depends(get_db)):
     """
-    Retorna o faturamento de HOJE, agrupado por hora e por PDV.
-    (Versão Compatível com PostgreSQL)
+    Retorna o faturamento de HOJE (ou do 'dia' informado), agrupado por hora
+    e por PDV. No máximo 24 linhas por PDV no resumo.
     """
-    today = date.today()
-    
-    # ✅ 1. CORREÇÃO: Formatação de Hora
-    # SQLite: func.strftime('%H:00', ...)
-    # Postgres: func.to_char(..., 'HH24:00')
-    campo_hora = func.to_char(models.Venda.data_hora, 'HH24:00').label("sale_hour")
-    
-    # ✅ 2. CORREÇÃO: Comparação de Data
-    # SQLite: func.date(...)
-    # Postgres: cast(..., Date)
-    data_venda_date = cast(models.Venda.data_hora, Date)
+    dia = dia or periodos.hoje_local(db)
+    R = models.ResumoVendasHora
 
     resultado_query = (
         db.query(
-            campo_hora, # Usa a expressão definida acima
+            R.hora.label("sale_hour"),
             models.Pdv.id.label("pdv_id"),
             models.Pdv.nome.label("pdv_name"),
-            func.sum(models.Venda.valor_total).label("hourly_total"),
+            func.sum(R.faturamento).label("hourly_total"),
         )
-        .join(models.Pdv, models.Venda.pdv_id == models.Pdv.id)
-        .filter(
-            models.Venda.status == "concluida",
-            data_venda_date == today # ✅ Compara Date com Date (Seguro)
-        )
-        .group_by(campo_hora, models.Pdv.id, models.Pdv.nome) # ✅ Agrupamento Explícito
-        .order_by(campo_hora)
+        .join(models.Pdv, R.pdv_id == models.Pdv.id)
+        .filter(R.data == dia)
+        .group_by(R.hora, models.Pdv.id, models.Pdv.nome)
+        .order_by(R.hora)
         .all()
     )
 
     dados_agrupados: Dict[str, schemas.ResumoPorHora] = {}
     for row in resultado_query:
-        if row.sale_hour not in dados_agrupados:
-            dados_agrupados[row.sale_hour] = schemas.ResumoPorHora(
-                hour=row.sale_hour,
+        hora = f"{row.sale_hour:02d}:00" # Mesmo formato de antes (HH24:00)
+        if hora not in dados_agrupados:
+            dados_agrupados[hora] = schemas.ResumoPorHora(
+                hour=hora,
                 faturamento_total_hora=0,
                 faturamento_por_pdv=[]
             )
         
-        dados_agrupados[row.sale_hour].faturamento_por_pdv.append(
+        dados_agrupados[hora].faturamento_por_pdv.append(
             schemas.FaturamentoPorPdvHora(pdv_id=row.pdv_id, pdv_nome=row.pdv_name, total=row.hourly_total)
         )
-        dados_agrupados[row.sale_hour].faturamento_total_hora += row.hourly_total
+        dados_agrupados[hora].faturamento_total_hora += row.hourly_total
             
     return list(dados_agrupados.values())
 
 # --- ROTAS DE CRUD DE VENDA ---
 
-@router.get("/", response_model=List[schemas.Venda])
-def get_all_vendas(db: Session = Depends(get_db)):
+ORDENACOES_VENDAS = {
+    "data_hora": models.Venda.data_hora,
+    "valor_total": models.Venda.valor_total,
+    "id": models.Venda.id,
+}
+
+
+def consultar_vendas_lista(db: Session):
     """
-    Retorna todas as vendas, com suas notas fiscais (se existirem).
-    Esta é a única definição desta rota.
+    Projeção das listagens de vendas (esta rota e /fiscal/notas): colunas da
+    venda + da nota (LEFT JOIN), sem itens e sem carregar entidades.
     """
-    vendas = db.query(models.Venda).options(
-        joinedload(models.Venda.nota_fiscal_saida)
-    ).order_by(models.Venda.data_hora.desc()).all()
-    
-    return vendas
+    V, N = models.Venda, models.NotaFiscalSaida
+    return db.query(
+        V.id, V.pdv_id, V.operador_id, V.cliente_id, V.valor_total, V.quantidade_itens,
+        V.data_hora, V.status,
+        N.id.label("nota_id"), N.chave_acesso, N.status_sefaz, N.data_hora_autorizacao,
+    ).outerjoin(N, N.venda_id == V.id)
+
+
+def montar_vendas_lista(linhas) -> List[schemas.VendaLista]:
+    return [
+        schemas.VendaLista(
+            id=linha.id,
+            pdv_id=linha.pdv_id,
+            operador_id=linha.operador_id,
+            cliente_id=linha.cliente_id,
+            valor_total=linha.valor_total,
+            quantidade_itens=linha.quantidade_itens or 0.0,
+            data_hora=linha.data_hora,
+            status=linha.status,
+            nota_fiscal_saida=schemas.NotaFiscalSaida(
+                id=linha.nota_id,
+                chave_acesso=linha.chave_acesso,
+                status_sefaz=linha.status_sefaz,
+                data_hora_autorizacao=linha.data_hora_autorizacao,
+            ) if linha.nota_id else None,
+        )
+        for linha in linhas
+    ]
+
+
+@router.get("/", response_model=List[schemas.VendaLista])
+def get_all_vendas(
+    status_venda: Optional[str] = Query(None, alias="status"),
+    pdv_id: Optional[int] = None,
+    operador_id: Optional[int] = None,
+    inicio: Optional[date] = None,
+    fim: Optional[date] = None,
+    pagina: Paginacao = Depends(),
+    db: Session = Depends(get_db)
+):
+    """
+    Vendas com a situação da nota fiscal, paginadas por cursor (padrão: mais
+    recentes primeiro). Filtros opcionais: status, PDV, operador e período
+    (dias locais da loja).
+    """
+    query = consultar_vendas_lista(db)
+    if status_venda:
+        query = query.filter(models.Venda.status == status_venda)
+    if pdv_id:
+        query = query.filter(models.Venda.pdv_id == pdv_id)
+    if operador_id:
+        query = query.filter(models.Venda.operador_id == operador_id)
+    if inicio or fim:
+        intervalo = periodos.dias(inicio or fim, fim or inicio, db)
+        query = query.filter(intervalo.contem(models.Venda.data_hora))
+
+    linhas = pagina.aplicar(query, ORDENACOES_VENDAS, padrao="-data_hora", chave_id=models.Venda.id)
+    return montar_vendas_lista(linhas)
 
 @router.post("/iniciar", response_model=schemas.Venda)
 def iniciar_venda(request: schemas.IniciarVendaRequest, db: Session = Depends(get_db)):
@@ -183,11 +327,186 @@ def adicionar_item_venda(venda_id: int, item: schemas.VendaItemCreate, db: Sessi
     )
     db.add(venda_item)
 
-    venda.valor_total += item.quantidade * produto.preco_venda
+    _aplicar_delta_totais(venda, item.quantidade * produto.preco_venda, item.quantidade)
     db.commit()
     db.refresh(venda)
     return venda
 
+def _registrar_pagamentos(db: Session, venda: models.Venda, request, valor_troco: float):
+    """
+    Pagamentos (crediário/dinheiro), troco, forma de pagamento da venda e
+    contadores da sessão de caixa.
+    Compartilhado entre /finalizar e /lote: 'request' traz pdv_db_id,
+    operador_db_id, cliente_db_id, pagamentos e override_auth.
+    Não faz commit (a venda inteira é uma transação só).
+    """
+    for pagamento in request.pagamentos:
+        
+        # >>> Lógica de CREDIÁRIO <<<
+        if pagamento.tipo == 'crediario':
+            if not request.cliente_db_id:
+                raise HTTPException(status_code=400, detail="Cliente não identificado para venda em crediário.")
+            
+            db_cliente = db.query(models.Cliente).filter(
+                models.Cliente.id == request.cliente_db_id
+            ).with_for_update().first()
+            
+            if not db_cliente:
+                raise HTTPException(status_code=404, detail="Cliente do crediário não encontrado.")
+            
+            # A. Validação de Status (O Porteiro)
+            if db_cliente.status_conta != 'ativo':
+                 raise HTTPException(
+                     status_code=403,
+                     detail=f"Compra negada: Conta {db_cliente.status_conta}."
+                 )
+            
+            # B. Validação de Limite com Override (O Gerente)
+            limite_disponivel = (db_cliente.limite_credito - db_cliente.saldo_devedor)
+            
+            if not db_cliente.trust_mode and pagamento.valor > limite_disponivel:
+                 autorizado = False
+                 
+                 # Verifica "Crachá" de Override
+                 if request.override_auth and request.override_auth.admin_senha:
+                     admin = get_admin_by_password_only(request.override_auth, db)
+                     if admin:
+                         autorizado = True
+                         print(f"AUDITORIA: Override limite Cliente {db_cliente.id} por Admin {admin.id}")
+
+                 if not autorizado:
+                     raise HTTPException(
+                         status_code=402, # Payment Required (Gatilho do Frontend)
+                         detail=f"Limite insuficiente. Disponível: R$ {limite_disponivel:.2f}"
+                     )
+            
+            # C. Efetivação
+            db_cliente.saldo_devedor += pagamento.valor
+            db.add(db_cliente)
+            
+            db.add(models.TransacaoCrediario(
+                cliente_id=request.cliente_db_id,
+                tipo='compra',
+                valor=pagamento.valor,
+                descricao=f"Venda #{venda.id}",
+                venda_id=venda.id,
+                data_hora=datetime.utcnow()
+            ))
+        
+        # >>> Lógica de DINHEIRO <<<
+        if pagamento.tipo == 'dinheiro':
+            db.add(models.MovimentacaoCaixa(
+                tipo='suprimento',
+                valor=pagamento.valor,
+                pdv_id=request.pdv_db_id,
+                operador_id=request.operador_db_id
+            ))
+
+    # --- 5. TROCO ---
+    if valor_troco > 0:
+        db.add(models.MovimentacaoCaixa(
+            tipo='sangria',
+            valor=valor_troco,
+            pdv_id=request.pdv_db_id,
+            operador_id=request.operador_db_id
+        ))
+
+    # --- 6. FORMA DE PAGAMENTO (Resumo) ---
+    if request.pagamentos:
+        # Se tiver mais de um, marca como misto, senão pega o primeiro
+        venda.forma_pagamento = "misto" if len(request.pagamentos) > 1 else request.pagamentos[0].tipo
+    else:
+        venda.forma_pagamento = "indefinido"
+    
+    db.add(venda)
+
+    # --- CONTADORES DO TURNO (sessão de caixa) ---
+    dinheiro_recebido = sum(p.valor for p in request.pagamentos if p.tipo == 'dinheiro')
+    caixa.registrar(
+        db, request.pdv_db_id,
+        total_vendas_dinheiro=dinheiro_recebido - valor_troco,
+        total_vendas=venda.valor_total,
+        quantidade_vendas=1,
+    )
+
+
+def _baixar_estoque(db: Session, venda: models.Venda):
+    """Baixa definitiva do estoque da venda; falta de saldo vira 400 (sem commit)."""
+    try:
+        config = config_empresa.obter(db)
+        estoque.baixar_venda(db, venda, permitir_negativo=bool(config and config.permitir_estoque_negativo))
+    except estoque.EstoqueInsuficiente as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+def _avisar_venda_finalizada(venda: models.Venda):
+    """Painel de PDVs (e o próprio caixa) em qualquer worker: atualiza os números do turno."""
+    barramento.publicar(["gerentes", topico_pdv(venda.pdv_id)], {
+        "type": "VENDA_FINALIZADA",
+        "payload": {
+            "venda_id": venda.id,
+            "pdv_id": venda.pdv_id,
+            "operador_id": venda.operador_id,
+            "valor_total": venda.valor_total,
+        }
+    })
+
+
+def _acionar_motor_fiscal(db: Session, venda: models.Venda) -> str:
+    """
+    Pós-venda (já commitada): gera a NFC-e e transmite conforme o modo de
+    emissão da empresa. Devolve o complemento da mensagem para o PDV.
+    Falhas aqui nunca desfazem a venda.
+    """
+    mensagem_fiscal = ""
+    
+    try:
+        # A. Busca Configuração da Empresa
+        config = config_empresa.obter(db)
+        modo_emissao = config.modo_emissao if config else "automatico"
+        
+        # B. Gera a Nota "Pendente" (O Nascimento)
+        # Isso cria o registro no banco de notas.
+        nota = fiscal_service.inicializar_nota_para_venda(venda.id, db)
+        # Commit da nota pendente
+        db.commit() 
+        
+        # C. Transmissão
+        # 'automatico': a nota vai para a fila e o caixa é liberado na hora.
+        # O resultado chega ao PDV pelo WebSocket (evento NFE_STATUS).
+        if modo_emissao == "automatico" and fila_emissao.ativa:
+            fila_emissao.avisar()
+            mensagem_fiscal = " | NFe na fila de emissão ⏳"
+
+        elif modo_emissao in ["automatico", "sincrono"]:
+            print(f"📡 Tentando transmissão automática para Venda {venda.id}...")
+            try:
+                # Chama o motor real que conecta no PHP/SEFAZ
+                nota_processada = fiscal_service.transmitir_nota(nota.id, db)
+                fiscal_service.avisar_status(nota_processada)
+                
+                if nota_processada.status_sefaz == 'Autorizada':
+                    mensagem_fiscal = " | NFe Autorizada ✅"
+                elif nota_processada.status_sefaz == 'Rejeitada':
+                    mensagem_fiscal = f" | NFe Rejeitada ❌ ({nota_processada.xmotivo})"
+                else:
+                    mensagem_fiscal = " | NFe Pendente ⏳"
+                    
+            except Exception as e_transmissao:
+                # Se der erro de conexão (internet, timeout), não faz mal.
+                # A nota já está salva como 'Pendente'. O robô ou o gerente envia depois.
+                print(f"⚠️ Falha na transmissão (Contingência Ativa): {e_transmissao}")
+                mensagem_fiscal = " | NFe em Contingência ⚠️"
+
+    except Exception as e_fiscal:
+        # Se der erro na GERAÇÃO da nota (antes de salvar), logamos.
+        # A venda continua válida.
+        print(f"❌ Erro crítico no módulo fiscal: {e_fiscal}")
+        mensagem_fiscal = " | Erro Fiscal (Verificar Log)"
+
+    return mensagem_fiscal
+
+
 @router.post("/finalizar", response_model=schemas.PdvVendaResponse)
 def finalizar_venda_pdv(
     request: schemas.PdvVendaRequest,
@@ -242,136 +561,24 @@ def finalizar_venda_pdv(
 
         db.add(venda)
         
-        # --- 4. PROCESSA PAGAMENTOS ---
-        for pagamento in request.pagamentos:
-            
-            # >>> Lógica de CREDIÁRIO <<<
-            if pagamento.tipo == 'crediario':
-                if not request.cliente_db_id:
-                    raise HTTPException(status_code=400, detail="Cliente não identificado para venda em crediário.")
-                
-                db_cliente = db.query(models.Cliente).filter(
-                    models.Cliente.id == request.cliente_db_id
-                ).with_for_update().first()
-                
-                if not db_cliente:
-                    raise HTTPException(status_code=404, detail="Cliente do crediário não encontrado.")
-                
-                # A. Validação de Status (O Porteiro)
-                if db_cliente.status_conta != 'ativo':
-                     raise HTTPException(
-                         status_code=403,
-                         detail=f"Compra negada: Conta {db_cliente.status_conta}."
-                     )
-                
-                # B. Validação de Limite com Override (O Gerente)
-                limite_disponivel = (db_cliente.limite_credito - db_cliente.saldo_devedor)
-                
-                if not db_cliente.trust_mode and pagamento.valor > limite_disponivel:
-                     autorizado = False
-                     
-                     # Verifica "Crachá" de Override
-                     if request.override_auth and request.override_auth.admin_senha:
-                         admin = get_admin_by_password_only(request.override_auth, db)
-                         if admin:
-                             autorizado = True
-                             print(f"AUDITORIA: Override limite Cliente {db_cliente.id} por Admin {admin.id}")
-
-                     if not autorizado:
-                         raise HTTPException(
-                             status_code=402, # Payment Required (Gatilho do Frontend)
-                             detail=f"Limite insuficiente. Disponível: R$ {limite_disponivel:.2f}"
-                         )
-                
-                # C. Efetivação
-                db_cliente.saldo_devedor += pagamento.valor
-                db.add(db_cliente)
-                
-                db.add(models.TransacaoCrediario(
-                    cliente_id=request.cliente_db_id,
-                    tipo='compra',
-                    valor=pagamento.valor,
-                    descricao=f"Venda #{venda.id}",
-                    venda_id=venda.id,
-                    data_hora=datetime.utcnow()
-                ))
-            
-            # >>> Lógica de DINHEIRO <<<
-            if pagamento.tipo == 'dinheiro':
-                db.add(models.MovimentacaoCaixa(
-                    tipo='suprimento',
-                    valor=pagamento.valor,
-                    pdv_id=request.pdv_db_id,
-                    operador_id=request.operador_db_id
-                ))
-
-        # --- 5. TROCO ---
-        if valor_troco > 0:
-            db.add(models.MovimentacaoCaixa(
-                tipo='sangria',
-                valor=valor_troco,
-                pdv_id=request.pdv_db_id,
-                operador_id=request.operador_db_id
-            ))
+        # --- 4/5/6. PAGAMENTOS, TROCO E FORMA DE PAGAMENTO ---
+        _registrar_pagamentos(db, venda, request, valor_troco)
 
-        # --- 6. FORMA DE PAGAMENTO (Resumo) ---
-        if request.pagamentos:
-            # Se tiver mais de um, marca como misto, senão pega o primeiro
-            venda.forma_pagamento = "misto" if len(request.pagamentos) > 1 else request.pagamentos[0].tipo
-        else:
-            venda.forma_pagamento = "indefinido"
-        
-        db.add(venda)
+        # --- 6b. BAIXA DE ESTOQUE (1 UPDATE condicional para todos os itens) ---
+        _baixar_estoque(db, venda)
+
+        # --- 6c. RESUMOS DOS DASHBOARDS (upsert incremental) ---
+        resumo_vendas.registrar_venda(db, venda)
 
         # 🚨 PONTO CRÍTICO: COMMIT DA VENDA 🚨
         # Salvamos a venda AGORA. O dinheiro entrou. O estoque saiu.
         # Se o fiscal falhar depois daqui, a venda NÃO pode ser desfeita.
         db.commit()
         db.refresh(venda)
+        _avisar_venda_finalizada(venda)
 
-        # ==================================================================
         # 🚀 7. O MOTOR FISCAL (Pós-Venda)
-        # ==================================================================
-        
-        mensagem_fiscal = ""
-        
-        try:
-            # A. Busca Configuração da Empresa
-            config_empresa = db.query(models.Empresa).first()
-            modo_emissao = config_empresa.modo_emissao if config_empresa else "automatico"
-            
-            # B. Gera a Nota "Pendente" (O Nascimento)
-            # Isso cria o registro no banco de notas.
-            nota = fiscal_service.inicializar_nota_para_venda(venda.id, db)
-            # Commit da nota pendente
-            db.commit() 
-            
-            # C. Tenta Transmitir (Se configurado para automático)
-            if modo_emissao in ["automatico", "sincrono"]:
-                print(f"📡 Tentando transmissão automática para Venda {venda.id}...")
-                try:
-                    # Chama o motor real que conecta no PHP/SEFAZ
-                    nota_processada = fiscal_service.transmitir_nota(nota.id, db)
-                    
-                    if nota_processada.status_sefaz == 'Autorizada':
-                        mensagem_fiscal = " | NFe Autorizada ✅"
-                    elif nota_processada.status_sefaz == 'Rejeitada':
-                        mensagem_fiscal = f" | NFe Rejeitada ❌ ({nota_processada.xmotivo})"
-                    else:
-                        mensagem_fiscal = " | NFe Pendente ⏳"
-                        
-                except Exception as e_transmissao:
-                    # Se der erro de conexão (internet, timeout), não faz mal.
-                    # A nota já está salva como 'Pendente'. O robô ou o gerente envia depois.
-                    print(f"⚠️ Falha na transmissão (Contingência Ativa): {e_transmissao}")
-                    mensagem_fiscal = " | NFe em Contingência ⚠️"
-
-        except Exception as e_fiscal:
-            # Se der erro na GERAÇÃO da nota (antes de salvar), logamos.
-            # A venda continua válida.
-            print(f"❌ Erro crítico no módulo fiscal: {e_fiscal}")
-            mensagem_fiscal = " | Erro Fiscal (Verificar Log)"
-
+        mensagem_fiscal = _acionar_motor_fiscal(db, venda)
 
         # --- 8. RETORNO FINAL ---
         return schemas.PdvVendaResponse(
@@ -393,52 +600,201 @@ def finalizar_venda_pdv(
             detail=f"Erro interno ao processar a venda: {str(e)}"
         )
             
-@router.post("/adicionar-item-smart", response_model=schemas.Venda)
-def adicionar_item_smart(request: schemas.AdicionarItemSmartRequest, db: Session = Depends(get_db)):
-    config = db.query(models.Empresa).filter(models.Empresa.id == 1).first()
-    permitir_negativo = config.permitir_estoque_negativo if config else False
-
-    now = datetime.utcnow()
-    produto = db.query(models.Produto).options(
-        joinedload(models.Produto.promocoes) 
-    ).filter(
-        models.Produto.codigo_barras == request.codigo_barras
+
+def _horario_do_bip(registrado_em: Optional[datetime], agora: datetime) -> datetime:
+    if registrado_em is None:
+        return agora
+    if registrado_em.tzinfo is not None:
+        registrado_em = registrado_em.astimezone(timezone.utc).replace(tzinfo=None)
+    if registrado_em > agora or agora - registrado_em > JANELA_HORARIO_PDV:
+        return agora
+    return registrado_em
+
+
+@router.post("/lote", response_model=schemas.PdvVendaLoteResponse)
+def sincronizar_venda_lote(
+    request: schemas.PdvVendaLoteRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Recebe o carrinho inteiro montado no PDV (bips guardados localmente) e
+    fecha a venda numa transação só: 1 commit por venda em vez de 1 por bip.
+    Pagamentos pela mesma regra do /finalizar.
+    O 'codigo_local' torna o reenvio seguro: a mesma venda não entra duas vezes.
+    Produtos e preços resolvidos de uma vez (índice + um IN para os que
+    faltam); a baixa de estoque é o mesmo UPDATE condicional do /finalizar.
+    """
+    codigo_venda = f"PDV{request.pdv_db_id}_{request.codigo_local}"
+
+    # --- 1. REENVIO (PDV não recebeu a resposta da primeira tentativa) ---
+    ja_recebida = db.query(models.Venda).filter(models.Venda.codigo_venda == codigo_venda).first()
+    if ja_recebida:
+        return _resposta_lote(ja_recebida, request, ja_sincronizada=True)
+
+    venda_aberta = db.query(models.Venda.id).filter(
+        models.Venda.pdv_id == request.pdv_db_id,
+        models.Venda.status == "em_andamento"
     ).first()
+    if venda_aberta:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"O caixa tem a venda #{venda_aberta.id} em andamento. Finalize ou cancele antes de sincronizar."
+        )
+
+    # --- 2. PRODUTOS E PREÇOS (de uma vez) ---
+    produtos = catalogo_cache.buscar_por_codigos((i.codigo_barras for i in request.itens), db)
+
+    agora = datetime.utcnow()
+    erros = []
+    linhas: Dict[tuple, float] = {} # (produto_id, preço) -> quantidade
+    quantidade_por_produto: Dict[int, float] = {}
+    horarios = []
+
+    for item in request.itens:
+        produto = produtos.get(item.codigo_barras)
+        if not produto:
+            erros.append(f"Produto com código '{item.codigo_barras}' não encontrado.")
+            continue
+        if item.quantidade % 1 != 0 and produto.unidade_medida.upper() not in UNIDADES_FRACIONAVEIS:
+            erros.append(f"'{produto.nome}' não aceita quantidade quebrada ({item.quantidade}).")
+            continue
+
+        horario = _horario_do_bip(item.registrado_em, agora)
+        horarios.append(horario)
+        preco_final = round(produto.preco_atual(horario).preco_final, 2)
+
+        chave = (produto.id, preco_final)
+        linhas[chave] = linhas.get(chave, 0) + item.quantidade
+        quantidade_por_produto[produto.id] = quantidade_por_produto.get(produto.id, 0) + item.quantidade
+
+    if erros:
+        # Todos os problemas de uma vez: o operador corrige o carrinho e reenvia
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=" | ".join(erros))
+
+    valor_total = sum(qtd * preco for (_, preco), qtd in linhas.items())
+    valor_total_pago = sum(p.valor for p in request.pagamentos)
+
+    if round(valor_total_pago, 2) < round(valor_total, 2) - 0.01:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Pagamento insuficiente. Total: {valor_total:.2f}, Pago: {valor_total_pago:.2f}"
+        )
+    if abs(valor_total - request.total_calculado) > 0.05:
+        print(f"⚠️ Alerta: Divergência de valor (lote). Front: {request.total_calculado}, Back: {valor_total}")
+
+    valor_troco = max(0.0, valor_total_pago - valor_total)
+
+    # --- 3. EFETIVAÇÃO (uma transação, um commit) ---
+    try:
+        venda = models.Venda(
+            codigo_venda=codigo_venda,
+            pdv_id=request.pdv_db_id,
+            operador_id=request.operador_db_id,
+            cliente_id=request.cliente_db_id,
+            status="concluida",
+            valor_total=valor_total,
+            quantidade_itens=sum(quantidade_por_produto.values()),
+            data_hora=min(horarios), # Quando a venda começou no PDV
+        )
+        if request.cpf_nota:
+            venda.cpf_nota = request.cpf_nota.replace(".", "").replace("-", "")
+        venda.itens = [
+            models.VendaItem(produto_id=produto_id, quantidade=qtd, preco_unitario_na_venda=preco)
+            for (produto_id, preco), qtd in linhas.items()
+        ]
+        db.add(venda)
+        db.flush() # ID da venda para o crediário
+
+        _registrar_pagamentos(db, venda, request, valor_troco)
+
+        # Estoque de todos os produtos num UPDATE condicional (trava contra venda a descoberto)
+        _baixar_estoque(db, venda)
+        resumo_vendas.registrar_venda(db, venda)
+
+        db.commit()
+        db.refresh(venda)
+
+    except HTTPException:
+        db.rollback()
+        raise
+    except IntegrityError:
+        # Dois envios do mesmo carrinho ao mesmo tempo: o outro já gravou
+        db.rollback()
+        ja_recebida = db.query(models.Venda).filter(models.Venda.codigo_venda == codigo_venda).first()
+        if not ja_recebida:
+            raise HTTPException(status_code=500, detail="Erro de integridade ao gravar a venda.")
+        return _resposta_lote(ja_recebida, request, ja_sincronizada=True)
+    except Exception as e:
+        db.rollback()
+        print(f"ERRO CRÍTICO DE VENDA (lote): {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro interno ao processar a venda: {str(e)}"
+        )
+
+    print(f"Venda #{venda.id} sincronizada do PDV {request.pdv_db_id}: {len(request.itens)} bips, {len(linhas)} linhas.")
+    _avisar_venda_finalizada(venda)
+
+    # --- 4. MOTOR FISCAL (Pós-Venda) ---
+    mensagem_fiscal = _acionar_motor_fiscal(db, venda)
+    return _resposta_lote(venda, request, mensagem_fiscal=mensagem_fiscal)
+
+
+def _resposta_lote(
+    venda: models.Venda,
+    request: schemas.PdvVendaLoteRequest,
+    ja_sincronizada: bool = False,
+    mensagem_fiscal: str = ""
+) -> schemas.PdvVendaLoteResponse:
+    valor_total_pago = sum(p.valor for p in request.pagamentos)
+    if ja_sincronizada:
+        mensagem = f"Venda #{venda.id} já havia sido sincronizada."
+    else:
+        mensagem = f"Venda #{venda.id} finalizada com sucesso!{mensagem_fiscal}"
+    return schemas.PdvVendaLoteResponse(
+        venda_id=venda.id,
+        mensagem=mensagem,
+        troco=max(0.0, valor_total_pago - venda.valor_total),
+        valor_total=venda.valor_total,
+        ja_sincronizada=ja_sincronizada,
+    )
+
+@router.post("/adicionar-item-smart", response_model=Union[schemas.Venda, schemas.VendaDelta])
+async def adicionar_item_smart(
+    request: schemas.AdicionarItemSmartRequest,
+    modo: str = "completo", # 'completo' | 'delta'
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    O bip. Rota assíncrona: a lógica abaixo é a mesma (síncrona, com os
+    serviços de catálogo/estoque), executada pela sessão assíncrona.
+    """
+    _validar_modo(modo)
+    return await db.run_sync(_adicionar_item_smart, request, modo)
+
+
+def _adicionar_item_smart(db: Session, request: schemas.AdicionarItemSmartRequest, modo: str):
+    config = config_empresa.obter(db)
+    permitir_negativo = bool(config and config.permitir_estoque_negativo)
+
+    # Índice em memória: produto + promoções sem ida ao banco no caso comum
+    produto = catalogo_cache.buscar_por_codigo(request.codigo_barras, db)
     
     if not produto:
         raise HTTPException(status_code=404, detail=f"Produto com código '{request.codigo_barras}' não encontrado.")
 
     if request.quantidade % 1 != 0: 
-        unidades_fracionaveis = ['KG', 'MT', 'LT', 'M', 'L'] 
-        
-        unidade_prod = (produto.unidade_medida or "UN").upper()
+        unidade_prod = produto.unidade_medida.upper()
 
-        if unidade_prod not in unidades_fracionaveis:
+        if unidade_prod not in UNIDADES_FRACIONAVEIS:
              raise HTTPException(
                 status_code=400, 
                 detail=f"ERRO: O produto '{produto.nome}' é vendido por '{unidade_prod}' e não aceita quantidade quebrada ({request.quantidade})."
             )
 
-    preco_final = produto.preco_venda
-    melhor_promocao_nome = None
-    
-    promocoes_validas = [
-        p for p in produto.promocoes
-        if p.data_inicio <= now and (p.data_fim is None or p.data_fim >= now)
-    ]
-    
-    for promo in promocoes_validas:
-        preco_promocional = produto.preco_venda
-        if promo.tipo == 'percentual':
-            preco_promocional = produto.preco_venda * (1 - promo.valor / 100.0)
-        elif promo.tipo == 'preco_fixo':
-            preco_promocional = promo.valor
-            
-        if preco_promocional < preco_final:
-            preco_final = preco_promocional
-            melhor_promocao_nome = promo.nome
-
-    preco_final = round(preco_final, 2)
+    preco = produto.preco_atual()
+    preco_final = round(preco.preco_final, 2)
+    melhor_promocao_nome = preco.promocao_ativa
 
     venda = db.query(models.Venda).filter(
         models.Venda.pdv_id == request.pdv_id,
@@ -473,11 +829,20 @@ def adicionar_item_smart(request: schemas.AdicionarItemSmartRequest, db: Session
     quantidade_final_desejada = quantidade_atual_no_carrinho + request.quantidade
 
     # ✅ TRAVA DE SEGURANÇA: Verifica o TOTAL (Carrinho + Novo) contra o Estoque
-    if not permitir_negativo and produto.quantidade_estoque < quantidade_final_desejada:
-         raise HTTPException(
-             status_code=status.HTTP_400_BAD_REQUEST, 
-             detail=f"Estoque insuficiente. Disponível: {produto.quantidade_estoque}. Tentando vender: {quantidade_final_desejada}."
-         )
+    # (O saldo vem sempre do banco; o índice guarda apenas uma foto dele)
+    # Aviso antecipado ao operador: a baixa com trava (UPDATE condicional)
+    # acontece na finalização, em estoque.baixar_venda.
+    estoque_atual = None
+    if not permitir_negativo:
+        estoque_atual = db.query(models.Produto.quantidade_estoque).filter(
+            models.Produto.id == produto.id
+        ).scalar() or 0
+
+        if estoque_atual < quantidade_final_desejada:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, 
+                detail=f"Estoque insuficiente. Disponível: {estoque_atual}. Tentando vender: {quantidade_final_desejada}."
+            )
 
     # 5. EFETIVAÇÃO (A Ação)
     if item_existente:
@@ -485,6 +850,7 @@ def adicionar_item_smart(request: schemas.AdicionarItemSmartRequest, db: Session
         # Nota: Mantemos o preço original do item ou atualizamos? 
         # Em geral, mantemos o preço de quando entrou, ou atualizamos tudo. 
         # Aqui estamos mantendo o preço antigo do item_existente.
+        venda_item = item_existente
     else:
         venda_item = models.VendaItem(
             venda_id=venda.id,
@@ -495,24 +861,14 @@ def adicionar_item_smart(request: schemas.AdicionarItemSmartRequest, db: Session
         db.add(venda_item)
         if melhor_promocao_nome:
              print(f"Item adicionado com promoção: {melhor_promocao_nome}")
-    
-    db.flush() 
 
-    # 6. ATUALIZAÇÃO FINAL
-    total_calc = db.query(
-        func.sum(models.VendaItem.quantidade * models.VendaItem.preco_unitario_na_venda)
-    ).filter(models.VendaItem.venda_id == venda.id).scalar() or 0.0
-
-    venda.valor_total = total_calc
-    db.add(venda)
+    # 6. ATUALIZAÇÃO FINAL (por diferença: só o que entrou agora)
+    _aplicar_delta_totais(venda, request.quantidade * venda_item.preco_unitario_na_venda, request.quantidade)
     db.commit()
 
     # 7. RETORNO
-    venda_atualizada = db.query(models.Venda).options(
-        selectinload(models.Venda.itens).joinedload(models.VendaItem.produto)
-    ).filter(models.Venda.id == venda.id).first()
-    
-    return venda_atualizada
+    produto_dados = catalogo_cache.dados_resposta(produto, db, estoque=estoque_atual)
+    return _resposta_item(db, venda, modo, item=venda_item, produto_dados=produto_dados)
 
 def get_admin_by_password_only(
     # ✅ O BODY (auth_request) AGORA É OPCIONAL
@@ -559,11 +915,12 @@ def get_admin_from_remover_request(
     # (payload.auth pode ser None, e get_admin_by_password_only aceita None)
     return get_admin_by_password_only(payload.auth, db)
 
-@router.post("/{venda_id}/itens/{item_venda_id}/remover", response_model=schemas.Venda)
+@router.post("/{venda_id}/itens/{item_venda_id}/remover", response_model=Union[schemas.Venda, schemas.VendaDelta])
 def remover_item_da_venda_auditada(
     venda_id: int, 
     item_venda_id: int, 
     payload: schemas.RemoverItemRequest,
+    modo: str = "completo", # 'completo' | 'delta'
     db: Session = Depends(get_db),
     admin_user: models.Usuario = Depends(get_admin_from_remover_request),
 ):
@@ -571,6 +928,7 @@ def remover_item_da_venda_auditada(
     Remove parcialmente (ou totalmente) um item de uma venda 'em_andamento'.
     Requer autenticação de admin (código de barras).
     """
+    _validar_modo(modo)
     
     item = db.query(models.VendaItem).filter(
         models.VendaItem.id == item_venda_id,
@@ -590,30 +948,23 @@ def remover_item_da_venda_auditada(
 
     print(f"AUDITORIA: Admin ID: {admin_user.id} removeu {quantidade_a_remover} de {item.quantidade} do Item ID: {item_venda_id}")
 
+    venda_atualizada = item.venda
+    _aplicar_delta_totais(venda_atualizada, -quantidade_a_remover * item.preco_unitario_na_venda, -quantidade_a_remover)
+
+    item_removido_id = None
     if quantidade_a_remover == item.quantidade:
+        item_removido_id = item.id
         db.delete(item)
     else:
         item.quantidade -= quantidade_a_remover
     
-    db.flush() 
-
-    venda_atualizada = db.query(models.Venda).filter(models.Venda.id == venda_id).first()
-    
-    total_calc = db.query(
-        func.sum(models.VendaItem.quantidade * models.VendaItem.preco_unitario_na_venda)
-    ).filter(models.VendaItem.venda_id == venda_id).scalar() or 0.0
-
-    venda_atualizada.valor_total = total_calc
-    
-    db.add(venda_atualizada)
     db.commit()
-    db.refresh(venda_atualizada) # Garante que os dados mais recentes sejam enviados
-
-    venda_com_itens = db.query(models.Venda).options(
-        selectinload(models.Venda.itens).joinedload(models.VendaItem.produto)
-    ).filter(models.Venda.id == venda_id).first()
 
-    return venda_com_itens
+    return _resposta_item(
+        db, venda_atualizada, modo,
+        item=None if item_removido_id else item,
+        item_removido_id=item_removido_id
+    )
 
 @router.post("/{venda_id}/cancelar", status_code=status.HTTP_204_NO_CONTENT)
 def cancelar_venda_em_andamento(
@@ -642,38 +993,38 @@ def cancelar_venda_em_andamento(
     
     print(f"AUDITORIA: Venda #{venda_id} cancelada por Admin ID: {admin_user.id} ({admin_user.nome})")
 
-    # (Lógica de estorno de estoque)
-    for item in venda.itens:
-        db_produto = db.query(models.Produto).filter(models.Produto.id == item.produto_id).first()
-        if db_produto:
-            db_produto.quantidade_estoque += item.quantidade
-            db.add(db_produto)
-        
-        db.delete(item)
-        
-    db.delete(venda)
+    # Estorno pelo razão: devolve só o que a venda de fato baixou (1 UPDATE para todos)
+    estoque.estornar_venda(db, venda.id, usuario_id=admin_user.id, observacao="Venda cancelada")
+
+    db.delete(venda) # Itens vão junto (cascade)
     db.commit()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 @router.get("/pdvs/{pdv_id}/venda-ativa", response_model=schemas.Venda)
-def get_venda_ativa_por_pdv(pdv_id: int, db: Session = Depends(get_db)):
+async def get_venda_ativa_por_pdv(pdv_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Busca a venda com status 'em_andamento' para o PDV especificado.
     Retorna 404 se não houver venda ativa.
     """
     
-    venda_ativa = db.query(models.Venda).options(
-        selectinload(models.Venda.itens).joinedload(models.VendaItem.produto)
-    ).filter(
-        models.Venda.pdv_id == pdv_id,
-        models.Venda.status == "em_andamento"
-    ).first()
+    venda_ativa = await db.run_sync(_venda_ativa, pdv_id)
     
     if not venda_ativa:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Nenhuma venda ativa encontrada para este PDV.")
         
     return venda_ativa
 
+
+def _venda_ativa(db: Session, pdv_id: int) -> Optional[schemas.Venda]:
+    venda = db.query(models.Venda).options(
+        selectinload(models.Venda.itens).joinedload(models.VendaItem.produto)
+    ).filter(
+        models.Venda.pdv_id == pdv_id,
+        models.Venda.status == "em_andamento"
+    ).first()
+    # Serializa aqui dentro: produto -> fornecedor/criador ainda carregam sob demanda
+    return schemas.Venda.model_validate(venda) if venda else None
+
 @router.delete("/{venda_id}/descartar-venda-ativa", status_code=status.HTTP_204_NO_CONTENT)
 def descartar_venda_ativa_startup(venda_id: int, db: Session = Depends(get_db)):
     """
@@ -694,11 +1045,7 @@ def descartar_venda_ativa_startup(venda_id: int, db: Session = Depends(get_db)):
         return Response(status_code=status.HTTP_204_NO_CONTENT)
         
     print(f"DESCARTE: Estornando estoque para Venda #{venda_id}...")
-    for item in venda.itens:
-        db_produto = db.query(models.Produto).filter(models.Produto.id == item.produto_id).first()
-        if db_produto:
-            db_produto.quantidade_estoque += item.quantidade
-            db.add(db_produto)
+    estoque.estornar_venda(db, venda.id, observacao="Venda descartada na abertura do PDV")
     
     # 2. Deleta Venda e Itens
     db.delete(venda)
@@ -707,8 +1054,17 @@ def descartar_venda_ativa_startup(venda_id: int, db: Session = Depends(get_db)):
     print(f"DESCARTE: Venda #{venda_id} descartada com sucesso.")
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
-@router.post("/adicionar-item-manual", response_model=schemas.Venda)
-def adicionar_item_manual(request: schemas.ManualItemRequest, db: Session = Depends(get_db)):
+@router.post("/adicionar-item-manual", response_model=Union[schemas.Venda, schemas.VendaDelta])
+async def adicionar_item_manual(
+    request: schemas.ManualItemRequest,
+    modo: str = "completo", # 'completo' | 'delta'
+    db: AsyncSession = Depends(get_async_db)
+):
+    _validar_modo(modo)
+    return await db.run_sync(_adicionar_item_manual, request, modo)
+
+
+def _adicionar_item_manual(db: Session, request: schemas.ManualItemRequest, modo: str):
 
     venda = db.query(models.Venda).filter(
         models.Venda.pdv_id == request.pdv_id,
@@ -745,18 +1101,8 @@ def adicionar_item_manual(request: schemas.ManualItemRequest, db: Session = Depe
     
     print(f"Lançamento Manual Registrado: {request.descricao} x {request.quantidade} @ R$ {request.preco_unitario}")
 
-    db.flush()
-    total_calc = db.query(
-        func.sum(models.VendaItem.quantidade * models.VendaItem.preco_unitario_na_venda)
-    ).filter(models.VendaItem.venda_id == venda.id).scalar() or 0.0
-
-    venda.valor_total = total_calc
-    db.add(venda)
+    _aplicar_delta_totais(venda, request.quantidade * request.preco_unitario, request.quantidade)
     db.commit()
 
-    # 6. RETORNA A VENDA COMPLETA (com 'itens' e 'produto' de cada item)
-    venda_atualizada = db.query(models.Venda).options(
-        selectinload(models.Venda.itens).joinedload(models.VendaItem.produto)
-    ).filter(models.Venda.id == venda.id).first()
-    
-    return venda_atualizada
\ No newline at end of file
+    # 6. RETORNA A VENDA COMPLETA (com 'itens' e 'produto' de cada item) ou só o delta
+    return _resposta_item(db, venda, modo, item=venda_item)
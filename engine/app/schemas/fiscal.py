@@ -34,6 +34,32 @@ class NotaFiscalEntrada(BaseModel):
     class Config:
         from_attributes = True
 
+class DocumentoDFe(BaseModel):
+    id: int
+    nsu: int
+    chave_acesso: Optional[str] = None
+    tipo: str # nfe, resumo, evento, outro
+    emitente_cnpj: Optional[str] = None
+    emitente_nome: Optional[str] = None
+    valor_total: Optional[float] = None
+    data_emissao: Optional[date] = None
+    recebido_em: Optional[datetime] = None
+    importada: bool = False
+
+    class Config:
+        from_attributes = True
+
+class SincronizacaoDFeStatus(BaseModel):
+    cnpj: Optional[str] = None
+    ult_nsu: int = 0
+    max_nsu: int = 0
+    ultima_consulta: Optional[datetime] = None
+    proxima_consulta: Optional[datetime] = None
+    ultimo_status: Optional[str] = None
+    novos: int = 0
+    mensagem: str = ""
+    sincronizacao_automatica: bool = False
+
 class FiscalConfigResponse(BaseModel):
     strategy: str = 'coeficiente'
     goal_value: float = 2.1
@@ -54,6 +80,40 @@ class FiscalSummary(BaseModel):
 
 class EmitirLoteRequest(BaseModel):
     venda_ids: List[int]
+
+class NumeracaoFaixa(BaseModel):
+    numero_inicial: int
+    numero_final: int
+
+class NumeracaoInutilizarRequest(NumeracaoFaixa):
+    modelo: str = "65"
+    serie: int = 1
+    motivo: str
+
+class NumeracaoInutilizada(NumeracaoFaixa):
+    id: int
+    modelo: str
+    serie: int
+    motivo: Optional[str] = None
+    status: str
+    protocolo: Optional[str] = None
+    data_registro: datetime
+
+    class Config:
+        from_attributes = True
+
+class JobFiscalResponse(BaseModel):
+    job_id: str
+    tipo: str
+    status: str # em_andamento, concluido, erro
+    total: int = 0
+    processadas: int = 0
+    sucessos: int = 0
+    falhas: int = 0
+    message: str = ""
+    erros: List[str] = []
+    criado_em: datetime
+    finalizado_em: Optional[datetime] = None
     
 class CertificadoUpload(BaseModel):
     senha: str
@@ -113,6 +173,7 @@ class EmpresaConfig(BaseModel):
     regime_tributario: str = "simples"
     inscricao_estadual: Optional[str] = None
     inscricao_municipal: Optional[str] = None
+    uf: Optional[str] = None
     csc_id: Optional[str] = None
     csc_token: Optional[str] = None
     
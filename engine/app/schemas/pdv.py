@@ -30,6 +30,31 @@ class PdvVendaRequest(BaseModel):
     override_auth: Optional[AdminAuthRequest] = None
     cpf_nota: Optional[str] = None
 
+class PdvLoteItem(BaseModel):
+    """Um bip registrado no carrinho local do PDV."""
+    codigo_barras: str
+    quantidade: float = Field(1.0, gt=0)
+    registrado_em: Optional[datetime] = None # Relógio do PDV (UTC)
+
+class PdvVendaLoteRequest(BaseModel):
+    """
+    Carrinho montado no PDV (inclusive sem servidor) e enviado de uma vez:
+    itens + pagamentos numa única transação.
+    """
+    codigo_local: str = Field(..., min_length=1, max_length=60) # Gerado no PDV; reenvio não duplica a venda
+    pdv_db_id: int
+    operador_db_id: int
+    cliente_db_id: Optional[int] = None
+    itens: List[PdvLoteItem] = Field(..., min_length=1)
+    pagamentos: List[PdvPagamento]
+    total_calculado: float
+    override_auth: Optional[AdminAuthRequest] = None
+    cpf_nota: Optional[str] = None
+
+class PdvVendaLoteResponse(PdvVendaResponse):
+    valor_total: float
+    ja_sincronizada: bool = False # True quando o 'codigo_local' já tinha sido recebido
+
 class SolicitacaoBase(BaseModel):
     tipo: str
     detalhes: Optional[str] = None
@@ -192,6 +217,13 @@ class Pdv(PdvBase):
     class Config:
         from_attributes = True
 
+class PdvPix(PdvBase):
+    """Listagem de chaves PIX por PDV (configurações financeiras)."""
+    id: int
+
+    class Config:
+        from_attributes = True
+
 class MovimentacaoCaixaRequest(BaseModel):
     valor: float = Field(gt=0, description="Valor da movimentação")
     observacao: Optional[str] = None # Motivo da sangria/suprimento
@@ -32,6 +32,20 @@ class Produto(ProdutoBase):
     class Config:
         from_attributes = True
 
+class ProdutoLista(ProdutoBase):
+    """Linha da listagem paginada (GET /produtos/): só colunas do produto."""
+    id: int
+
+    class Config:
+        from_attributes = True
+
+class ProdutoBusca(ProdutoLista):
+    """Resultado da busca por texto (GET /produtos/busca), do mais relevante ao menos."""
+    fornecedor_nome: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
 class ProdutoUpdate(BaseModel):
     nome: Optional[str] = None
     quantidade_estoque: Optional[float] = None
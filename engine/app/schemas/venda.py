@@ -39,6 +39,7 @@ class Venda(VendaBase):
     """Modelo completo retornado nas respostas"""
     id: int
     valor_total: float
+    quantidade_itens: float = 0.0
     data_hora: datetime
     status: str
     itens: List[VendaItem] = []
@@ -47,6 +48,32 @@ class Venda(VendaBase):
     class Config:
         from_attributes = True
 
+class VendaLista(BaseModel):
+    """Linha das listagens paginadas (GET /vendas/, /fiscal/notas): sem itens."""
+    id: int
+    pdv_id: Optional[int] = None
+    operador_id: Optional[int] = None
+    cliente_id: Optional[int] = None
+    valor_total: float
+    quantidade_itens: float = 0.0
+    data_hora: datetime
+    status: str
+    nota_fiscal_saida: Optional[NotaFiscalSaida] = None
+
+    class Config:
+        from_attributes = True
+
+class VendaDelta(BaseModel):
+    """
+    Resposta enxuta (modo=delta) das rotas de item: só a linha alterada e os
+    totais novos. O PDV aplica sobre o carrinho que já tem em tela.
+    """
+    venda_id: int
+    valor_total: float
+    quantidade_itens: float
+    item: Optional[VendaItem] = None # Linha incluída/alterada
+    item_removido_id: Optional[int] = None # Linha removida por completo
+
 class IniciarVendaRequest(BaseModel):
     """Rota /vendas/iniciar"""
     pdv_id: int
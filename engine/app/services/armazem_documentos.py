@@ -0,0 +1,188 @@
+"""
+Armazém de documentos: XMLs, certificado e logo fora das tabelas quentes.
+
+O XML da nota de entrada, os XMLs de envio/retorno da NFC-e, o .pfx do
+certificado e o logo da empresa ficavam na própria linha, e toda consulta
+que carregava o modelo inteiro (listagens, Empresa nas rotas, duplicidade
+do preview) arrastava dezenas de KB por linha. Agora:
+
+- O conteúdo fica em 'documentos_armazenados', compactado em zstd, um por
+  (tabela, registro, campo). Só é lido por quem precisa dele: rotas de
+  download do XML, emissão/consulta com o certificado, tela de configuração.
+- As colunas antigas continuam nos models como 'deferred' (fora de toda
+  consulta) e são esvaziadas pela migração ('migrar_legado', chamada uma
+  vez só por app/migrations.py). Registro ainda não migrado: 'ler' cai na
+  coluna antiga.
+
+Uso (a coluna do model identifica o documento):
+    armazem_documentos.gravar(db, models.NotaFiscalEntrada.xml_conteudo, nota.id, xml)
+    armazem_documentos.ler_texto(db, models.NotaFiscalEntrada.xml_conteudo, nota.id)
+"""
+import base64
+import binascii
+import os
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple, Union
+
+import zstandard
+from sqlalchemy.orm import Session
+
+from .. import models
+
+FORMATO = "zstd"
+NIVEL_ZSTD = int(os.getenv("DOCUMENTOS_ZSTD_NIVEL", "10"))
+# Registros por transação na migração das colunas antigas
+LOTE_MIGRACAO = 200
+
+Conteudo = Union[bytes, str]
+
+
+def _chave(coluna) -> Tuple[str, str]:
+    """(tabela, campo) de uma coluna do model, ex.: models.NotaFiscalSaida.xml_retorno."""
+    return coluna.class_.__tablename__, coluna.key
+
+
+def _bytes(conteudo: Conteudo) -> bytes:
+    return conteudo.encode("utf-8") if isinstance(conteudo, str) else bytes(conteudo)
+
+
+def compactar(dados: bytes) -> bytes:
+    # Um compressor por chamada: o objeto do zstandard não pode ser dividido entre threads
+    return zstandard.ZstdCompressor(level=NIVEL_ZSTD).compress(dados)
+
+
+def descompactar(dados: bytes) -> bytes:
+    return zstandard.ZstdDecompressor().decompress(dados)
+
+
+def _insert_dialeto(db: Session):
+    dialeto = db.get_bind().dialect.name
+    if dialeto == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as insert_dialeto
+    elif dialeto == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as insert_dialeto
+    else:
+        raise RuntimeError(f"Banco '{dialeto}' sem suporte ao armazém de documentos.")
+    return insert_dialeto
+
+
+def _linha(tabela: str, campo: str, registro_id: int, dados: bytes) -> dict:
+    return {
+        "tabela": tabela, "registro_id": registro_id, "campo": campo, "formato": FORMATO,
+        "tamanho_original": len(dados), "conteudo": compactar(dados), "atualizado_em": datetime.utcnow(),
+    }
+
+
+def gravar(db: Session, coluna, registro_id: int, conteudo: Optional[Conteudo]):
+    """
+    Grava (ou substitui) o documento do registro, na transação do chamador.
+    Conteúdo vazio ou None apaga.
+    """
+    tabela, campo = _chave(coluna)
+    D = models.DocumentoArmazenado
+    if not conteudo:
+        db.query(D).filter(
+            D.tabela == tabela, D.registro_id == registro_id, D.campo == campo
+        ).delete(synchronize_session=False)
+        return
+
+    valores = _linha(tabela, campo, registro_id, _bytes(conteudo))
+    comando = _insert_dialeto(db)(D).values(valores)
+    db.execute(comando.on_conflict_do_update(
+        index_elements=[D.tabela, D.registro_id, D.campo],
+        set_={nome: comando.excluded[nome] for nome in ("formato", "tamanho_original", "conteudo", "atualizado_em")},
+    ))
+
+
+def apagar(db: Session, modelo, registro_id: int):
+    """Apaga todos os documentos de um registro (ex.: certificado excluído)."""
+    D = models.DocumentoArmazenado
+    db.query(D).filter(
+        D.tabela == modelo.__tablename__, D.registro_id == registro_id
+    ).delete(synchronize_session=False)
+
+
+def ler(db: Session, coluna, registro_id: int) -> Optional[bytes]:
+    """Conteúdo original (descompactado) do documento, ou None se não houver."""
+    tabela, campo = _chave(coluna)
+    D = models.DocumentoArmazenado
+    linha = db.query(D.formato, D.conteudo).filter(
+        D.tabela == tabela, D.registro_id == registro_id, D.campo == campo
+    ).first()
+    if linha is not None:
+        if linha.formato != FORMATO:
+            raise ValueError(f"Formato de documento desconhecido: {linha.formato}")
+        return descompactar(linha.conteudo)
+
+    # Registro de antes do armazém que a migração ainda não moveu
+    legado = db.query(coluna).filter(coluna.class_.id == registro_id).scalar()
+    return _CONVERSORES[(tabela, campo)](legado) if legado else None
+
+
+def ler_texto(db: Session, coluna, registro_id: int) -> Optional[str]:
+    dados = ler(db, coluna, registro_id)
+    return dados.decode("utf-8") if dados is not None else None
+
+
+# --- Migração das colunas antigas ---
+
+def _xml_entrada(valor: str) -> Optional[bytes]:
+    # Notas lançadas sem XML gravavam o texto "Importação via Sistema"
+    return valor.encode("utf-8") if valor.lstrip().startswith("<") else None
+
+
+def _xml_saida(valor: str) -> bytes:
+    # O worker PHP devolve os XMLs da NFC-e em base64, e assim eram gravados
+    texto = valor.strip()
+    if texto.startswith("<"):
+        return texto.encode("utf-8")
+    try:
+        return base64.b64decode(texto, validate=True)
+    except binascii.Error:
+        return texto.encode("utf-8")
+
+
+COLUNAS: Tuple[Tuple[object, Callable[[Conteudo], Optional[bytes]]], ...] = (
+    (models.NotaFiscalEntrada.xml_conteudo, _xml_entrada),
+    (models.NotaFiscalSaida.xml_envio, _xml_saida),
+    (models.NotaFiscalSaida.xml_retorno, _xml_saida),
+    (models.CertificadoDigital.arquivo_binario, _bytes),
+    (models.Empresa.logo_data, _bytes),
+)
+_CONVERSORES = {_chave(coluna): conversor for coluna, conversor in COLUNAS}
+
+
+def migrar_legado(db: Session, lote: int = LOTE_MIGRACAO) -> Dict[str, int]:
+    """
+    Move o conteúdo das colunas antigas para o armazém e as deixa NULL, um
+    commit por lote. Idempotente (pode ser interrompida e chamada de novo),
+    mas varre as colunas inteiras: app/migrations.py só a chama até a
+    primeira vez que termina. Devolve {'tabela.campo': registros movidos}.
+    (No PostgreSQL o espaço das linhas volta com o autovacuum.)
+    """
+    D = models.DocumentoArmazenado
+    insert = _insert_dialeto(db)
+    movidos: Dict[str, int] = {}
+    for coluna, conversor in COLUNAS:
+        modelo = coluna.class_
+        tabela, campo = _chave(coluna)
+        while True:
+            linhas = db.query(modelo.id, coluna).filter(coluna != None).order_by(modelo.id).limit(lote).all()
+            if not linhas:
+                break
+            valores = []
+            for registro_id, valor in linhas:
+                dados = conversor(valor)
+                if dados:
+                    valores.append(_linha(tabela, campo, registro_id, dados))
+            if valores:
+                # Documento já gravado pelo código novo é mais recente que a coluna antiga
+                db.execute(insert(D).values(valores).on_conflict_do_nothing(
+                    index_elements=[D.tabela, D.registro_id, D.campo]
+                ))
+            db.query(modelo).filter(modelo.id.in_([registro_id for registro_id, _ in linhas])).update(
+                {campo: None}, synchronize_session=False
+            )
+            db.commit()
+            movidos[f"{tabela}.{campo}"] = movidos.get(f"{tabela}.{campo}", 0) + len(linhas)
+    return movidos
@@ -0,0 +1,198 @@
+"""
+Barramento de eventos entre processos (vários workers do uvicorn).
+
+O 'manager' do WebSocket é por processo: um NOVA_SOLICITACAO gerado no
+worker A não chegava ao gerente conectado no worker B. Agora quem gera um
+evento publica aqui; cada worker escuta o barramento e repassa ao seu
+próprio manager (que entrega só a quem assina o tópico).
+
+Backends:
+- BarramentoPostgres: NOTIFY/LISTEN no canal 'sinapse_eventos' do próprio
+  banco (nenhum serviço extra). Uma thread envia (fila -> pg_notify) e
+  outra escuta; o processo que publica também recebe o próprio NOTIFY,
+  então a entrega é sempre pelo mesmo caminho. Sem banco, o evento é
+  entregue só no processo local (e avisado no log).
+- BarramentoMemoria: entrega direto no processo (sqlite, testes, scripts).
+
+Escolha: BARRAMENTO_EVENTOS=postgres|memoria (padrão: postgres quando o
+banco é PostgreSQL).
+
+Eventos são avisos de tela: se a escuta cair, os NOTIFY do intervalo de
+reconexão se perdem (as telas recarregam os dados ao reconectar).
+
+Avisos internos ('avisar_processos' / 'ouvir'): mesmo canal, mas entregues
+a funções do próprio servidor em cada worker, não ao WebSocket (ex.: o
+índice de produtos invalidado num worker é invalidado em todos).
+"""
+import os
+import queue
+import select
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+import orjson
+
+from ..database import engine
+
+CANAL = "sinapse_eventos"
+LIMITE_PAYLOAD = 7900 # NOTIFY aceita até 8000 bytes
+ESPERA_RECONEXAO = 2.0 # segundos
+
+
+class Barramento:
+    """Interface comum. 'publicar' pode ser chamado de qualquer thread."""
+
+    def __init__(self):
+        self._manager = None
+        self._ouvintes: Dict[str, List[Callable[[dict], None]]] = {}
+
+    def iniciar(self, manager):
+        """Startup do app: passa a repassar os eventos para o manager deste processo."""
+        self._manager = manager
+
+    def parar(self):
+        self._manager = None
+
+    def publicar(self, topicos: Iterable[str], mensagem: dict):
+        """Para quem assina algum dos tópicos, em todos os workers."""
+        self._enviar(self._codificar(list(topicos), mensagem))
+
+    def broadcast(self, mensagem: dict):
+        """Para todas as conexões de todos os workers."""
+        self._enviar(self._codificar(None, mensagem))
+
+    def ouvir(self, tipo: str, funcao: Callable[[dict], None]):
+        """Registra uma função deste processo para os avisos internos 'tipo'."""
+        self._ouvintes.setdefault(tipo, []).append(funcao)
+
+    def avisar_processos(self, tipo: str, dados: dict):
+        """Aviso interno para todos os workers (inclusive este). Não vai para as telas."""
+        self._enviar(orjson.dumps({"interno": tipo, "dados": dados}).decode())
+
+    def _enviar(self, payload: str):
+        raise NotImplementedError
+
+    @staticmethod
+    def _codificar(topicos: Optional[list], mensagem: dict) -> str:
+        return orjson.dumps({"topicos": topicos, "mensagem": mensagem}).decode()
+
+    def _entregar(self, payload: str):
+        """Evento recebido do barramento -> ouvintes internos ou manager deste processo."""
+        evento = orjson.loads(payload)
+        if "interno" in evento:
+            for funcao in self._ouvintes.get(evento["interno"], ()):
+                funcao(evento["dados"])
+            return
+        manager = self._manager
+        if manager is None:
+            return
+        if evento["topicos"] is None:
+            manager.broadcast_threadsafe(evento["mensagem"])
+        else:
+            manager.publicar_threadsafe(evento["topicos"], evento["mensagem"])
+
+
+class BarramentoMemoria(Barramento):
+    """Um processo só: entrega direto (mesma codificação do Postgres)."""
+
+    def _enviar(self, payload: str):
+        self._entregar(payload)
+
+
+class BarramentoPostgres(Barramento):
+    def __init__(self, engine):
+        super().__init__()
+        self.engine = engine
+        self._fila: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._parar = threading.Event()
+
+    def iniciar(self, manager):
+        super().iniciar(manager)
+        self._parar.clear()
+        for alvo, nome in ((self._escutar, "barramento-escuta"), (self._enviar_fila, "barramento-envio")):
+            threading.Thread(target=alvo, name=nome, daemon=True).start()
+
+    def parar(self):
+        self._parar.set()
+        self._fila.put(None)
+        super().parar()
+
+    def _enviar(self, payload: str):
+        if self._manager is None:
+            return # Fora do app (scripts): ninguém escutando neste processo
+        if len(payload.encode()) > LIMITE_PAYLOAD:
+            print(f"⚠️ [Eventos] Mensagem grande demais para NOTIFY ({len(payload)} bytes): entregue só neste processo.")
+            self._entregar(payload)
+            return
+        self._fila.put(payload) # Não bloqueia a rota (nem o event loop)
+
+    def _conectar(self):
+        """Conexão própria, fora do pool (LISTEN prende a conexão), em autocommit."""
+        conexao = self.engine.raw_connection()
+        conexao.detach()
+        conexao.dbapi_connection.rollback() # O pre_ping do pool pode ter aberto uma transação
+        conexao.dbapi_connection.autocommit = True
+        return conexao
+
+    def _enviar_fila(self):
+        conexao = None
+        while True:
+            payload = self._fila.get()
+            if payload is None:
+                break
+            try:
+                if conexao is None:
+                    conexao = self._conectar()
+                cursor = conexao.cursor()
+                cursor.execute("SELECT pg_notify(%s, %s)", (CANAL, payload))
+                cursor.close()
+            except Exception as e:
+                print(f"⚠️ [Eventos] Falha no NOTIFY ({e}): entregue só neste processo.")
+                self._entregar(payload)
+                if conexao is not None:
+                    try:
+                        conexao.close()
+                    except Exception:
+                        pass
+                    conexao = None
+        if conexao is not None:
+            conexao.close()
+
+    def _escutar(self):
+        while not self._parar.is_set():
+            try:
+                conexao = self._conectar()
+                try:
+                    cursor = conexao.cursor()
+                    cursor.execute(f"LISTEN {CANAL}")
+                    cursor.close()
+                    print(f"📡 [Eventos] Escutando o canal '{CANAL}'.")
+
+                    pg = conexao.dbapi_connection
+                    while not self._parar.is_set():
+                        # Acorda a cada 1s para checar o desligamento
+                        if select.select([pg], [], [], 1.0) == ([], [], []):
+                            continue
+                        pg.poll()
+                        while pg.notifies:
+                            aviso = pg.notifies.pop(0)
+                            try:
+                                self._entregar(aviso.payload)
+                            except Exception as e:
+                                print(f"⚠️ [Eventos] Evento inválido descartado: {e}")
+                finally:
+                    conexao.close()
+            except Exception as e:
+                print(f"⚠️ [Eventos] Escuta caiu ({e}). Reconectando em {ESPERA_RECONEXAO:.0f}s.")
+                self._parar.wait(ESPERA_RECONEXAO)
+
+
+def criar_barramento() -> Barramento:
+    escolha = os.getenv("BARRAMENTO_EVENTOS", "").lower()
+    if escolha == "memoria" or (not escolha and engine.dialect.name != "postgresql"):
+        return BarramentoMemoria()
+    return BarramentoPostgres(engine)
+
+
+# Instância global (iniciada no startup do app)
+barramento = criar_barramento()
@@ -0,0 +1,220 @@
+"""
+Busca de produtos por texto (o caixa digita "coca 2l", não o código).
+
+No PostgreSQL:
+- produtos.busca_documento (tsvector, config 'sinapse_pt' = português com
+  unaccent): nome (peso A), categoria (B), fornecedor (C) e código (A).
+  Cada palavra digitada vira prefixo ("coc" acha "Coca-Cola") e o stemming
+  junta plural/singular ("refrigerantes" acha "Refrigerante").
+- produtos.busca_texto (texto normalizado, índice trigram): tolera erro de
+  digitação ("cocacola", "margarna").
+- Uma trigger mantém as duas colunas a cada INSERT/UPDATE do produto (e
+  quando o nome do fornecedor muda), inclusive nos UPDATEs em massa da
+  importação de notas. Elas não estão no model: só a busca as lê.
+
+Candidatos (cada um ranqueado antes de cortar, nunca "os primeiros que o
+banco achar"):
+- o código de barras exato (índice único), sempre incluído;
+- as MAX_CANDIDATOS melhores pelo texto (ts_rank). Termos amplos
+  ("leite" em 100 mil produtos) casam milhares de linhas e o corte mantém
+  a busca estável com o catálogo;
+- só se o texto não encheu a página (e não houve código exato), as
+  MAX_CANDIDATOS mais parecidas pelo trigram: é o caminho do erro de
+  digitação, e calcular similaridade de milhares de linhas custa caro.
+Ordem final: código exato primeiro, depois ts_rank + similaridade.
+
+Em outros bancos (sqlite de desenvolvimento) cai para ILIKE por palavra,
+sem acentos/stemming e sem índice.
+"""
+import re
+from typing import List, Optional
+
+from sqlalchemy import case, or_, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from .. import models
+
+CONFIG_TS = "sinapse_pt"
+LIMITE_PADRAO = 20
+LIMITE_MAXIMO = 100
+MAX_CANDIDATOS = 200
+
+# None = ainda não verificado neste processo
+_indice_disponivel: Optional[bool] = None
+
+_DDL_POSTGRES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    # unaccent() é STABLE; o wrapper com dicionário fixo pode ser IMMUTABLE
+    """
+    CREATE OR REPLACE FUNCTION sinapse_normalizar(texto text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS
+    $$ SELECT lower(unaccent('unaccent'::regdictionary, coalesce(texto, ''))) $$
+    """,
+    f"""
+    DO $$ BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = '{CONFIG_TS}') THEN
+            CREATE TEXT SEARCH CONFIGURATION {CONFIG_TS} (COPY = portuguese);
+            ALTER TEXT SEARCH CONFIGURATION {CONFIG_TS}
+                ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem;
+        END IF;
+    END $$
+    """,
+    "ALTER TABLE produtos ADD COLUMN IF NOT EXISTS busca_texto text",
+    "ALTER TABLE produtos ADD COLUMN IF NOT EXISTS busca_documento tsvector",
+    f"""
+    CREATE OR REPLACE FUNCTION sinapse_produto_busca() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        fornecedor text;
+    BEGIN
+        SELECT nome INTO fornecedor FROM fornecedores WHERE id = NEW.fornecedor_id;
+        NEW.busca_texto := sinapse_normalizar(concat_ws(' ', NEW.nome, NEW.categoria, NEW.codigo_barras, fornecedor));
+        NEW.busca_documento :=
+            setweight(to_tsvector('{CONFIG_TS}', coalesce(NEW.nome, '')), 'A') ||
+            setweight(to_tsvector('{CONFIG_TS}', coalesce(NEW.codigo_barras, '')), 'A') ||
+            setweight(to_tsvector('{CONFIG_TS}', coalesce(NEW.categoria, '')), 'B') ||
+            setweight(to_tsvector('{CONFIG_TS}', coalesce(fornecedor, '')), 'C');
+        RETURN NEW;
+    END $$
+    """,
+    """
+    DO $$ BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'tg_produtos_busca') THEN
+            CREATE TRIGGER tg_produtos_busca
+            BEFORE INSERT OR UPDATE OF nome, categoria, codigo_barras, fornecedor_id ON produtos
+            FOR EACH ROW EXECUTE FUNCTION sinapse_produto_busca();
+        END IF;
+    END $$
+    """,
+    # Fornecedor renomeado: 'SET fornecedor_id = fornecedor_id' dispara a trigger acima
+    """
+    CREATE OR REPLACE FUNCTION sinapse_fornecedor_busca() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        UPDATE produtos SET fornecedor_id = fornecedor_id WHERE fornecedor_id = NEW.id;
+        RETURN NULL;
+    END $$
+    """,
+    """
+    DO $$ BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'tg_fornecedores_busca') THEN
+            CREATE TRIGGER tg_fornecedores_busca
+            AFTER UPDATE OF nome ON fornecedores
+            FOR EACH ROW WHEN (OLD.nome IS DISTINCT FROM NEW.nome)
+            EXECUTE FUNCTION sinapse_fornecedor_busca();
+        END IF;
+    END $$
+    """,
+    # fastupdate=off: o catálogo muda pouco e a lista pendente do GIN (varrida
+    # linearmente a cada busca) triplicava a latência logo após uma importação
+    "CREATE INDEX IF NOT EXISTS ix_produtos_busca_documento ON produtos "
+    "USING gin (busca_documento) WITH (fastupdate = off)",
+    "CREATE INDEX IF NOT EXISTS ix_produtos_busca_trgm ON produtos "
+    "USING gin (busca_texto gin_trgm_ops) WITH (fastupdate = off)",
+    # Produtos que já existiam (só na primeira vez: depois a trigger mantém)
+    "UPDATE produtos SET nome = nome WHERE busca_documento IS NULL",
+]
+
+
+def preparar(engine: Engine) -> bool:
+    """Cria extensões, colunas, trigger e índices (idempotente). Só PostgreSQL."""
+    global _indice_disponivel
+    if engine.dialect.name != "postgresql":
+        _indice_disponivel = False
+        return False
+    with engine.begin() as conn:
+        for comando in _DDL_POSTGRES:
+            conn.execute(text(comando))
+    _indice_disponivel = True
+    return True
+
+
+def _indice_pronto(db: Session) -> bool:
+    global _indice_disponivel
+    if _indice_disponivel is None:
+        _indice_disponivel = db.bind.dialect.name == "postgresql" and bool(db.execute(text(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = 'produtos' AND column_name = 'busca_documento'"
+        )).first())
+    return _indice_disponivel
+
+
+def palavras(termo: str) -> List[str]:
+    return re.findall(r"[^\W_]+", termo or "")
+
+
+_SQL_POSTGRES = text(f"""
+    WITH busca AS (
+        SELECT to_tsquery('{CONFIG_TS}', :consulta) AS consulta, sinapse_normalizar(:termo) AS termo
+    ),
+    exato AS (
+        SELECT id FROM produtos
+        WHERE codigo_barras = :bruto AND (CAST(:categoria AS text) IS NULL OR categoria = :categoria)
+    ),
+    texto AS (
+        SELECT p.id FROM produtos p, busca b
+        WHERE p.busca_documento @@ b.consulta
+          AND (CAST(:categoria AS text) IS NULL OR p.categoria = :categoria)
+        ORDER BY ts_rank(p.busca_documento, b.consulta) DESC, p.id
+        LIMIT :candidatos
+    ),
+    parecidos AS (
+        SELECT p.id FROM produtos p, busca b
+        WHERE NOT EXISTS (SELECT 1 FROM exato)
+          AND (SELECT count(*) FROM texto) < :limite
+          AND b.termo <% p.busca_texto
+          AND (CAST(:categoria AS text) IS NULL OR p.categoria = :categoria)
+        ORDER BY word_similarity(b.termo, p.busca_texto) DESC, p.id
+        LIMIT :candidatos
+    ),
+    candidatos AS (
+        SELECT id FROM exato UNION SELECT id FROM texto UNION SELECT id FROM parecidos
+    )
+    SELECT p.id, p.nome, p.preco_venda, p.quantidade_estoque, p.codigo_barras, p.categoria,
+           p.preco_custo, p.unidade_medida, p.vencimento, f.nome AS fornecedor_nome,
+           CASE WHEN p.codigo_barras = :bruto THEN 10 ELSE 0 END
+             + ts_rank(p.busca_documento, b.consulta)
+             + word_similarity(b.termo, p.busca_texto) AS relevancia
+    FROM candidatos c
+    JOIN produtos p ON p.id = c.id
+    CROSS JOIN busca b
+    LEFT JOIN fornecedores f ON f.id = p.fornecedor_id
+    ORDER BY relevancia DESC, p.nome, p.id
+    LIMIT :limite
+""")
+
+
+
+def buscar(db: Session, termo: str, limite: int = LIMITE_PADRAO, categoria: Optional[str] = None) -> list:
+    """Produtos que casam com 'termo', do mais relevante ao menos."""
+    tokens = palavras(termo)
+    if not tokens:
+        return []
+    bruto = termo.strip()
+
+    if _indice_pronto(db):
+        # Cada palavra vira prefixo e todas precisam aparecer: "coca 2l" -> coca:* & 2l:*
+        consulta = " & ".join(f"{token}:*" for token in tokens)
+        return db.execute(_SQL_POSTGRES, {
+            "consulta": consulta, "termo": " ".join(tokens), "bruto": bruto,
+            "categoria": categoria, "limite": limite, "candidatos": MAX_CANDIDATOS,
+        }).all()
+
+    P, F = models.Produto, models.Fornecedor
+    query = db.query(
+        P.id, P.nome, P.preco_venda, P.quantidade_estoque, P.codigo_barras, P.categoria,
+        P.preco_custo, P.unidade_medida, P.vencimento, F.nome.label("fornecedor_nome"),
+    ).outerjoin(F, F.id == P.fornecedor_id)
+    for token in tokens:
+        padrao = f"%{token}%"
+        query = query.filter(or_(
+            P.nome.ilike(padrao), P.categoria.ilike(padrao), P.codigo_barras.ilike(padrao), F.nome.ilike(padrao)
+        ))
+    if categoria:
+        query = query.filter(P.categoria == categoria)
+    return query.order_by(
+        case((P.codigo_barras == bruto, 0), (P.nome.ilike(f"{tokens[0]}%"), 1), else_=2),
+        P.nome, P.id,
+    ).limit(limite).all()
@@ -0,0 +1,125 @@
+"""
+Sessão de caixa (turno) do PDV.
+
+O "valor em caixa" era refeito a cada leitura: última abertura em
+MovimentacaoCaixa + soma de suprimentos/sangrias + varredura das vendas do
+turno, custo que crescia com o tamanho do turno. Agora o turno é uma linha
+em 'sessoes_caixa' e cada operação soma no contador certo, na mesma
+transação da operação:
+
+    UPDATE sessoes_caixa SET total_sangrias = total_sangrias + :v
+     WHERE pdv_id = :pdv AND status = 'aberta'
+
+Ler a gaveta é ler uma linha. MovimentacaoCaixa continua sendo gravada
+como trilha de auditoria.
+"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from .. import models
+
+CONTADORES = (
+    "total_suprimentos",
+    "total_sangrias",
+    "total_vendas_dinheiro",
+    "total_recebimentos",
+    "total_vendas",
+    "quantidade_vendas",
+)
+
+
+def sessao_aberta(db: Session, pdv_id: int, travar: bool = False) -> Optional[models.SessaoCaixa]:
+    query = db.query(models.SessaoCaixa).filter(
+        models.SessaoCaixa.pdv_id == pdv_id,
+        models.SessaoCaixa.status == "aberta"
+    )
+    if travar:
+        # populate_existing: os contadores mudam por UPDATE direto, o objeto
+        # que já estiver na sessão do SQLAlchemy pode estar defasado
+        query = query.populate_existing().with_for_update()
+    return query.first()
+
+
+def abrir_sessao(
+    db: Session,
+    pdv_id: int,
+    operador_id: int,
+    valor_abertura: float,
+    aberta_por_id: Optional[int] = None,
+) -> models.SessaoCaixa:
+    """
+    Sem commit: roda dentro da transação da abertura do PDV. Uma sessão que
+    tenha ficado aberta (PDV fechado por fora do fluxo) é encerrada antes.
+    """
+    anterior = sessao_aberta(db, pdv_id, travar=True)
+    if anterior:
+        print(f"⚠️ [Caixa] PDV {pdv_id} tinha a sessão #{anterior.id} aberta. Encerrando antes da nova abertura.")
+        anterior.status = "fechada"
+        anterior.fechada_em = datetime.utcnow()
+        db.flush()
+
+    sessao = models.SessaoCaixa(
+        pdv_id=pdv_id,
+        operador_id=operador_id,
+        aberta_por_id=aberta_por_id,
+        valor_abertura=valor_abertura,
+        aberta_em=datetime.utcnow(),
+    )
+    db.add(sessao)
+    db.flush()
+    return sessao
+
+
+def registrar(db: Session, pdv_id: int, **incrementos: float) -> bool:
+    """
+    Soma nos contadores da sessão aberta do PDV (UPDATE atômico, sem ler a
+    linha antes). Devolve False se o PDV não tem sessão aberta.
+    Ex: registrar(db, pdv_id, total_sangrias=50.0)
+    """
+    valores = {}
+    for contador, valor in incrementos.items():
+        if contador not in CONTADORES:
+            raise ValueError(f"Contador de caixa desconhecido: {contador}")
+        if valor:
+            coluna = getattr(models.SessaoCaixa, contador)
+            valores[contador] = coluna + valor
+
+    if not valores:
+        return True
+
+    resultado = db.execute(
+        update(models.SessaoCaixa)
+        .where(models.SessaoCaixa.pdv_id == pdv_id, models.SessaoCaixa.status == "aberta")
+        .values(**valores)
+        .execution_options(synchronize_session=False)
+    )
+    if resultado.rowcount == 0:
+        print(f"⚠️ [Caixa] PDV {pdv_id} sem sessão aberta: movimento não entrou nos totais do turno.")
+        return False
+    return True
+
+
+def fechar_sessao(
+    db: Session,
+    pdv_id: int,
+    fechada_por_id: Optional[int] = None,
+    valor_informado: Optional[float] = None,
+) -> Optional[models.SessaoCaixa]:
+    """
+    Encerra a sessão aberta (sem commit). Com 'valor_informado' (fechamento
+    cego), grava a diferença contra o valor calculado.
+    """
+    sessao = sessao_aberta(db, pdv_id, travar=True)
+    if sessao is None:
+        return None
+
+    sessao.status = "fechada"
+    sessao.fechada_em = datetime.utcnow()
+    sessao.fechada_por_id = fechada_por_id
+    if valor_informado is not None:
+        sessao.valor_informado = valor_informado
+        sessao.diferenca = valor_informado - sessao.valor_em_caixa
+    return sessao
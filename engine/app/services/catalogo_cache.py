@@ -0,0 +1,273 @@
+"""
+Índice de códigos de barras em memória (por processo).
+
+O PDV bipa vários itens por segundo por caixa. Em vez de ir ao banco
+(Produto + promoções + Empresa) a cada bip, mantemos um registro compacto
+por 'codigo_barras' já pronto para a resposta, com o preço efetivo
+materializado pelo motor_precos. As rotas que alteram produtos/promoções
+chamam 'invalidar_*' logo após o commit.
+
+Vários workers do uvicorn: cada um tem o seu índice. 'invalidar_*' limpa o
+índice local na hora e avisa os outros pelo barramento (NOTIFY no
+PostgreSQL). Um aviso perdido (escuta reconectando) é coberto por
+TTL_SEGUNDOS: nenhum registro é servido por mais tempo que isso.
+
+O saldo de estoque não fica no índice (muda a cada venda, estorno e
+entrada): 'dados_resposta' lê só essa coluna do banco, pela PK.
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass, replace
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy.orm import Session, joinedload
+
+from .. import models, schemas
+from .barramento import barramento
+from .motor_precos import PrecoEfetivo, calcular_preco_efetivo, AgendadorFronteiras
+
+TTL_SEGUNDOS = float(os.getenv("CATALOGO_CACHE_TTL", "300"))
+EVENTO_INVALIDACAO = "catalogo_invalidado"
+# Acima disso o aviso vira "invalidar tudo" (o NOTIFY tem limite de tamanho)
+MAX_CODIGOS_AVISO = 200
+
+
+@dataclass(frozen=True)
+class PromocaoIndexada:
+    nome: str
+    tipo: str
+    valor: float
+    data_inicio: Optional[datetime]
+    data_fim: Optional[datetime]
+
+
+@dataclass(frozen=True)
+class ProdutoIndexado:
+    id: int
+    nome: str
+    codigo_barras: str
+    preco_venda: float
+    unidade_medida: str
+    promocoes: Tuple[PromocaoIndexada, ...]
+    # Dados já serializados no formato de schemas.Produto (resposta da API),
+    # SEM quantidade_estoque: use 'dados_resposta(registro, db)'.
+    dados_resposta: dict
+    preco: PrecoEfetivo
+    carregado_em: float # time.monotonic() da carga (TTL)
+
+    def preco_atual(self, agora: Optional[datetime] = None) -> PrecoEfetivo:
+        """
+        Preço efetivo já materializado (O(1)). Só recalcula se uma fronteira
+        de promoção passou e o agendador ainda não trocou o registro.
+        """
+        agora = agora or datetime.utcnow()
+        if self.preco.valido_em(agora):
+            return self.preco
+        return calcular_preco_efetivo(self.preco_venda, self.promocoes, agora)
+
+
+_lock = threading.Lock()
+_indice: Dict[str, ProdutoIndexado] = {}
+# Incrementa a cada invalidação. Uma carga que começou antes de uma
+# invalidação não pode gravar o resultado (evita reintroduzir dado velho).
+_geracao = 0
+
+
+def _montar_registro(produto: models.Produto) -> ProdutoIndexado:
+    promocoes = tuple(
+        PromocaoIndexada(
+            nome=p.nome,
+            tipo=p.tipo,
+            valor=p.valor,
+            data_inicio=p.data_inicio,
+            data_fim=p.data_fim,
+        )
+        for p in produto.promocoes
+    )
+    return ProdutoIndexado(
+        preco=calcular_preco_efetivo(produto.preco_venda, promocoes),
+        id=produto.id,
+        nome=produto.nome,
+        codigo_barras=produto.codigo_barras,
+        preco_venda=produto.preco_venda,
+        unidade_medida=(produto.unidade_medida or "UN"),
+        promocoes=promocoes,
+        dados_resposta=schemas.Produto.model_validate(produto).model_dump(exclude={"quantidade_estoque"}),
+        carregado_em=time.monotonic(),
+    )
+
+
+def _valido(registro: Optional[ProdutoIndexado]) -> bool:
+    return registro is not None and time.monotonic() - registro.carregado_em < TTL_SEGUNDOS
+
+
+def dados_resposta(registro: ProdutoIndexado, db: Session, estoque: Optional[float] = None) -> dict:
+    """
+    Payload de schemas.Produto com o saldo atual. 'estoque' evita a leitura
+    quando o chamador já consultou o saldo na mesma transação.
+    """
+    if estoque is None:
+        estoque = db.query(models.Produto.quantidade_estoque).filter(
+            models.Produto.id == registro.id
+        ).scalar()
+    return {**registro.dados_resposta, "quantidade_estoque": estoque or 0}
+
+
+def buscar_por_codigo(codigo_barras: str, db: Session) -> Optional[ProdutoIndexado]:
+    """
+    Resolve um código de barras. Acerto no índice = nenhuma consulta aqui;
+    a resposta da bipagem faz só uma leitura pela PK, a do saldo de estoque
+    ('dados_resposta'), para não mostrar saldo velho.
+    Na falta, carrega do banco (produto + promoções + fornecedor/criador).
+    """
+    registro = _indice.get(codigo_barras)
+    if _valido(registro):
+        return registro
+
+    with _lock:
+        geracao_inicial = _geracao
+
+    produto = db.query(models.Produto).options(
+        joinedload(models.Produto.promocoes),
+        joinedload(models.Produto.fornecedor),
+        joinedload(models.Produto.criador),
+    ).filter(
+        models.Produto.codigo_barras == codigo_barras
+    ).first()
+
+    if not produto:
+        return None
+
+    registro = _montar_registro(produto)
+
+    with _lock:
+        if _geracao == geracao_inicial:
+            _indice[codigo_barras] = registro
+
+    _agendador.agendar(registro.preco.valido_ate)
+    return registro
+
+
+def buscar_por_codigos(codigos_barras: Iterable[str], db: Session) -> Dict[str, ProdutoIndexado]:
+    """
+    Versão em lote do 'buscar_por_codigo' (carrinho sincronizado de uma vez):
+    os códigos fora do índice são carregados numa única consulta com IN.
+    Códigos inexistentes simplesmente não aparecem no resultado.
+    """
+    codigos = set(c for c in codigos_barras if c)
+    encontrados = {c: r for c in codigos if _valido(r := _indice.get(c))}
+    faltando = codigos - encontrados.keys()
+    if not faltando:
+        return encontrados
+
+    with _lock:
+        geracao_inicial = _geracao
+
+    produtos = db.query(models.Produto).options(
+        joinedload(models.Produto.promocoes),
+        joinedload(models.Produto.fornecedor),
+        joinedload(models.Produto.criador),
+    ).filter(
+        models.Produto.codigo_barras.in_(faltando)
+    ).all()
+
+    novos = {p.codigo_barras: _montar_registro(p) for p in produtos}
+    encontrados.update(novos)
+
+    with _lock:
+        if _geracao == geracao_inicial:
+            _indice.update(novos)
+
+    for registro in novos.values():
+        _agendador.agendar(registro.preco.valido_ate)
+    return encontrados
+
+
+def _recalcular_vencidos(agora: datetime) -> Optional[datetime]:
+    """
+    Chamado pelo agendador na fronteira: rematerializa os preços vencidos
+    e devolve a próxima fronteira ainda pendente no índice.
+    """
+    proxima = None
+    with _lock:
+        for codigo, registro in list(_indice.items()):
+            if not registro.preco.valido_em(agora):
+                registro = replace(
+                    registro,
+                    preco=calcular_preco_efetivo(registro.preco_venda, registro.promocoes, agora)
+                )
+                _indice[codigo] = registro
+
+            fronteira = registro.preco.valido_ate
+            if fronteira is not None and (proxima is None or fronteira < proxima):
+                proxima = fronteira
+    return proxima
+
+
+_agendador = AgendadorFronteiras(_recalcular_vencidos)
+
+
+def _remover_codigos(codigos: Iterable[str]):
+    global _geracao
+    with _lock:
+        _geracao += 1
+        for codigo in codigos:
+            _indice.pop(codigo, None)
+
+
+def _remover_produtos(produto_ids: Iterable[int]):
+    global _geracao
+    ids = set(produto_ids)
+    with _lock:
+        _geracao += 1
+        for codigo in [c for c, r in _indice.items() if r.id in ids]:
+            _indice.pop(codigo, None)
+
+
+def _remover_tudo():
+    global _geracao
+    with _lock:
+        _geracao += 1
+        _indice.clear()
+
+
+def _avisar(dados: dict):
+    """Repete a invalidação nos outros workers (este também recebe; é idempotente)."""
+    if len(dados.get("codigos", dados.get("produto_ids", ()))) > MAX_CODIGOS_AVISO:
+        dados = {"tudo": True}
+    barramento.avisar_processos(EVENTO_INVALIDACAO, dados)
+
+
+def _ao_receber(dados: dict):
+    if dados.get("tudo"):
+        _remover_tudo()
+    elif "codigos" in dados:
+        _remover_codigos(dados["codigos"])
+    elif "produto_ids" in dados:
+        _remover_produtos(dados["produto_ids"])
+
+
+barramento.ouvir(EVENTO_INVALIDACAO, _ao_receber)
+
+
+def invalidar_codigos(codigos: Iterable[Optional[str]]):
+    """Remove códigos específicos do índice, em todos os workers (ex: produto editado)."""
+    codigos = [codigo for codigo in codigos if codigo]
+    if codigos:
+        _remover_codigos(codigos)
+        _avisar({"codigos": codigos})
+
+
+def invalidar_produtos(produto_ids: Iterable[int]):
+    """Remove do índice os registros dos produtos informados (por ID), em todos os workers."""
+    ids = list(set(produto_ids))
+    if ids:
+        _remover_produtos(ids)
+        _avisar({"produto_ids": ids})
+
+
+def invalidar_tudo():
+    _remover_tudo()
+    _avisar({"tudo": True})
@@ -0,0 +1,158 @@
+"""
+Configuração da empresa em memória (foto imutável, por processo).
+
+Quase toda rota de operação (bip, finalização, emissão, cupom, juros) fazia
+'db.query(models.Empresa).filter(models.Empresa.id == 1).first()', uma
+linha larga que inclui 'logo_data' (base64 que pode ter centenas de KB).
+Aqui a configuração é lida uma vez, sem o logo, e servida como
+'ConfigEmpresa' (frozen dataclass).
+
+Coerência:
+- no mesmo processo: as rotas que alteram a Empresa chamam 'nova_versao'
+  antes do commit e 'invalidar' depois (a próxima leitura recarrega);
+- entre processos (vários workers do uvicorn, fila fiscal): cada linha tem
+  'versao_config'. A foto é revalidada a cada INTERVALO_REVALIDACAO
+  segundos lendo só essa coluna; mudou, recarrega;
+- telas abertas: 'invalidar' avisa pelo WebSocket (CONFIG_EMPRESA_ATUALIZADA)
+  para o frontend buscar a configuração de novo.
+
+Telas de configuração continuam lendo/gravando o modelo completo; o logo
+fica no armazém de documentos e volta nas respostas delas por 'com_logo'.
+"""
+import threading
+import time
+from dataclasses import dataclass, fields
+from typing import Optional
+
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from .. import models
+from . import armazem_documentos
+from .barramento import barramento
+
+INTERVALO_REVALIDACAO = 5.0 # segundos
+
+
+@dataclass(frozen=True)
+class ConfigEmpresa:
+    id: int
+    versao_config: int
+
+    # Identidade
+    nome_fantasia: str
+    razao_social: Optional[str]
+    cnpj: Optional[str]
+    fuso_horario: Optional[str]
+
+    # Operacional / Financeiro
+    permitir_estoque_negativo: bool
+    pix_chave_padrao: Optional[str]
+    pix_tipo_chave: Optional[str]
+    crediario_multa: float
+    crediario_juros_mensal: float
+    crediario_dias_carencia: int
+
+    # Fiscal - Identificação e padrões
+    regime_tributario: Optional[str]
+    inscricao_estadual: Optional[str]
+    inscricao_municipal: Optional[str]
+    uf: Optional[str]
+    csc_id: Optional[str]
+    csc_token: Optional[str]
+    padrao_ncm: Optional[str]
+    padrao_cfop_dentro: Optional[str]
+    padrao_cfop_fora: Optional[str]
+    padrao_csosn: Optional[str]
+
+    # Fiscal - Envio e governador
+    ambiente_sefaz: Optional[str]
+    modo_emissao: Optional[str]
+    contingencia_automatica: bool
+    timeout_sefaz: Optional[int]
+    tempo_rejeicao: Optional[int]
+    fiscal_strategy: Optional[str]
+    fiscal_goal_value: Optional[float]
+    fiscal_autopilot: bool
+
+
+_CAMPOS = tuple(f.name for f in fields(ConfigEmpresa))
+
+_lock = threading.Lock()
+_foto: Optional[ConfigEmpresa] = None
+_verificada_em = 0.0
+# Incrementa a cada invalidação: uma carga que começou antes não grava o resultado
+_geracao = 0
+
+
+def _carregar(db: Session) -> Optional[ConfigEmpresa]:
+    linha = db.query(
+        *(getattr(models.Empresa, campo) for campo in _CAMPOS)
+    ).filter(models.Empresa.id == 1).first()
+    if linha is None:
+        return None
+    valores = dict(zip(_CAMPOS, linha))
+    valores["versao_config"] = valores["versao_config"] or 0
+    for campo in ("permitir_estoque_negativo", "contingencia_automatica", "fiscal_autopilot"):
+        valores[campo] = bool(valores[campo])
+    for campo in ("crediario_multa", "crediario_juros_mensal"):
+        valores[campo] = valores[campo] or 0.0
+    valores["crediario_dias_carencia"] = valores["crediario_dias_carencia"] or 0
+    return ConfigEmpresa(**valores)
+
+
+def obter(db: Session) -> Optional[ConfigEmpresa]:
+    """
+    Configuração atual (None se a empresa ainda não foi cadastrada).
+    Custo normal: zero consultas; a cada INTERVALO_REVALIDACAO, uma consulta
+    de uma coluna.
+    """
+    global _foto, _verificada_em
+
+    with _lock:
+        foto, verificada_em, geracao = _foto, _verificada_em, _geracao
+
+    agora = time.monotonic()
+    if foto is not None and agora - verificada_em < INTERVALO_REVALIDACAO:
+        return foto
+
+    if foto is not None:
+        versao = db.query(models.Empresa.versao_config).filter(models.Empresa.id == 1).scalar()
+        if (versao or 0) == foto.versao_config:
+            with _lock:
+                if _geracao == geracao:
+                    _verificada_em = agora
+            return foto
+        print(f"🔄 [Config] Empresa alterada em outro processo (versão {versao}). Recarregando.")
+
+    nova = _carregar(db)
+    with _lock:
+        if _geracao == geracao and nova is not None:
+            _foto, _verificada_em = nova, agora
+    return nova
+
+
+def nova_versao(config: models.Empresa):
+    """Chamar antes do commit de qualquer alteração na Empresa."""
+    config.versao_config = (config.versao_config or 0) + 1
+
+
+def invalidar(avisar: bool = True):
+    """Chamar depois do commit. Descarta a foto e avisa as telas conectadas."""
+    global _foto, _geracao
+    with _lock:
+        _geracao += 1
+        _foto = None
+
+    if avisar:
+        barramento.broadcast({"type": "CONFIG_EMPRESA_ATUALIZADA", "payload": {}})
+
+
+def com_logo(db: Session, config: models.Empresa) -> models.Empresa:
+    """
+    A Empresa com o logo lido do armazém de documentos, para as respostas
+    das telas de configuração. Não marca a linha como alterada.
+    """
+    logo = armazem_documentos.ler_texto(db, models.Empresa.logo_data, config.id)
+    set_committed_value(config, "logo_data", logo)
+    return config
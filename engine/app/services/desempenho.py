@@ -0,0 +1,89 @@
+"""
+Desempenho por operador num período: vendas, faturamento e horas de caixa.
+
+/usuarios/performance fazia 1 consulta de vendas (sem filtro de data) e mais
+1 consulta de movimentações POR usuário (1 + N). Agora qualquer período
+custa duas consultas, para todos os operadores de uma vez:
+
+- vendas: soma do resumo diário por operador (resumo_vendas_operador,
+  mantido por services/resumo_vendas.py);
+- horas: turnos de 'sessoes_caixa' (aberta_em/fechada_em) que cruzam o
+  período, recortados aqui (subtração de datas é diferente em cada banco).
+  A sessão é encerrada por qualquer caminho de fechamento (admin, cego,
+  nova abertura), o que a trilha de MovimentacaoCaixa não garante.
+
+'por_operador' serve a qualquer dashboard que precise desses números.
+"""
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..utils import periodos
+
+
+@dataclass(frozen=True)
+class DesempenhoOperador:
+    operador_id: int
+    total_vendas: int = 0
+    faturamento: float = 0.0
+    minutos_trabalhados: float = 0.0
+
+    @property
+    def ticket_medio(self) -> float:
+        return (self.faturamento / self.total_vendas) if self.total_vendas > 0 else 0.0
+
+    @property
+    def horas_trabalhadas(self) -> str:
+        return f"{int(self.minutos_trabalhados // 60)}h {int(self.minutos_trabalhados % 60)}m"
+
+
+def vendas_por_operador(db: Session, inicio: date, fim: date) -> Dict[int, Tuple[int, float]]:
+    """{operador_id: (quantidade de vendas, faturamento)} nos dias [inicio, fim]."""
+    R = models.ResumoVendasOperador
+    linhas = db.query(
+        R.operador_id, func.sum(R.quantidade_vendas), func.sum(R.faturamento)
+    ).filter(R.data >= inicio, R.data <= fim).group_by(R.operador_id).all()
+    return {operador_id: (int(qtd or 0), float(total or 0)) for operador_id, qtd, total in linhas}
+
+
+def minutos_por_operador(
+    db: Session, intervalo: periodos.Intervalo, agora: Optional[datetime] = None
+) -> Dict[int, float]:
+    """
+    Minutos de caixa aberto por operador dentro do intervalo (UTC). Sessão
+    ainda aberta conta até agora.
+    """
+    agora = agora or datetime.utcnow()
+    S = models.SessaoCaixa
+    turnos = db.query(S.operador_id, S.aberta_em, S.fechada_em).filter(
+        S.operador_id.isnot(None),
+        S.aberta_em < intervalo.fim,
+        or_(S.fechada_em.is_(None), S.fechada_em > intervalo.inicio),
+    ).all()
+
+    minutos: Dict[int, float] = {}
+    for operador_id, inicio, fim in turnos:
+        duracao = min(fim or agora, intervalo.fim, agora) - max(inicio, intervalo.inicio)
+        if duracao.total_seconds() > 0:
+            minutos[operador_id] = minutos.get(operador_id, 0.0) + duracao.total_seconds() / 60
+    return minutos
+
+
+def por_operador(db: Session, inicio: date, fim: date) -> Dict[int, DesempenhoOperador]:
+    """Vendas + horas de cada operador com atividade nos dias locais [inicio, fim]."""
+    vendas = vendas_por_operador(db, inicio, fim)
+    minutos = minutos_por_operador(db, periodos.dias(inicio, fim, db))
+
+    return {
+        operador_id: DesempenhoOperador(
+            operador_id=operador_id,
+            total_vendas=vendas.get(operador_id, (0, 0.0))[0],
+            faturamento=vendas.get(operador_id, (0, 0.0))[1],
+            minutos_trabalhados=minutos.get(operador_id, 0.0),
+        )
+        for operador_id in vendas.keys() | minutos.keys()
+    }
@@ -0,0 +1,308 @@
+"""
+Distribuição DF-e por NSU, com armazenamento local dos documentos.
+
+Antes, o preview por chave ia à SEFAZ na hora, nota por nota, com duas
+idas ao PHP (consulta + download). Agora um worker em segundo plano
+percorre a distribuição a partir do último NSU lido: cada resposta traz até
+50 documentos emitidos contra o nosso CNPJ (NF-e completas, resumos e
+eventos). Cada um é guardado em 'documentos_dfe' compactado como veio no
+docZip (gzip) e indexado pela chave de acesso. O preview por chave procura
+primeiro ali (consultar_local) e só cai na SEFAZ se a nota ainda não chegou.
+
+Regras da SEFAZ:
+- Repete a consulta enquanto ultNSU < maxNSU (até MAX_CONSULTAS_POR_CICLO).
+- Sem documento novo (cStat 137) ou consumo indevido (656): só consulta de
+  novo depois de ESPERA_SEFAZ ('proxima_consulta' em sincronizacao_dfe).
+
+Com vários processos do servidor, só um sincroniza por vez: a linha do CNPJ
+em 'sincronizacao_dfe' fica travada (FOR UPDATE SKIP LOCKED) a cada lote e
+os outros pulam. Documento repetido (mesmo NSU) é ignorado no insert.
+
+Resumos (resNFe) ficam guardados, mas a NF-e completa só vem na
+distribuição depois da manifestação do destinatário, que não é feita aqui.
+
+Para testar sem rede: PHP_WORKER_SCRIPT=sefaz_service/worker_gravado.php.
+"""
+import os
+import threading
+from base64 import b64decode
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..database import SessionLocal
+from . import armazem_documentos, leitor_nfe, sefaz_query_service
+from .barramento import barramento
+from .php_worker import pool_php
+
+# 0 = sem worker (sincroniza só quando pedido pela rota)
+INTERVALO_MINUTOS = float(os.getenv("DFE_INTERVALO_MINUTOS", "60"))
+ESPERA_SEFAZ = timedelta(hours=1)
+MAX_CONSULTAS_POR_CICLO = 20
+
+CSTAT_DOCUMENTOS = "138"
+
+CAMPOS_RESUMO = ("chNFe", "CNPJ", "CPF", "xNome", "dhEmi", "vNF")
+
+
+def _so_digitos(valor: Optional[str]) -> str:
+    return "".join(c for c in (valor or "") if c.isdigit())
+
+
+def _data(valor: Optional[str]) -> Optional[date]:
+    try:
+        return date.fromisoformat(valor[:10]) if valor else None
+    except ValueError:
+        return None
+
+
+def _numero(valor: Optional[str]) -> Optional[float]:
+    try:
+        return float(valor) if valor else None
+    except ValueError:
+        return None
+
+
+def _certificado_ativo(db: Session) -> Optional[models.CertificadoDigital]:
+    return db.query(models.CertificadoDigital).filter_by(ativo=True).order_by(
+        models.CertificadoDigital.data_validade.desc()
+    ).first()
+
+
+def _tipo(schema: str) -> str:
+    if schema.startswith("procNFe"):
+        return "nfe"
+    if schema.startswith("resNFe"):
+        return "resumo"
+    if "Evento" in schema:
+        return "evento"
+    return "outro"
+
+
+def _linha(documento: leitor_nfe.DocumentoDistribuicao) -> dict:
+    """Linha de 'documentos_dfe': metadados lidos do XML + conteúdo ainda compactado."""
+    tipo = _tipo(documento.schema)
+    linha = {
+        "nsu": int(documento.nsu or 0),
+        "schema": documento.schema[:50],
+        "tipo": tipo,
+        "conteudo": documento.compactado,
+        "recebido_em": datetime.utcnow(),
+        # Todas as linhas com as mesmas colunas (INSERT de várias linhas)
+        "chave_acesso": None, "emitente_cnpj": None, "emitente_nome": None,
+        "valor_total": None, "data_emissao": None,
+    }
+    try:
+        if tipo == "nfe":
+            leitor = leitor_nfe.LeitorNFe(documento.abrir())
+            for _ in leitor.itens(): # Só o cabeçalho interessa aqui
+                pass
+            cabecalho = leitor.cabecalho
+            linha.update(
+                chave_acesso=cabecalho["chave_acesso"], emitente_cnpj=cabecalho["emitente_cnpj"],
+                emitente_nome=cabecalho["emitente_nome"], valor_total=_numero(cabecalho["valor_total"]),
+                data_emissao=_data(cabecalho["data_emissao"]),
+            )
+        else:
+            campos = leitor_nfe.ler_campos(documento.abrir(), CAMPOS_RESUMO)
+            linha.update(
+                chave_acesso=campos["chNFe"], emitente_cnpj=campos["CNPJ"] or campos["CPF"],
+                emitente_nome=campos["xNome"], valor_total=_numero(campos["vNF"]),
+                data_emissao=_data(campos["dhEmi"]),
+            )
+    except ValueError as e:
+        # Guarda assim mesmo: um documento ilegível não pode travar a fila no mesmo NSU
+        print(f"⚠️ [DF-e] NSU {linha['nsu']} ({documento.schema}) ilegível: {e}")
+    return linha
+
+
+def _insert_dialeto(db: Session):
+    dialeto = db.get_bind().dialect.name
+    if dialeto == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as insert_dialeto
+    elif dialeto == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as insert_dialeto
+    else:
+        raise RuntimeError(f"Banco '{dialeto}' sem suporte à distribuição DF-e.")
+    return insert_dialeto
+
+
+def _gravar(db: Session, linhas: List[dict]) -> List[dict]:
+    """Insere os documentos (NSU repetido é ignorado). Devolve os que eram novos."""
+    if not linhas:
+        return []
+    insert_dialeto = _insert_dialeto(db)
+    comando = insert_dialeto(models.DocumentoDFe).values(linhas).on_conflict_do_nothing(
+        index_elements=["nsu"]
+    ).returning(models.DocumentoDFe.nsu)
+    novos = {nsu for (nsu,) in db.execute(comando)}
+    return [linha for linha in linhas if linha["nsu"] in novos]
+
+
+def _travar_estado(db: Session, cnpj: str) -> Optional[models.SincronizacaoDFe]:
+    """Linha do CNPJ travada para este processo, ou None se outro já está sincronizando."""
+    insert_dialeto = _insert_dialeto(db)
+    db.execute(insert_dialeto(models.SincronizacaoDFe).values(
+        cnpj=cnpj, ult_nsu=0, max_nsu=0
+    ).on_conflict_do_nothing(index_elements=["cnpj"]))
+    return db.query(models.SincronizacaoDFe).filter(
+        models.SincronizacaoDFe.cnpj == cnpj
+    ).with_for_update(skip_locked=True).first()
+
+
+def estado_como_dict(estado: Optional[models.SincronizacaoDFe], **extras) -> dict:
+    dados = {
+        "cnpj": estado.cnpj if estado else None,
+        "ult_nsu": estado.ult_nsu if estado else 0,
+        "max_nsu": estado.max_nsu if estado else 0,
+        "ultima_consulta": estado.ultima_consulta if estado else None,
+        "proxima_consulta": estado.proxima_consulta if estado else None,
+        "ultimo_status": estado.ultimo_status if estado else None,
+        "novos": 0,
+        "mensagem": "",
+    }
+    dados.update(extras)
+    return dados
+
+
+def sincronizar(db: Session) -> dict:
+    """
+    Baixa os documentos novos da distribuição (até MAX_CONSULTAS_POR_CICLO
+    lotes) e devolve a posição da sincronização com 'novos' e 'mensagem'.
+    """
+    certificado = _certificado_ativo(db)
+    cnpj = _so_digitos(certificado.empresa.cnpj) if certificado and certificado.empresa else ""
+    if not cnpj:
+        return estado_como_dict(None, mensagem="Sem certificado digital ativo com CNPJ da empresa.")
+    # cUFAutor: UF errada faz a SEFAZ rejeitar toda consulta, então sem UF nem tenta
+    uf = (certificado.empresa.uf or "").strip().upper()
+    if len(uf) != 2:
+        mensagem = "UF da empresa não configurada (Configurações > Fiscal): a distribuição DF-e precisa dela."
+        print(f"⚠️ [DF-e] {mensagem}")
+        return estado_como_dict(None, mensagem=mensagem)
+    pfx = armazem_documentos.ler(db, models.CertificadoDigital.arquivo_binario, certificado.id)
+
+    novos: List[dict] = []
+    estado = None
+    mensagem = ""
+    try:
+        for _ in range(MAX_CONSULTAS_POR_CICLO):
+            estado = _travar_estado(db, cnpj)
+            if estado is None:
+                db.rollback()
+                mensagem = "Outro processo está sincronizando."
+                break
+
+            agora = datetime.utcnow()
+            if estado.proxima_consulta and agora < estado.proxima_consulta:
+                db.rollback()
+                mensagem = "Aguardando o intervalo mínimo da SEFAZ entre consultas."
+                break
+
+            # Distribuição de notas recebidas só existe em produção (como no preview por chave)
+            resultado = pool_php.executar("distribuicao_nsu", {
+                "ult_nsu": estado.ult_nsu, "cnpj": cnpj, "producao": True, "uf": uf,
+            }, pfx=pfx, senha=certificado.senha_arquivo)
+            retorno, documentos = leitor_nfe.ler_distribuicao(b64decode(resultado["xml_base64"]))
+
+            cstat = retorno["cStat"]
+            estado.ultima_consulta = agora
+            estado.ultimo_status = f"{cstat} - {retorno['xMotivo']}"[:255]
+            if cstat == CSTAT_DOCUMENTOS:
+                novos.extend(_gravar(db, [_linha(documento) for documento in documentos]))
+            if retorno["ultNSU"]:
+                estado.ult_nsu = max(estado.ult_nsu, int(retorno["ultNSU"]))
+            if retorno["maxNSU"]:
+                estado.max_nsu = int(retorno["maxNSU"])
+
+            terminou = cstat != CSTAT_DOCUMENTOS or estado.ult_nsu >= estado.max_nsu
+            if terminou:
+                # Nada novo (137), fim da fila ou rejeição (ex.: 656): a SEFAZ exige esperar
+                estado.proxima_consulta = agora + ESPERA_SEFAZ
+            db.commit() # Documentos e NSU juntos: se cair no meio, recomeça do último lote gravado
+            if terminou:
+                mensagem = f"SEFAZ: {estado.ultimo_status}"
+                break
+        else:
+            mensagem = "Ainda há documentos na SEFAZ; o próximo ciclo continua do último NSU."
+    except Exception:
+        db.rollback()
+        raise
+
+    if novos:
+        print(f"📥 [DF-e] {len(novos)} documento(s) novo(s) até o NSU {estado.ult_nsu}.")
+        barramento.publicar(["fiscal"], {"type": "DFE_DOCUMENTOS_NOVOS", "payload": {
+            "novos": len(novos),
+            "nfe": sum(1 for linha in novos if linha["tipo"] == "nfe"),
+        }})
+    if estado is not None:
+        db.refresh(estado)
+    return estado_como_dict(estado, novos=len(novos), mensagem=mensagem)
+
+
+def consultar_local(db: Session, chave: str) -> Optional[dict]:
+    """
+    NF-e completa já baixada pela distribuição, no mesmo formato de
+    sefaz_query_service.consultar_nfe_por_chave (None se não está no banco).
+    """
+    documento = db.query(models.DocumentoDFe.conteudo).filter(
+        models.DocumentoDFe.chave_acesso == chave,
+        models.DocumentoDFe.tipo == "nfe",
+    ).order_by(models.DocumentoDFe.nsu.desc()).first()
+    if documento is None:
+        return None
+    return sefaz_query_service.montar_resultado(chave, leitor_nfe.ler_nfe_compactada(documento.conteudo))
+
+
+class SincronizadorDFe:
+    """Thread que sincroniza a cada INTERVALO_MINUTOS (ou quando acordada pela rota)."""
+
+    def __init__(self, intervalo_minutos: float = INTERVALO_MINUTOS):
+        self.intervalo = intervalo_minutos * 60
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def iniciar(self):
+        if self._thread or self.intervalo <= 0:
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._executar, name="sincronizacao-dfe", daemon=True)
+        self._thread.start()
+        print(f"📥 [DF-e] Sincronização automática a cada {self.intervalo / 60:.0f} min.")
+
+    def parar(self):
+        self._parar.set()
+        self._acordar.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    @property
+    def ativo(self) -> bool:
+        return self._thread is not None
+
+    def avisar(self):
+        self._acordar.set()
+
+    def _executar(self):
+        while not self._parar.is_set():
+            pendente = False
+            db = SessionLocal()
+            try:
+                resumo = sincronizar(db)
+                # Parou no limite de consultas do ciclo com fila na SEFAZ: segue sem esperar
+                pendente = resumo["novos"] > 0 and resumo["ult_nsu"] < resumo["max_nsu"]
+            except Exception as e:
+                print(f"❌ [DF-e] Falha na sincronização: {e}")
+            finally:
+                db.close()
+            if not pendente:
+                self._acordar.wait(timeout=self.intervalo)
+                self._acordar.clear()
+
+
+# Instância global (iniciada no startup do app)
+sincronizador_dfe = SincronizadorDFe()
@@ -0,0 +1,200 @@
+"""
+Emissão fiscal em lote (job em segundo plano).
+
+Antes, /fiscal/emitir/lote e /fiscal/emitir/pendentes transmitiam nota por
+nota dentro da requisição HTTP: um fechamento de mês com milhares de notas
+levava horas com a tela travada. Agora a rota cria um job e devolve o id;
+a thread do job gera as notas que faltam e transmite em paralelo
+(LOTE_WORKERS threads, cada uma com sua sessão). O ritmo por UF é controlado
+pelo limite_sefaz dentro do transmitir_nota.
+
+A fila fiscal (fila_fiscal.py) transmite as mesmas notas 'Pendente' ao
+mesmo tempo. Por isso o lote guarda o status que selecionou e, na hora de
+transmitir, trava a nota com SKIP LOCKED: se ela está com a fila (ou com
+outro lote) ou o status mudou desde a seleção, pula. Esperar a trava e
+olhar só STATUS_FINAIS reenviaria à SEFAZ a nota que a fila acabou de
+deixar 'Rejeitada' ou 'Erro'.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..database import SessionLocal
+from .barramento import barramento
+from . import fiscal_service
+from .jobs import Job, criar_job
+
+LOTE_WORKERS = int(os.getenv("FISCAL_LOTE_WORKERS", "4"))
+# Intervalo mínimo entre dois avisos de progresso no WebSocket
+INTERVALO_PROGRESSO = 0.5
+
+STATUS_SUCESSO = ('autorizada', 'emitida')
+
+# Preparação: recebe a sessão e o job, devolve (ID da nota, status visto na seleção)
+Preparador = Callable[[Session, Job], List[Tuple[int, str]]]
+
+
+def iniciar_lote(tipo: str, preparar: Preparador, descricao: str) -> Job:
+    job = criar_job(tipo, mensagem=f"{descricao}: preparando notas...")
+    threading.Thread(
+        target=_executar_lote, args=(job, preparar, descricao),
+        name=f"lote-fiscal-{job.id[:8]}", daemon=True
+    ).start()
+    return job
+
+
+def preparar_por_vendas(venda_ids: List[int]) -> Preparador:
+    """Lote manual: garante a nota de cada venda e separa as que precisam de envio."""
+    def preparar(db: Session, job: Job) -> List[Tuple[int, str]]:
+        notas_existentes = {
+            n.venda_id: n for n in db.query(models.NotaFiscalSaida).filter(
+                models.NotaFiscalSaida.venda_id.in_(venda_ids)
+            )
+        }
+        a_transmitir = []
+        for v_id in venda_ids:
+            try:
+                nota = notas_existentes.get(v_id)
+                if not nota:
+                    nota = fiscal_service.inicializar_nota_para_venda(v_id, db)
+                    db.commit()
+
+                if nota.status_sefaz in fiscal_service.STATUS_FINAIS:
+                    # Já estava emitida
+                    job.registrar(True)
+                else:
+                    a_transmitir.append((nota.id, nota.status_sefaz))
+            except Exception as e:
+                db.rollback()
+                print(f"Erro lote venda {v_id}: {e}")
+                job.registrar(False, f"Venda {v_id}: {e}")
+        return a_transmitir
+    return preparar
+
+
+def preparar_pendencias(tipo: str) -> Preparador:
+    """Lote 'cirúrgico' (tipo: todas, nao_geradas, pendentes, rejeitadas)."""
+    def preparar(db: Session, job: Job) -> List[Tuple[int, str]]:
+        a_transmitir = []
+
+        # 1. ALVO: VENDAS SEM NOTA (Não Geradas)
+        if tipo in ["todas", "nao_geradas"]:
+            vendas_sem_nota = db.query(models.Venda.id).outerjoin(models.NotaFiscalSaida).filter(
+                models.NotaFiscalSaida.id == None,
+                models.Venda.status == 'concluida'
+            ).all()
+
+            print(f"  > Gerando {len(vendas_sem_nota)} notas novas...")
+
+            for (venda_id,) in vendas_sem_nota:
+                try:
+                    nova_nota = fiscal_service.inicializar_nota_para_venda(venda_id, db)
+                    db.commit()
+                    a_transmitir.append((nova_nota.id, nova_nota.status_sefaz))
+                except Exception as e:
+                    db.rollback()
+                    print(f"  X Erro ao gerar nota venda {venda_id}: {e}")
+                    job.registrar(False, f"Venda {venda_id}: {e}")
+
+        # 2. ALVO: NOTAS EXISTENTES (Pendentes/Rejeitadas)
+        filtros_status = []
+        if tipo == "todas":
+            filtros_status = ['Pendente', 'Rejeitada', 'Erro', 'pendente', 'rejeitada', 'erro']
+        elif tipo == "pendentes":
+            filtros_status = ['Pendente', 'pendente']
+        elif tipo == "rejeitadas":
+            filtros_status = ['Rejeitada', 'Erro', 'rejeitada', 'erro']
+
+        if filtros_status:
+            existentes = db.query(models.NotaFiscalSaida.id, models.NotaFiscalSaida.status_sefaz).filter(
+                models.NotaFiscalSaida.status_sefaz.in_(filtros_status)
+            ).order_by(models.NotaFiscalSaida.id).all()
+            # As recém-geradas também estão 'Pendente': não enviar duas vezes
+            ja_incluidas = {n_id for n_id, _ in a_transmitir}
+            a_transmitir.extend((n_id, st) for n_id, st in existentes if n_id not in ja_incluidas)
+
+        return a_transmitir
+    return preparar
+
+
+def _transmitir(item: Tuple[int, str]) -> Tuple[Optional[bool], str]:
+    """
+    Executa numa thread do pool, com sessão própria. Devolve (None, "") quando
+    a nota foi pulada: está com a fila/outro lote ou mudou de status.
+    """
+    nota_id, status_selecionado = item
+    db = SessionLocal()
+    try:
+        # A trava fica com este lote até o commit do transmitir_nota
+        nota = db.query(models.NotaFiscalSaida).filter(
+            models.NotaFiscalSaida.id == nota_id
+        ).with_for_update(skip_locked=True).first()
+        if nota is None or nota.status_sefaz != status_selecionado:
+            db.rollback()
+            return None, ""
+
+        nota = fiscal_service.transmitir_nota(nota_id, db)
+        if (nota.status_sefaz or "").lower() in STATUS_SUCESSO:
+            return True, ""
+        return False, f"Nota {nota_id}: {nota.xmotivo}"
+    except Exception as e:
+        db.rollback()
+        print(f"  X Erro transmissão nota {nota_id}: {e}")
+        return False, f"Nota {nota_id}: {e}"
+    finally:
+        db.close()
+
+
+def _avisar(job: Job, tipo_evento: str):
+    barramento.publicar(["fiscal"], {"type": tipo_evento, "payload": jsonable_encoder(job.como_dict())})
+
+
+def _executar_lote(job: Job, preparar: Preparador, descricao: str):
+    db = SessionLocal()
+    try:
+        print(f"--- LOTE INICIADO: {descricao} (job {job.id}) ---")
+        nota_ids = preparar(db, job)
+    except Exception as e:
+        print(f"❌ Falha ao preparar lote {job.id}: {e}")
+        job.finalizar(f"{descricao}: falha ao preparar notas ({e}).", status="erro")
+        _avisar(job, "LOTE_FISCAL_CONCLUIDO")
+        return
+    finally:
+        db.close()
+
+    job.atualizar(total=job.processadas + len(nota_ids))
+    print(f"  > Total a transmitir: {len(nota_ids)}")
+    puladas = 0
+    _avisar(job, "LOTE_FISCAL_PROGRESSO")
+
+    ultimo_aviso = time.monotonic()
+    if nota_ids:
+        with ThreadPoolExecutor(max_workers=LOTE_WORKERS, thread_name_prefix=f"lote-{job.id[:8]}") as executor:
+            for sucesso, erro in executor.map(_transmitir, nota_ids):
+                if sucesso is None:
+                    # Não é falha: quem está com a nota avisa o resultado
+                    puladas += 1
+                    sucesso = True
+                job.registrar(sucesso, erro or None)
+                agora = time.monotonic()
+                if agora - ultimo_aviso >= INTERVALO_PROGRESSO:
+                    ultimo_aviso = agora
+                    _avisar(job, "LOTE_FISCAL_PROGRESSO")
+
+    if job.total == 0:
+        resumo = f"{descricao}: nenhuma pendência encontrada."
+    else:
+        resumo = f"{descricao} concluído. {job.sucessos - puladas} sucessos, {job.falhas} falhas."
+        if puladas:
+            resumo += f" {puladas} puladas (com a fila ou já transmitidas)."
+        if job.erros:
+            resumo += f" Ex: {job.erros[0]}..."
+    job.finalizar(resumo)
+    print(f"--- LOTE FINALIZADO: {resumo} ---")
+    _avisar(job, "LOTE_FISCAL_CONCLUIDO")
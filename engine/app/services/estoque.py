@@ -0,0 +1,160 @@
+"""
+Baixa e estorno de estoque por venda, com razão de movimentações.
+
+O saldo ('produtos.quantidade_estoque') muda em UM comando por venda,
+qualquer que seja o número de itens:
+
+    UPDATE produtos
+       SET quantidade_estoque = quantidade_estoque - CASE id WHEN .. THEN .. END
+     WHERE id IN (..) AND quantidade_estoque >= CASE id WHEN .. THEN .. END
+
+A condição no WHERE é a trava: dois caixas vendendo a última unidade não
+passam os dois (o segundo UPDATE encontra o saldo já baixado e não afeta a
+linha). Se alguma linha ficar de fora, a venda inteira é recusada e o
+chamador desfaz a transação.
+
+Cada alteração vira linha em 'movimentacoes_estoque' (insert em lote), que
+é a fonte do histórico do produto. O estorno de uma venda devolve
+exatamente o que o razão registra para ela: carrinho que nunca baixou
+estoque não devolve nada.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, func, insert, update
+from sqlalchemy.orm import Session
+
+from .. import models
+
+TIPO_VENDA = "venda"
+TIPO_CANCELAMENTO = "cancelamento_venda"
+TIPO_ENTRADA_NOTA = "entrada_nota"
+TIPO_AJUSTE = "ajuste"
+
+
+class EstoqueInsuficiente(Exception):
+    def __init__(self, faltas: List[Tuple[str, float, float]]):
+        # (nome do produto, disponível, pedido)
+        self.faltas = faltas
+        super().__init__(" | ".join(
+            f"Estoque insuficiente de '{nome}'. Disponível: {disponivel}. Tentando vender: {pedido}."
+            for nome, disponivel, pedido in faltas
+        ))
+
+
+def _quantidades_por_produto(itens: Iterable[models.VendaItem]) -> Dict[int, float]:
+    quantidades: Dict[int, float] = {}
+    for item in itens:
+        if item.descricao_manual:
+            # Lançamento "Diversos": não é produto de estoque
+            continue
+        quantidades[item.produto_id] = quantidades.get(item.produto_id, 0) + item.quantidade
+    return quantidades
+
+
+def _aplicar(db: Session, variacoes: Dict[int, float], exigir_saldo: bool) -> int:
+    """UPDATE único com CASE por produto. Devolve quantas linhas mudaram."""
+    ids = sorted(variacoes)
+    # Trava as linhas sempre na mesma ordem (por id): duas vendas com
+    # produtos em comum não entram em deadlock no UPDATE.
+    db.query(models.Produto.id).filter(
+        models.Produto.id.in_(ids)
+    ).order_by(models.Produto.id).with_for_update().all()
+
+    variacao = case(variacoes, value=models.Produto.id)
+    stmt = update(models.Produto).where(models.Produto.id.in_(ids)).values(
+        quantidade_estoque=models.Produto.quantidade_estoque + variacao
+    )
+    if exigir_saldo:
+        stmt = stmt.where(models.Produto.quantidade_estoque + variacao >= 0)
+
+    return db.execute(stmt.execution_options(synchronize_session=False)).rowcount
+
+
+def registrar_movimentos(db: Session, movimentos: List[dict]):
+    """
+    Insert em lote no razão. Cada dict: produto_id, tipo, quantidade (com
+    sinal) e, opcionalmente, venda_id, nota_entrada_id, usuario_id, observacao.
+    """
+    if not movimentos:
+        return
+    agora = datetime.utcnow()
+    db.execute(insert(models.MovimentacaoEstoque), [
+        {
+            "data_hora": agora,
+            "venda_id": None,
+            "nota_entrada_id": None,
+            "usuario_id": None,
+            "observacao": None,
+            **m,
+        }
+        for m in movimentos
+    ])
+
+
+def baixar_venda(db: Session, venda: models.Venda, permitir_negativo: bool = False):
+    """
+    Baixa o estoque de todos os itens da venda (1 UPDATE + 1 INSERT em lote).
+    Levanta EstoqueInsuficiente sem commitar; o chamador faz o rollback.
+    """
+    quantidades = _quantidades_por_produto(venda.itens)
+    if not quantidades:
+        return
+
+    alteradas = _aplicar(db, {pid: -qtd for pid, qtd in quantidades.items()}, exigir_saldo=not permitir_negativo)
+
+    if alteradas < len(quantidades):
+        saldos = db.query(
+            models.Produto.id, models.Produto.nome, models.Produto.quantidade_estoque
+        ).filter(models.Produto.id.in_(quantidades.keys())).all()
+        encontrados = {pid for pid, _, _ in saldos}
+        faltas = [
+            (nome, disponivel or 0, quantidades[pid])
+            for pid, nome, disponivel in saldos
+            if (disponivel or 0) < quantidades[pid]
+        ]
+        faltas += [(f"Produto #{pid}", 0, qtd) for pid, qtd in quantidades.items() if pid not in encontrados]
+        raise EstoqueInsuficiente(faltas)
+
+    registrar_movimentos(db, [
+        {
+            "produto_id": pid,
+            "tipo": TIPO_VENDA,
+            "quantidade": -qtd,
+            "venda_id": venda.id,
+            "usuario_id": venda.operador_id,
+        }
+        for pid, qtd in quantidades.items()
+    ])
+
+
+def estornar_venda(db: Session, venda_id: int, usuario_id: Optional[int] = None, observacao: Optional[str] = None) -> int:
+    """
+    Devolve ao estoque o saldo líquido que o razão tem para a venda
+    (1 SELECT agregado + 1 UPDATE + 1 INSERT em lote). Devolve o número de
+    produtos estornados.
+    """
+    pendentes = db.query(
+        models.MovimentacaoEstoque.produto_id,
+        func.sum(models.MovimentacaoEstoque.quantidade)
+    ).filter(
+        models.MovimentacaoEstoque.venda_id == venda_id
+    ).group_by(models.MovimentacaoEstoque.produto_id).all()
+
+    variacoes = {pid: -total for pid, total in pendentes if total}
+    if not variacoes:
+        return 0
+
+    _aplicar(db, variacoes, exigir_saldo=False)
+    registrar_movimentos(db, [
+        {
+            "produto_id": pid,
+            "tipo": TIPO_CANCELAMENTO,
+            "quantidade": qtd,
+            "venda_id": venda_id,
+            "usuario_id": usuario_id,
+            "observacao": observacao,
+        }
+        for pid, qtd in variacoes.items()
+    ])
+    return len(variacoes)
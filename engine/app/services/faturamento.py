@@ -1,6 +1,8 @@
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 from .. import models
+from ..utils import periodos
+from . import config_empresa
 
 def processar_juros_atraso(db: Session):
     """
@@ -10,7 +12,7 @@ def processar_juros_atraso(db: Session):
     """
     
     # 1. Busca Configurações da Empresa (Regras)
-    config = db.query(models.Empresa).filter(models.Empresa.id == 1).first()
+    config = config_empresa.obter(db)
     if not config:
         return {"status": "erro", "mensagem": "Configurações não encontradas."}
 
@@ -26,7 +28,7 @@ def processar_juros_atraso(db: Session):
     taxa_diaria = (juros_mensal / 30.0) / 100.0 
 
     # 2. Data de Referência
-    hoje = datetime.utcnow().date()
+    hoje = periodos.hoje_local(periodos.fuso(config.fuso_horario)) # Dia da loja, não do UTC
     dia_hoje = hoje.day
     
     # 3. Busca Clientes com Débito
@@ -0,0 +1,107 @@
+"""
+Fila de emissão de NFC-e.
+
+A fila é a própria tabela 'notas_fiscais_saida': toda nota em status
+'Pendente' está aguardando transmissão. Um pool de threads (cada uma com sua
+sessão) reivindica as notas com SELECT ... FOR UPDATE SKIP LOCKED, transmite
+e avisa o PDV pelo WebSocket. Assim o caixa não espera a SEFAZ para liberar
+o cliente, e nada se perde se o processo cair (a nota continua 'Pendente').
+"""
+import os
+import threading
+from typing import List
+
+from .. import models
+from ..database import SessionLocal
+from . import fiscal_service, config_empresa
+
+NUM_WORKERS = int(os.getenv("FISCAL_WORKERS", "2"))
+# Varredura periódica: cobre notas criadas por outros processos/rotas
+INTERVALO_VARREDURA = float(os.getenv("FISCAL_INTERVALO_SEGUNDOS", "5"))
+
+
+class FilaEmissao:
+    def __init__(self, num_workers: int = NUM_WORKERS):
+        self.num_workers = num_workers
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def iniciar(self):
+        """Sobe os workers (chamado no startup do app)."""
+        if self._threads or self.num_workers <= 0:
+            return
+        self._parar.clear()
+        for i in range(self.num_workers):
+            t = threading.Thread(target=self._executar, name=f"fila-fiscal-{i + 1}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        print(f"🧾 [Fila Fiscal] {self.num_workers} worker(s) de emissão iniciados.")
+
+    def parar(self):
+        self._parar.set()
+        self._acordar.set()
+        for t in self._threads:
+            t.join(timeout=5)
+        self._threads = []
+
+    @property
+    def ativa(self) -> bool:
+        return bool(self._threads)
+
+    def avisar(self):
+        """Chamado após o commit de uma nota 'Pendente' para acordar os workers."""
+        self._acordar.set()
+
+    def _executar(self):
+        while not self._parar.is_set():
+            try:
+                processou = self._processar_proxima()
+            except Exception as e:
+                print(f"❌ [Fila Fiscal] Erro inesperado no worker: {e}")
+                processou = False
+
+            if not processou:
+                self._acordar.wait(timeout=INTERVALO_VARREDURA)
+                self._acordar.clear()
+
+    def _processar_proxima(self) -> bool:
+        """Reivindica e transmite UMA nota. Retorna False se a fila está vazia."""
+        db = SessionLocal()
+        try:
+            config = config_empresa.obter(db)
+            if config and config.modo_emissao == "offline_forcado":
+                db.rollback()
+                return False
+
+            # A trava da linha fica com este worker até o commit da transmissão.
+            # Os outros workers pulam a linha (SKIP LOCKED) em vez de esperar.
+            nota = db.query(models.NotaFiscalSaida).filter(
+                models.NotaFiscalSaida.status_sefaz == "Pendente"
+            ).order_by(
+                models.NotaFiscalSaida.id
+            ).with_for_update(skip_locked=True).first()
+
+            if not nota:
+                db.rollback()
+                return False
+
+            nota_id = nota.id
+            try:
+                nota = fiscal_service.transmitir_nota(nota_id, db)
+            except Exception as e:
+                # Sem isso a nota voltaria a 'Pendente' e seria tentada para sempre
+                db.rollback()
+                nota = db.query(models.NotaFiscalSaida).get(nota_id)
+                nota.status_sefaz = "Erro"
+                nota.xmotivo = f"Erro sistêmico: {str(e)}"[:255]
+                db.commit()
+
+            fiscal_service.avisar_status(nota)
+            return True
+        finally:
+            db.close()
+
+
+# Instância global (iniciada no startup do app)
+fila_emissao = FilaEmissao()
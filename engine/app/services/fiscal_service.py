@@ -1,16 +1,18 @@
 from sqlalchemy.orm import Session
 from .. import models
 from datetime import datetime
+import base64
 import time
 import random
-import json
-import subprocess
-import os
-import tempfile
+from .php_worker import pool_php, ErroWorkerPHP
+from . import armazem_documentos, limite_sefaz, numeracao_fiscal, config_empresa
+from .barramento import barramento
+from ..websockets import topico_pdv
 
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-PHP_EXEC = "php" # Garanta que o php está no PATH do sistema
-SCRIPT_PATH = os.path.join(BASE_DIR, "sefaz_service", "emitir_nfce.php")
+FOLGA_TIMEOUT_PHP = 15 # Segundos além do timeout da SEFAZ (montagem + assinatura)
+
+# Notas nesses status não são retransmitidas
+STATUS_FINAIS = ('Autorizada', 'Emitida', 'Cancelada')
 
 def inicializar_nota_para_venda(venda_id: int, db: Session):
     """
@@ -21,12 +23,8 @@ def inicializar_nota_para_venda(venda_id: int, db: Session):
     if existing:
         return existing
 
-    # 2. Busca número sequencial
-    ultima_nota = db.query(models.NotaFiscalSaida).order_by(models.NotaFiscalSaida.numero.desc()).first()
-    proximo_numero = (ultima_nota.numero + 1) if (ultima_nota and ultima_nota.numero) else 1
-    
-    # 3. Busca a empresa para pegar o ID
-    config = db.query(models.Empresa).first()
+    # 2. Busca a empresa para pegar o ID
+    config = config_empresa.obter(db)
     
     # ✅ BLINDAGEM: Se não houver empresa, usa ID 1 e avisa
     if not config:
@@ -35,6 +33,9 @@ def inicializar_nota_para_venda(venda_id: int, db: Session):
     else:
         empresa_id = config.id
 
+    # 3. Próximo número da série (alocador com reserva em bloco, sem varrer a tabela)
+    proximo_numero = numeracao_fiscal.proximo_numero(empresa_id, modelo="65", serie=1)
+
     # 4. Cria o registro "Pendente"
     nova_nota = models.NotaFiscalSaida(
         venda_id=venda_id,
@@ -52,6 +53,26 @@ def inicializar_nota_para_venda(venda_id: int, db: Session):
     
     return nova_nota
 
+def avisar_status(nota: models.NotaFiscalSaida):
+    """NFE_STATUS para a tela fiscal e para o PDV da venda (todos os workers)."""
+    venda = nota.venda
+    topicos = ["fiscal"]
+    if venda:
+        topicos.append(topico_pdv(venda.pdv_id))
+    barramento.publicar(topicos, {
+        "type": "NFE_STATUS",
+        "payload": {
+            "nota_id": nota.id,
+            "venda_id": nota.venda_id,
+            "pdv_id": venda.pdv_id if venda else None,
+            "status": nota.status_sefaz,
+            "cstat": nota.cstat,
+            "motivo": nota.xmotivo,
+            "protocolo": nota.protocolo
+        }
+    })
+
+
 def transmitir_nota(nota_id: int, db: Session):
     """
     Motor REAL de Emissão NFC-e.
@@ -62,15 +83,23 @@ def transmitir_nota(nota_id: int, db: Session):
     """
     
     # 1. Busca a Nota e Validações Iniciais
-    nota = db.query(models.NotaFiscalSaida).get(nota_id)
+    # Trava a linha: a fila de emissão e as rotas manuais podem disputar a mesma nota
+    nota = db.query(models.NotaFiscalSaida).filter(
+        models.NotaFiscalSaida.id == nota_id
+    ).populate_existing().with_for_update().first()
     if not nota: 
         raise ValueError(f"Nota ID {nota_id} não encontrada.")
+
+    if nota.status_sefaz in STATUS_FINAIS:
+        # Outro worker/rota já transmitiu enquanto esperávamos a trava
+        db.commit()
+        return nota
     
     venda = nota.venda
     if not venda:
         raise ValueError("Venda vinculada não encontrada.")
 
-    empresa = db.query(models.Empresa).first()
+    empresa = config_empresa.obter(db)
     if not empresa: 
         raise ValueError("Configurações da empresa não encontradas.")
     
@@ -144,46 +173,27 @@ def transmitir_nota(nota_id: int, db: Session):
             "valor_total": qtd * preco
         })
 
-    # 4. Prepara Arquivos Temporários (JSON e PFX)
-    # O PFX é extraído do banco e salvo temporariamente para o PHP ler
-    fd_json, path_json = tempfile.mkstemp(suffix=".json")
-    with os.fdopen(fd_json, 'w') as f:
-        json.dump(payload, f)
-    
-    fd_pfx, path_pfx = tempfile.mkstemp(suffix=".pfx")
-    with os.fdopen(fd_pfx, 'wb') as f:
-        f.write(certificado.arquivo_binario)
-
     try:
         print(f"🚀 [Python] Acionando PHP para emitir Nota #{nota.numero}...")
         
-        # 5. Execução do Microserviço
-        result = subprocess.run(
-            [PHP_EXEC, SCRIPT_PATH, path_json, path_pfx, certificado.senha_arquivo],
-            capture_output=True, 
-            text=True, 
-            encoding='utf-8',
-            # timeout=30 # Opcional: timeout de segurança para não travar a thread
-        )
-        
-        # Log de erro do PHP (se houver crash)
-        if result.stderr:
-            print(f"⚠️ [PHP STDERR]: {result.stderr}")
-
-        # 6. Parse da Resposta
+        # 4. Execução no Worker PHP persistente
+        # O payload e o PFX vão pelo pipe (sem arquivos temporários); o worker
+        # mantém o certificado lido em memória entre uma nota e outra.
+        limite_sefaz.aguardar_vez()
         try:
-            # Tenta decodificar o JSON retornado pelo PHP
-            resposta = json.loads(result.stdout)
-        except json.JSONDecodeError:
-            print("❌ Erro ao ler JSON do PHP. Saída bruta:", result.stdout)
-            # Retorna um erro amigável para o front
-            nota.status_sefaz = "Erro"
-            nota.xmotivo = "Falha interna no motor de emissão (PHP)."
-            db.add(nota)
-            db.commit()
-            return nota
+            resposta = pool_php.executar(
+                "emitir_nfce",
+                payload,
+                pfx=armazem_documentos.ler(db, models.CertificadoDigital.arquivo_binario, certificado.id),
+                senha=certificado.senha_arquivo,
+                # Timeout de segurança: a SEFAZ tem o timeout configurado + folga para o PHP
+                timeout=(empresa.timeout_sefaz or 8) + FOLGA_TIMEOUT_PHP
+            )
+        except ErroWorkerPHP as e:
+            # Exceção dentro do PHP (validação local, certificado, montagem do XML)
+            resposta = {"status": "erro_interno", "motivo": str(e)}
 
-        # 7. Atualiza o Banco com o Resultado SEFAZ
+        # 5. Atualiza o Banco com o Resultado SEFAZ
         if resposta['status'] == 'autorizada':
             nota.status_sefaz = "Autorizada"
             nota.cstat = str(resposta.get('cstat', '100'))
@@ -192,9 +202,12 @@ def transmitir_nota(nota_id: int, db: Session):
             nota.chave_acesso = resposta.get('chave', nota.chave_acesso) # Atualiza a chave se o PHP gerou uma nova
             nota.data_hora_autorizacao = datetime.utcnow()
             
-            # Salva o XML Protocolado (Base64) se disponível
+            # Salva o XML Protocolado se disponível (o PHP manda em base64;
+            # no armazém fica o XML, que compacta bem melhor)
             if 'xml_protocolado' in resposta:
-                nota.xml_retorno = resposta['xml_protocolado'] 
+                armazem_documentos.gravar(
+                    db, models.NotaFiscalSaida.xml_retorno, nota.id, base64.b64decode(resposta['xml_protocolado'])
+                )
                 
         elif resposta['status'] == 'rejeitada':
             nota.status_sefaz = "Rejeitada"
@@ -202,7 +215,9 @@ def transmitir_nota(nota_id: int, db: Session):
             nota.xmotivo = resposta.get('motivo', 'Rejeição desconhecida')
             # Se o PHP devolveu o XML de envio (para debug), salvamos
             if 'xml_envio' in resposta:
-                nota.xml_envio = resposta['xml_envio']
+                armazem_documentos.gravar(
+                    db, models.NotaFiscalSaida.xml_envio, nota.id, base64.b64decode(resposta['xml_envio'])
+                )
                 
         else:
             # Erros de validação local (antes de enviar) ou exceções
@@ -225,11 +240,6 @@ def transmitir_nota(nota_id: int, db: Session):
         db.commit()
         return nota
 
-    finally:
-        # 8. Limpeza (Segurança)
-        # Apaga os arquivos temporários com a senha e dados
-        if os.path.exists(path_json): os.remove(path_json)
-        if os.path.exists(path_pfx): os.remove(path_pfx)
 
 # --- FALLBACK DE SIMULAÇÃO ---
 def _simular_transmissao(nota, db):
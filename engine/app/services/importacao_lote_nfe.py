@@ -0,0 +1,190 @@
+"""
+Importação em lote de NF-e de entrada (os XMLs do mês que o contador manda).
+
+Antes era uma nota por vez pelo preview/confirmar da tela. Agora a rota
+recebe um ZIP (ou vários arquivos .xml/.zip), grava numa pasta temporária
+e devolve um job; a thread do job:
+
+1. Lista os XMLs (dentro dos ZIPs sem extrair para o disco).
+2. Faz o parse num pool de PROCESSOS processos (o parse é CPU puro e o GIL
+   seguraria threads), em grupos de DOCUMENTOS_POR_TAREFA arquivos.
+3. Descarta as notas já lançadas com UMA consulta por chave de acesso (e as
+   repetidas dentro do próprio lote).
+4. Lança cada nota numa transação própria, como o "confirmar" da tela com
+   as sugestões do preview (services/importacao_nfe): uma nota com
+   problema não desfaz as outras.
+
+O progresso sai em GET /produtos/nfe/importar/lote/{job_id} e no tópico
+'fiscal' do WebSocket.
+"""
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.exc import IntegrityError
+
+from .. import models
+from ..database import SessionLocal
+from . import catalogo_cache, importacao_nfe, xml_service
+from .barramento import barramento
+from .jobs import Job, criar_job
+
+# 0 = parse na própria thread do job (sem pool; útil em desenvolvimento)
+PROCESSOS = int(os.getenv("NFE_LOTE_PROCESSOS", str(max(1, (os.cpu_count() or 2) - 1))))
+DOCUMENTOS_POR_TAREFA = 50
+# Intervalo mínimo entre dois avisos de progresso no WebSocket
+INTERVALO_PROGRESSO = 0.5
+
+# (caminho no disco, membro dentro do ZIP ou None, nome para as mensagens)
+Documento = Tuple[str, Optional[str], str]
+
+
+def iniciar_importacao(pasta: str, caminhos: List[str]) -> Job:
+    """Dispara o job sobre os arquivos já gravados em 'pasta' (apagada no final)."""
+    job = criar_job("importar_nfe_lote", mensagem="Importação de XMLs: lendo arquivos...")
+    threading.Thread(
+        target=_executar, args=(job, pasta, caminhos),
+        name=f"importacao-nfe-{job.id[:8]}", daemon=True
+    ).start()
+    return job
+
+
+def listar_documentos(caminhos: List[str]) -> List[Documento]:
+    documentos = []
+    for caminho in caminhos:
+        nome_arquivo = os.path.basename(caminho).split("_", 1)[-1]
+        if zipfile.is_zipfile(caminho):
+            with zipfile.ZipFile(caminho) as arquivo_zip:
+                for info in arquivo_zip.infolist():
+                    nome = info.filename
+                    # Pastas e lixo do Finder (__MACOSX/._arquivo.xml) ficam de fora
+                    if info.is_dir() or not nome.lower().endswith(".xml") or "__MACOSX/" in nome:
+                        continue
+                    documentos.append((caminho, nome, f"{nome_arquivo}/{nome}"))
+        else:
+            documentos.append((caminho, None, nome_arquivo))
+    return documentos
+
+
+def _ler(documentos: List[Documento]):
+    """Gera (documento, resultado do parse) na ordem da lista."""
+    grupos = [documentos[i:i + DOCUMENTOS_POR_TAREFA] for i in range(0, len(documentos), DOCUMENTOS_POR_TAREFA)]
+    origens = [[(caminho, membro) for caminho, membro, _ in grupo] for grupo in grupos]
+
+    if PROCESSOS <= 0 or len(grupos) <= 1:
+        resultados = map(xml_service.ler_documentos, origens)
+        for grupo, lidos in zip(grupos, resultados):
+            yield from zip(grupo, lidos)
+        return
+
+    # spawn: o processo do servidor tem threads (uvicorn, pool do banco, workers PHP)
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(PROCESSOS, len(grupos)), mp_context=contexto) as executor:
+        for grupo, lidos in zip(grupos, executor.map(xml_service.ler_documentos, origens)):
+            yield from zip(grupo, lidos)
+
+
+def _avisar(job: Job, tipo_evento: str):
+    barramento.publicar(["fiscal"], {"type": tipo_evento, "payload": jsonable_encoder(job.como_dict())})
+
+
+def _lancar(nota_lida: dict) -> List[str]:
+    """Uma nota, uma transação. Devolve os códigos de barras afetados."""
+    db = SessionLocal()
+    try:
+        nota = importacao_nfe.criar_nota(db, nota_lida["header"], nota_lida["xml"])
+        # Mesmas sugestões do preview (produto casado pelo EAN ou cadastro com margem padrão)
+        itens = importacao_nfe.enriquecer_itens_arquivo(db, nota_lida["itens"])
+        _, codigos = importacao_nfe.confirmar(db, nota, itens)
+        db.commit()
+        return codigos
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _executar(job: Job, pasta: str, caminhos: List[str]):
+    print(f"--- IMPORTAÇÃO DE XMLs INICIADA (job {job.id}) ---")
+    ignoradas = 0
+    try:
+        documentos = listar_documentos(caminhos)
+        job.atualizar(total=len(documentos), mensagem=f"Importação de XMLs: lendo {len(documentos)} arquivos...")
+        _avisar(job, "IMPORTACAO_NFE_PROGRESSO")
+
+        # 1. Parse em paralelo (falhas de leitura já contam no job)
+        inicio = time.monotonic()
+        lidas: List[Tuple[str, dict]] = []
+        for (_, _, nome), resultado in _ler(documentos):
+            if "erro" in resultado:
+                job.registrar(False, f"{nome}: {resultado['erro']}")
+            else:
+                lidas.append((nome, resultado))
+        print(f"  > {len(lidas)} notas lidas em {time.monotonic() - inicio:.1f}s")
+
+        # 2. Duplicidade: uma consulta para o lote inteiro
+        chaves = {nota["header"]["chave_acesso"] for _, nota in lidas}
+        with SessionLocal() as db:
+            ja_lancadas = {
+                chave for (chave,) in db.query(models.NotaFiscalEntrada.chave_acesso).filter(
+                    models.NotaFiscalEntrada.chave_acesso.in_(chaves)
+                )
+            } if chaves else set()
+
+        # 3. Uma transação por nota
+        job.atualizar(mensagem="Importação de XMLs: lançando notas...")
+        ultimo_aviso = time.monotonic()
+        vistas = set()
+        for nome, nota in lidas:
+            chave = nota["header"]["chave_acesso"]
+            if chave in ja_lancadas or chave in vistas:
+                ignoradas += 1
+                job.registrar(True)
+                continue
+            vistas.add(chave)
+            try:
+                catalogo_cache.invalidar_codigos(_lancar(nota))
+                job.registrar(True)
+            except IntegrityError as e:
+                # Lançada por outra importação no meio do caminho
+                if "chave_acesso" in str(e.orig):
+                    ignoradas += 1
+                    job.registrar(True)
+                else:
+                    job.registrar(False, f"{nome}: {e.orig}")
+            except Exception as e:
+                print(f"  X Erro ao lançar {nome}: {e}")
+                job.registrar(False, f"{nome}: {e}")
+
+            agora = time.monotonic()
+            if agora - ultimo_aviso >= INTERVALO_PROGRESSO:
+                ultimo_aviso = agora
+                _avisar(job, "IMPORTACAO_NFE_PROGRESSO")
+
+    except Exception as e:
+        print(f"❌ Falha na importação {job.id}: {e}")
+        job.finalizar(f"Importação de XMLs interrompida: {e}", status="erro")
+        _avisar(job, "IMPORTACAO_NFE_CONCLUIDA")
+        return
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    if job.total == 0:
+        resumo = "Importação de XMLs: nenhum XML encontrado nos arquivos enviados."
+    else:
+        resumo = (
+            f"Importação de XMLs concluída. {job.sucessos - ignoradas} notas lançadas, "
+            f"{ignoradas} já lançadas (ignoradas), {job.falhas} falhas."
+        )
+        if job.erros:
+            resumo += f" Ex: {job.erros[0]}..."
+    job.finalizar(resumo)
+    print(f"--- IMPORTAÇÃO DE XMLs FINALIZADA: {resumo} ---")
+    _avisar(job, "IMPORTACAO_NFE_CONCLUIDA")
@@ -0,0 +1,350 @@
+"""
+Importação de NF-e de entrada (fornecedor) em lote.
+
+Antes cada linha da nota fazia sua consulta por EAN no preview e de novo
+no confirmar (mais um .get() por item e um add por produto): 300 itens
+eram 600+ idas ao banco. Agora:
+
+- casar(): UMA consulta 'WHERE codigo_barras IN (..) OR id IN (..)' para
+  a nota inteira. Preview (arquivo e chave) e confirmação usam o mesmo
+  casamento, então o que o usuário revisou é o que é gravado.
+- confirmar(): agrupa as linhas (o mesmo produto pode vir em várias) e
+  grava estoque, custo, nome e preço com UM
+      INSERT .. ON CONFLICT (codigo_barras) DO UPDATE
+          SET quantidade_estoque = produtos.quantidade_estoque + excluded.quantidade_estoque, ..
+      RETURNING id
+  (produto novo e existente no mesmo comando; se outra importação cadastrou
+  o EAN no meio do caminho, vira atualização em vez de erro de duplicidade).
+  Sem código de barras não há colisão: os novos vão num INSERT em lote e
+  os casados por ID num UPDATE em lote. O razão de estoque é um insert em
+  lote.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, insert, or_, update
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..utils import periodos
+from . import armazem_documentos, estoque
+
+SEM_GTIN = "SEM GTIN"
+CATEGORIA_PADRAO = "Geral"
+LOTE_UPSERT = 500 # linhas por INSERT (limite de parâmetros do banco)
+
+
+def normalizar_ean(valor) -> Optional[str]:
+    """'SEM GTIN', vazio e None viram None."""
+    if valor is None:
+        return None
+    valor = str(valor).strip()
+    if not valor or valor.upper() == SEM_GTIN:
+        return None
+    return valor
+
+
+@dataclass
+class Casamento:
+    """Produtos do sistema que correspondem aos itens da nota."""
+    por_ean: Dict[str, tuple] = field(default_factory=dict)
+    por_id: Dict[int, tuple] = field(default_factory=dict)
+
+    def produto(self, ean: Optional[str] = None, produto_id: Optional[int] = None):
+        """Linha (id, nome, codigo_barras, quantidade_estoque, preco_venda) ou None. ID tem prioridade."""
+        if produto_id and produto_id in self.por_id:
+            return self.por_id[produto_id]
+        if ean:
+            return self.por_ean.get(ean)
+        return None
+
+
+def casar(db: Session, eans: Iterable[Optional[str]] = (), ids: Iterable[Optional[int]] = ()) -> Casamento:
+    """Uma consulta para todos os EANs e IDs da nota."""
+    eans = {e for e in eans if e}
+    ids = {int(i) for i in ids if i}
+    casamento = Casamento()
+    if not eans and not ids:
+        return casamento
+
+    P = models.Produto
+    condicoes = []
+    if eans:
+        condicoes.append(P.codigo_barras.in_(eans))
+    if ids:
+        condicoes.append(P.id.in_(ids))
+    linhas = db.query(
+        P.id, P.nome, P.codigo_barras, P.quantidade_estoque, P.preco_venda
+    ).filter(or_(*condicoes)).all()
+
+    for linha in linhas:
+        casamento.por_id[linha.id] = linha
+        if linha.codigo_barras:
+            casamento.por_ean[linha.codigo_barras] = linha
+    return casamento
+
+
+def enriquecer_itens_arquivo(db: Session, itens: List[dict]) -> List[dict]:
+    """
+    Preview do XML enviado: acrescenta a cada item 'produto_existente_id',
+    'nome_sistema', 'estoque_atual', 'preco_venda_atual' e 'status_match'.
+    """
+    casamento = casar(db, eans=(normalizar_ean(item.get("codigo_barras")) for item in itens))
+    for item in itens:
+        produto = casamento.produto(ean=normalizar_ean(item.get("codigo_barras")))
+        if produto:
+            # Encontrou! Usa o nome do nosso sistema (geralmente mais limpo)
+            item["produto_existente_id"] = produto.id
+            item["nome_sistema"] = produto.nome
+            item["estoque_atual"] = produto.quantidade_estoque
+            item["preco_venda_atual"] = produto.preco_venda
+            item["status_match"] = "existente"
+        else:
+            # Não encontrou: sugere cadastro com margem de 80%
+            item["produto_existente_id"] = None
+            item["nome_sistema"] = item["nome"]
+            item["estoque_atual"] = 0
+            item["preco_venda_atual"] = round(item["valor_unitario"] * 1.8, 2)
+            item["status_match"] = "novo"
+    return itens
+
+
+def montar_itens_sefaz(db: Session, produtos_xml: List[dict]) -> List[dict]:
+    """Preview por chave (itens vindos da SEFAZ) no formato que o frontend revisa."""
+    casamento = casar(db, eans=(normalizar_ean(item.get("ean")) for item in produtos_xml))
+    itens = []
+    for item_xml in produtos_xml:
+        ean = normalizar_ean(item_xml.get("ean")) or ""
+        produto = casamento.produto(ean=ean)
+        itens.append({
+            # Dados da Nota
+            "codigo_fornecedor": item_xml["codigo"],
+            "ean": ean,
+            "nome": item_xml["descricao"],
+            "ncm": item_xml["ncm"],
+            "cfop": item_xml["cfop"],
+            "unidade": item_xml["unidade"],
+            "quantidade": item_xml["quantidade"],
+            "valor_unitario": item_xml["valor_unitario"],
+            "valor_total": item_xml["valor_total"],
+
+            # Dados do Sistema (Cruzamento)
+            "produto_existente_id": produto.id if produto else None,
+            "nome_sistema": produto.nome if produto else item_xml["descricao"],
+
+            # Sugestão de Preço
+            "preco_venda_atual": float(produto.preco_venda) if produto else round(item_xml["valor_unitario"] * 1.5, 2),
+        })
+    return itens
+
+
+@dataclass
+class _Linha:
+    """Itens da nota já agrupados por produto."""
+    produto: Optional[tuple] # Linha do casamento (None = produto novo)
+    ean: Optional[str]
+    quantidade: float
+    custo: float
+    nome: str
+    preco_venda: float
+    unidade: str
+    ncm: str
+    cfop: str
+
+
+def _agrupar(itens: List[dict], casamento: Casamento) -> List[_Linha]:
+    linhas: Dict[tuple, _Linha] = {}
+    for posicao, item in enumerate(itens):
+        ean = normalizar_ean(item.get("ean") or item.get("codigo_barras"))
+        produto = casamento.produto(ean=ean, produto_id=item.get("produto_existente_id"))
+        quantidade = float(item.get("quantidade", 0))
+        custo = float(item.get("valor_unitario", 0))
+        nome_nota = item.get("nome_sistema") or item.get("nome") or item.get("descricao") or "Produto Sem Nome"
+
+        if produto:
+            chave = ("id", produto.id)
+            # Existente: nome e preço só mudam se o usuário mandou
+            nome = nome_nota if item.get("nome_sistema") else produto.nome
+            preco = float(item["preco_venda_atual"]) if item.get("preco_venda_atual") else produto.preco_venda
+        else:
+            chave = ("ean", ean) if ean else ("linha", posicao)
+            nome = nome_nota
+            preco = float(item.get("preco_venda_atual", custo * 1.5))
+
+        anterior = linhas.get(chave)
+        if anterior:
+            # Mesmo produto em outra linha: soma a quantidade, o resto fica com a última
+            quantidade += anterior.quantidade
+        linhas[chave] = _Linha(
+            produto=produto, ean=ean, quantidade=quantidade, custo=custo, nome=nome, preco_venda=preco,
+            unidade=item.get("unidade", "UN"), ncm=str(item.get("ncm", "")), cfop=str(item.get("cfop", "")),
+        )
+    return list(linhas.values())
+
+
+def _insert_dialeto(db: Session):
+    dialeto = db.get_bind().dialect.name
+    if dialeto == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as insert_dialeto
+    elif dialeto == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as insert_dialeto
+    else:
+        raise RuntimeError(f"Banco '{dialeto}' sem suporte a upsert na importação de notas.")
+    return insert_dialeto
+
+
+def _valores_produto(linha: _Linha, agora: datetime) -> dict:
+    return {
+        "nome": linha.nome,
+        "codigo_barras": _codigo(linha),
+        "quantidade_estoque": linha.quantidade,
+        "preco_custo": linha.custo,
+        "preco_venda": linha.preco_venda,
+        "unidade_medida": linha.unidade,
+        "ncm": linha.ncm,
+        "cfop": linha.cfop,
+        "categoria": CATEGORIA_PADRAO,
+        "criado_em": agora,
+        "atualizado_em": agora,
+    }
+
+
+def _upsert_produtos(db: Session, linhas: List[_Linha]) -> Dict[str, int]:
+    """
+    INSERT .. VALUES (..), (..) ON CONFLICT (codigo_barras) DO UPDATE para as
+    linhas com código de barras. Devolve {codigo_barras: id}.
+    """
+    ids: Dict[str, int] = {}
+    if not linhas:
+        return ids
+    agora = datetime.utcnow()
+    tabela = models.Produto.__table__
+    insert_dialeto = _insert_dialeto(db)
+
+    for inicio in range(0, len(linhas), LOTE_UPSERT):
+        stmt = insert_dialeto(tabela).values([
+            _valores_produto(linha, agora) for linha in linhas[inicio:inicio + LOTE_UPSERT]
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["codigo_barras"],
+            set_={
+                "quantidade_estoque": tabela.c.quantidade_estoque + stmt.excluded.quantidade_estoque,
+                "preco_custo": stmt.excluded.preco_custo,
+                "nome": stmt.excluded.nome,
+                "preco_venda": stmt.excluded.preco_venda,
+                "atualizado_em": stmt.excluded.atualizado_em,
+            },
+        ).returning(tabela.c.id, tabela.c.codigo_barras)
+        ids.update({codigo: produto_id for produto_id, codigo in db.execute(stmt)})
+    return ids
+
+
+def _inserir_sem_codigo(db: Session, linhas: List[_Linha]) -> List[int]:
+    """Produtos novos sem código de barras (nunca colidem): INSERT em lote, IDs na ordem de 'linhas'."""
+    if not linhas:
+        return []
+    agora = datetime.utcnow()
+    tabela = models.Produto.__table__
+    stmt = insert(tabela).returning(tabela.c.id, sort_by_parameter_order=True)
+    return list(db.execute(stmt, [_valores_produto(linha, agora) for linha in linhas]).scalars())
+
+
+def _atualizar_sem_codigo(db: Session, linhas: List[_Linha]):
+    """Produtos casados por ID sem código de barras (fora do ON CONFLICT): um UPDATE em lote."""
+    if not linhas:
+        return
+    tabela = models.Produto.__table__
+    stmt = update(tabela).where(tabela.c.id == bindparam("b_id")).values(
+        quantidade_estoque=tabela.c.quantidade_estoque + bindparam("b_quantidade"),
+        preco_custo=bindparam("b_custo"),
+        nome=bindparam("b_nome"),
+        preco_venda=bindparam("b_preco"),
+        atualizado_em=datetime.utcnow(),
+    )
+    db.execute(stmt, [
+        {
+            "b_id": linha.produto.id,
+            "b_quantidade": linha.quantidade,
+            "b_custo": linha.custo,
+            "b_nome": linha.nome,
+            "b_preco": linha.preco_venda,
+        }
+        for linha in linhas
+    ])
+
+
+def _codigo(linha: _Linha) -> Optional[str]:
+    """Código de barras com que a linha é gravada (o do cadastro, se já existe)."""
+    return linha.produto.codigo_barras if linha.produto else linha.ean
+
+
+def _data_emissao(db: Session, bruto: Optional[str]):
+    try:
+        if bruto and 'T' in bruto:
+            return datetime.fromisoformat(bruto.split('+')[0]).date()
+        if bruto:
+            return datetime.strptime(bruto, "%Y-%m-%d").date()
+    except ValueError:
+        pass
+    return periodos.hoje_local(db)
+
+
+def criar_nota(db: Session, header: dict, xml_conteudo: Optional[str]) -> models.NotaFiscalEntrada:
+    """Grava o cabeçalho da nota de entrada (flush, para os itens terem o id)."""
+    nota = models.NotaFiscalEntrada(
+        numero_nota=str(header.get('numero_nota') or '0'),
+        serie=str(header.get('serie') or '1'),
+        chave_acesso=header.get('chave_acesso', ''),
+        data_emissao=_data_emissao(db, header.get('data_emissao')),
+        valor_total=float(header.get('valor_total_nota', header.get('valor_total', 0)) or 0),
+    )
+    db.add(nota)
+    db.flush()
+    # O XML vai para o armazém de documentos (fora da linha que as listagens leem)
+    armazem_documentos.gravar(db, models.NotaFiscalEntrada.xml_conteudo, nota.id, xml_conteudo)
+    return nota
+
+
+def confirmar(db: Session, nota: models.NotaFiscalEntrada, itens: List[dict]) -> Tuple[List[str], List[str]]:
+    """
+    Grava os itens revisados da nota (dentro da transação do chamador).
+    Devolve (logs, códigos de barras afetados) para a resposta e o cache.
+    """
+    casamento = casar(
+        db,
+        eans=(normalizar_ean(item.get("ean") or item.get("codigo_barras")) for item in itens),
+        ids=(item.get("produto_existente_id") for item in itens),
+    )
+    linhas = _agrupar(itens, casamento)
+
+    existentes_sem_codigo = [linha for linha in linhas if linha.produto and not linha.produto.codigo_barras]
+    novos_sem_codigo = [linha for linha in linhas if not linha.produto and not linha.ean]
+    com_codigo = [linha for linha in linhas if _codigo(linha)]
+    # Trava as linhas sempre na mesma ordem: duas importações simultâneas não entram em deadlock
+    com_codigo.sort(key=_codigo)
+
+    ids_por_codigo = _upsert_produtos(db, com_codigo)
+    ids_novos = _inserir_sem_codigo(db, novos_sem_codigo)
+    _atualizar_sem_codigo(db, existentes_sem_codigo)
+
+    gravadas = (
+        [(ids_por_codigo[_codigo(linha)], linha) for linha in com_codigo]
+        + list(zip(ids_novos, novos_sem_codigo))
+        + [(linha.produto.id, linha) for linha in existentes_sem_codigo]
+    )
+    estoque.registrar_movimentos(db, [
+        {
+            "produto_id": produto_id,
+            "tipo": estoque.TIPO_ENTRADA_NOTA,
+            "quantidade": linha.quantidade,
+            "nota_entrada_id": nota.id,
+        }
+        for produto_id, linha in gravadas if linha.quantidade
+    ])
+
+    logs = [
+        f"✅ Atualizado: {linha.nome}" if linha.produto else f"🆕 Cadastrado: {linha.nome}"
+        for linha in linhas
+    ]
+    return logs, [_codigo(linha) for linha in linhas]
@@ -0,0 +1,173 @@
+"""
+Registro de jobs em segundo plano (tabela 'jobs_segundo_plano').
+
+Operações longas (lotes fiscais, importações) devolvem um 'job_id' na hora e
+seguem numa thread. O front acompanha por polling (GET .../jobs/{id}) ou
+pelo WebSocket. Guardamos só os últimos jobs: é acompanhamento, não histórico.
+
+O Job vive na memória da thread que o executa e é gravado na tabela na
+criação, a cada INTERVALO_GRAVACAO enquanto anda e no fim. As rotas de
+consulta leem a tabela: com vários workers do uvicorn o polling pode cair em
+qualquer um deles. Job de processo que caiu no meio fica 'em_andamento'
+com o último progresso gravado.
+"""
+import json
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional
+
+from .. import models
+from ..database import SessionLocal
+
+MAX_JOBS_GUARDADOS = 100
+MAX_ERROS_POR_JOB = 20
+# Progresso vai para o banco no máximo uma vez por intervalo (segundos)
+INTERVALO_GRAVACAO = 1.0
+
+
+@dataclass
+class Job:
+    tipo: str
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "em_andamento" # em_andamento, concluido, erro
+    total: int = 0
+    processadas: int = 0
+    sucessos: int = 0
+    falhas: int = 0
+    mensagem: str = ""
+    erros: List[str] = field(default_factory=list)
+    criado_em: datetime = field(default_factory=datetime.utcnow)
+    finalizado_em: Optional[datetime] = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    _gravado_em: float = field(default=0.0, repr=False)
+
+    def registrar(self, sucesso: bool, erro: Optional[str] = None):
+        """Contabiliza um item processado (thread-safe)."""
+        with self._lock:
+            self.processadas += 1
+            if sucesso:
+                self.sucessos += 1
+            else:
+                self.falhas += 1
+                if erro and len(self.erros) < MAX_ERROS_POR_JOB:
+                    self.erros.append(erro)
+        if time.monotonic() - self._gravado_em >= INTERVALO_GRAVACAO:
+            self.gravar()
+
+    def atualizar(self, total: Optional[int] = None, mensagem: Optional[str] = None):
+        """Muda o total e/ou a mensagem e grava na hora."""
+        with self._lock:
+            if total is not None:
+                self.total = total
+            if mensagem is not None:
+                self.mensagem = mensagem
+        self.gravar()
+
+    def finalizar(self, mensagem: str, status: str = "concluido"):
+        with self._lock:
+            self.status = status
+            self.mensagem = mensagem
+            self.finalizado_em = datetime.utcnow()
+        self.gravar()
+
+    def como_dict(self) -> dict:
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "tipo": self.tipo,
+                "status": self.status,
+                "total": self.total,
+                "processadas": self.processadas,
+                "sucessos": self.sucessos,
+                "falhas": self.falhas,
+                "message": self.mensagem,
+                "erros": list(self.erros),
+                "criado_em": self.criado_em,
+                "finalizado_em": self.finalizado_em,
+            }
+
+    def gravar(self):
+        """Grava o estado atual na tabela (transação própria). Falha só é avisada."""
+        self._gravado_em = time.monotonic()
+        dados = self.como_dict()
+        db = SessionLocal()
+        try:
+            db.merge(models.JobSegundoPlano(
+                id=dados["job_id"],
+                tipo=dados["tipo"],
+                status=dados["status"],
+                total=dados["total"],
+                processadas=dados["processadas"],
+                sucessos=dados["sucessos"],
+                falhas=dados["falhas"],
+                mensagem=dados["message"],
+                erros=json.dumps(dados["erros"], ensure_ascii=False),
+                criado_em=dados["criado_em"],
+                finalizado_em=dados["finalizado_em"],
+            ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ [Jobs] Falha ao gravar o job {self.id}: {e}")
+        finally:
+            db.close()
+
+
+def _como_dict(registro: models.JobSegundoPlano) -> dict:
+    return {
+        "job_id": registro.id,
+        "tipo": registro.tipo,
+        "status": registro.status,
+        "total": registro.total,
+        "processadas": registro.processadas,
+        "sucessos": registro.sucessos,
+        "falhas": registro.falhas,
+        "message": registro.mensagem,
+        "erros": json.loads(registro.erros or "[]"),
+        "criado_em": registro.criado_em,
+        "finalizado_em": registro.finalizado_em,
+    }
+
+
+def criar_job(tipo: str, mensagem: str = "") -> Job:
+    job = Job(tipo=tipo, mensagem=mensagem)
+    job.gravar()
+
+    # Descarta os mais antigos já terminados
+    db = SessionLocal()
+    try:
+        antigos = db.query(models.JobSegundoPlano.id).filter(
+            models.JobSegundoPlano.status != "em_andamento"
+        ).order_by(models.JobSegundoPlano.criado_em.desc()).offset(MAX_JOBS_GUARDADOS).all()
+        if antigos:
+            db.query(models.JobSegundoPlano).filter(
+                models.JobSegundoPlano.id.in_([j_id for (j_id,) in antigos])
+            ).delete(synchronize_session=False)
+            db.commit()
+    finally:
+        db.close()
+    return job
+
+
+def obter_job(job_id: str) -> Optional[dict]:
+    db = SessionLocal()
+    try:
+        registro = db.get(models.JobSegundoPlano, job_id)
+        return _como_dict(registro) if registro else None
+    finally:
+        db.close()
+
+
+def listar_jobs(tipo_prefixo: str = "") -> List[dict]:
+    """Jobs guardados, do mais recente para o mais antigo (filtra pelo início do tipo)."""
+    db = SessionLocal()
+    try:
+        consulta = db.query(models.JobSegundoPlano)
+        if tipo_prefixo:
+            consulta = consulta.filter(models.JobSegundoPlano.tipo.startswith(tipo_prefixo))
+        return [_como_dict(r) for r in consulta.order_by(models.JobSegundoPlano.criado_em.desc())]
+    finally:
+        db.close()
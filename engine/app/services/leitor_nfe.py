@@ -0,0 +1,278 @@
+"""
+Leitor de NF-e em fluxo (lxml.etree.iterparse), compartilhado pelo upload
+de XML (xml_service) e pela distribuição DF-e (sefaz_query_service).
+
+Antes o upload montava a árvore inteira com xmltodict, e a distribuição
+fazia parse do envelope, descompactava para string, recodificava, fazia
+parse de novo e reescrevia todas as tags para tirar o namespace. Agora:
+
+- Os itens (<det>/<prod>) saem um a um de um gerador e cada <det> é
+  limpo (e removido da árvore) assim que lido: a memória não cresce com o
+  número de linhas da nota.
+- Consultas com namespace (n: = http://www.portalfiscal.inf.br/nfe); notas
+  sem namespace (sistemas antigos) também são aceitas.
+- O docZip da distribuição é decodificado (base64 -> gzip) direto para o
+  parser, sem passar por string. O XML lido fica disponível em
+  'xml_lido()' para ser gravado na nota.
+
+Uso:
+    leitor = LeitorNFe(conteudo_bytes_ou_arquivo)
+    for item in leitor.itens():   # um dict por <det>
+        ...
+    leitor.cabecalho              # completo depois de percorrer os itens
+"""
+import base64
+import gzip
+import io
+import zlib
+from dataclasses import dataclass
+from typing import IO, Dict, Iterator, List, Optional, Tuple, Union
+
+from lxml import etree
+
+NS_NFE = "http://www.portalfiscal.inf.br/nfe"
+NS = {"n": NS_NFE}
+
+Fonte = Union[bytes, str, IO[bytes]]
+
+
+def _abrir(fonte: Fonte) -> IO[bytes]:
+    if isinstance(fonte, str):
+        fonte = fonte.encode("utf-8")
+    if isinstance(fonte, (bytes, bytearray)):
+        return io.BytesIO(fonte)
+    return fonte
+
+
+def _iterparse(arquivo: IO[bytes], tags: Tuple[str, ...]):
+    """Eventos 'end' das tags pedidas, com e sem o namespace da NF-e. Sem entidades externas."""
+    return etree.iterparse(
+        arquivo, events=("end",),
+        tag=[f"{{{NS_NFE}}}{tag}" for tag in tags] + list(tags),
+        resolve_entities=False, no_network=True, huge_tree=True,
+    )
+
+
+def _descartar(elemento):
+    """Libera o elemento já lido e os irmãos anteriores (memória constante)."""
+    elemento.clear(keep_tail=True)
+    pai = elemento.getparent()
+    if pai is not None:
+        while elemento.getprevious() is not None:
+            del pai[0]
+
+
+def _filhos(elemento) -> Dict[str, str]:
+    """{nome local: texto} dos filhos diretos (uma passada, com ou sem namespace)."""
+    return {
+        filho.tag.rpartition("}")[2]: (filho.text or "")
+        for filho in elemento
+        if isinstance(filho.tag, str)
+    }
+
+
+def _numero(texto: Optional[str], padrao: float = 0.0) -> float:
+    try:
+        return float(texto) if texto not in (None, "") else padrao
+    except ValueError:
+        return padrao
+
+
+class _CopiaLeitura(io.RawIOBase):
+    """Repassa um stream ao parser guardando os bytes lidos (o XML vai para a nota)."""
+
+    def __init__(self, origem: IO[bytes]):
+        self.origem = origem
+        self.partes: List[bytes] = []
+
+    def readable(self):
+        return True
+
+    def read(self, tamanho=-1):
+        dados = self.origem.read(tamanho)
+        if dados:
+            self.partes.append(dados)
+        return dados
+
+    def conteudo(self) -> bytes:
+        return b"".join(self.partes)
+
+
+class LeitorNFe:
+    """Uma NF-e (<nfeProc>, <procNFe> ou <NFe>) lida em fluxo."""
+
+    TAGS = ("ide", "emit", "det", "total", "infProt", "infNFe")
+
+    def __init__(self, fonte: Fonte):
+        self._arquivo = _abrir(fonte)
+        self._lido = False
+        self.cabecalho: Dict[str, Optional[str]] = {
+            "chave_acesso": None, "numero_nota": None, "serie": None, "data_emissao": None,
+            "emitente_cnpj": None, "emitente_nome": None, "emitente_ie": None,
+            "valor_total": None, "protocolo": None,
+        }
+
+    def itens(self) -> Iterator[dict]:
+        """Gera os itens da nota na ordem do XML. Só pode ser percorrido uma vez."""
+        if self._lido:
+            raise RuntimeError("A NF-e já foi lida.")
+        self._lido = True
+        achou_nota = False
+        try:
+            for _, elemento in _iterparse(self._arquivo, self.TAGS):
+                nome = elemento.tag.rpartition("}")[2]
+                if nome == "det":
+                    yield self._item(elemento)
+                    _descartar(elemento)
+                elif nome == "ide":
+                    campos = _filhos(elemento)
+                    self.cabecalho.update(
+                        numero_nota=campos.get("nNF"), serie=campos.get("serie"),
+                        data_emissao=campos.get("dhEmi") or campos.get("dEmi"),
+                    )
+                    _descartar(elemento)
+                elif nome == "emit":
+                    campos = _filhos(elemento)
+                    self.cabecalho.update(
+                        emitente_cnpj=campos.get("CNPJ") or campos.get("CPF"),
+                        emitente_nome=campos.get("xNome"), emitente_ie=campos.get("IE", ""),
+                    )
+                    _descartar(elemento)
+                elif nome == "total":
+                    icms = elemento.find("n:ICMSTot", NS)
+                    if icms is None:
+                        icms = elemento.find("ICMSTot")
+                    if icms is not None:
+                        self.cabecalho["valor_total"] = _filhos(icms).get("vNF")
+                    _descartar(elemento)
+                elif nome == "infProt":
+                    campos = _filhos(elemento)
+                    self.cabecalho["protocolo"] = campos.get("nProt")
+                    self.cabecalho["chave_acesso"] = self.cabecalho["chave_acesso"] or campos.get("chNFe")
+                elif nome == "infNFe":
+                    achou_nota = True
+                    identificador = elemento.get("Id") or ""
+                    self.cabecalho["chave_acesso"] = identificador.replace("NFe", "") or self.cabecalho["chave_acesso"]
+        except etree.XMLSyntaxError as e:
+            raise ValueError(f"XML malformado: {e}")
+        except (OSError, EOFError, zlib.error) as e:
+            # docZip truncado ou corrompido (erro do gzip durante a leitura)
+            raise ValueError(f"Conteúdo compactado inválido: {e}")
+
+        if not achou_nota:
+            raise ValueError("Estrutura XML de NF-e completa não reconhecida.")
+
+    @staticmethod
+    def _item(det) -> dict:
+        prod = det.find("n:prod", NS)
+        if prod is None:
+            prod = det.find("prod")
+        campos = _filhos(prod) if prod is not None else {}
+        return {
+            "nItem": det.get("nItem"),
+            "codigo": campos.get("cProd", ""),
+            "ean": campos.get("cEAN", ""),
+            "descricao": campos.get("xProd", ""),
+            "ncm": campos.get("NCM", ""),
+            "cfop": campos.get("CFOP", ""),
+            "unidade": campos.get("uCom", ""),
+            "quantidade": _numero(campos.get("qCom")),
+            "valor_unitario": _numero(campos.get("vUnCom")),
+            "valor_total": _numero(campos.get("vProd")),
+        }
+
+    def ler_tudo(self) -> Tuple[dict, List[dict]]:
+        """Cabeçalho e lista de itens (para quem precisa da nota inteira)."""
+        itens = list(self.itens())
+        return self.cabecalho, itens
+
+    def xml_lido(self) -> Optional[str]:
+        """Texto do XML lido, quando veio de um docZip (para gravar na nota)."""
+        if isinstance(self._arquivo, _CopiaLeitura):
+            return self._arquivo.conteudo().decode("utf-8")
+        return None
+
+
+@dataclass
+class DocumentoDistribuicao:
+    """Um <docZip> da distribuição: o conteúdo fica compactado (gzip) até ser aberto."""
+    nsu: Optional[str]
+    schema: str
+    compactado: bytes
+
+    def abrir(self) -> IO[bytes]:
+        return gzip.GzipFile(fileobj=io.BytesIO(self.compactado))
+
+
+def _doc_zips(envelope: Fonte, retorno: Optional[dict] = None) -> Iterator[DocumentoDistribuicao]:
+    """
+    Percorre a resposta da distribuição DF-e gerando os <docZip>. Se
+    'retorno' vier, preenche cStat, xMotivo, ultNSU e maxNSU (que vêm antes
+    do lote no XML).
+    """
+    try:
+        for _, elemento in _iterparse(_abrir(envelope), ("cStat", "xMotivo", "ultNSU", "maxNSU", "docZip")):
+            nome = elemento.tag.rpartition("}")[2]
+            if nome != "docZip":
+                if retorno is not None and retorno.get(nome) is None:
+                    retorno[nome] = elemento.text
+                continue
+            conteudo = elemento.text or ""
+            nsu, schema = elemento.get("NSU"), elemento.get("schema") or ""
+            _descartar(elemento)
+            if conteudo.strip():
+                yield DocumentoDistribuicao(nsu, schema, base64.b64decode(conteudo))
+    except etree.XMLSyntaxError as e:
+        raise ValueError(f"Envelope da distribuição malformado: {e}")
+
+
+def documentos_distribuicao(envelope: Fonte) -> Iterator[Tuple[Optional[str], str, IO[bytes]]]:
+    """
+    Gera (NSU, schema, stream do XML descompactado) de cada <docZip>. O
+    stream é lido sob demanda pelo parser: nada é descompactado para string.
+    """
+    for documento in _doc_zips(envelope):
+        yield documento.nsu, documento.schema, documento.abrir()
+
+
+def ler_distribuicao(envelope: Fonte) -> Tuple[Dict[str, Optional[str]], List[DocumentoDistribuicao]]:
+    """
+    Lote inteiro da distribuição (até 50 documentos por resposta):
+    ({'cStat', 'xMotivo', 'ultNSU', 'maxNSU'}, documentos ainda compactados).
+    """
+    retorno: Dict[str, Optional[str]] = {"cStat": None, "xMotivo": None, "ultNSU": None, "maxNSU": None}
+    documentos = list(_doc_zips(envelope, retorno))
+    return retorno, documentos
+
+
+def ler_campos(fonte: Fonte, campos: Tuple[str, ...]) -> Dict[str, Optional[str]]:
+    """
+    Primeiro valor de cada campo (nome local) de um XML pequeno, como os
+    resumos de nota (resNFe) e de evento (resEvento) da distribuição.
+    """
+    valores: Dict[str, Optional[str]] = dict.fromkeys(campos)
+    try:
+        for _, elemento in _iterparse(_abrir(fonte), campos):
+            nome = elemento.tag.rpartition("}")[2]
+            if valores[nome] is None:
+                valores[nome] = elemento.text
+            _descartar(elemento)
+    except etree.XMLSyntaxError as e:
+        raise ValueError(f"XML malformado: {e}")
+    return valores
+
+
+def ler_nfe_distribuicao(envelope: Fonte) -> Optional[LeitorNFe]:
+    """
+    Leitor da NF-e completa (schema procNFe) contida na distribuição, ou
+    None se a resposta não trouxer a nota (só resumo/evento ou nada).
+    """
+    for documento in _doc_zips(envelope):
+        if documento.schema.startswith("procNFe") or not documento.schema:
+            return ler_nfe_compactada(documento.compactado)
+    return None
+
+
+def ler_nfe_compactada(compactado: bytes) -> LeitorNFe:
+    """Leitor de uma NF-e guardada em gzip (como vem no docZip), com o XML em 'xml_lido()'."""
+    return LeitorNFe(_CopiaLeitura(gzip.GzipFile(fileobj=io.BytesIO(compactado))))
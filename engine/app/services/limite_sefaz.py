@@ -0,0 +1,55 @@
+"""
+Limite de requisições por autorizadora (UF) da SEFAZ.
+
+Disparar centenas de notas em paralelo contra a mesma autorizadora gera
+rejeições por consumo indevido (cStat 656) e bloqueio temporário do CNPJ.
+Cada UF tem um balde de fichas (token bucket): no máximo N envios por
+segundo, somando todas as threads do processo (fila de emissão + lotes).
+"""
+import os
+import threading
+import time
+from typing import Dict
+
+# Balde da emissão (o emitir_nfce.php ainda não recebe a UF). A distribuição
+# DF-e usa empresa_config.uf; aqui é só o nome do balde e a taxa por UF.
+UF_EMITENTE = os.getenv("SEFAZ_UF", "").strip().upper()
+TAXA_PADRAO = float(os.getenv("SEFAZ_ENVIOS_POR_SEGUNDO", "5"))
+# Ajuste fino por UF: SEFAZ_ENVIOS_POR_SEGUNDO_SP=10
+TAXA_POR_UF_PREFIXO = "SEFAZ_ENVIOS_POR_SEGUNDO_"
+
+
+class LimitadorTaxa:
+    def __init__(self, por_segundo: float):
+        self.por_segundo = max(por_segundo, 0.1)
+        # Permite uma rajada de até 1 segundo de envios
+        self.capacidade = max(1.0, self.por_segundo)
+        self._fichas = self.capacidade
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def aguardar(self):
+        """Bloqueia a thread até haver uma ficha disponível."""
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._fichas = min(self.capacidade, self._fichas + (agora - self._ultimo) * self.por_segundo)
+                self._ultimo = agora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                espera = (1 - self._fichas) / self.por_segundo
+            time.sleep(espera)
+
+
+_limitadores: Dict[str, LimitadorTaxa] = {}
+_lock = threading.Lock()
+
+
+def aguardar_vez(uf: str = UF_EMITENTE):
+    with _lock:
+        limitador = _limitadores.get(uf)
+        if limitador is None:
+            taxa = float(os.getenv(TAXA_POR_UF_PREFIXO + uf, TAXA_PADRAO))
+            limitador = _limitadores[uf] = LimitadorTaxa(taxa)
+    limitador.aguardar()
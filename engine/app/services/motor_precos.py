@@ -0,0 +1,116 @@
+"""
+Motor de preço efetivo (promoções).
+
+O preço de um produto só muda em "fronteiras": criação de promoção, início
+(data_inicio) ou fim (data_fim) de uma promoção. Calculamos o preço uma vez,
+junto com o instante da próxima fronteira ('valido_ate'), e até lá a consulta
+é O(1). Um agendador acorda na próxima fronteira e recalcula os afetados.
+"""
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Optional
+
+# Uma promoção vale enquanto 'data_fim >= agora'; ela sai logo depois.
+_RESOLUCAO = timedelta(microseconds=1)
+
+
+@dataclass(frozen=True)
+class PrecoEfetivo:
+    preco_final: float
+    promocao_ativa: Optional[str]
+    # Próxima fronteira de promoção. None = preço estável até nova invalidação.
+    valido_ate: Optional[datetime]
+
+    def valido_em(self, agora: datetime) -> bool:
+        return self.valido_ate is None or agora < self.valido_ate
+
+
+def calcular_preco_efetivo(preco_venda: float, promocoes: Iterable, agora: Optional[datetime] = None) -> PrecoEfetivo:
+    """
+    Regra única de promoção: entre as promoções vigentes, vence a que gera
+    o menor preço ('percentual' ou 'preco_fixo'). Também devolve quando
+    esse resultado deixa de valer.
+    """
+    agora = agora or datetime.utcnow()
+    preco_final = preco_venda
+    melhor_promocao = None
+    proxima_fronteira = None
+
+    for promo in promocoes:
+        if promo.data_inicio and promo.data_inicio > agora:
+            # Ainda vai começar: o preço muda quando ela entrar
+            fronteira = promo.data_inicio
+            if proxima_fronteira is None or fronteira < proxima_fronteira:
+                proxima_fronteira = fronteira
+            continue
+
+        if promo.data_fim is not None:
+            if promo.data_fim < agora:
+                continue
+            fronteira = promo.data_fim + _RESOLUCAO
+            if proxima_fronteira is None or fronteira < proxima_fronteira:
+                proxima_fronteira = fronteira
+
+        preco_promocional = preco_venda
+        if promo.tipo == 'percentual':
+            preco_promocional = preco_venda * (1 - promo.valor / 100.0)
+        elif promo.tipo == 'preco_fixo':
+            preco_promocional = promo.valor
+
+        if preco_promocional < preco_final:
+            preco_final = preco_promocional
+            melhor_promocao = promo.nome
+
+    return PrecoEfetivo(
+        preco_final=preco_final,
+        promocao_ativa=melhor_promocao,
+        valido_ate=proxima_fronteira
+    )
+
+
+class AgendadorFronteiras:
+    """
+    Thread única que dorme até a próxima fronteira conhecida e então chama
+    'ao_vencer(agora)'. O callback devolve a próxima fronteira que ainda
+    existe (ou None), e o agendador volta a dormir até ela.
+    """
+
+    def __init__(self, ao_vencer: Callable[[datetime], Optional[datetime]]):
+        self._ao_vencer = ao_vencer
+        self._cond = threading.Condition()
+        self._proxima: Optional[datetime] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def agendar(self, fronteira: Optional[datetime]):
+        if fronteira is None:
+            return
+        with self._cond:
+            if self._proxima is not None and self._proxima <= fronteira:
+                return
+            self._proxima = fronteira
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._executar, name="agendador-precos", daemon=True
+                )
+                self._thread.start()
+            self._cond.notify()
+
+    def _executar(self):
+        while True:
+            with self._cond:
+                while self._proxima is None:
+                    self._cond.wait()
+                espera = (self._proxima - datetime.utcnow()).total_seconds()
+                if espera > 0:
+                    # Acorda antes se alguém agendar uma fronteira mais cedo
+                    self._cond.wait(timeout=espera)
+                    continue
+                self._proxima = None
+
+            try:
+                seguinte = self._ao_vencer(datetime.utcnow())
+            except Exception as e:
+                print(f"⚠️ [Preços] Falha ao recalcular promoções na fronteira: {e}")
+                seguinte = None
+            self.agendar(seguinte)
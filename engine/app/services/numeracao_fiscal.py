@@ -0,0 +1,281 @@
+"""
+Numeração de notas fiscais por (empresa, modelo, série).
+
+O número vinha de 'ORDER BY numero DESC LIMIT 1': varredura da tabela e,
+com dois caixas finalizando juntos, o mesmo número para as duas notas.
+Agora cada (empresa, modelo, série) tem uma linha em 'sequencias_fiscais'.
+O processo reserva um BLOCO de números de uma vez (trava a linha só durante
+esse UPDATE, numa transação própria) e distribui os números do bloco em
+memória. Alocar é O(1) e os caixas não disputam a tabela de notas.
+
+Cada worker do uvicorn tem o seu bloco, então o bloco também fica gravado
+em 'blocos_numeracao' (dono = host:pid). A detecção de lacunas e o registro
+de inutilização ignoram os blocos em uso por QUALQUER processo; senão um
+número ainda na mão de outro worker seria inutilizado e emitido depois.
+Um bloco vale por VALIDADE_BLOCO: passado isso o dono não o usa mais
+(reserva outro), e o que sobrou vira lacuna comum. É o que cobre processo
+que caiu com bloco na mão.
+
+Números que não viram nota (bloco não usado no desligamento, venda que
+falhou depois de reservar) ficam registrados em 'numeracao_inutilizada'
+para a inutilização na SEFAZ. A reserva pula as faixas já registradas lá.
+"""
+import os
+import socket
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..database import SessionLocal
+
+TAMANHO_BLOCO = max(1, int(os.getenv("FISCAL_BLOCO_NUMERACAO", "10")))
+VALIDADE_BLOCO = timedelta(hours=float(os.getenv("FISCAL_BLOCO_VALIDADE_HORAS", "12")))
+# Venda que pegou número pouco antes do bloco vencer ainda pode estar gravando a nota
+FOLGA_VALIDADE = timedelta(minutes=10)
+
+DONO = f"{socket.gethostname()}:{os.getpid()}"
+
+Chave = Tuple[int, str, int] # (empresa_id, modelo, serie)
+
+
+@dataclass
+class _Bloco:
+    proximo: int
+    fim: int # exclusivo
+    reservado_em: datetime
+
+
+_blocos: Dict[Chave, _Bloco] = {}
+_lock = threading.Lock()
+
+
+def proximo_numero(empresa_id: int, modelo: str = "65", serie: int = 1) -> int:
+    """Entrega o próximo número da série. Só vai ao banco quando o bloco acaba."""
+    chave = (empresa_id, modelo, serie)
+    with _lock:
+        bloco = _blocos.get(chave)
+        if (bloco is None or bloco.proximo >= bloco.fim
+                or datetime.utcnow() - bloco.reservado_em >= VALIDADE_BLOCO):
+            bloco = _blocos[chave] = _reservar_bloco(chave, TAMANHO_BLOCO)
+        numero = bloco.proximo
+        bloco.proximo += 1
+        return numero
+
+
+def _reservar_bloco(chave: Chave, tamanho: int) -> _Bloco:
+    """
+    Transação própria e curta: a trava da linha não pode durar a venda
+    inteira (serializaria os caixas), e um rollback da venda não pode
+    "devolver" números que já estão no bloco em memória.
+    """
+    empresa_id, modelo, serie = chave
+    db = SessionLocal()
+    try:
+        for _ in range(2):
+            sequencia = db.query(models.SequenciaFiscal).filter_by(
+                empresa_id=empresa_id, modelo=modelo, serie=serie
+            ).with_for_update().first()
+
+            if sequencia is None:
+                # Primeira vez: continua a partir do maior número já emitido
+                maior = db.query(func.max(models.NotaFiscalSaida.numero)).filter(
+                    models.NotaFiscalSaida.empresa_id == empresa_id,
+                    models.NotaFiscalSaida.modelo == modelo,
+                    models.NotaFiscalSaida.serie == serie
+                ).scalar() or 0
+                sequencia = models.SequenciaFiscal(
+                    empresa_id=empresa_id, modelo=modelo, serie=serie, proximo_numero=maior + 1
+                )
+                db.add(sequencia)
+                try:
+                    db.flush()
+                except IntegrityError:
+                    # Outro processo criou a linha ao mesmo tempo: relê travando
+                    db.rollback()
+                    continue
+
+            inicio, fim = _faixa_livre(db, chave, sequencia.proximo_numero, tamanho)
+            sequencia.proximo_numero = fim
+
+            # O bloco anterior deste processo acabou (ou venceu): sai da lista dos em uso
+            agora = datetime.utcnow()
+            db.query(models.BlocoNumeracao).filter_by(
+                empresa_id=empresa_id, modelo=modelo, serie=serie, dono=DONO
+            ).delete(synchronize_session=False)
+            db.add(models.BlocoNumeracao(
+                empresa_id=empresa_id, modelo=modelo, serie=serie,
+                numero_inicial=inicio, numero_final=fim - 1,
+                dono=DONO, reservado_em=agora
+            ))
+            db.commit()
+            return _Bloco(proximo=inicio, fim=fim, reservado_em=agora)
+
+        raise RuntimeError(f"Não foi possível reservar numeração para {chave}.")
+    finally:
+        db.close()
+
+
+def _faixa_livre(db: Session, chave: Chave, inicio: int, tamanho: int) -> Tuple[int, int]:
+    """
+    [inicio, fim) a partir de 'inicio' sem números já registrados para
+    inutilização. Se uma faixa registrada começa no meio, o bloco fica menor.
+    """
+    empresa_id, modelo, serie = chave
+    registradas = db.query(
+        models.NumeracaoInutilizada.numero_inicial, models.NumeracaoInutilizada.numero_final
+    ).filter(
+        models.NumeracaoInutilizada.empresa_id == empresa_id,
+        models.NumeracaoInutilizada.modelo == modelo,
+        models.NumeracaoInutilizada.serie == serie,
+        models.NumeracaoInutilizada.numero_final >= inicio
+    ).order_by(models.NumeracaoInutilizada.numero_inicial).all()
+
+    for r_ini, r_fim in registradas:
+        if r_ini <= inicio <= r_fim:
+            inicio = r_fim + 1
+
+    fim = inicio + tamanho
+    for r_ini, _ in registradas:
+        if inicio < r_ini < fim:
+            fim = r_ini
+            break
+    return inicio, fim
+
+
+def liberar_blocos():
+    """
+    Desligamento: o que sobrou dos blocos volta para a sequência quando
+    ninguém reservou depois (sem lacuna). Se outro processo já avançou a
+    sequência, a sobra é registrada para inutilização.
+    """
+    with _lock:
+        sobras = [(chave, b.proximo, b.fim) for chave, b in _blocos.items() if b.proximo < b.fim]
+        tinha_blocos = bool(_blocos)
+        _blocos.clear()
+
+    if not tinha_blocos:
+        return
+
+    db = SessionLocal()
+    try:
+        db.query(models.BlocoNumeracao).filter_by(dono=DONO).delete(synchronize_session=False)
+        for (empresa_id, modelo, serie), inicio, fim in sobras:
+            sequencia = db.query(models.SequenciaFiscal).filter_by(
+                empresa_id=empresa_id, modelo=modelo, serie=serie
+            ).with_for_update().first()
+
+            if sequencia and sequencia.proximo_numero == fim:
+                sequencia.proximo_numero = inicio
+            else:
+                db.add(models.NumeracaoInutilizada(
+                    empresa_id=empresa_id, modelo=modelo, serie=serie,
+                    numero_inicial=inicio, numero_final=fim - 1,
+                    motivo="Bloco de numeração reservado e não utilizado"
+                ))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ [Numeração] Falha ao liberar blocos: {e}")
+    finally:
+        db.close()
+
+
+def blocos_em_uso(db: Session, empresa_id: int, modelo: str = "65", serie: int = 1) -> List[Tuple[int, int]]:
+    """Faixas [inicial, final] reservadas por processos em execução (de todos os workers)."""
+    limite = datetime.utcnow() - VALIDADE_BLOCO - FOLGA_VALIDADE
+    return db.query(models.BlocoNumeracao.numero_inicial, models.BlocoNumeracao.numero_final).filter(
+        models.BlocoNumeracao.empresa_id == empresa_id,
+        models.BlocoNumeracao.modelo == modelo,
+        models.BlocoNumeracao.serie == serie,
+        models.BlocoNumeracao.reservado_em > limite
+    ).all()
+
+
+def _subtrair(faixa: Tuple[int, int], cobertas: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Pedaços de 'faixa' fora de todas as faixas 'cobertas'."""
+    restos = [faixa]
+    for c_ini, c_fim in cobertas:
+        novos = []
+        for ini, fim in restos:
+            if c_fim < ini or fim < c_ini:
+                novos.append((ini, fim))
+                continue
+            if ini < c_ini:
+                novos.append((ini, c_ini - 1))
+            if c_fim < fim:
+                novos.append((c_fim + 1, fim))
+        restos = novos
+    return restos
+
+
+def detectar_lacunas(db: Session, empresa_id: int, modelo: str = "65", serie: int = 1) -> List[Tuple[int, int]]:
+    """
+    Faixas [inicial, final] sem nota abaixo do último número emitido, fora
+    das já registradas para inutilização e dos blocos em uso (ex: venda que
+    falhou depois de reservar o número, processo que caiu com bloco na mão).
+    """
+    numero = models.NotaFiscalSaida.numero
+    seguinte = func.lead(numero).over(order_by=numero).label("seguinte")
+    sub = db.query(numero.label("numero"), seguinte).filter(
+        models.NotaFiscalSaida.empresa_id == empresa_id,
+        models.NotaFiscalSaida.modelo == modelo,
+        models.NotaFiscalSaida.serie == serie,
+        numero.isnot(None)
+    ).subquery()
+
+    faixas = [
+        (atual + 1, prox - 1)
+        for atual, prox in db.query(sub.c.numero, sub.c.seguinte).filter(sub.c.seguinte - sub.c.numero > 1)
+    ]
+
+    cobertas = db.query(
+        models.NumeracaoInutilizada.numero_inicial, models.NumeracaoInutilizada.numero_final
+    ).filter_by(empresa_id=empresa_id, modelo=modelo, serie=serie).all()
+    cobertas += blocos_em_uso(db, empresa_id, modelo, serie)
+
+    return [resto for faixa in faixas for resto in _subtrair(faixa, cobertas)]
+
+
+def registrar_inutilizacao(
+    db: Session, empresa_id: int, modelo: str, serie: int,
+    numero_inicial: int, numero_final: int, motivo: Optional[str]
+) -> models.NumeracaoInutilizada:
+    """
+    Registra a faixa para inutilização (com commit). ValueError se algum
+    número já é de uma nota ou está num bloco em uso. Trava a linha da
+    sequência: uma reserva concorrente espera e já pula a faixa nova.
+    """
+    db.query(models.SequenciaFiscal).filter_by(
+        empresa_id=empresa_id, modelo=modelo, serie=serie
+    ).with_for_update().first()
+
+    em_uso = db.query(models.NotaFiscalSaida.numero).filter(
+        models.NotaFiscalSaida.empresa_id == empresa_id,
+        models.NotaFiscalSaida.modelo == modelo,
+        models.NotaFiscalSaida.serie == serie,
+        models.NotaFiscalSaida.numero.between(numero_inicial, numero_final)
+    ).first()
+    if em_uso:
+        raise ValueError(f"O número {em_uso.numero} já pertence a uma nota.")
+
+    for b_ini, b_fim in blocos_em_uso(db, empresa_id, modelo, serie):
+        if b_ini <= numero_final and numero_inicial <= b_fim:
+            raise ValueError(
+                f"Os números {b_ini} a {b_fim} estão reservados por um caixa em uso "
+                "e ainda podem virar nota."
+            )
+
+    registro = models.NumeracaoInutilizada(
+        empresa_id=empresa_id, modelo=modelo, serie=serie,
+        numero_inicial=numero_inicial, numero_final=numero_final, motivo=motivo
+    )
+    db.add(registro)
+    db.commit()
+    db.refresh(registro)
+    return registro
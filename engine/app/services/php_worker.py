@@ -0,0 +1,173 @@
+"""
+Pool de workers PHP persistentes (sefaz_service/worker.php).
+
+Antes, cada emissão/consulta subia um interpretador PHP novo, carregava o
+vendor do NFePHP, gravava JSON + PFX em arquivos temporários e relia o
+certificado. Aqui os processos ficam vivos e conversam por JSON em linhas
+(stdin/stdout). O PFX só atravessa o pipe na primeira vez em cada processo;
+depois vai apenas a impressão digital (SHA-256).
+"""
+import base64
+import hashlib
+import itertools
+import json
+import os
+import queue
+import subprocess
+import threading
+from typing import Optional
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PHP_EXEC = os.getenv("PHP_EXEC", "php") # Garanta que o php está no PATH do sistema
+# worker_gravado.php reproduz respostas gravadas da SEFAZ (testes sem rede)
+WORKER_PATH = os.getenv("PHP_WORKER_SCRIPT", os.path.join(BASE_DIR, "sefaz_service", "worker.php"))
+
+TAMANHO_POOL = int(os.getenv("PHP_WORKERS", "2"))
+# Recicla o processo depois de N operações (limita vazamento de memória do PHP)
+MAX_OPERACOES_POR_PROCESSO = int(os.getenv("PHP_WORKER_MAX_OPERACOES", "500"))
+TIMEOUT_PADRAO = 60
+
+
+class ErroWorkerPHP(Exception):
+    pass
+
+
+class ProcessoPHP:
+    """Um 'php worker.php' vivo. Não é thread-safe: o pool entrega a um chamador por vez."""
+
+    def __init__(self):
+        self._proc = subprocess.Popen(
+            [PHP_EXEC, WORKER_PATH],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=None, # Warnings do PHP vão para o console do servidor
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+        )
+        self._ids = itertools.count(1)
+        self._certificados = set()
+        self.operacoes = 0
+        # Timeout, EOF ou pipe fechado: não volta para o pool. Logo depois do
+        # kill() o poll() ainda devolve None, então 'vivo' não basta.
+        self._quebrado = False
+        # Leitura em thread própria: permite timeout no readline em qualquer SO
+        self._respostas: "queue.Queue[Optional[str]]" = queue.Queue()
+        threading.Thread(target=self._ler_stdout, daemon=True).start()
+
+    def _ler_stdout(self):
+        for linha in self._proc.stdout:
+            self._respostas.put(linha)
+        self._respostas.put(None) # EOF: processo morreu
+
+    @property
+    def vivo(self) -> bool:
+        return not self._quebrado and self._proc.poll() is None
+
+    def encerrar(self):
+        try:
+            self._proc.stdin.close()
+            self._proc.wait(timeout=5)
+        except Exception:
+            self._proc.kill()
+
+    def _enviar(self, pedido: dict, timeout: float) -> dict:
+        try:
+            self._proc.stdin.write(json.dumps(pedido) + "\n")
+            self._proc.stdin.flush()
+        except OSError as e:
+            self._quebrado = True
+            raise ErroWorkerPHP(f"Worker PHP não aceitou o pedido: {e}")
+
+        while True:
+            try:
+                linha = self._respostas.get(timeout=timeout)
+            except queue.Empty:
+                # Estado desconhecido: mata para não receber a resposta atrasada depois
+                self._quebrado = True
+                self._proc.kill()
+                raise TimeoutError(f"Worker PHP não respondeu em {timeout}s.")
+            if linha is None:
+                self._quebrado = True
+                raise ErroWorkerPHP("Worker PHP encerrou inesperadamente.")
+            try:
+                resposta = json.loads(linha)
+            except json.JSONDecodeError:
+                print(f"⚠️ [PHP Worker] Linha ignorada fora do protocolo: {linha.strip()[:200]}")
+                continue
+            if resposta.get("id") == pedido["id"]:
+                return resposta
+
+    def executar(self, op: str, dados: dict, pfx: Optional[bytes], senha: Optional[str], timeout: float) -> dict:
+        self.operacoes += 1
+        pedido = {"id": next(self._ids), "op": op, "dados": dados}
+
+        if pfx is not None:
+            fingerprint = hashlib.sha256(pfx).hexdigest()
+            pedido["cert"] = {"fingerprint": fingerprint}
+            if fingerprint not in self._certificados:
+                pedido["cert"].update(pfx_base64=base64.b64encode(pfx).decode("ascii"), senha=senha)
+
+        resposta = self._enviar(pedido, timeout)
+
+        if pfx is not None and not resposta.get("ok") and resposta.get("codigo") == "cert_desconhecido":
+            # Só acontece se o processo foi reiniciado sem sabermos: reenvia o PFX
+            pedido["id"] = next(self._ids)
+            pedido["cert"].update(pfx_base64=base64.b64encode(pfx).decode("ascii"), senha=senha)
+            resposta = self._enviar(pedido, timeout)
+
+        if pfx is not None and resposta.get("ok"):
+            self._certificados.add(pedido["cert"]["fingerprint"])
+
+        if not resposta.get("ok"):
+            raise ErroWorkerPHP(resposta.get("erro") or "Erro desconhecido no worker PHP.")
+        return resposta["resultado"]
+
+
+class PoolPHP:
+    def __init__(self, tamanho: int = TAMANHO_POOL):
+        self.tamanho = max(1, tamanho)
+        self._vagas = threading.BoundedSemaphore(self.tamanho)
+        self._livres = [] # Processos ociosos (LIFO: reaproveita o mais "quente")
+        self._lock = threading.Lock()
+
+    def _obter(self) -> ProcessoPHP:
+        self._vagas.acquire()
+        with self._lock:
+            processo = self._livres.pop() if self._livres else None
+        if processo is None or not processo.vivo:
+            if processo is not None:
+                processo.encerrar()
+            try:
+                processo = ProcessoPHP()
+            except Exception:
+                self._vagas.release()
+                raise
+        return processo
+
+    def _devolver(self, processo: ProcessoPHP):
+        if processo.vivo and processo.operacoes < MAX_OPERACOES_POR_PROCESSO:
+            with self._lock:
+                self._livres.append(processo)
+        else:
+            processo.encerrar()
+        self._vagas.release()
+
+    def executar(self, op: str, dados: dict, pfx: Optional[bytes] = None, senha: Optional[str] = None,
+                 timeout: float = TIMEOUT_PADRAO) -> dict:
+        """Executa uma operação do worker.php e devolve o 'resultado' (mesmo JSON dos scripts CLI)."""
+        processo = self._obter()
+        try:
+            return processo.executar(op, dados, pfx, senha, timeout)
+        finally:
+            self._devolver(processo)
+
+    def encerrar(self):
+        with self._lock:
+            livres, self._livres = self._livres, []
+        for processo in livres:
+            processo.encerrar()
+
+
+# Instância global (os processos sobem sob demanda)
+pool_php = PoolPHP()
@@ -0,0 +1,185 @@
+"""
+Resumos de vendas para os dashboards (rollups incrementais).
+
+Os gráficos agrupavam a tabela 'vendas' inteira (sem limite de data) a
+cada chamada. Agora cada venda concluída soma sua parte em três tabelas:
+
+    resumo_vendas_hora      (data, hora, pdv_id)  -> faturamento, quantidade_vendas
+    resumo_vendas_produto   (data, produto_id)    -> quantidade, faturamento
+    resumo_vendas_operador  (data, operador_id)   -> faturamento, quantidade_vendas
+
+com 'INSERT ... ON CONFLICT DO UPDATE SET col = col + excluded.col', na
+mesma transação da venda. As rotas leem só os dias pedidos. 'data' e 'hora'
+são do fuso da loja (utils/periodos.py), não UTC.
+
+'reconstruir' refaz um intervalo a partir do histórico (carga inicial ou
+correção): python reconstruir_resumos.py --inicio 2025-01-01
+
+Hoje nenhuma rota estorna venda já concluída (só as 'em_andamento', que
+nunca entraram aqui). Quem criar esse estorno precisa tirar a venda dos
+resumos na mesma transação, ou rodar 'reconstruir' para o dia dela.
+"""
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..utils import periodos
+
+
+def _upsert_incremento(db: Session, modelo, chaves: Tuple[str, ...], linhas: List[dict], somar: Tuple[str, ...]):
+    """INSERT em lote; na colisão das chaves, soma as colunas 'somar'."""
+    if not linhas:
+        return
+
+    dialeto = db.get_bind().dialect.name
+    if dialeto == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as insert_dialeto
+    elif dialeto == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as insert_dialeto
+    else:
+        raise RuntimeError(f"Banco '{dialeto}' sem suporte a upsert nos resumos de vendas.")
+
+    stmt = insert_dialeto(modelo.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(chaves),
+        set_={col: modelo.__table__.c[col] + stmt.excluded[col] for col in somar},
+    )
+    db.execute(stmt, linhas)
+
+
+def registrar_venda(db: Session, venda: models.Venda):
+    """Venda concluída entra nos resumos (sem commit; mesma transação da venda)."""
+    momento = periodos.para_local(venda.data_hora or datetime.utcnow(), db)
+    dia = momento.date()
+
+    _upsert_incremento(
+        db, models.ResumoVendasHora, ("data", "hora", "pdv_id"),
+        [{
+            "data": dia,
+            "hora": momento.hour,
+            "pdv_id": venda.pdv_id,
+            "faturamento": venda.valor_total or 0.0,
+            "quantidade_vendas": 1,
+        }],
+        somar=("faturamento", "quantidade_vendas"),
+    )
+
+    if venda.operador_id:
+        _upsert_incremento(
+            db, models.ResumoVendasOperador, ("data", "operador_id"),
+            [{
+                "data": dia,
+                "operador_id": venda.operador_id,
+                "faturamento": venda.valor_total or 0.0,
+                "quantidade_vendas": 1,
+            }],
+            somar=("faturamento", "quantidade_vendas"),
+        )
+
+    por_produto: Dict[int, List[float]] = {}
+    for item in venda.itens:
+        if item.descricao_manual:
+            continue # "Diversos" não é produto cadastrado
+        acumulado = por_produto.setdefault(item.produto_id, [0.0, 0.0])
+        acumulado[0] += item.quantidade
+        acumulado[1] += item.quantidade * item.preco_unitario_na_venda
+
+    _upsert_incremento(
+        db, models.ResumoVendasProduto, ("data", "produto_id"),
+        [
+            {"data": dia, "produto_id": pid, "quantidade": qtd, "faturamento": valor}
+            for pid, (qtd, valor) in por_produto.items()
+        ],
+        somar=("quantidade", "faturamento"),
+    )
+
+
+def reconstruir(db: Session, inicio: Optional[date] = None, fim: Optional[date] = None) -> Tuple[int, int, int]:
+    """
+    Apaga e recalcula os resumos do intervalo [inicio, fim] (dias locais) a
+    partir das vendas concluídas (sem limites = tudo). Devolve (linhas por
+    hora, linhas por produto, linhas por operador). Sem commit.
+
+    O banco agrupa por hora UTC (portável, sem função de fuso); cada hora
+    UTC vira dia/hora local aqui e as linhas são somadas antes do insert.
+    """
+    tz = periodos.fuso_da_loja(db)
+    filtros_venda = [models.Venda.status == "concluida"]
+    if inicio:
+        filtros_venda.append(models.Venda.data_hora >= periodos.dia(inicio, tz).inicio)
+    if fim:
+        filtros_venda.append(models.Venda.data_hora < periodos.dia(fim, tz).fim)
+
+    for modelo in (models.ResumoVendasHora, models.ResumoVendasProduto, models.ResumoVendasOperador):
+        filtros = []
+        if inicio:
+            filtros.append(modelo.data >= inicio)
+        if fim:
+            filtros.append(modelo.data <= fim)
+        db.query(modelo).filter(*filtros).delete(synchronize_session=False)
+
+    dia_utc, hora_utc = periodos.hora_utc(models.Venda.data_hora)
+
+    por_hora: Dict[Tuple[date, int, int], List[float]] = {}
+    por_operador: Dict[Tuple[date, int], List[float]] = {}
+    for dia, hora, pdv_id, operador_id, total, quantidade in db.query(
+        dia_utc, hora_utc, models.Venda.pdv_id, models.Venda.operador_id,
+        func.sum(models.Venda.valor_total), func.count(models.Venda.id),
+    ).filter(*filtros_venda).group_by(dia_utc, hora_utc, models.Venda.pdv_id, models.Venda.operador_id):
+        local = periodos.hora_local(dia, hora, tz)
+        acumulado = por_hora.setdefault((local.date(), local.hour, pdv_id), [0.0, 0])
+        acumulado[0] += total or 0.0
+        acumulado[1] += quantidade
+        if operador_id:
+            acumulado = por_operador.setdefault((local.date(), operador_id), [0.0, 0])
+            acumulado[0] += total or 0.0
+            acumulado[1] += quantidade
+
+    por_produto: Dict[Tuple[date, int], List[float]] = {}
+    for dia, hora, produto_id, quantidade, total in db.query(
+        dia_utc, hora_utc, models.VendaItem.produto_id,
+        func.sum(models.VendaItem.quantidade),
+        func.sum(models.VendaItem.quantidade * models.VendaItem.preco_unitario_na_venda),
+    ).join(
+        models.Venda, models.VendaItem.venda_id == models.Venda.id
+    ).join(
+        # Só produtos cadastrados ("Diversos" usa um ID fictício)
+        models.Produto, models.VendaItem.produto_id == models.Produto.id
+    ).filter(
+        *filtros_venda, models.VendaItem.descricao_manual.is_(None)
+    ).group_by(dia_utc, hora_utc, models.VendaItem.produto_id):
+        local = periodos.hora_local(dia, hora, tz)
+        acumulado = por_produto.setdefault((local.date(), produto_id), [0.0, 0.0])
+        acumulado[0] += quantidade or 0.0
+        acumulado[1] += total or 0.0
+
+    _upsert_incremento(
+        db, models.ResumoVendasHora, ("data", "hora", "pdv_id"),
+        [
+            {"data": d, "hora": h, "pdv_id": pdv, "faturamento": total, "quantidade_vendas": qtd}
+            for (d, h, pdv), (total, qtd) in por_hora.items()
+        ],
+        somar=("faturamento", "quantidade_vendas"),
+    )
+    _upsert_incremento(
+        db, models.ResumoVendasProduto, ("data", "produto_id"),
+        [
+            {"data": d, "produto_id": pid, "quantidade": qtd, "faturamento": total}
+            for (d, pid), (qtd, total) in por_produto.items()
+        ],
+        somar=("quantidade", "faturamento"),
+    )
+
+    _upsert_incremento(
+        db, models.ResumoVendasOperador, ("data", "operador_id"),
+        [
+            {"data": d, "operador_id": op, "faturamento": total, "quantidade_vendas": qtd}
+            for (d, op), (total, qtd) in por_operador.items()
+        ],
+        somar=("faturamento", "quantidade_vendas"),
+    )
+
+    return len(por_hora), len(por_produto), len(por_operador)
@@ -1,87 +1,94 @@
-import xmltodict
-from datetime import datetime
-from typing import Dict, Any, List
+import zipfile
+from typing import Dict, Any, List, Optional, Tuple, Union
 
-def parse_nfe_xml(xml_content: str) -> Dict[str, Any]:
+from .leitor_nfe import LeitorNFe
+
+def parse_nfe_xml(xml_content: Union[bytes, str]) -> Dict[str, Any]:
     """
-    Transforma o conteúdo XML (<procNFe> ou <nfeProc>) de uma NFe baixada
-    pelo serviço DF-e em um objeto Python limpo e estruturado.
-    
+    Transforma o conteúdo XML (<procNFe>, <nfeProc> ou <NFe>) de uma NF-e
+    em um objeto Python limpo e estruturado.
+
+    A leitura é em fluxo (services/leitor_nfe): cada <det> é convertido e
+    descartado, sem montar a árvore inteira da nota em memória.
+
     Args:
-        xml_content: String XML bruta da NF-e completa.
-        
+        xml_content: XML bruto da NF-e (bytes do upload ou string).
+
     Returns:
         Um dicionário contendo 'header' e 'itens' da nota.
     """
     try:
-        # 1. Transforma XML em Dict
-        parsed = xmltodict.parse(xml_content)
-        
-        # 2. Navegação até a raiz <infNFe>
-        
-        # O DF-e retorna <procNFe> que contém a nota e o protocolo
-        if 'procNFe' in parsed:
-            # Estrutura: <procNFe> -> <NFe> -> <infNFe>
-            nfe_root = parsed['procNFe']['NFe']['infNFe']
-        
-        # Estrutura de sistemas antigos (ou upload direto)
-        elif 'nfeProc' in parsed:
-            nfe_root = parsed['nfeProc']['NFe']['infNFe']
-            
-        # Se veio a nota sem o protocolo
-        elif 'NFe' in parsed:
-            nfe_root = parsed['NFe']['infNFe']
-        
-        else:
-             raise ValueError("Estrutura XML de NF-e completa não reconhecida.")
+        leitor = LeitorNFe(xml_content)
+
+        itens: List[Dict[str, Any]] = []
+        for prod in leitor.itens():
+            itens.append({
+                "codigo_fornecedor": prod['codigo'],
+                # cEAN é o código de barras global (pode estar ausente)
+                "codigo_barras": prod['ean'] or 'SEM GTIN',
+                "nome": prod['descricao'],
+                "ncm": prod['ncm'],
+                "cfop": prod['cfop'],
+                "unidade": prod['unidade'],
+                "quantidade": prod['quantidade'],
+                "valor_unitario": prod['valor_unitario'],
+                "valor_total": prod['valor_total']
+                # Nota: Outras informações fiscais (ICMS, PIS/COFINS) devem ser
+                # extraídas no leitor se forem necessárias para o preview.
+            })
 
-        
-        # 3. Extrai Cabeçalho (Identificação e Emitente)
+        # O cabeçalho só está completo depois de percorrer os itens (o <total> vem após os <det>)
+        cabecalho = leitor.cabecalho
         header = {
-            # O @Id da infNFe é a chave de acesso (com o prefixo 'NFe')
-            "chave_acesso": nfe_root['@Id'].replace('NFe', ''),
-            "numero_nota": nfe_root['ide']['nNF'],
-            "serie": nfe_root['ide']['serie'],
+            "chave_acesso": cabecalho['chave_acesso'],
+            "numero_nota": cabecalho['numero_nota'],
+            "serie": cabecalho['serie'],
             # Data e hora de emissão
-            "data_emissao": nfe_root['ide']['dhEmi'], 
+            "data_emissao": cabecalho['data_emissao'],
             "emitente": {
-                "cnpj": nfe_root['emit']['CNPJ'],
-                "nome": nfe_root['emit']['xNome'],
-                "ie": nfe_root['emit'].get('IE', '')
+                "cnpj": cabecalho['emitente_cnpj'],
+                "nome": cabecalho['emitente_nome'],
+                "ie": cabecalho['emitente_ie'] or ''
             },
             # O valor total sempre deve ser float
-            "valor_total_nota": float(nfe_root['total']['ICMSTot']['vNF'])
+            "valor_total_nota": float(cabecalho['valor_total'])
         }
-        
-        # 4. Extrai Produtos (Itens)
-        detalhes = nfe_root['det']
-        # xmltodict retorna uma lista se houver vários, ou um dict se for só um. Normalizar é obrigatório.
-        if not isinstance(detalhes, list):
-            detalhes = [detalhes]
-            
-        itens: List[Dict[str, Any]] = []
-        for det in detalhes:
-            prod = det['prod']
-            
-            # Garantir que os campos que serão usados em cálculos sejam float
-            itens.append({
-                "codigo_fornecedor": prod['cProd'],
-                # cEAN é o código de barras global (pode estar ausente)
-                "codigo_barras": prod.get('cEAN', 'SEM GTIN'), 
-                "nome": prod['xProd'],
-                "ncm": prod['NCM'],
-                "cfop": prod['CFOP'],
-                "unidade": prod['uCom'],
-                "quantidade": float(prod['qCom']),
-                "valor_unitario": float(prod['vUnCom']),
-                "valor_total": float(prod['vProd'])
-                # Nota: Outras informações fiscais (ICMS, PIS/COFINS) devem ser 
-                # extraídas aqui se forem necessárias para o preview.
-            })
-            
+
         return { "header": header, "itens": itens }
 
     except Exception as e:
         print(f"Erro ao parsear XML: {e}")
         # Lançar um erro genérico com mais contexto
-        raise ValueError(f"Falha ao interpretar a estrutura XML da NF-e: {e}")
\ No newline at end of file
+        raise ValueError(f"Falha ao interpretar a estrutura XML da NF-e: {e}")
+
+
+def ler_documentos(origens: List[Tuple[str, Optional[str]]]) -> List[Dict[str, Any]]:
+    """
+    Lê um grupo de XMLs do disco para a importação em lote (roda no pool de
+    processos, por isso este módulo não importa banco nem models).
+
+    Cada origem é (caminho, membro): membro é o nome dentro do ZIP, ou None
+    para um .xml solto. Devolve, na mesma ordem, o parse_nfe_xml + 'xml'
+    (texto para gravar na nota) ou {'erro': ...} para o arquivo que falhou.
+    """
+    resultados = []
+    zips: Dict[str, zipfile.ZipFile] = {}
+    try:
+        for caminho, membro in origens:
+            try:
+                if membro is None:
+                    with open(caminho, "rb") as arquivo:
+                        conteudo = arquivo.read()
+                else:
+                    if caminho not in zips:
+                        zips[caminho] = zipfile.ZipFile(caminho)
+                    conteudo = zips[caminho].read(membro)
+                dados = parse_nfe_xml(conteudo)
+                dados["xml"] = conteudo.decode("utf-8", errors="replace")
+                resultados.append(dados)
+            except Exception as e:
+                resultados.append({"erro": str(e)})
+    finally:
+        for arquivo_zip in zips.values():
+            arquivo_zip.close()
+    return resultados
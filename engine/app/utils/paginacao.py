@@ -0,0 +1,116 @@
+"""
+Paginação por cursor (keyset) para as rotas de listagem.
+
+As listas devolviam a tabela inteira (ou usavam OFFSET, que lê e descarta
+todas as linhas anteriores). Aqui cada página continua de onde a outra
+parou: WHERE (chave, id) > (:ultima_chave, :ultimo_id) ORDER BY chave, id
+LIMIT n. O custo de qualquer página é o mesmo da primeira (com índice na
+chave de ordenação).
+
+Na rota:
+
+    @router.get("/", response_model=List[schemas.ProdutoLista])
+    def listar(pagina: Paginacao = Depends(), db: Session = Depends(get_db)):
+        query = db.query(models.Produto.id, models.Produto.nome, ...)
+        return pagina.aplicar(query, ORDENACOES, padrao="nome", chave_id=models.Produto.id)
+
+Parâmetros: ?limite=100&ordem=-data_hora&cursor=...  ('-' = decrescente).
+O corpo continua sendo a lista; o cursor da próxima página vem no
+cabeçalho X-Proximo-Cursor (ausente na última página). O cursor é opaco
+para o cliente e só vale para a mesma ordenação.
+"""
+import base64
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+import orjson
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import literal, tuple_
+
+PAGINA_PADRAO = 100
+PAGINA_MAXIMA = 1000
+CABECALHO_CURSOR = "X-Proximo-Cursor"
+
+
+def _tipo_python(expressao) -> Optional[type]:
+    try:
+        return expressao.type.python_type
+    except NotImplementedError:
+        return None
+
+
+def codificar_cursor(ordem: str, valor: Any, ultimo_id: int) -> str:
+    bruto = orjson.dumps([ordem, valor, ultimo_id])
+    return base64.urlsafe_b64encode(bruto).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str, ordem: str, expressao) -> tuple:
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        ordem_cursor, valor, ultimo_id = orjson.loads(bruto)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor de paginação inválido.")
+
+    if ordem_cursor != ordem:
+        raise HTTPException(status_code=400, detail="Cursor gerado para outra ordenação. Recomece sem cursor.")
+
+    # JSON não tem data: volta ao tipo da coluna para comparar no banco
+    tipo = _tipo_python(expressao)
+    if valor is not None and tipo is datetime:
+        valor = datetime.fromisoformat(valor)
+    elif valor is not None and tipo is date:
+        valor = date.fromisoformat(valor)
+    return valor, ultimo_id
+
+
+class Paginacao:
+    """Dependência: lê ?limite, ?cursor e ?ordem e grava o cabeçalho da próxima página."""
+
+    def __init__(
+        self,
+        response: Response,
+        limite: int = Query(PAGINA_PADRAO, ge=1, le=PAGINA_MAXIMA),
+        cursor: Optional[str] = None,
+        ordem: Optional[str] = None,
+    ):
+        self.response = response
+        self.limite = limite
+        self.cursor = cursor
+        self.ordem = ordem
+
+    def aplicar(self, query, ordenacoes: Dict[str, Any], padrao: str, chave_id) -> List:
+        """
+        Ordena, filtra pelo cursor e limita a 'query' (de colunas, não de
+        entidades). 'ordenacoes' mapeia o nome aceito em ?ordem para a
+        coluna/expressão; a chave deve ser NOT NULL (use coalesce senão).
+        """
+        ordem = self.ordem or padrao
+        decrescente = ordem.startswith("-")
+        campo = ordem.lstrip("-")
+        if campo not in ordenacoes:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Ordenação inválida: '{campo}'. Use: {', '.join(sorted(ordenacoes))} (prefixo '-' para decrescente)."
+            )
+        expressao = ordenacoes[campo]
+
+        if self.cursor:
+            valor, ultimo_id = decodificar_cursor(self.cursor, ordem, expressao)
+            chave = tuple_(expressao, chave_id)
+            limite = tuple_(literal(valor, type_=expressao.type), literal(ultimo_id))
+            query = query.filter(chave < limite if decrescente else chave > limite)
+
+        if decrescente:
+            query = query.order_by(expressao.desc(), chave_id.desc())
+        else:
+            query = query.order_by(expressao.asc(), chave_id.asc())
+
+        linhas = query.add_columns(
+            expressao.label("chave_ordem"), chave_id.label("chave_id")
+        ).limit(self.limite + 1).all()
+
+        if len(linhas) > self.limite:
+            linhas = linhas[:self.limite]
+            ultima = linhas[-1]
+            self.response.headers[CABECALHO_CURSOR] = codificar_cursor(ordem, ultima.chave_ordem, ultima.chave_id)
+        return linhas
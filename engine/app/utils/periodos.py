@@ -0,0 +1,133 @@
+"""
+Períodos de relatório no fuso da loja.
+
+As colunas de data/hora ('vendas.data_hora', 'movimentacoes_caixa.data_hora',
+...) guardam UTC sem fuso (default=datetime.utcnow). Os relatórios filtravam
+com 'func.date(coluna) == date.today()', 'cast(coluna, Date)' ou
+'extract(month, coluna)': a função em volta da coluna impede o uso do índice
+(varre a tabela) e o "dia" era o do UTC (ou do relógio do servidor), não o
+da loja (Empresa.fuso_horario).
+
+Aqui "hoje", "este mês" ou "de X a Y" no fuso da loja viram um intervalo
+semiaberto em UTC, [inicio, fim), que o banco resolve por faixa de índice:
+
+    p = periodos.hoje(db)
+    db.query(...).filter(p.contem(models.Venda.data_hora))
+
+Para agrupar por dia/hora local sem função de fuso no banco (SQLite não tem),
+agrupe pela hora UTC com 'hora_utc(coluna)' e converta com 'hora_local'.
+"""
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+from typing import Optional, Union
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import and_, extract, func
+from sqlalchemy.orm import Session
+
+from ..services import config_empresa
+
+FUSO_PADRAO = "America/Sao_Paulo"
+
+
+@dataclass(frozen=True)
+class Intervalo:
+    """[inicio, fim) em UTC sem fuso, no mesmo formato das colunas."""
+    inicio: datetime
+    fim: datetime
+
+    def contem(self, coluna):
+        return and_(coluna >= self.inicio, coluna < self.fim)
+
+
+@lru_cache(maxsize=32)
+def fuso(nome: Optional[str]) -> ZoneInfo:
+    try:
+        return ZoneInfo(nome or FUSO_PADRAO)
+    except (ZoneInfoNotFoundError, ValueError):
+        print(f"⚠️ [Períodos] Fuso '{nome}' inválido. Usando {FUSO_PADRAO}.")
+        return ZoneInfo(FUSO_PADRAO)
+
+
+def fuso_da_loja(db: Session) -> ZoneInfo:
+    config = config_empresa.obter(db)
+    return fuso(config.fuso_horario if config else None)
+
+
+def _resolver(tz: Union[Session, ZoneInfo, None]) -> ZoneInfo:
+    if isinstance(tz, ZoneInfo):
+        return tz
+    if tz is None:
+        return fuso(None)
+    return fuso_da_loja(tz)
+
+
+def agora_local(tz: Union[Session, ZoneInfo, None] = None) -> datetime:
+    return datetime.now(_resolver(tz))
+
+
+def hoje_local(tz: Union[Session, ZoneInfo, None] = None) -> date:
+    return agora_local(tz).date()
+
+
+def para_utc(momento_local: datetime) -> datetime:
+    """Data/hora com fuso -> UTC sem fuso (formato das colunas)."""
+    return momento_local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def para_local(momento_utc: datetime, tz: Union[Session, ZoneInfo, None] = None) -> datetime:
+    """UTC sem fuso (como vem do banco) -> data/hora no fuso da loja."""
+    return momento_utc.replace(tzinfo=timezone.utc).astimezone(_resolver(tz))
+
+
+def dias(inicio: date, fim: date, tz: Union[Session, ZoneInfo, None] = None) -> Intervalo:
+    """Do começo de 'inicio' ao fim de 'fim' (inclusive), dias locais."""
+    z = _resolver(tz)
+    return Intervalo(
+        para_utc(datetime.combine(inicio, time.min, tzinfo=z)),
+        para_utc(datetime.combine(fim + timedelta(days=1), time.min, tzinfo=z)),
+    )
+
+
+def dia(referencia: date, tz: Union[Session, ZoneInfo, None] = None) -> Intervalo:
+    return dias(referencia, referencia, tz)
+
+
+def hoje(tz: Union[Session, ZoneInfo, None] = None) -> Intervalo:
+    z = _resolver(tz)
+    return dia(hoje_local(z), z)
+
+
+def mes(referencia: Optional[date] = None, tz: Union[Session, ZoneInfo, None] = None) -> Intervalo:
+    """Mês (local) que contém 'referencia'; padrão: mês corrente."""
+    z = _resolver(tz)
+    referencia = referencia or hoje_local(z)
+    primeiro = referencia.replace(day=1)
+    proximo = (primeiro + timedelta(days=32)).replace(day=1)
+    return dias(primeiro, proximo - timedelta(days=1), z)
+
+
+def ultimos_dias(quantidade: int, tz: Union[Session, ZoneInfo, None] = None) -> Intervalo:
+    """Os últimos 'quantidade' dias locais, incluindo hoje."""
+    z = _resolver(tz)
+    fim = hoje_local(z)
+    return dias(fim - timedelta(days=quantidade - 1), fim, z)
+
+
+def hora_utc(coluna):
+    """
+    Expressões (dia UTC, hora UTC) para GROUP BY portável. Funciona em
+    PostgreSQL e SQLite; a conversão para o fuso é feita em 'hora_local'.
+    """
+    return func.date(coluna), extract("hour", coluna)
+
+
+def hora_local(dia_utc: Union[date, str], hora: int, tz: Union[Session, ZoneInfo, None] = None) -> datetime:
+    """
+    Converte a chave de 'hora_utc' no início da hora local. Fusos com
+    deslocamento de meia hora caem na hora cheia anterior.
+    """
+    if isinstance(dia_utc, str): # SQLite devolve 'AAAA-MM-DD'
+        dia_utc = date.fromisoformat(dia_utc)
+    return para_local(datetime.combine(dia_utc, time(int(hora))), tz).replace(minute=0)
@@ -1,36 +1,182 @@
 # app/websockets.py
-from typing import List
-from fastapi import WebSocket, WebSocketDisconnect
+"""
+Canal em tempo real com assinatura por tópico.
+
+Tópicos:
+    pdv:{id}    eventos de UM caixa (resposta de solicitação, status da NFC-e)
+    gerentes    painel de PDVs (novas solicitações, resoluções)
+    fiscal      fila de emissão e jobs em lote
+    *           tudo (clientes antigos, que filtravam no navegador)
+
+O cliente escolhe na conexão (/solicitacoes/ws?topicos=pdv:3,gerentes) e
+pode mudar depois mandando {"acao": "assinar" | "cancelar", "topicos": [...]}.
+Sem o parâmetro 'topicos' a conexão assina '*' (comportamento anterior).
+
+Cada conexão tem sua fila (limitada) e sua tarefa escritora: publicar só
+serializa uma vez (orjson) e enfileira para quem assina o tópico. Cliente
+lento que enche a fila é derrubado (o frontend reconecta sozinho) em vez
+de segurar o envio para os outros.
+"""
+from typing import Dict, Iterable, Optional, Set
+from fastapi import WebSocket
+import asyncio
 import json
+import orjson
+
+TOPICO_TODOS = "*"
+TOPICOS_FIXOS = {"gerentes", "fiscal", TOPICO_TODOS}
+TAMANHO_FILA = 100 # mensagens pendentes por conexão antes de derrubar
+
+
+def topico_pdv(pdv_id: int) -> str:
+    return f"pdv:{pdv_id}"
+
+
+def topico_valido(topico: str) -> bool:
+    if topico in TOPICOS_FIXOS:
+        return True
+    prefixo, _, pdv_id = topico.partition(":")
+    return prefixo == "pdv" and pdv_id.isdigit()
+
+
+class Conexao:
+    """Um socket, os tópicos que ele assina e sua fila de saída."""
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.topicos: Set[str] = set()
+        self.fila: asyncio.Queue = asyncio.Queue(maxsize=TAMANHO_FILA)
+        self.escritor: Optional[asyncio.Task] = None
+
 
 class ConnectionManager:
     def __init__(self):
-        # Lista de todas as conexões ativas (PDVs e Painéis de Gerente)
-        self.active_connections: List[WebSocket] = []
+        # Conexões ativas (PDVs e Painéis de Gerente)
+        self.conexoes: Dict[WebSocket, Conexao] = {}
+        # Índice tópico -> conexões (o custo de publicar é o nº de interessados)
+        self.assinantes: Dict[str, Set[Conexao]] = {}
+        # Loop do servidor, para enviar a partir de threads (workers/jobs)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
 
-    async def connect(self, websocket: WebSocket):
+    async def connect(self, websocket: WebSocket, topicos: Optional[Iterable[str]] = None):
         await websocket.accept()
-        self.active_connections.append(websocket)
-        print(f"🔌 Nova conexão WebSocket. Total: {len(self.active_connections)}")
+        conexao = Conexao(websocket)
+        self.conexoes[websocket] = conexao
+        self.assinar(websocket, [TOPICO_TODOS] if topicos is None else topicos)
+        conexao.escritor = asyncio.create_task(self._escrever(conexao))
+        print(f"🔌 Nova conexão WebSocket {sorted(conexao.topicos)}. Total: {len(self.conexoes)}")
 
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-            print(f"🔌 Conexão fechada. Restam: {len(self.active_connections)}")
+        conexao = self.conexoes.pop(websocket, None)
+        if conexao is None:
+            return
+        for topico in conexao.topicos:
+            assinantes = self.assinantes.get(topico)
+            if assinantes is not None:
+                assinantes.discard(conexao)
+                if not assinantes:
+                    del self.assinantes[topico]
+        if conexao.escritor is not None and conexao.escritor is not asyncio.current_task():
+            conexao.escritor.cancel()
+        print(f"🔌 Conexão fechada. Restam: {len(self.conexoes)}")
+
+    def assinar(self, websocket: WebSocket, topicos: Iterable[str]):
+        conexao = self.conexoes.get(websocket)
+        if conexao is None:
+            return
+        for topico in topicos:
+            if not topico_valido(topico):
+                print(f"⚠️ [WebSocket] Tópico desconhecido ignorado: '{topico}'")
+                continue
+            conexao.topicos.add(topico)
+            self.assinantes.setdefault(topico, set()).add(conexao)
+
+    def cancelar(self, websocket: WebSocket, topicos: Iterable[str]):
+        conexao = self.conexoes.get(websocket)
+        if conexao is None:
+            return
+        for topico in topicos:
+            conexao.topicos.discard(topico)
+            assinantes = self.assinantes.get(topico)
+            if assinantes is not None:
+                assinantes.discard(conexao)
+                if not assinantes:
+                    del self.assinantes[topico]
+
+    def receber(self, websocket: WebSocket, texto: str):
+        """Mensagens do cliente: assinar/cancelar tópicos. O resto (ping) é ignorado."""
+        try:
+            mensagem = json.loads(texto)
+        except ValueError:
+            return
+        if not isinstance(mensagem, dict):
+            return
+        topicos = [t for t in mensagem.get("topicos") or [] if isinstance(t, str)]
+        if mensagem.get("acao") == "assinar":
+            self.assinar(websocket, topicos)
+        elif mensagem.get("acao") == "cancelar":
+            self.cancelar(websocket, topicos)
+
+    async def _escrever(self, conexao: Conexao):
+        """Tarefa escritora da conexão: esvazia a fila no ritmo do cliente."""
+        try:
+            while True:
+                texto = await conexao.fila.get()
+                await conexao.websocket.send_text(texto)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Erro ao enviar socket, removendo conexão morta: {e}")
+            self.disconnect(conexao.websocket)
+
+    def _derrubar(self, conexao: Conexao):
+        print(f"🐢 [WebSocket] Cliente lento ({TAMANHO_FILA} mensagens pendentes). Derrubando conexão.")
+        self.disconnect(conexao.websocket)
+        asyncio.get_running_loop().create_task(self._fechar(conexao.websocket))
 
-    async def broadcast(self, message: dict):
+    @staticmethod
+    async def _fechar(websocket: WebSocket):
+        try:
+            await websocket.close(code=1013) # "Try again later": o frontend reconecta
+        except Exception:
+            pass
+
+    def publicar(self, topicos: Iterable[str], message: dict):
         """
-        Envia um dicionário como JSON para TODOS os conectados.
-        O frontend decide se a mensagem é para ele ou não.
+        Enfileira a mensagem para quem assina algum dos tópicos (ou '*').
+        Não espera nenhum cliente. Chamar dentro do event loop.
         """
-        payload = json.dumps(message)
-        # Itera sobre uma cópia da lista para evitar erros se uma conexão cair durante o loop
-        for connection in self.active_connections[:]:
+        destinatarios = set(self.assinantes.get(TOPICO_TODOS, ()))
+        for topico in topicos:
+            destinatarios.update(self.assinantes.get(topico, ()))
+        self._enfileirar(destinatarios, message)
+
+    def broadcast(self, message: dict):
+        """Para todas as conexões, assinem o que assinarem (ex: configuração da empresa)."""
+        self._enfileirar(list(self.conexoes.values()), message)
+
+    def _enfileirar(self, destinatarios: Iterable[Conexao], message: dict):
+        destinatarios = list(destinatarios)
+        if not destinatarios:
+            return
+        payload = orjson.dumps(message).decode() # Serializa uma vez para todos
+        for conexao in destinatarios:
             try:
-                await connection.send_text(payload)
-            except Exception as e:
-                print(f"Erro ao enviar socket, removendo conexão morta: {e}")
-                self.disconnect(connection)
+                conexao.fila.put_nowait(payload)
+            except asyncio.QueueFull:
+                self._derrubar(conexao)
+
+    def publicar_threadsafe(self, topicos: Iterable[str], message: dict):
+        """Versão do publicar para código que roda fora do event loop (threads)."""
+        if self.loop is None or self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self.publicar, tuple(topicos), message)
+
+    def broadcast_threadsafe(self, message: dict):
+        """Versão do broadcast para código que roda fora do event loop (threads)."""
+        if self.loop is None or self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self.broadcast, message)
 
 # Instância global
-manager = ConnectionManager()
\ No newline at end of file
+manager = ConnectionManager()
@@ -0,0 +1,138 @@
+"""
+Benchmark: latência da busca de produtos por texto (services/busca_produtos)
+com um catálogo grande. Meta: p95 abaixo de 20 ms com 100 mil produtos.
+
+Mede a consulta direto no banco de DATABASE_URL (sem HTTP), termo a termo.
+Com --popular, cadastra produtos sintéticos antes (código de barras com
+prefixo 990, removidos no final; --manter para reaproveitar na próxima
+rodada). Rode contra um banco de desenvolvimento, nunca o da loja.
+
+Uso (a partir da pasta engine/):
+    python -m benchmarks.bench_busca_produtos --popular 100000
+    python -m benchmarks.bench_busca_produtos --explain "coca 2l"
+"""
+import argparse
+import random
+import statistics
+import time
+
+from sqlalchemy import insert, text
+
+from app import migrations, models
+from app.database import SessionLocal, engine
+from app.services import busca_produtos
+
+PREFIXO_CODIGO = "990"
+META_MS = 20.0
+LOTE = 5000
+
+MARCAS = ["Coca-Cola", "Guaraná Antarctica", "Tio João", "Camil", "Sadia", "Perdigão", "Nestlé", "Ypê",
+          "Omo", "Pilão", "Melitta", "Qualy", "Itambé", "Piracanjuba", "Bauducco", "Nissin", "Heinz"]
+TIPOS = ["Refrigerante", "Arroz", "Feijão", "Café", "Leite", "Margarina", "Biscoito", "Macarrão",
+         "Detergente", "Sabão em pó", "Molho de tomate", "Achocolatado", "Suco", "Água mineral", "Iogurte"]
+TAMANHOS = ["2L", "1L", "350ml", "500g", "1kg", "5kg", "200g", "600ml", "Lata", "Pet", "Caixa 12un"]
+CATEGORIAS = ["Bebidas", "Mercearia", "Limpeza", "Laticínios", "Matinais", "Frios"]
+
+TERMOS_PADRAO = ["coca 2l", "arroz 5kg", "cafe pilao", "refrigerantes", "leite", "biscoito bauduco",
+                 "sab", "macarrao nissin", "limpeza ype", "achocolatado nestle 200g"]
+
+
+def popular(quantidade: int):
+    """Cadastra 'quantidade' produtos sintéticos (em lotes, para a trigger de busca preencher)."""
+    aleatorio = random.Random(42)
+    fornecedor = models.Fornecedor(nome="Distribuidora Benchmark", cnpj=f"{PREFIXO_CODIGO}00000000000")
+    with SessionLocal() as db:
+        db.add(fornecedor)
+        db.flush()
+        inicio = time.perf_counter()
+        for base in range(0, quantidade, LOTE):
+            linhas = []
+            for i in range(base, min(base + LOTE, quantidade)):
+                linhas.append({
+                    "nome": f"{aleatorio.choice(TIPOS)} {aleatorio.choice(MARCAS)} {aleatorio.choice(TAMANHOS)} #{i}",
+                    "categoria": aleatorio.choice(CATEGORIAS),
+                    "codigo_barras": f"{PREFIXO_CODIGO}{i:010d}",
+                    "preco_venda": round(aleatorio.uniform(1, 80), 2),
+                    "quantidade_estoque": aleatorio.randint(0, 200),
+                    "fornecedor_id": fornecedor.id if i % 3 == 0 else None,
+                })
+            db.execute(insert(models.Produto), linhas)
+        db.commit()
+        print(f"📦 {quantidade} produtos cadastrados em {time.perf_counter() - inicio:.1f}s")
+    if engine.dialect.name == "postgresql":
+        # Estatísticas novas para o planejador (VACUUM não roda dentro de transação)
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM ANALYZE produtos"))
+
+
+def limpar():
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM produtos WHERE codigo_barras LIKE :p"), {"p": f"{PREFIXO_CODIGO}%"})
+        conn.execute(text("DELETE FROM fornecedores WHERE cnpj LIKE :p"), {"p": f"{PREFIXO_CODIGO}%"})
+
+
+def medir(termos, repeticoes: int) -> list:
+    resultados = []
+    with SessionLocal() as db:
+        for termo in termos:
+            busca_produtos.buscar(db, termo) # Aquecimento (cache de páginas/plano)
+            tempos = []
+            for _ in range(repeticoes):
+                inicio = time.perf_counter()
+                achados = busca_produtos.buscar(db, termo)
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            tempos.sort()
+            p95 = tempos[max(int(len(tempos) * 0.95) - 1, 0)]
+            resultados.append(p95)
+            primeiro = achados[0].nome if achados else "-"
+            print(f"{termo:<28} p50 {statistics.median(tempos):>7.2f} ms  p95 {p95:>7.2f} ms  "
+                  f"{len(achados):>3} achados  1º: {primeiro}")
+    return resultados
+
+
+def explicar(termo: str):
+    tokens = busca_produtos.palavras(termo)
+    parametros = {
+        "consulta": " & ".join(f"{t}:*" for t in tokens), "termo": " ".join(tokens),
+        "bruto": termo.strip(), "categoria": None, "limite": busca_produtos.LIMITE_PADRAO,
+        "candidatos": busca_produtos.MAX_CANDIDATOS,
+    }
+    with engine.connect() as conn:
+        plano = conn.execute(text("EXPLAIN ANALYZE " + busca_produtos._SQL_POSTGRES.text), parametros)
+        for (linha,) in plano:
+            print(linha)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--popular", type=int, default=0, help="Cadastra N produtos sintéticos antes de medir")
+    parser.add_argument("--manter", action="store_true", help="Não remove os produtos sintéticos no final")
+    parser.add_argument("--repeticoes", type=int, default=50, help="Execuções por termo")
+    parser.add_argument("--explain", metavar="TERMO", help="Mostra o plano (EXPLAIN ANALYZE) de um termo e sai")
+    parser.add_argument("termos", nargs="*", help=f"Termos buscados (padrão: {len(TERMOS_PADRAO)} termos típicos)")
+    args = parser.parse_args()
+
+    # Mesmo preparo do startup do app: tabelas + colunas, trigger e índices de busca
+    migrations.aplicar(engine)
+    if args.explain:
+        explicar(args.explain)
+        return
+
+    if args.popular:
+        popular(args.popular)
+    try:
+        with SessionLocal() as db:
+            quantidade = db.query(models.Produto).count()
+            modo = "índice (tsvector + trigram)" if busca_produtos._indice_pronto(db) else "ILIKE (sem índice)"
+        print(f"Banco: {engine.dialect.name} | {quantidade} produtos | modo: {modo}")
+
+        p95s = medir(args.termos or TERMOS_PADRAO, args.repeticoes)
+        pior = max(p95s)
+        print(f"\nPior p95: {pior:.2f} ms (meta: {META_MS:.0f} ms) {'✅' if pior <= META_MS else '❌'}")
+    finally:
+        if args.popular and not args.manter:
+            limpar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Benchmark de carga: requisições/segundo nas rotas quentes do PDV com 10, 50
+e 100 "caixas" simultâneos (lanes), cada um disparando em sequência.
+
+Rotas medidas (as que o PDV chama o tempo todo):
+    GET /produtos/barcode/{codigo}        (consulta de preço / bip)
+    GET /pdvs/{pdv}/session               (polling da sessão)
+    GET /vendas/pdvs/{pdv}/venda-ativa    (recuperação do carrinho; 404 conta como resposta)
+
+Mede o servidor que estiver rodando em --url. Para comparar antes/depois
+da camada assíncrona, rode na versão antiga e na nova com o mesmo banco:
+
+    # versão anterior (rotas 'def' + threadpool)
+    uvicorn app.main:app --port 8000
+    python -m benchmarks.bench_carga_pdv --saida antes.json
+
+    # versão atual (rotas 'async def' + asyncpg)
+    uvicorn app.main:app --port 8000
+    python -m benchmarks.bench_carga_pdv --comparar antes.json
+
+Sem --codigo, usa o primeiro produto com código de barras de GET /produtos/.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+LANES_PADRAO = (10, 50, 100)
+
+
+def montar_rotas(codigo: str, pdv_id: int):
+    return {
+        "barcode": f"/produtos/barcode/{codigo}",
+        "sessao": f"/pdvs/{pdv_id}/session",
+        "venda-ativa": f"/vendas/pdvs/{pdv_id}/venda-ativa",
+    }
+
+
+async def descobrir_codigo(cliente: httpx.AsyncClient) -> str:
+    resposta = await cliente.get("/produtos/")
+    resposta.raise_for_status()
+    for produto in resposta.json():
+        if produto.get("codigo_barras"):
+            return produto["codigo_barras"]
+    raise SystemExit("Nenhum produto com código de barras cadastrado. Informe --codigo.")
+
+
+async def medir(cliente: httpx.AsyncClient, caminho: str, lanes: int, duracao: float) -> dict:
+    """Cada lane faz uma requisição atrás da outra até o fim do tempo."""
+    fim = time.perf_counter() + duracao
+    respostas = 0
+    erros = 0
+    latencias = []
+
+    async def lane():
+        nonlocal respostas, erros
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            try:
+                resposta = await cliente.get(caminho)
+                if resposta.status_code >= 500:
+                    erros += 1
+                    continue
+            except httpx.HTTPError:
+                erros += 1
+                continue
+            latencias.append(time.perf_counter() - inicio)
+            respostas += 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(lane() for _ in range(lanes)))
+    decorrido = time.perf_counter() - inicio
+
+    latencias.sort()
+    p95 = latencias[int(len(latencias) * 0.95) - 1] if latencias else 0.0
+    return {
+        "req_s": respostas / decorrido,
+        "p95_ms": p95 * 1000,
+        "erros": erros,
+    }
+
+
+def _cliente(url: str, lanes: int) -> httpx.AsyncClient:
+    limites = httpx.Limits(max_connections=lanes, max_keepalive_connections=lanes)
+    return httpx.AsyncClient(base_url=url, limits=limites, timeout=30)
+
+
+async def executar(args) -> dict:
+    async with _cliente(args.url, min(args.lanes)) as cliente:
+        codigo = args.codigo or await descobrir_codigo(cliente)
+        rotas = montar_rotas(codigo, args.pdv)
+
+        # Aquecimento: índice de produtos carregado e pools de conexão abertos
+        for caminho in rotas.values():
+            await medir(cliente, caminho, min(args.lanes), 1.0)
+
+    resultados = {}
+    for nome, caminho in rotas.items():
+        for lanes in args.lanes:
+            # Cliente novo por nível: as 100 conexões da rodada anterior deixavam a
+            # seguinte lenta por alguns segundos (no cliente, não no servidor)
+            async with _cliente(args.url, lanes) as cliente:
+                r = await medir(cliente, caminho, lanes, args.duracao)
+            resultados[f"{nome}@{lanes}"] = r
+            print(f"{nome:<12} {lanes:>4} lanes  {r['req_s']:>9.1f} req/s  p95 {r['p95_ms']:>7.1f} ms  erros: {r['erros']}")
+    return resultados
+
+
+def comparar(antes: dict, depois: dict):
+    print()
+    print(f"{'rota@lanes':<18} {'antes':>10} {'depois':>10} {'ganho':>7}")
+    for chave, r in depois.items():
+        if chave not in antes:
+            continue
+        anterior = antes[chave]["req_s"]
+        ganho = r["req_s"] / anterior if anterior else float("inf")
+        print(f"{chave:<18} {anterior:>10.1f} {r['req_s']:>10.1f} {ganho:>6.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--codigo", help="Código de barras consultado (padrão: primeiro produto cadastrado)")
+    parser.add_argument("--pdv", type=int, default=1, help="ID do PDV consultado")
+    parser.add_argument("--lanes", type=int, nargs="+", default=list(LANES_PADRAO), help="Níveis de concorrência")
+    parser.add_argument("--duracao", type=float, default=10.0, help="Segundos por rota/nível")
+    parser.add_argument("--saida", help="Grava os resultados em JSON (ex: antes.json)")
+    parser.add_argument("--comparar", help="JSON de uma rodada anterior para mostrar o ganho")
+    args = parser.parse_args()
+
+    print(f"Servidor: {args.url} | {args.duracao:.0f}s por rota/nível")
+    resultados = asyncio.run(executar(args))
+
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump(resultados, f, indent=2)
+    if args.comparar:
+        with open(args.comparar) as f:
+            comparar(json.load(f), resultados)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Benchmark: leitura de NF-e no upload de XML e na distribuição DF-e, antes
+(xmltodict / parse do envelope + descompactar para string + parse de novo
++ limpar namespaces) e depois (services/leitor_nfe, iterparse em fluxo).
+
+Gera notas sintéticas com 1, 100 e 1000 itens (--linhas para outros
+tamanhos) e mede, para cada leitura:
+- tempo médio por nota;
+- memória extra de pico (RSS) da leitura, medida num interpretador novo
+  (spawn) para cada caso, com o pico zerado logo antes da leitura
+  (/proc/self/clear_refs, só Linux). Inclui a memória da libxml2, que o
+  tracemalloc não vê.
+
+Não usa banco nem SEFAZ.
+
+Uso (a partir da pasta engine/):
+    python -m benchmarks.bench_leitor_nfe
+    python -m benchmarks.bench_leitor_nfe --linhas 1 100 1000 10000 --repeticoes 20
+"""
+import argparse
+import base64
+import gzip
+import io
+import gc
+import multiprocessing
+import time
+
+import xmltodict
+from lxml import etree
+
+from app.services import leitor_nfe, xml_service
+
+NS = "http://www.portalfiscal.inf.br/nfe"
+
+
+def gerar_nota(linhas: int) -> bytes:
+    """nfeProc com 'linhas' itens, no formato da SEFAZ (com namespace e impostos)."""
+    dets = []
+    for i in range(linhas):
+        dets.append(
+            f'<det nItem="{i + 1}"><prod><cProd>{i:06d}</cProd><cEAN>{7891000000000 + i}</cEAN>'
+            f'<xProd>PRODUTO SINTETICO DE TESTE NUMERO {i}</xProd><NCM>22021000</NCM><CFOP>5102</CFOP>'
+            f'<uCom>UN</uCom><qCom>12.0000</qCom><vUnCom>3.4900000000</vUnCom><vProd>41.88</vProd>'
+            f'<cEANTrib>{7891000000000 + i}</cEANTrib><uTrib>UN</uTrib><qTrib>12.0000</qTrib>'
+            f'<vUnTrib>3.4900000000</vUnTrib><indTot>1</indTot></prod>'
+            f'<imposto><ICMS><ICMS00><orig>0</orig><CST>00</CST><modBC>3</modBC><vBC>41.88</vBC>'
+            f'<pICMS>18.00</pICMS><vICMS>7.54</vICMS></ICMS00></ICMS>'
+            f'<PIS><PISAliq><CST>01</CST><vBC>41.88</vBC><pPIS>1.65</pPIS><vPIS>0.69</vPIS></PISAliq></PIS>'
+            f'<COFINS><COFINSAliq><CST>01</CST><vBC>41.88</vBC><pCOFINS>7.60</pCOFINS><vCOFINS>3.18</vCOFINS>'
+            f'</COFINSAliq></COFINS></imposto></det>'
+        )
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?><nfeProc xmlns="{NS}" versao="4.00"><NFe>'
+        f'<infNFe Id="NFe35240111222333000181550010000012341000012345" versao="4.00">'
+        f'<ide><cUF>35</cUF><nNF>1234</nNF><serie>1</serie><dhEmi>2024-01-15T10:00:00-03:00</dhEmi></ide>'
+        f'<emit><CNPJ>11222333000181</CNPJ><xNome>DISTRIBUIDORA BENCHMARK LTDA</xNome><IE>111222333</IE></emit>'
+        f'{"".join(dets)}'
+        f'<total><ICMSTot><vNF>{41.88 * linhas:.2f}</vNF></ICMSTot></total></infNFe></NFe>'
+        f'<protNFe versao="4.00"><infProt><chNFe>35240111222333000181550010000012341000012345</chNFe>'
+        f'<nProt>135240000000001</nProt></infProt></protNFe></nfeProc>'
+    ).encode("utf-8")
+
+
+def gerar_envelope(nota: bytes) -> bytes:
+    """Resposta SOAP da distribuição com a nota em docZip (gzip + base64)."""
+    doc_zip = base64.b64encode(gzip.compress(nota)).decode()
+    return (
+        '<soap:Envelope xmlns:soap="http://www.w3.org/2003/05/soap-envelope"><soap:Body>'
+        '<nfeDistDFeInteresseResponse><nfeDistDFeInteresseResult>'
+        f'<retDistDFeInt xmlns="{NS}" versao="1.01"><cStat>138</cStat><xMotivo>Documento localizado</xMotivo>'
+        f'<loteDistDFeInt><docZip NSU="000000000000001" schema="procNFe_v4.00.xsd">{doc_zip}</docZip>'
+        '</loteDistDFeInt></retDistDFeInt></nfeDistDFeInteresseResult></nfeDistDFeInteresseResponse>'
+        '</soap:Body></soap:Envelope>'
+    ).encode("utf-8")
+
+
+# --- Leituras anteriores (como estavam em xml_service / sefaz_query_service) ---
+
+def upload_anterior(nota: bytes):
+    nfe = xmltodict.parse(nota)["nfeProc"]["NFe"]["infNFe"]
+    detalhes = nfe["det"] if isinstance(nfe["det"], list) else [nfe["det"]]
+    return [
+        (d["prod"]["cProd"], d["prod"].get("cEAN", "SEM GTIN"), d["prod"]["xProd"], float(d["prod"]["qCom"]),
+         float(d["prod"]["vUnCom"]), float(d["prod"]["vProd"]))
+        for d in detalhes
+    ], float(nfe["total"]["ICMSTot"]["vNF"])
+
+
+def distribuicao_anterior(envelope: bytes):
+    raiz = etree.fromstring(envelope.decode("utf-8").encode("utf-8"))
+    doc_zip = raiz.xpath("//*[local-name()='docZip']")[0]
+    with gzip.GzipFile(fileobj=io.BytesIO(base64.b64decode(doc_zip.text))) as f:
+        xml_real = f.read().decode("utf-8")
+    raiz_nfe = etree.fromstring(xml_real.encode("utf-8"))
+    for elemento in raiz_nfe.iter():
+        if isinstance(elemento.tag, str) and "}" in elemento.tag:
+            elemento.tag = elemento.tag.split("}", 1)[1]
+    produtos = []
+    for det in raiz_nfe.findall(".//det"):
+        prod = det.find("prod")
+        produtos.append((prod.findtext("cProd"), prod.findtext("cEAN"), prod.findtext("xProd"),
+                         float(prod.findtext("qCom")), float(prod.findtext("vUnCom")), float(prod.findtext("vProd"))))
+    return xml_real, produtos
+
+
+# --- Leituras novas ---
+
+def upload_novo(nota: bytes):
+    return xml_service.parse_nfe_xml(nota)
+
+
+def distribuicao_nova(envelope: bytes):
+    leitor = leitor_nfe.ler_nfe_distribuicao(envelope)
+    cabecalho, produtos = leitor.ler_tudo()
+    return leitor.xml_lido(), produtos
+
+
+def fluxo_novo(nota: bytes):
+    """Só percorre os itens (sem guardar a lista): o consumo que não cresce com a nota."""
+    total = 0.0
+    for item in leitor_nfe.LeitorNFe(nota).itens():
+        total += item["valor_total"]
+    return total
+
+
+CASOS = [
+    ("upload  | xmltodict (anterior)", upload_anterior, "nota"),
+    ("upload  | leitor em fluxo", upload_novo, "nota"),
+    ("DF-e    | fromstring x2 (anterior)", distribuicao_anterior, "envelope"),
+    ("DF-e    | leitor em fluxo", distribuicao_nova, "envelope"),
+    ("fluxo   | só percorre os itens", fluxo_novo, "nota"),
+]
+
+
+def _status_kb(campo: str) -> int:
+    with open("/proc/self/status") as f:
+        for linha in f:
+            if linha.startswith(campo + ":"):
+                return int(linha.split()[1])
+    return 0
+
+
+def _medir_memoria(funcao, entrada, fila):
+    """Roda no processo filho: pico de RSS da leitura acima do RSS de antes dela."""
+    gc.collect()
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")  # Zera o pico (VmHWM) com o RSS atual
+    antes = _status_kb("VmRSS")
+    funcao(entrada)
+    fila.put(_status_kb("VmHWM") - antes)
+
+
+def medir_memoria(funcao, entrada) -> int:
+    contexto = multiprocessing.get_context("spawn")
+    fila = contexto.Queue()
+    processo = contexto.Process(target=_medir_memoria, args=(funcao, entrada, fila))
+    processo.start()
+    extra = fila.get()
+    processo.join()
+    return extra
+
+
+def medir_tempo(funcao, entrada, repeticoes: int) -> float:
+    funcao(entrada)  # Aquecimento
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao(entrada)
+    return (time.perf_counter() - inicio) / repeticoes * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, nargs="+", default=[1, 100, 1000], help="Itens por nota")
+    parser.add_argument("--repeticoes", type=int, default=50, help="Leituras por caso (tempo médio)")
+    args = parser.parse_args()
+
+    for linhas in args.linhas:
+        nota = gerar_nota(linhas)
+        entradas = {"nota": nota, "envelope": gerar_envelope(nota)}
+        repeticoes = max(1, args.repeticoes if linhas <= 1000 else args.repeticoes // 10)
+        print(f"\n📄 {linhas} itens | XML {len(nota) / 1024:.0f} KB | envelope {len(entradas['envelope']) / 1024:.0f} KB")
+        for nome, funcao, tipo in CASOS:
+            tempo = medir_tempo(funcao, entradas[tipo], repeticoes)
+            extra = medir_memoria(funcao, entradas[tipo])
+            print(f"  {nome:<36} {tempo:>9.2f} ms/nota   pico +{extra / 1024:>7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Benchmark: notas/segundo com um processo PHP por nota vs. worker persistente.
+
+Por padrão roda em modo ensaio ("enviar": false): monta e assina a NFC-e
+sem mandar para a SEFAZ, que é exatamente o custo local que o worker
+elimina (boot do PHP + autoload do NFePHP + leitura do PFX).
+
+Uso (a partir da pasta engine/):
+    python -m benchmarks.bench_php_worker --notas 200
+    python -m benchmarks.bench_php_worker --pfx cert.pfx --senha 1234 --workers 4
+
+Sem --pfx, gera um certificado autoassinado descartável (apenas para assinar).
+"""
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from app.services import php_worker
+
+SCRIPT_CLI = os.path.join(php_worker.BASE_DIR, "sefaz_service", "emitir_nfce.php")
+
+
+def gerar_pfx_teste(cnpj: str, senha: str) -> bytes:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.hazmat.primitives.serialization import pkcs12
+    from cryptography.x509.oid import NameOID
+
+    chave = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    nome = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, f"EMPRESA BENCHMARK:{cnpj}")])
+    agora = datetime.utcnow()
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(nome).issuer_name(nome)
+        .public_key(chave.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(agora - timedelta(days=1))
+        .not_valid_after(agora + timedelta(days=30))
+        .sign(chave, hashes.SHA256())
+    )
+    return pkcs12.serialize_key_and_certificates(
+        b"benchmark", chave, cert, None,
+        serialization.BestAvailableEncryption(senha.encode())
+    )
+
+
+def montar_payload(numero: int, cnpj: str, itens: int, enviar: bool) -> dict:
+    return {
+        "enviar": enviar,
+        "empresa": {
+            "razao_social": "EMPRESA BENCHMARK LTDA",
+            "nome_fantasia": "BENCHMARK",
+            "cnpj": cnpj,
+            "ie": "1234567890",
+            "regime": "simples",
+            "ambiente": "2",
+            "csc_id": "000001",
+            "csc_token": "TOKEN-HOMOLOGACAO"
+        },
+        "venda": {
+            "id": numero,
+            "numero_nota": numero,
+            "total_produtos": 10.0 * itens,
+            "total_nota": 10.0 * itens,
+            "forma_pagamento": "dinheiro",
+            "cliente_cpf": None,
+            "cliente_nome": None,
+            "itens": [
+                {
+                    "codigo": str(i + 1),
+                    "descricao": f"PRODUTO {i + 1}",
+                    "ncm": "22021000",
+                    "cfop": "5102",
+                    "csosn": "102",
+                    "unidade": "UN",
+                    "quantidade": 1.0,
+                    "valor_unitario": 10.0,
+                    "valor_total": 10.0
+                }
+                for i in range(itens)
+            ]
+        }
+    }
+
+
+def emitir_por_processo(payload: dict, pfx: bytes, senha: str) -> dict:
+    """Caminho antigo: JSON + PFX em arquivos temporários e um 'php' novo por nota."""
+    fd_json, path_json = tempfile.mkstemp(suffix=".json")
+    with os.fdopen(fd_json, "w") as f:
+        json.dump(payload, f)
+    fd_pfx, path_pfx = tempfile.mkstemp(suffix=".pfx")
+    with os.fdopen(fd_pfx, "wb") as f:
+        f.write(pfx)
+    try:
+        result = subprocess.run(
+            [php_worker.PHP_EXEC, SCRIPT_CLI, path_json, path_pfx, senha],
+            capture_output=True, text=True, encoding="utf-8", timeout=120
+        )
+        return json.loads(result.stdout)
+    finally:
+        os.remove(path_json)
+        os.remove(path_pfx)
+
+
+def medir(nome: str, funcao, payloads, paralelo: int):
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=paralelo) as executor:
+        resultados = list(executor.map(funcao, payloads))
+    duracao = time.perf_counter() - inicio
+
+    status = {}
+    for r in resultados:
+        status[r.get("status")] = status.get(r.get("status"), 0) + 1
+    print(f"{nome:<22} {len(payloads):>6} notas  {duracao:>8.2f}s  {len(payloads) / duracao:>8.1f} notas/s  {status}")
+    return duracao
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notas", type=int, default=100)
+    parser.add_argument("--itens", type=int, default=5, help="Itens por nota")
+    parser.add_argument("--workers", type=int, default=php_worker.TAMANHO_POOL, help="Processos/threads em paralelo")
+    parser.add_argument("--pfx", help="Caminho do PFX (padrão: autoassinado gerado na hora)")
+    parser.add_argument("--senha", default="benchmark")
+    parser.add_argument("--cnpj", default="12345678000195")
+    parser.add_argument("--enviar", action="store_true", help="Envia de verdade (use SOMENTE em homologação)")
+    args = parser.parse_args()
+
+    if args.pfx:
+        with open(args.pfx, "rb") as f:
+            pfx = f.read()
+    else:
+        pfx = gerar_pfx_teste(args.cnpj, args.senha)
+
+    payloads = [montar_payload(n + 1, args.cnpj, args.itens, args.enviar) for n in range(args.notas)]
+
+    print(f"Modo: {'ENVIO (homologação)' if args.enviar else 'ensaio (monta + assina)'} | paralelismo: {args.workers}")
+
+    t_processo = medir("processo por nota", lambda p: emitir_por_processo(p, pfx, args.senha), payloads, args.workers)
+
+    pool = php_worker.PoolPHP(args.workers)
+
+    def emitir_no_worker(payload):
+        try:
+            return pool.executar("emitir_nfce", payload, pfx=pfx, senha=args.senha, timeout=120)
+        except php_worker.ErroWorkerPHP as e:
+            return {"status": "erro_interno", "motivo": str(e)}
+
+    try:
+        # Aquecimento: sobe os processos e carrega o certificado fora da medição
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            list(executor.map(emitir_no_worker, payloads[:args.workers * 2]))
+        t_worker = medir("worker persistente", emitir_no_worker, payloads, args.workers)
+    finally:
+        pool.encerrar()
+
+    print(f"Ganho: {t_processo / t_worker:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
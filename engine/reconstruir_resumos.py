@@ -0,0 +1,39 @@
+"""
+Recalcula os resumos de vendas dos dashboards a partir do histórico.
+
+Uso:
+    python reconstruir_resumos.py                      # todo o histórico
+    python reconstruir_resumos.py --inicio 2025-01-01 --fim 2025-01-31
+"""
+import argparse
+from datetime import date
+
+from app.database import SessionLocal, engine
+from app import models
+from app.services import resumo_vendas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstrói os resumos de vendas (hora/PDV, produto e operador).")
+    parser.add_argument("--inicio", type=date.fromisoformat, default=None, help="AAAA-MM-DD")
+    parser.add_argument("--fim", type=date.fromisoformat, default=None, help="AAAA-MM-DD")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        print(f"🔄 Reconstruindo resumos de vendas ({args.inicio or 'início'} até {args.fim or 'hoje'})...")
+        linhas_hora, linhas_produto, linhas_operador = resumo_vendas.reconstruir(db, args.inicio, args.fim)
+        db.commit()
+        print(f"✅ {linhas_hora} linhas por hora/PDV, {linhas_produto} por produto/dia, {linhas_operador} por operador/dia.")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Erro ao reconstruir resumos: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
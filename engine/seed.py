@@ -310,4 +310,16 @@ try:
          print("Snapshots já existem. Pulando criação.")
 
 finally:
-    db.close
\ No newline at end of file
+    db.close
+
+# --- 5. RESUMOS DE VENDAS (DASHBOARDS) ---
+from app.services import resumo_vendas
+
+db = SessionLocal()
+try:
+    print("\nReconstruindo resumos de vendas dos dashboards...")
+    linhas_hora, linhas_produto, linhas_operador = resumo_vendas.reconstruir(db)
+    db.commit()
+    print(f"-> {linhas_hora} linhas por hora/PDV, {linhas_produto} por produto/dia, {linhas_operador} por operador/dia.")
+finally:
+    db.close()
@@ -4,9 +4,8 @@ error_reporting(E_ALL & ~E_DEPRECATED);
 ini_set('display_errors', 0);
 ini_set('log_errors', 0);
 
-require __DIR__ . '/vendor/autoload.php';
+require __DIR__ . '/operacoes.php';
 
-use NFePHP\NFe\Tools;
 use NFePHP\Common\Certificate;
 
 $chave   = $argv[1] ?? null;
@@ -32,33 +31,7 @@ try {
     // Lê certificado
     $certificate = Certificate::readPfx($certContent, $senha);
 
-    // Config NFePHP
-    $config = [
-        "atualizacao" => "2024-01-01",
-        "tpAmb" => $prod ? 1 : 2,
-        "razaosocial" => "EMPRESA",
-        "cnpj" => $cnpj,
-        "siglaUF" => "PR",
-        "schemes" => "PL_009_V4",
-        "versao" => "4.00",
-        "tokenIBPT" => "",
-        "pathCerts" => __DIR__ . "/storage"
-    ];
-
-    if (!is_dir($config["pathCerts"])) {
-        mkdir($config["pathCerts"], 0777, true);
-    }
-
-    $tools = new Tools(json_encode($config), $certificate);
-
-    // Consulta por chave
-    $response = $tools->sefazConsultaChave($chave);
-
-    echo json_encode([
-        "status" => "ok",
-        "raw_xml" => $response,
-        "xml_base64" => base64_encode($response)
-    ]);
+    echo json_encode(sinapse_consultar_chave($chave, $certificate, $cnpj, $prod));
     exit(0);
 
 } catch (Exception $e) {
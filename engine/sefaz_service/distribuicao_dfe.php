@@ -2,9 +2,8 @@
 header("Content-Type: application/json");
 
 use NFePHP\Common\Certificate;
-use NFePHP\NFe\Tools;
 
-require_once __DIR__ . "/vendor/autoload.php";
+require_once __DIR__ . "/operacoes.php";
 
 // =======================
 // 1) Parâmetros CLI
@@ -23,67 +22,16 @@ if (!$chave || !$pfxPath || !$senha || !$cnpj) {
     exit(1);
 }
 
-// =======================
-// 2) Configuração NFePHP
-// =======================
-$tpAmb = $producao === "1" ? 1 : 2;
-
-$config = [
-    "atualizacao" => date('Y-m-d H:i:s'),
-    "tpAmb" => $tpAmb,
-    "razaosocial" => "EMPRESA",
-    "siglaUF" => "SP",
-    "cnpj" => $cnpj,
-    "schemes" => "PL_009_V4",
-    "versao" => "4.00",
-    "proxyConf" => [
-        "proxyIp" => "",
-        "proxyPort" => "",
-        "proxyUser" => "",
-        "proxyPass" => ""
-    ]
-];
-
 try {
     // =======================
-    // 3) Certificado
+    // 2) Certificado
     // =======================
     $cert = Certificate::readPfx(file_get_contents($pfxPath), $senha);
-    $tools = new Tools(json_encode($config), $cert);
-    $tools->model("55");
 
     // =======================
-    // 4) Download por chave
+    // 3) Download por chave
     // =======================
-    $resp = $tools->sefazDownload($chave);
-
-    // XML normal ou compactado
-    $array = json_decode(json_encode(simplexml_load_string($resp)), true);
-
-    $xml = null;
-
-    if (isset($array['procEventoNFe'])) {
-        $xml = $resp;
-    }
-
-    if (isset($array['nfeProc'])) {
-        $xml = $resp;
-    }
-
-    // Caso venha zipado
-    if (isset($array['docZip'])) {
-        $zip = base64_decode($array['docZip']);
-        $xml = gzdecode($zip);
-    }
-
-    if (!$xml) {
-        $xml = $resp; // fallback
-    }
-
-    echo json_encode([
-        "status" => "ok",
-        "xml_base64" => base64_encode($xml)
-    ]);
+    echo json_encode(sinapse_distribuicao_chave($chave, $cert, $cnpj, $producao === "1"));
 
 } catch (\Exception $e) {
     echo json_encode([
@@ -0,0 +1,141 @@
+<?php
+// engine/sefaz_service/worker.php
+//
+// Worker persistente: um processo PHP atende várias operações SEFAZ.
+// O autoload do NFePHP é carregado uma vez e o certificado fica em memória
+// (indexado pela impressão digital SHA-256 do PFX).
+//
+// Protocolo: JSON por linha no STDIN/STDOUT.
+//   Pedido:   {"id": 1, "op": "emitir_nfce", "cert": {"fingerprint": "...", "pfx_base64": "...", "senha": "..."}, "dados": {...}}
+//   Resposta: {"id": 1, "ok": true, "resultado": {...}}
+//             {"id": 1, "ok": false, "codigo": "cert_desconhecido", "erro": "..."}
+// O PFX (pfx_base64/senha) só precisa vir na primeira vez; depois basta o fingerprint.
+
+error_reporting(E_ALL & ~E_DEPRECATED & ~E_NOTICE);
+ini_set('display_errors', 0);
+ini_set('log_errors', 1); // Logs vão para o STDERR, nunca para o protocolo
+
+require __DIR__ . '/operacoes.php';
+
+use NFePHP\NFe\Tools;
+use NFePHP\Common\Certificate;
+
+$certificados = []; // fingerprint => Certificate
+$toolsNfce = [];    // fingerprint|config => Tools
+
+function responder(array $resposta): void
+{
+    fwrite(STDOUT, json_encode($resposta, JSON_UNESCAPED_UNICODE | JSON_INVALID_UTF8_SUBSTITUTE) . "\n");
+    fflush(STDOUT);
+}
+
+// Com SINAPSE_GRAVAR_DFE=/pasta, as respostas da distribuição são gravadas
+// nessa pasta para o worker_gravado.php reproduzir depois (sem rede/certificado).
+function gravar_resposta(string $arquivo, array $resultado): void
+{
+    $pasta = getenv('SINAPSE_GRAVAR_DFE');
+    if ($pasta && !empty($resultado['xml_base64'])) {
+        @mkdir($pasta, 0777, true);
+        file_put_contents($pasta . '/' . $arquivo, base64_decode($resultado['xml_base64']));
+    }
+}
+
+function obter_certificado(array $pedido, array &$certificados): ?Certificate
+{
+    $cert = $pedido['cert'] ?? [];
+    $fingerprint = $cert['fingerprint'] ?? null;
+    if (!$fingerprint) {
+        throw new Exception("Pedido sem certificado.");
+    }
+
+    if (isset($certificados[$fingerprint])) {
+        return $certificados[$fingerprint];
+    }
+
+    if (empty($cert['pfx_base64'])) {
+        return null; // O Python reenvia com o PFX
+    }
+
+    $pfx = base64_decode($cert['pfx_base64']);
+    if (hash('sha256', $pfx) !== $fingerprint) {
+        throw new Exception("Fingerprint não confere com o PFX enviado.");
+    }
+
+    $certificados[$fingerprint] = Certificate::readPfx($pfx, $cert['senha'] ?? '');
+    return $certificados[$fingerprint];
+}
+
+while (($linha = fgets(STDIN)) !== false) {
+    $linha = trim($linha);
+    if ($linha === '') {
+        continue;
+    }
+
+    $pedido = json_decode($linha, true);
+    $id = $pedido['id'] ?? null;
+
+    // Qualquer echo/warning perdido do NFePHP não pode corromper o protocolo
+    ob_start();
+    try {
+        if (!is_array($pedido)) {
+            throw new Exception("Pedido inválido (JSON).");
+        }
+
+        $op = $pedido['op'] ?? '';
+        if ($op === 'ping') {
+            ob_end_clean();
+            responder(["id" => $id, "ok" => true, "resultado" => ["status" => "ok", "pid" => getmypid()]]);
+            continue;
+        }
+
+        $certificate = obter_certificado($pedido, $certificados);
+        if (!$certificate) {
+            ob_end_clean();
+            responder(["id" => $id, "ok" => false, "codigo" => "cert_desconhecido", "erro" => "Certificado não carregado neste worker."]);
+            continue;
+        }
+
+        $dados = $pedido['dados'] ?? [];
+        $fingerprint = $pedido['cert']['fingerprint'];
+
+        switch ($op) {
+            case 'emitir_nfce':
+                // Reaproveita o Tools (config + certificado) entre notas da mesma empresa
+                $config = sinapse_config_nfce($dados['empresa']);
+                unset($config['atualizacao']);
+                $chaveTools = $fingerprint . '|' . md5(json_encode($config));
+                if (!isset($toolsNfce[$chaveTools])) {
+                    $toolsNfce[$chaveTools] = new Tools(json_encode(sinapse_config_nfce($dados['empresa'])), $certificate);
+                }
+                $resultado = sinapse_emitir_nfce($dados, $certificate, $toolsNfce[$chaveTools]);
+                break;
+
+            case 'consulta_dfe':
+                $resultado = sinapse_consultar_chave($dados['chave'], $certificate, $dados['cnpj'], (bool)$dados['producao']);
+                break;
+
+            case 'distribuicao_dfe':
+                $resultado = sinapse_distribuicao_chave($dados['chave'], $certificate, $dados['cnpj'], (bool)$dados['producao']);
+                gravar_resposta("distribuicao_chave_{$dados['chave']}.xml", $resultado);
+                break;
+
+            case 'distribuicao_nsu':
+                if (empty($dados['uf'])) {
+                    throw new Exception("Pedido sem a UF do emitente (cUFAutor).");
+                }
+                $resultado = sinapse_distribuicao_nsu((int)$dados['ult_nsu'], $certificate, $dados['cnpj'], (bool)$dados['producao'], $dados['uf']);
+                gravar_resposta(sprintf("distribuicao_nsu_%015d.xml", (int)$dados['ult_nsu']), $resultado);
+                break;
+
+            default:
+                throw new Exception("Operação desconhecida: {$op}");
+        }
+
+        ob_end_clean();
+        responder(["id" => $id, "ok" => true, "resultado" => $resultado]);
+
+    } catch (\Throwable $e) {
+        ob_end_clean();
+        responder(["id" => $id, "ok" => false, "codigo" => "erro", "erro" => $e->getMessage()]);
+    }
+}
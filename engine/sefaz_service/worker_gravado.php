@@ -0,0 +1,87 @@
+<?php
+// engine/sefaz_service/worker_gravado.php
+//
+// Substituto do worker.php que reproduz respostas gravadas da SEFAZ, para
+// testar a distribuição DF-e (services/distribuicao_dfe.py) sem rede, sem
+// certificado e sem o vendor do NFePHP. Mesmo protocolo JSON por linha.
+//
+//   PHP_WORKER_SCRIPT=sefaz_service/worker_gravado.php \
+//   SINAPSE_GRAVACOES_DFE=/pasta/com/gravacoes uvicorn app.main:app
+//
+// As gravações são as respostas SOAP cruas, gravadas pelo worker.php real
+// com SINAPSE_GRAVAR_DFE=/pasta:
+//   distribuicao_nsu_{ultNSU com 15 dígitos}.xml   consulta por NSU
+//   distribuicao_chave_{chave}.xml                 download por chave
+// Sem gravação para o pedido, responde cStat 137 (nenhum documento).
+// Gravações usadas no teste: engine/tests/gravacoes (tests/test_distribuicao_dfe.py).
+
+error_reporting(E_ALL & ~E_DEPRECATED & ~E_NOTICE);
+ini_set('display_errors', 0);
+ini_set('log_errors', 1);
+
+$pasta = getenv('SINAPSE_GRAVACOES_DFE') ?: __DIR__ . '/gravacoes';
+
+function responder(array $resposta): void
+{
+    fwrite(STDOUT, json_encode($resposta, JSON_UNESCAPED_UNICODE | JSON_INVALID_UTF8_SUBSTITUTE) . "\n");
+    fflush(STDOUT);
+}
+
+function nenhum_documento(int $ultNSU): string
+{
+    $nsu = sprintf("%015d", $ultNSU);
+    return '<retDistDFeInt xmlns="http://www.portalfiscal.inf.br/nfe" versao="1.01">'
+        . '<tpAmb>1</tpAmb><verAplic>gravado</verAplic><cStat>137</cStat>'
+        . '<xMotivo>Nenhum documento localizado</xMotivo><dhResp>' . date('c') . '</dhResp>'
+        . "<ultNSU>{$nsu}</ultNSU><maxNSU>{$nsu}</maxNSU></retDistDFeInt>";
+}
+
+function gravacao(string $pasta, string $arquivo): ?string
+{
+    $caminho = $pasta . '/' . $arquivo;
+    return is_file($caminho) ? file_get_contents($caminho) : null;
+}
+
+while (($linha = fgets(STDIN)) !== false) {
+    $linha = trim($linha);
+    if ($linha === '') {
+        continue;
+    }
+
+    $pedido = json_decode($linha, true);
+    $id = $pedido['id'] ?? null;
+    $dados = $pedido['dados'] ?? [];
+
+    try {
+        switch ($pedido['op'] ?? '') {
+            case 'ping':
+                $resultado = ["status" => "ok", "pid" => getmypid()];
+                break;
+
+            case 'distribuicao_nsu':
+                if (empty($dados['uf'])) {
+                    throw new Exception("Pedido sem a UF do emitente (cUFAutor).");
+                }
+                $ultNSU = (int)($dados['ult_nsu'] ?? 0);
+                $xml = gravacao($pasta, sprintf("distribuicao_nsu_%015d.xml", $ultNSU)) ?? nenhum_documento($ultNSU);
+                $resultado = ["status" => "ok", "xml_base64" => base64_encode($xml)];
+                break;
+
+            case 'distribuicao_dfe':
+                $xml = gravacao($pasta, "distribuicao_chave_{$dados['chave']}.xml") ?? nenhum_documento(0);
+                $resultado = ["status" => "ok", "xml_base64" => base64_encode($xml)];
+                break;
+
+            case 'consulta_dfe':
+                $resultado = ["status" => "ok", "raw_xml" => "", "xml_base64" => ""];
+                break;
+
+            default:
+                throw new Exception("Operação sem gravação: " . ($pedido['op'] ?? ''));
+        }
+        responder(["id" => $id, "ok" => true, "resultado" => $resultado]);
+
+    } catch (\Throwable $e) {
+        responder(["id" => $id, "ok" => false, "codigo" => "erro", "erro" => $e->getMessage()]);
+    }
+}
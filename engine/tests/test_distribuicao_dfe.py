@@ -0,0 +1,136 @@
+"""
+Distribuição DF-e (services/distribuicao_dfe) com respostas gravadas da
+SEFAZ: sincronizar() conversa com o sefaz_service/worker_gravado.php pelo
+pool de workers, como em produção, mas sem rede e sem certificado real.
+
+As gravações ficam em tests/gravacoes (distribuicao_nsu_{ultNSU}.xml, no
+formato que o worker.php grava com SINAPSE_GRAVAR_DFE): NSU 0 traz um
+resumo e uma NF-e completa (ultNSU 2 de maxNSU 3), NSU 2 traz um evento e
+encerra a fila.
+
+Uso (a partir da pasta engine/, com o php no PATH):
+    python -m unittest tests.test_distribuicao_dfe
+
+Precisa do php (PHP_EXEC, padrão 'php'): sem ele TODOS os casos são pulados
+e o unittest termina "OK (skipped=N)" sem ter testado nada. Confira a
+contagem de skipped antes de dar a distribuição como testada.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+PASTA = os.path.dirname(os.path.abspath(__file__))
+
+# Antes de importar o app: banco descartável e o worker que reproduz as gravações
+_banco = tempfile.NamedTemporaryFile(prefix="sinapse_teste_", suffix=".db", delete=False)
+_banco.close()
+os.environ["DATABASE_URL"] = f"sqlite:///{_banco.name}"
+os.environ["PHP_WORKER_SCRIPT"] = os.path.join(PASTA, os.pardir, "sefaz_service", "worker_gravado.php")
+os.environ["SINAPSE_GRAVACOES_DFE"] = os.path.join(PASTA, "gravacoes")
+os.environ["DFE_INTERVALO_MINUTOS"] = "0"
+
+from app import models  # noqa: E402
+from app.database import SessionLocal, engine  # noqa: E402
+from app.services import armazem_documentos, distribuicao_dfe  # noqa: E402
+from app.services.php_worker import PHP_EXEC, pool_php  # noqa: E402
+
+CNPJ_EMPRESA = "11222333000181"
+CHAVE_NFE = "41261012345678000195550010000012341000012345"
+CHAVE_RESUMO = "35261098765432000110550010000056781000056789"
+
+
+def tearDownModule():
+    # Também quando a classe é pulada (sem php): o banco já foi criado no import do app
+    pool_php.encerrar()
+    engine.dispose()
+    os.unlink(_banco.name)
+
+
+@unittest.skipUnless(shutil.which(PHP_EXEC), f"'{PHP_EXEC}' não encontrado no PATH")
+class SincronizacaoGravadaTest(unittest.TestCase):
+
+    def setUp(self):
+        models.Base.metadata.drop_all(bind=engine)
+        models.Base.metadata.create_all(bind=engine)
+        self.db = SessionLocal()
+
+        empresa = models.Empresa(nome_fantasia="Loja Teste", cnpj="11.222.333/0001-81", uf="PR")
+        self.db.add(empresa)
+        self.db.flush()
+        certificado = models.CertificadoDigital(
+            empresa_id=empresa.id, nome_arquivo="teste.pfx", senha_arquivo="1234",
+            data_validade=datetime(2030, 1, 1), ativo=True,
+        )
+        self.db.add(certificado)
+        self.db.flush()
+        # O worker gravado não abre o PFX, mas o pool sempre o envia na primeira vez
+        armazem_documentos.gravar(self.db, models.CertificadoDigital.arquivo_binario, certificado.id, b"pfx de teste")
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.close()
+
+    def _documentos(self):
+        return {
+            documento.nsu: documento
+            for documento in self.db.query(models.DocumentoDFe).order_by(models.DocumentoDFe.nsu)
+        }
+
+    def test_percorre_a_fila_ate_o_max_nsu(self):
+        resumo = distribuicao_dfe.sincronizar(self.db)
+
+        self.assertEqual(resumo["cnpj"], CNPJ_EMPRESA)
+        self.assertEqual(resumo["novos"], 3)
+        self.assertEqual((resumo["ult_nsu"], resumo["max_nsu"]), (3, 3))
+        self.assertTrue(resumo["mensagem"].startswith("SEFAZ: 138"))
+        # Fim da fila: a próxima consulta só depois do intervalo exigido pela SEFAZ
+        self.assertGreater(resumo["proxima_consulta"], resumo["ultima_consulta"])
+
+        documentos = self._documentos()
+        self.assertEqual({nsu: d.tipo for nsu, d in documentos.items()}, {1: "resumo", 2: "nfe", 3: "evento"})
+        nota = documentos[2]
+        self.assertEqual(nota.chave_acesso, CHAVE_NFE)
+        self.assertEqual(nota.emitente_cnpj, "12345678000195")
+        self.assertEqual(nota.emitente_nome, "DISTRIBUIDORA EXEMPLO LTDA")
+        self.assertAlmostEqual(nota.valor_total, 135.0)
+        resumo_nota = documentos[1]
+        self.assertEqual(resumo_nota.chave_acesso, CHAVE_RESUMO)
+        self.assertAlmostEqual(resumo_nota.valor_total, 1520.40)
+        self.assertEqual(documentos[3].chave_acesso, CHAVE_NFE)
+
+    def test_respeita_o_intervalo_da_sefaz(self):
+        distribuicao_dfe.sincronizar(self.db)
+        resumo = distribuicao_dfe.sincronizar(self.db)
+
+        self.assertEqual(resumo["novos"], 0)
+        self.assertEqual(resumo["ult_nsu"], 3)
+        self.assertEqual(resumo["mensagem"], "Aguardando o intervalo mínimo da SEFAZ entre consultas.")
+        self.assertEqual(len(self._documentos()), 3)
+
+    def test_sem_uf_nao_consulta_a_sefaz(self):
+        self.db.query(models.Empresa).update({"uf": None})
+        self.db.commit()
+
+        resumo = distribuicao_dfe.sincronizar(self.db)
+
+        self.assertIn("UF da empresa não configurada", resumo["mensagem"])
+        self.assertIsNone(resumo["ultima_consulta"])
+        self.assertEqual(self._documentos(), {})
+
+    def test_preview_por_chave_le_a_nota_local(self):
+        distribuicao_dfe.sincronizar(self.db)
+
+        resultado = distribuicao_dfe.consultar_local(self.db, CHAVE_NFE)
+        self.assertEqual(resultado["header"]["emitente_nome"], "DISTRIBUIDORA EXEMPLO LTDA")
+        self.assertEqual(resultado["header"]["protocolo"], "141260000012345")
+        self.assertEqual([p["ean"] for p in resultado["produtos"]], ["7894900011517", "7891000100103"])
+        self.assertEqual(resultado["produtos"][1]["quantidade"], 2.5)
+        self.assertIn(CHAVE_NFE, resultado["xml_nfe"])
+        # Só o resumo chegou: o preview ainda precisa ir à SEFAZ
+        self.assertIsNone(distribuicao_dfe.consultar_local(self.db, CHAVE_RESUMO))
+
+
+if __name__ == "__main__":
+    unittest.main()
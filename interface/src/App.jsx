@@ -20,7 +20,7 @@ import PerfilSettingsPage from "./pages/configuracoes/perfils";
 import FinanceiroSettingsPage from "./pages/configuracoes/financeiro";
 import FiscalSettingsPage from "./pages/configuracoes/fiscal";
 import ConexoesSettingsPage from "./pages/configuracoes/conexoes";
-import { SettingsProvider } from "./ConfigContext";
+import { SettingsProvider, ConfigSocketSync } from "./ConfigContext";
 
 // IMPORTANTE: Importe o componente que criamos
 import PrivateRoute from "./components/rotasprivadas";
@@ -29,6 +29,7 @@ function App() {
   return (
     <SettingsProvider>
       <WebSocketProvider>
+        <ConfigSocketSync />
         <div>
           <Routes>
             
@@ -1,6 +1,7 @@
 "use client"
 
 import * as React from "react";
+import { useWebSocket } from "./WebSocketContext";
 
 const API_URL = "http://localhost:8000"; 
 
@@ -91,4 +92,19 @@ export function SettingsProvider({ children }) {
 
 export function useSettings() {
   return React.useContext(SettingsContext);
-}
\ No newline at end of file
+}
+
+// Recarrega as configurações quando o backend avisa que a Empresa mudou
+// (outra aba, outro terminal). Precisa ficar dentro do WebSocketProvider.
+export function ConfigSocketSync() {
+  const { lastMessage } = useWebSocket();
+  const { refreshSettings } = useSettings();
+
+  React.useEffect(() => {
+    if (lastMessage?.type === "CONFIG_EMPRESA_ATUALIZADA") {
+      refreshSettings();
+    }
+  }, [lastMessage, refreshSettings]);
+
+  return null;
+}
@@ -4,11 +4,14 @@ import { toast } from "sonner";
 // O URL do seu backend (ajuste a porta/caminho se necessário)
 const WEBSOCKET_URL = "ws://localhost:8000/solicitacoes/ws";
 
+// Tópicos (ver engine/app/websockets.py): cada tela assina só o que precisa
+// ("pdv:3", "gerentes", "fiscal") e o servidor não manda o resto.
+
 // 1. Criamos o "Contrato" (Context)
 const WebSocketContext = React.createContext({
   lastMessage: null, // A última mensagem recebida
   isConnected: false,  // O status da conexão
-  // (No futuro, podemos adicionar 'sendMessage' aqui)
+  assinar: () => () => {}, // Assina tópicos; devolve a função que cancela
 });
 
 // 2. Criamos o "Abraço" (Provider)
@@ -19,17 +22,48 @@ export function WebSocketProvider({ children }) {
   
   // Usamos useRef para segurar a conexão e evitar re-renderizações
   const socket = React.useRef(null);
+  // Tópico -> quantos componentes assinam (reenviados a cada reconexão)
+  const topicos = React.useRef(new Map());
+
+  const enviar = React.useCallback((acao, lista) => {
+    if (lista.length > 0 && socket.current?.readyState === WebSocket.OPEN) {
+      socket.current.send(JSON.stringify({ acao, topicos: lista }));
+    }
+  }, []);
+
+  const assinar = React.useCallback((lista) => {
+    const novos = lista.filter((t) => !topicos.current.has(t));
+    lista.forEach((t) => topicos.current.set(t, (topicos.current.get(t) || 0) + 1));
+    enviar("assinar", novos);
+
+    return () => {
+      const sobraram = [];
+      lista.forEach((t) => {
+        const restantes = (topicos.current.get(t) || 1) - 1;
+        if (restantes > 0) {
+          topicos.current.set(t, restantes);
+        } else {
+          topicos.current.delete(t);
+          sobraram.push(t);
+        }
+      });
+      enviar("cancelar", sobraram);
+    };
+  }, [enviar]);
 
   // 3. O Efeito de Conexão (Roda UMA VEZ quando o App carrega)
   React.useEffect(() => {
     // Função para conectar (e reconectar, se necessário)
     const connect = () => {
       console.log("🔌 Socket: Tentando conectar...");
-      const ws = new WebSocket(WEBSOCKET_URL);
+      const lista = [...topicos.current.keys()].join(",");
+      const ws = new WebSocket(`${WEBSOCKET_URL}?topicos=${encodeURIComponent(lista)}`);
 
       ws.onopen = () => {
         console.log("🔌 Socket: Conectado ao canal global.");
         setIsConnected(true);
+        // Tópicos assinados enquanto a conexão abria
+        enviar("assinar", [...topicos.current.keys()]);
         toast.success("Conexão em tempo real estabelecida!");
       };
 
@@ -66,12 +100,13 @@ export function WebSocketProvider({ children }) {
       console.log("🔌 Socket: Limpando conexão global.");
       socket.current?.close();
     };
-  }, []); // O array vazio [] garante que isso rode SÓ UMA VEZ.
+  }, [enviar]); // 'enviar' é estável: isso roda SÓ UMA VEZ.
 
   // 5. Compartilha o status e a última mensagem com todos os "filhos"
   const value = {
     isConnected,
     lastMessage,
+    assinar,
   };
 
   return (
@@ -89,4 +124,16 @@ export function useWebSocket() {
     throw new Error("useWebSocket deve ser usado dentro de um WebSocketProvider");
   }
   return context;
-}
\ No newline at end of file
+}
+
+// Assina os tópicos enquanto o componente estiver montado
+// Ex: useTopicos(["gerentes"]) ou useTopicos([`pdv:${pdvId}`])
+export function useTopicos(lista) {
+  const { assinar } = useWebSocket();
+  const chave = lista.filter(Boolean).join(",");
+
+  React.useEffect(() => {
+    if (!chave) return;
+    return assinar(chave.split(","));
+  }, [assinar, chave]);
+}
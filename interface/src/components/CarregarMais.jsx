@@ -0,0 +1,13 @@
+import { Loader2 } from "lucide-react";
+import { Button } from "@/components/ui/button";
+
+// Rodapé das tabelas paginadas por cursor (useListaPaginada): traz a próxima página do servidor
+export default function CarregarMais({ paginacao }) {
+  if (!paginacao?.temMais) return null;
+  return (
+    <Button variant="outline" size="sm" onClick={paginacao.carregarMais} disabled={paginacao.carregandoMais}>
+      {paginacao.carregandoMais && <Loader2 className="h-4 w-4 mr-2 animate-spin" />}
+      Carregar mais
+    </Button>
+  );
+}
@@ -37,8 +37,9 @@ import {
   SelectValue,
 } from "@/components/ui/select"
 import { XCircle } from "lucide-react"
+import CarregarMais from "@/components/CarregarMais"
 
-export function CrediarioDataTable({ columns, data, onClientSelect }) {
+export function CrediarioDataTable({ columns, data, onClientSelect, busca, onBuscaChange, statusConta, onStatusContaChange, paginacao }) {
   const [sorting, setSorting] = React.useState([])
   const [columnFilters, setColumnFilters] = React.useState([])
   const [rowSelection, setRowSelection] = React.useState({})
@@ -52,11 +53,20 @@ export function CrediarioDataTable({ columns, data, onClientSelect }) {
     getPaginationRowModel: getPaginationRowModel(),
     getSortedRowModel: getSortedRowModel(),
     getFilteredRowModel: getFilteredRowModel(),
+    // "Carregar mais" acrescenta linhas: continua na página em que estava
+    autoResetPageIndex: false,
     onRowSelectionChange: setRowSelection,
     state: { sorting, columnFilters, rowSelection },
   })
 
-  const isFiltered = table.getState().columnFilters.length > 0
+  // Busca e situação são filtradas no servidor (valem para todos os clientes, não só os carregados)
+  const isFiltered = Boolean(busca || statusConta)
+
+  // Lista nova (filtro, recarga): volta para a primeira página
+  const primeiraLinha = data[0]?.id
+  React.useEffect(() => {
+    table.setPageIndex(0)
+  }, [primeiraLinha])
 
   const DOTS = '...';
   const usePaginationRange = ({ totalPageCount, siblingCount = 1, currentPage }) => {
@@ -141,31 +151,28 @@ React.useEffect(() => {
       <div className="flex items-center gap-2 py-4">
         <Input
           placeholder="Buscar por nome ou CPF..."
-          value={table.getColumn("nome")?.getFilterValue() ?? ""}
-          onChange={(event) =>
-            table.getColumn("nome")?.setFilterValue(event.target.value)
-          }
+          value={busca ?? ""}
+          onChange={(event) => onBuscaChange(event.target.value)}
           className="max-w-sm"
         />
         <Select
-          onValueChange={(value) =>
-            table.getColumn("status_conta")?.setFilterValue(value === "todos" ? "" : value)
-          }
+          value={statusConta || "todos"}
+          onValueChange={(value) => onStatusContaChange(value === "todos" ? "" : value)}
         >
           <SelectTrigger className="w-[180px]">
             <SelectValue placeholder="Filtrar por Situação" />
           </SelectTrigger>
           <SelectContent>
             <SelectItem value="todos">Todas as Situações</SelectItem>
-            <SelectItem value="Em Dia">Em Dia</SelectItem>
-            <SelectItem value="Atrasado">Atrasado</SelectItem>
+            <SelectItem value="ativo">Em Dia</SelectItem>
+            <SelectItem value="atrasado">Atrasado</SelectItem>
           </SelectContent>
         </Select>
 
         {isFiltered && (
           <Button
             variant="ghost"
-            onClick={() => table.resetColumnFilters()}
+            onClick={() => { onBuscaChange(""); onStatusContaChange(""); }}
             className="h-10 px-2 lg:px-3"
           >
             Limpar Filtros
@@ -271,7 +278,7 @@ React.useEffect(() => {
             </PaginationContent>
           </Pagination>
         </div>
-      <div className="flex-1" />
+      <div className="flex flex-1 justify-end"><CarregarMais paginacao={paginacao} /></div>
     </div>
   </div>
   )
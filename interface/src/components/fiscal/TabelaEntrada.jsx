@@ -7,10 +7,11 @@ import { Input } from "@/components/ui/input"
 // Removidos Select, toast, Loader2 por enquanto
 import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from "@/components/ui/table"
 import { Pagination, PaginationLink, PaginationContent, PaginationItem, PaginationNext, PaginationPrevious, PaginationEllipsis } from "@/components/ui/pagination"
+import CarregarMais from "@/components/CarregarMais"
 
 // const API_URL = "http://localhost:8000"; // Desnecessário aqui por enquanto
 
-export default function NotaEntradaDataTable({ columns, data, refetchData }) { // Props mais simples
+export default function NotaEntradaDataTable({ columns, data, refetchData, paginacao }) { // Props mais simples
   const [sorting, setSorting] = React.useState([]);
   const [columnFilters, setColumnFilters] = React.useState([]);
   const [rowSelection, setRowSelection] = React.useState({});
@@ -57,11 +58,19 @@ export default function NotaEntradaDataTable({ columns, data, refetchData }) { /
     getPaginationRowModel: getPaginationRowModel(),
     getSortedRowModel: getSortedRowModel(),
     getFilteredRowModel: getFilteredRowModel(),
+    // "Carregar mais" acrescenta linhas: continua na página em que estava
+    autoResetPageIndex: false,
     onRowSelectionChange: setRowSelection,
     state: { sorting, columnFilters, rowSelection },
     // meta: {} // Vazio por enquanto, sem ações complexas
   });
 
+  // Lista nova (recarga): volta para a primeira página
+  const primeiraLinha = data[0]?.id;
+  React.useEffect(() => {
+    table.setPageIndex(0);
+  }, [primeiraLinha]);
+
   const numSelected = Object.keys(rowSelection).length;
   // const selectedRowsData = table.getFilteredSelectedRowModel().rows.map(row => row.original); // Desnecessário por enquanto
 
@@ -213,7 +222,7 @@ export default function NotaEntradaDataTable({ columns, data, refetchData }) { /
             </PaginationContent>
           </Pagination>
         </div>
-        <div className="flex-1" />
+        <div className="flex flex-1 justify-end"><CarregarMais paginacao={paginacao} /></div>
       </div>
     </div>
   );
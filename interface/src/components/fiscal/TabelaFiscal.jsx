@@ -18,6 +18,7 @@ import { Loader2,
     FunnelIcon
 } from "lucide-react"
 import { ButtonGroup } from "@/components/ui/button-group"
+import CarregarMais from "@/components/CarregarMais"
 
 const API_URL = "http://localhost:8000";
 const DOTS = '...';
@@ -51,7 +52,7 @@ const usePaginationRange = ({ totalPageCount, siblingCount = 1, currentPage }) =
   }, [totalPageCount, siblingCount, currentPage]);
 };
 
-export default function FiscalDataTable({ columns, data, refetchData, batchLoadingType, onBatchAction}) {
+export default function FiscalDataTable({ columns, data, refetchData, batchLoadingType, onBatchAction, onStatusFiltroChange, paginacao }) {
   const [sorting, setSorting] = React.useState([]);
   const [columnFilters, setColumnFilters] = React.useState([]);
   const [rowSelection, setRowSelection] = React.useState({});
@@ -109,11 +110,19 @@ const handleEmitSingleNote = async (notaId) => { // Recebe o ID da NOTA, não da
     getPaginationRowModel: getPaginationRowModel(),
     getSortedRowModel: getSortedRowModel(),
     getFilteredRowModel: getFilteredRowModel(),
+    // "Carregar mais" acrescenta linhas: continua na página em que estava
+    autoResetPageIndex: false,
     onRowSelectionChange: setRowSelection,
     state: { sorting, columnFilters, rowSelection },
     meta: { sendingIds, handleEmitSingleNote }
   });
 
+  // Lista nova (filtro, recarga): volta para a primeira página
+  const primeiraLinha = data[0]?.id;
+  React.useEffect(() => {
+    table.setPageIndex(0);
+  }, [primeiraLinha]);
+
   const numSelected = Object.keys(rowSelection).length;
   const selectedRowsData = table.getFilteredSelectedRowModel().rows.map(row => row.original);
   
@@ -149,35 +158,36 @@ const handleEmitSingleNote = async (notaId) => { // Recebe o ID da NOTA, não da
               </Button>
             </PopoverTrigger>
 
+            {/* Status filtrado no servidor (/fiscal/notas?status=): vale para todas as vendas */}
             <PopoverContent className="w-[180px] p-0">
               <div className="flex flex-col">
                 <button
                   className="px-3 py-2 text-left hover:bg-accent"
-                  onClick={() => table.getColumn("status")?.setFilterValue("")}
+                  onClick={() => onStatusFiltroChange("")}
                 >
                   Todos os Status
                 </button>
                 <button
                   className="px-3 py-2 text-left hover:bg-accent"
-                  onClick={() => table.getColumn("status")?.setFilterValue("pendente")}
+                  onClick={() => onStatusFiltroChange("pendente")}
                 >
                   Pendentes
                 </button>
                 <button
                   className="px-3 py-2 text-left hover:bg-accent"
-                  onClick={() => table.getColumn("status")?.setFilterValue("emitida")}
+                  onClick={() => onStatusFiltroChange("autorizada")}
                 >
                   Emitidas
                 </button>
                 <button
                   className="px-3 py-2 text-left hover:bg-accent"
-                  onClick={() => table.getColumn("status")?.setFilterValue("rejeitada")}
+                  onClick={() => onStatusFiltroChange("rejeitada")}
                 >
                   Rejeitadas
                 </button>
                 <button
                   className="px-3 py-2 text-left hover:bg-accent"
-                  onClick={() => table.getColumn("status")?.setFilterValue("nao_declarar")}
+                  onClick={() => onStatusFiltroChange("nao_declarar")}
                 >
                   Não Declarar
                 </button>
@@ -333,7 +343,7 @@ const handleEmitSingleNote = async (notaId) => { // Recebe o ID da NOTA, não da
             </PaginationContent>
           </Pagination>
         </div>
-      <div className="flex-1" />
+      <div className="flex flex-1 justify-end"><CarregarMais paginacao={paginacao} /></div>
       </div>
     </div>
   );
@@ -28,9 +28,12 @@ export default function PdvRevenueChart() {
       
       // Decide qual URL da API chamar
       const isDailyView = timeframe === 'daily';
+      // O backend recorta o período: só os dias do seletor vêm na resposta
+      const inicio = dateRange?.from ? format(dateRange.from, "yyyy-MM-dd") : null;
+      const fim = dateRange?.to ? format(dateRange.to, "yyyy-MM-dd") : inicio;
       const endpoint = isDailyView
         ? "http://localhost:8000/vendas/resumo-hoje-por-hora"
-        : "http://localhost:8000/vendas/resumo-diario-dinamico";
+        : `http://localhost:8000/vendas/resumo-diario-dinamico${inicio ? `?inicio=${inicio}&fim=${fim}` : ""}`;
 
         try {
         const response = await fetch(endpoint);
@@ -44,7 +47,7 @@ export default function PdvRevenueChart() {
       }
     };
     fetchChartData();
-  }, [timeframe]); // Roda quando 'timeframe' muda
+  }, [timeframe, dateRange]); // Roda quando 'timeframe' ou o período mudam
   
   // ✅ 3. O "Montador" agora lida com os dois formatos de dados
   const { chartData, chartConfig } = React.useMemo(() => {
@@ -17,9 +17,12 @@ import { ClientRegistrationModal } from "./ModalCadastroCliente"
 import { Kbd } from "../ui/kbd"
 import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from "@/components/ui/table"
 import { cn } from "@/lib/utils"
+import { buscarPagina } from "@/lib/paginacao"
 import { ClientPinModal } from "./ModalSenhaCliente"
 
 const API_URL = "http://localhost:8000"; // (Ou sua URL base)
+// Clientes mostrados por busca no seletor do PDV
+const LIMITE_CLIENTES = 50;
 
 // Componente recebe 'open', 'onOpenChange' e o callback 'onClientSelect'
 export function ClientSelectionModal({ open, onOpenChange, onClientSelect }) {
@@ -58,21 +61,12 @@ export function ClientSelectionModal({ open, onOpenChange, onClientSelect }) {
       setIsLoading(true);
       setErrorMessage("");
       try {
-          // ✅ Chama a rota de listagem de clientes (com query de busca)
-          // (Assumindo que sua rota GET /clientes aceita ?search=...)
-          // (Se não, precisamos criar a rota 'GET /clientes/search?q=...')
-          // Por enquanto, usaremos a rota que lista TODOS
-          const response = await fetch(`${API_URL}/clientes/`); 
-          
-          const clients = await response.json();
-          if (!response.ok) throw new Error(clients.detail || "Falha ao buscar clientes.");
-          
-          // Filtra no frontend (simulação, o ideal é o backend fazer isso)
-          const lowerQuery = query.toLowerCase();
-          const filteredClients = clients.filter(c => 
-              c.nome.toLowerCase().includes(lowerQuery) ||
-              c.cpf?.includes(lowerQuery)
-          );
+          // O backend filtra (nome ou CPF exato, ?busca=) e devolve só a primeira página:
+          // o caixa refina o termo em vez de rolar a base inteira de clientes
+          const { itens: filteredClients } = await buscarPagina(`${API_URL}/clientes/`, {
+              limite: LIMITE_CLIENTES,
+              filtros: { busca: query.trim() },
+          });
 
           setClientList(filteredClients);
           if(filteredClients.length > 0) {
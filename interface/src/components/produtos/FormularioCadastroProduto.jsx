@@ -412,7 +412,7 @@ export function ProductForm({ open, onOpenChange, onProductCreated }) {
 
     const submissionData = {
       ...formData,
-      quantidade_estoque: parseInt(formData.quantidade_estoque, 10),
+      quantidade_estoque: parseFloat(formData.quantidade_estoque), // Fracionado: KG, L
       preco_custo: custo,
       preco_venda: precoVendaFinal,
       vencimento: formData.vencimento ? format(formData.vencimento, 'yyyy-MM-dd') : null,
@@ -583,7 +583,7 @@ export function ProductForm({ open, onOpenChange, onProductCreated }) {
 
                 <div className="grid grid-cols-4 items-center gap-4">
                     <Label htmlFor="quantidade_estoque" className="text-right">{isExistingProduct ? "Qtd. Entrada*" : "Estoque Inicial*"}</Label>
-                    <Input id="quantidade_estoque" ref={refs.quantidade_estoque} type="number" value={formData.quantidade_estoque} onChange={handleChange} onKeyDown={(e) => handleKeyDown(e, refs.preco_custo)} className={cn("col-span-3", errors.quantidade_estoque && "border-destructive")} required />
+                    <Input id="quantidade_estoque" ref={refs.quantidade_estoque} type="number" step="any" value={formData.quantidade_estoque} onChange={handleChange} onKeyDown={(e) => handleKeyDown(e, refs.preco_custo)} className={cn("col-span-3", errors.quantidade_estoque && "border-destructive")} required />
                 </div>
 
                 {/* ... (Inputs de Preço, Vencimento, Fiscal) ... */}
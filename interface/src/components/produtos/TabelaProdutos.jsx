@@ -26,6 +26,8 @@ import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from "@
 import { Pagination, PaginationContent, PaginationItem, PaginationLink, PaginationNext, PaginationPrevious, PaginationEllipsis } from "@/components/ui/pagination"
 import { ProductForm } from "./FormularioCadastroProduto"
 import { PromocaoForm } from "./formulariopromocao"
+import { categories as categoriasProduto } from "./categoriaProdutos"
+import CarregarMais from "@/components/CarregarMais"
 
 // Helper para criar o range de paginação inteligente
 const DOTS = '...';
@@ -59,7 +61,7 @@ const usePaginationRange = ({ totalPageCount, siblingCount = 1, currentPage }) =
   }, [totalPageCount, siblingCount, currentPage]);
 };
 
-export function ProductDataTable({ columns, data, rowSelection, onRowSelectionChange, setActivePanelTab , onProductSelect, refetchData }) {
+export function ProductDataTable({ columns, data, busca, onBuscaChange, categoria, onCategoriaChange, paginacao, rowSelection, onRowSelectionChange, setActivePanelTab , onProductSelect, refetchData }) {
   const [editingProduct, setEditingProduct] = React.useState(null);
   const [sorting, setSorting] = React.useState([])
   const [columnFilters, setColumnFilters] = React.useState([])
@@ -84,6 +86,8 @@ export function ProductDataTable({ columns, data, rowSelection, onRowSelectionCh
     getPaginationRowModel: getPaginationRowModel(),
     getSortedRowModel: getSortedRowModel(),
     getFilteredRowModel: getFilteredRowModel(),
+    // "Carregar mais" acrescenta linhas: continua na página em que estava
+    autoResetPageIndex: false,
     onRowSelectionChange,
     onColumnVisibilityChange: setColumnVisibility,
     state: { sorting, columnFilters, rowSelection, columnVisibility },
@@ -95,10 +99,11 @@ export function ProductDataTable({ columns, data, rowSelection, onRowSelectionCh
   const canEdit = numSelected === 1;
   const canActOnSelection = numSelected > 0;
 
-  const categories = React.useMemo(() => {
-    const uniqueCategories = new Set(data.map(item => item.category).filter(Boolean));
-    return ["Todas", ...Array.from(uniqueCategories)];
-  }, [data]);
+  // Lista nova (busca, categoria, recarga): volta para a primeira página
+  const primeiraLinha = data[0]?.id;
+  React.useEffect(() => {
+    table.setPageIndex(0);
+  }, [primeiraLinha]);
   
   const currentPage = table.getState().pagination.pageIndex + 1;
   const totalPages = table.getPageCount();
@@ -259,10 +264,19 @@ export function ProductDataTable({ columns, data, rowSelection, onRowSelectionCh
           </Menubar>
 
         <div className="flex w-full items-center gap-2">
-          <Input placeholder="Filtrar por nome..." value={(table.getColumn("nome")?.getFilterValue()) ?? ""} onChange={(event) => table.getColumn("nome")?.setFilterValue(event.target.value)} className="max-w-xs" />
-          <Select onValueChange={(value) => { const filterValue = value === "Todas" ? "" : value; table.getColumn("categoria")?.setFilterValue(filterValue); }}>
+          {onBuscaChange ? (
+            // Busca no servidor (nome, categoria, código, fornecedor), não só nas linhas carregadas
+            <Input placeholder="Buscar produto (ex.: coca 2l)..." value={busca ?? ""} onChange={(event) => onBuscaChange(event.target.value)} className="max-w-xs" />
+          ) : (
+            <Input placeholder="Filtrar por nome..." value={(table.getColumn("nome")?.getFilterValue()) ?? ""} onChange={(event) => table.getColumn("nome")?.setFilterValue(event.target.value)} className="max-w-xs" />
+          )}
+          {/* Categoria filtrada no servidor: vale para todo o catálogo, não só para as linhas carregadas */}
+          <Select value={categoria || "Todas"} onValueChange={(value) => onCategoriaChange?.(value === "Todas" ? "" : value)}>
             <SelectTrigger className="w-[180px]"><SelectValue placeholder="Categoria" /></SelectTrigger>
-            <SelectContent>{categories.map(category => (<SelectItem key={category} value={category}>{category}</SelectItem>))}</SelectContent>
+            <SelectContent>
+              <SelectItem value="Todas">Todas</SelectItem>
+              {categoriasProduto.map(category => (<SelectItem key={category.value} value={category.value}>{category.label}</SelectItem>))}
+            </SelectContent>
           </Select>
           <DropdownMenu>
             <DropdownMenuTrigger asChild><Button variant="outline"><Filter className="h-4 w-4 mr-2" />Filtros</Button></DropdownMenuTrigger>
@@ -359,7 +373,7 @@ export function ProductDataTable({ columns, data, rowSelection, onRowSelectionCh
             </PaginationContent>
           </Pagination>
         </div>
-        <div className="flex-1" />
+        <div className="flex flex-1 justify-end"><CarregarMais paginacao={paginacao} /></div>
       </div>
 
       <ProductForm 
@@ -7,8 +7,8 @@ import { Button } from "@/components/ui/button"
 import { Command, CommandEmpty, CommandGroup, CommandInput, CommandItem, CommandList } from "@/components/ui/command"
 import { Popover, PopoverContent, PopoverTrigger } from "@/components/ui/popover"
 
-// Lista de categorias pré-prontas
-const categories = [
+// Lista de categorias pré-prontas (também é o filtro da tabela de produtos)
+export const categories = [
   { value: "laticinios", label: "Laticínios" },
   { value: "padaria", label: "Padaria" },
   { value: "acougue", label: "Açougue" },
@@ -0,0 +1,107 @@
+// Listagens do backend são paginadas por cursor (engine/app/utils/paginacao.py):
+// o corpo é a página e o cursor da próxima vem no cabeçalho X-Proximo-Cursor.
+//
+// Tabelas das telas: useListaPaginada (primeira página + "Carregar mais", filtros
+// no servidor). buscarTodasPaginas só onde a lista inteira é necessária de fato.
+
+import { useCallback, useEffect, useRef, useState } from "react";
+
+const CABECALHO_CURSOR = "X-Proximo-Cursor";
+const LIMITE_PAGINA = 1000;
+// Linhas por ida ao servidor nas tabelas das telas
+export const PAGINA_TELA = 100;
+
+// Busca uma página. Devolve { itens, proximoCursor } (proximoCursor = null na última).
+// 'filtros' viram parâmetros da URL (valores vazios são ignorados).
+export async function buscarPagina(url, { cursor = null, limite = LIMITE_PAGINA, filtros = {}, ...opcoesFetch } = {}) {
+  const endereco = new URL(url, window.location.origin);
+  endereco.searchParams.set("limite", limite);
+  if (cursor) endereco.searchParams.set("cursor", cursor);
+  for (const [nome, valor] of Object.entries(filtros)) {
+    if (valor !== undefined && valor !== null && valor !== "") endereco.searchParams.set(nome, valor);
+  }
+
+  const resposta = await fetch(endereco, opcoesFetch);
+  if (!resposta.ok) {
+    const erro = await resposta.json().catch(() => ({}));
+    throw new Error(erro.detail || `Falha ao buscar ${endereco.pathname}`);
+  }
+  return {
+    itens: await resposta.json(),
+    proximoCursor: resposta.headers.get(CABECALHO_CURSOR),
+  };
+}
+
+// Segue o cursor até a última página e devolve a lista inteira.
+// 'aoReceberPagina(parcial)' permite mostrar a tabela antes de terminar.
+export async function buscarTodasPaginas(url, { aoReceberPagina, ...opcoes } = {}) {
+  let todos = [];
+  let cursor = null;
+  do {
+    const { itens, proximoCursor } = await buscarPagina(url, { ...opcoes, cursor });
+    todos = todos.concat(itens);
+    cursor = proximoCursor;
+    if (aoReceberPagina) aoReceberPagina(todos);
+  } while (cursor);
+  return todos;
+}
+
+// Hook das tabelas: carrega a primeira página e as seguintes sob demanda.
+// Mudar 'url' ou 'filtros' recomeça do início; respostas de uma consulta
+// anterior (filtro já trocado) são descartadas.
+// Devolve { itens, setItens, carregando, carregandoMais, temMais, carregarMais, recarregar, erro }.
+export function useListaPaginada(url, filtros = {}, { limite = PAGINA_TELA } = {}) {
+  const [itens, setItens] = useState([]);
+  const [proximoCursor, setProximoCursor] = useState(null);
+  const [carregando, setCarregando] = useState(true);
+  const [carregandoMais, setCarregandoMais] = useState(false);
+  const [erro, setErro] = useState(null);
+  const chaveFiltros = JSON.stringify(filtros);
+  const consultaAtual = useRef(0);
+
+  // Primeira página de novo (filtro mudou, item editado/excluído). Devolve os itens.
+  const recarregar = useCallback(async () => {
+    const consulta = ++consultaAtual.current;
+    setCarregando(true);
+    setErro(null);
+    try {
+      const { itens: primeira, proximoCursor: cursor } = await buscarPagina(url, { limite, filtros: JSON.parse(chaveFiltros) });
+      if (consulta !== consultaAtual.current) return null;
+      setItens(primeira);
+      setProximoCursor(cursor);
+      return primeira;
+    } catch (e) {
+      if (consulta === consultaAtual.current) setErro(e);
+      return null;
+    } finally {
+      if (consulta === consultaAtual.current) setCarregando(false);
+    }
+  }, [url, chaveFiltros, limite]);
+
+  useEffect(() => {
+    recarregar();
+  }, [recarregar]);
+
+  const carregarMais = useCallback(async () => {
+    if (!proximoCursor || carregandoMais) return;
+    const consulta = consultaAtual.current;
+    setCarregandoMais(true);
+    try {
+      const { itens: pagina, proximoCursor: cursor } = await buscarPagina(url, {
+        limite, cursor: proximoCursor, filtros: JSON.parse(chaveFiltros),
+      });
+      if (consulta !== consultaAtual.current) return;
+      setItens((anteriores) => anteriores.concat(pagina));
+      setProximoCursor(cursor);
+    } catch (e) {
+      if (consulta === consultaAtual.current) setErro(e);
+    } finally {
+      setCarregandoMais(false);
+    }
+  }, [url, chaveFiltros, limite, proximoCursor, carregandoMais]);
+
+  return {
+    itens, setItens, carregando, carregandoMais, temMais: Boolean(proximoCursor),
+    carregarMais, recarregar, erro,
+  };
+}
@@ -8,10 +8,19 @@ import { crediarioColumns } from "@/components/crediario/ColunasTabelaCrediario"
 import { CrediarioDataTable } from "@/components/crediario/TabelaCrediario";
 import ClientDetailPanel from "@/components/crediario/PainelCrediario";
 import { Loader2 } from "lucide-react"; // Para um placeholder de loading
+import { useListaPaginada } from "@/lib/paginacao";
+
+const API_URL = "http://localhost:8000";
+// Espera o operador parar de digitar antes de ir ao servidor
+const ATRASO_BUSCA_MS = 300;
 
 export default function CrediarioPage() {
     const [selectedClient, setSelectedClient] = React.useState(null);
-    const [tableData, setTableData] = React.useState([]);
+    // Filtros aplicados no servidor (nome/CPF e situação), lista por páginas
+    const [busca, setBusca] = React.useState("");
+    const [buscaServidor, setBuscaServidor] = React.useState("");
+    const [statusConta, setStatusConta] = React.useState("");
+    const clientes = useListaPaginada(`${API_URL}/crediario/clientes`, { busca: buscaServidor, status_conta: statusConta });
     const [summaryData, setSummaryData] = React.useState({
         total_a_receber: 0,
         total_inadimplente: 0,
@@ -19,28 +28,32 @@ export default function CrediarioPage() {
     });
     const [isLoading, setIsLoading] = React.useState(true);
 
+    React.useEffect(() => {
+        const espera = setTimeout(() => setBuscaServidor(busca.trim()), ATRASO_BUSCA_MS);
+        return () => clearTimeout(espera);
+    }, [busca]);
+
+    const fetchSummary = async () => {
+        const summaryRes = await fetch(`${API_URL}/crediario/summary`);
+        if (!summaryRes.ok) {
+            throw new Error("Falha ao buscar dados do crediário");
+        }
+        setSummaryData(await summaryRes.json());
+    };
+
 const fetchData = async () => {
         setIsLoading(true);
         try {
-            const [summaryRes, clientsRes] = await Promise.all([
-                fetch('http://localhost:8000/crediario/summary'),
-                fetch('http://localhost:8000/crediario/clientes')
+            await Promise.all([
+                fetchSummary(),
+                clientes.recarregar() // Primeira página de novo (com os filtros atuais)
             ]);
             
-            if (!summaryRes.ok || !clientsRes.ok) {
-                throw new Error("Falha ao buscar dados do crediário");
-            }
-            
-            const summary = await summaryRes.json();
-            const clients = await clientsRes.json(); // Nova lista de clientes
-            
-            setSummaryData(summary);
-            setTableData(clients);
-            
+            // O selecionado pode estar numa página não recarregada: busca só ele
             if (selectedClient && selectedClient.id) {
-                const updatedSelectedClient = clients.find(c => c.id === selectedClient.id);
-                if (updatedSelectedClient) {
-                    setSelectedClient(updatedSelectedClient);
+                const clienteRes = await fetch(`${API_URL}/crediario/clientes/${selectedClient.id}`);
+                if (clienteRes.ok) {
+                    setSelectedClient(await clienteRes.json());
                     console.log("Painel lateral sincronizado com dados atualizados.");
                 } else {
                     setSelectedClient(null);
@@ -54,8 +67,11 @@ const fetchData = async () => {
         }
     };
 
+    // A lista de clientes é carregada pelo useListaPaginada
     React.useEffect(() => {
-        fetchData();
+        fetchSummary()
+            .catch((error) => console.error(error))
+            .finally(() => setIsLoading(false));
     }, []);
 
     // Placeholder para o loading
@@ -79,8 +95,13 @@ const fetchData = async () => {
             TabelaCredito={
                 <CrediarioDataTable 
                     columns={crediarioColumns} 
-                    data={tableData} 
+                    data={clientes.itens} 
                     onClientSelect={setSelectedClient}
+                    busca={busca}
+                    onBuscaChange={setBusca}
+                    statusConta={statusConta}
+                    onStatusContaChange={setStatusConta}
+                    paginacao={clientes}
                 />
             }
             PainelLateral1={
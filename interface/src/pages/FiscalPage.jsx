@@ -11,6 +11,7 @@ import { Skeleton } from "@/components/ui/skeleton";
 import { toast } from "sonner";
 import NotaEntradaDataTable from "@/components/fiscal/TabelaEntrada";
 import { notaEntradaColumns } from "@/components/fiscal/ColunasFiscalEntrada";
+import { useListaPaginada } from "@/lib/paginacao";
 import {
   AlertDialog,
   AlertDialogAction,
@@ -34,8 +35,10 @@ export default function FiscalPage() {
     });
     const [isConfigLoading, setIsConfigLoading] = React.useState(true);
 
-    const [entradaData, setEntradaData] = React.useState([]);
-    const [isEntradaLoading, setIsEntradaLoading] = React.useState(true); // Loading específico
+    // Tabelas por páginas ("Carregar mais"); o status da saída é filtrado no servidor
+    const [statusSaida, setStatusSaida] = React.useState("");
+    const saidas = useListaPaginada(`${API_URL}/fiscal/notas`, { status: statusSaida });
+    const entradas = useListaPaginada(`${API_URL}/notas-fiscais-entrada/`);
 
     const [activeTab, setActiveTab] = React.useState("saida"); // 'saida' ou 'entrada'
     const [batchLoadingType, setBatchLoadingType] = React.useState(null);
@@ -47,36 +50,26 @@ export default function FiscalPage() {
         notas_rejeitadas: 0,
         pendentes_antigas: 0,
     });
-    const [tableData, setTableData] = React.useState([]);
     const [isLoading, setIsLoading] = React.useState(true);
 
-    const fetchData = async (showLoading = true) => {
+    // Resumo e configuração (as tabelas carregam pelo useListaPaginada)
+    const fetchPainel = async (showLoading = true) => {
             if (showLoading) setIsLoading(true);
             setIsConfigLoading(true);
-            setIsEntradaLoading(true); // ✅ Inicia loading da tabela de entrada
             try {
-                // ✅ 3. BUSCA TUDO EM PARALELO (incluindo notas de entrada)
-                const [summaryRes, tableRes, configRes, entradaRes] = await Promise.all([
+                const [summaryRes, configRes] = await Promise.all([
                     fetch('http://localhost:8000/fiscal/summary'),
-                    fetch('http://localhost:8000/vendas/'),
                     fetch('http://localhost:8000/fiscal/config'), 
-                    fetch('http://localhost:8000/notas-fiscais-entrada/') // ✅ Busca notas de entrada
                 ]);
             
                 if (!summaryRes.ok) throw new Error("Falha ao buscar resumo fiscal");
-                if (!tableRes.ok) throw new Error("Falha ao buscar dados da tabela de saída");
                 if (!configRes.ok) throw new Error("Falha ao buscar configuração fiscal");
-                if (!entradaRes.ok) throw new Error("Falha ao buscar notas de entrada"); // ✅ Verifica resposta
             
                 const summary = await summaryRes.json();
-                const tableSaida = await tableRes.json();
                 const config = await configRes.json();
-                const tableEntrada = await entradaRes.json(); // ✅ Pega dados de entrada
             
                 setSummaryData(summary);
-                setTableData(tableSaida); // Dados de Saída
                 setFiscalConfig(config);
-                setEntradaData(tableEntrada); // ✅ Guarda dados de Entrada
             
             } catch (error) {
                 console.error("Erro ao buscar dados fiscais:", error);
@@ -84,10 +77,13 @@ export default function FiscalPage() {
             } finally {
                 if (showLoading) setIsLoading(false);
                 setIsConfigLoading(false);
-                setIsEntradaLoading(false); // ✅ Finaliza loading da entrada
             }
         };
 
+    // Depois de emitir/reenviar: painel e primeira página das duas tabelas
+    const fetchData = (showLoading = true) =>
+        Promise.all([fetchPainel(showLoading), saidas.recarregar(), entradas.recarregar()]);
+
 
     const handleConfigSave = async (newConfig) => {
         const apiPromise = fetch('http://localhost:8000/fiscal/config', {
@@ -137,7 +133,7 @@ export default function FiscalPage() {
     };
 
     React.useEffect(() => {
-            fetchData();
+            fetchPainel();
         }, []);
 
 const requestBatchAction = (tipo) => {
@@ -163,9 +159,19 @@ const requestBatchAction = (tipo) => {
             const response = await fetch(`${API_URL}/fiscal/emitir/pendentes?tipo=${tipo}`, { 
                 method: 'POST',
             });
-            const result = await response.json();
+            let result = await response.json();
             
             if (!response.ok) throw new Error(result.detail || "Erro no lote.");
+
+            // O lote roda em segundo plano: acompanha o job até terminar
+            while (result.status === "em_andamento") {
+                await new Promise(resolve => setTimeout(resolve, 1500));
+                const jobResponse = await fetch(`${API_URL}/fiscal/jobs/${result.job_id}`);
+                result = await jobResponse.json();
+                if (!jobResponse.ok) throw new Error(result.detail || "Erro ao acompanhar o lote.");
+            }
+
+            if (result.status === "erro") throw new Error(result.message);
             
             toast.success("Operação concluída!", { description: result.message });
             
@@ -215,12 +221,14 @@ const requestBatchAction = (tipo) => {
                 
                 {/* Conteúdo da Aba Saída */}
                 <TabsContent value="saida" className="flex-grow min-h-0"> 
-                    {isLoading ? ( // Usa o loading geral ou da tabela específica?
+                    {saidas.carregando && saidas.itens.length === 0 ? ( // Só na primeira carga (filtro mantém a tabela)
                         <Skeleton className="w-full h-full" /> 
                     ) : (
                         <FiscalDataTable 
                             columns={fiscalColumns} 
-                            data={tableData}
+                            data={saidas.itens}
+                            paginacao={saidas}
+                            onStatusFiltroChange={setStatusSaida}
                             refetchData={fetchData}
                             fiscalConfig={fiscalConfig}
                             totalPurchased={summaryData.total_comprado_mes}
@@ -234,13 +242,14 @@ const requestBatchAction = (tipo) => {
                 
                 {/* Conteúdo da Aba Entrada */}
                 <TabsContent value="entrada" className="flex-grow min-h-0">
-                    {isEntradaLoading ? (
+                    {entradas.carregando && entradas.itens.length === 0 ? (
                          <Skeleton className="w-full h-full" />
                     ) : (
                         // ✅ RENDERIZA A NOVA TABELA
                         <NotaEntradaDataTable
                             columns={notaEntradaColumns} 
-                            data={entradaData}
+                            data={entradas.itens}
+                            paginacao={entradas}
                             refetchData={fetchData} // Passa refetch para ações futuras
                         /> 
                     )}
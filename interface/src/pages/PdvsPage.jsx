@@ -12,7 +12,7 @@ import TicketMedioCardGeral from "@/components/pdvs/TicketMedioCard"
 import PdvsOperandoCard from "@/components/pdvs/PDVAbertos"
 import PdvAlertPanel from "@/components/pdvs/PainelAlertaPDV";
 import { toast } from "sonner"
-import { useWebSocket } from "@/WebSocketContext"
+import { useWebSocket, useTopicos } from "@/WebSocketContext"
 
 export default function PdvsPage() {
   const [dashboardStats, setDashboardStats] = React.useState({
@@ -27,6 +27,7 @@ export default function PdvsPage() {
 
   const [activeAlerts, setActiveAlerts] = React.useState([]);
   const { lastMessage, isConnected } = useWebSocket();
+  useTopicos(["gerentes"]);
 
   const [operatorData, setOperatorData] = React.useState([]);
   const [isLoading, setIsLoading] = React.useState(true);
@@ -107,6 +108,18 @@ export default function PdvsPage() {
 
   }, [lastMessage]);
 
+  // Venda finalizada em qualquer caixa: atualiza os números sem recarregar a tela
+  React.useEffect(() => {
+    if (lastMessage?.type !== "VENDA_FINALIZADA") return;
+    Promise.all([
+      fetch('http://localhost:8000/pdvs/summary').then(res => res.ok ? res.json() : null),
+      fetch('http://localhost:8000/pdvs/').then(res => res.ok ? res.json() : null),
+    ]).then(([summaryData, pdvsListData]) => {
+      if (summaryData) setDashboardStats(summaryData);
+      if (pdvsListData) setPdvsData(pdvsListData);
+    }).catch(error => console.error("Falha ao atualizar PDVs após venda:", error));
+  }, [lastMessage]);
+
   const handleResolveAlert = async (solicitacao, acao) => { // 'acao' será 'aprovado' ou 'rejeitado'
     if (!solicitacao) return;
 
@@ -24,9 +24,27 @@ import { StoreLogo } from "@/components/storelogo"
 import { CashManagementModal } from "@/components/pdvs/modalGestaoMonetaria"
 import { useHardwareScanner } from "@/lib/useHardwareScanner"
 import { WeightDetectedModal } from "@/components/pontovenda/pesodetectado"
+import { useTopicos } from "@/WebSocketContext"
+import { buscarTodasPaginas } from "@/lib/paginacao"
 
 const API_URL = "http://localhost:8000"; 
 
+// Aplica a resposta enxuta (?modo=delta) sobre o carrinho que já está em tela:
+// troca/insere só a linha alterada e os totais, sem receber a venda inteira.
+const aplicarDeltaVenda = (venda, delta) => {
+  let itens = venda.itens || [];
+  if (delta.item_removido_id) {
+    itens = itens.filter(i => i.id !== delta.item_removido_id);
+  }
+  if (delta.item) {
+    const existe = itens.some(i => i.id === delta.item.id);
+    itens = existe
+      ? itens.map(i => (i.id === delta.item.id ? delta.item : i))
+      : [...itens, delta.item];
+  }
+  return { ...venda, itens, valor_total: delta.valor_total, quantidade_itens: delta.quantidade_itens };
+};
+
 const PosLoadingSkeleton = () => (
    <div className="h-screen w-screen flex flex-col items-center justify-center p-12 gap-4">
       <Logo variant="full" size="200px" />
@@ -38,6 +56,8 @@ const PosLoadingSkeleton = () => (
 export default function PontoVenda() {
   const [isCashModalOpen, setIsCashModalOpen] = React.useState(false);
   const [pdvSession, setPdvSession] = React.useState(null); 
+  // Só os eventos deste caixa (respostas de solicitação, status da NFC-e)
+  useTopicos([pdvSession?.id && `pdv:${pdvSession.id}`]);
   const [saleStatus, setSaleStatus] = React.useState("loading"); 
   const [barcodeBuffer, setBarcodeBuffer] = React.useState(""); 
   const [isAddingItem, setIsAddingItem] = React.useState(false); 
@@ -177,7 +197,7 @@ const handleConfirmSaleCancel = async (adminCreds) => {
           };
           console.log(`Tentando remover item: ${item_db_id}, Qtd: ${quantidade_a_remover}, Venda: ${activeSale.id}`);
 
-          const response = await fetch(`${API_URL}/vendas/${activeSale.id}/itens/${item_db_id}/remover`, {
+          const response = await fetch(`${API_URL}/vendas/${activeSale.id}/itens/${item_db_id}/remover?modo=delta`, {
               method: "POST",
               headers: { "Content-Type": "application/json" },
               body: JSON.stringify(requestBody),
@@ -206,7 +226,7 @@ const handleConfirmSaleCancel = async (adminCreds) => {
               
               throw new Error(detail);
           }
-          setActiveSale(responseData);
+          setActiveSale(prev => aplicarDeltaVenda(prev, responseData));
           
       } catch (error) {
           console.error("Falha grave em handleItemCancelApi:", error);
@@ -289,9 +309,8 @@ const handleOpenCloseModalToggle = async () => {
           setIsLoadingOperators(true);
           console.log("Carregando lista de operadores...");
           try {
-              const res = await fetch(`${API_URL}/usuarios`);
-              if (!res.ok) throw new Error("Falha ao buscar operadores");
-              const ops = await res.json();
+              // Lista inteira de propósito: o modal de abertura escolhe entre todos os operadores ativos
+              const ops = await buscarTodasPaginas(`${API_URL}/usuarios/`);
               setOperatorData(ops.filter(op => op.status === 'ativo'));
               console.log("Operadores carregados.");
               setIsModalOpen(true);
@@ -379,7 +398,9 @@ const handleBarcodeSubmit = async (codigo, qtdEspecifica = null) => {
         throw new Error("Operador não encontrado na sessão.");
       }
 
-    const response = await fetch(`${API_URL}/vendas/adicionar-item-smart`, {
+    // Com carrinho aberto, basta o delta; sem venda ativa, a resposta completa cria o carrinho
+    const modoDelta = Boolean(activeSale);
+    const response = await fetch(`${API_URL}/vendas/adicionar-item-smart${modoDelta ? "?modo=delta" : ""}`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
@@ -395,7 +416,11 @@ const handleBarcodeSubmit = async (codigo, qtdEspecifica = null) => {
       if (!response.ok) {
         throw new Error(updatedSale.detail || "Erro ao adicionar item.");
       }
-      setActiveSale(updatedSale);
+      if (modoDelta) {
+        setActiveSale(prev => (prev && prev.id === updatedSale.venda_id) ? aplicarDeltaVenda(prev, updatedSale) : prev);
+      } else {
+        setActiveSale(updatedSale);
+      }
       
       // SUCESSO: Limpa gatilhos
       if (pesoPendente) setPesoPendente(null);
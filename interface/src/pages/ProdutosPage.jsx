@@ -10,29 +10,35 @@ import ProductDetailPanel from "@/components/produtos/PainelDetalheProduto";
 import MiniChart from "@/components/produtos/MiniChart";
 import { Loader2 } from "lucide-react";
 import { format } from "date-fns";
+import { useListaPaginada } from "@/lib/paginacao";
+
+const API_URL = 'http://localhost:8000';
+// Espera o operador parar de digitar antes de ir ao servidor
+const ATRASO_BUSCA_MS = 300;
+const LIMITE_BUSCA = 100;
 
 export default function ProdutosPage() {
-  const [productData, setProductData] = React.useState([]);
   const [rowSelection, setRowSelection] = React.useState({});
   const [historyData, setHistoryData] = React.useState([]); 
   const [isLoading, setIsLoading] = React.useState(true);
   const [activePanelTab, setActivePanelTab] = React.useState("visualizar");
+  // Busca por texto no servidor (/produtos/busca): relevância, sem acento, tolera erro de digitação
+  const [busca, setBusca] = React.useState("");
+  const [resultadoBusca, setResultadoBusca] = React.useState(null);
+  const [categoria, setCategoria] = React.useState("");
+  // Catálogo por páginas (filtro de categoria no servidor); as seguintes vêm com "Carregar mais"
+  const produtos = useListaPaginada(`${API_URL}/produtos/`, { categoria });
+  const productData = produtos.itens;
 
-  const fetchPageData = async () => {
+  const fetchHistory = async () => {
     setIsLoading(true);
     try {
-      const [productsRes, historyRes] = await Promise.all([
-        fetch('http://localhost:8000/produtos'),
-        fetch('http://localhost:8000/produtos/stats-history?limit=7')
-      ]);
+      const historyRes = await fetch(`${API_URL}/produtos/stats-history?limit=7`);
 
-      if (!productsRes.ok) throw new Error('Falha ao buscar produtos');
       if (!historyRes.ok) throw new Error('Falha ao buscar histórico de stats');
 
-      const products = await productsRes.json();
       const history = await historyRes.json();
 
-      setProductData(products);
       setHistoryData(history);
       
     } catch (error) {
@@ -42,9 +48,46 @@ export default function ProdutosPage() {
     }
   };
   
+  // Depois de cadastrar/editar/excluir: catálogo (primeira página) e indicadores de novo
+  const fetchPageData = () => Promise.all([produtos.recarregar(), fetchHistory()]);
+
   React.useEffect(() => {
-    fetchPageData();
+    fetchHistory();
   }, []);
+
+  React.useEffect(() => {
+    const termo = busca.trim();
+    if (!termo) {
+      setResultadoBusca(null);
+      return;
+    }
+    const controle = new AbortController();
+    const espera = setTimeout(async () => {
+      try {
+        const endereco = new URL(`${API_URL}/produtos/busca`);
+        endereco.searchParams.set("q", termo);
+        endereco.searchParams.set("limite", LIMITE_BUSCA);
+        if (categoria) endereco.searchParams.set("categoria", categoria);
+        const resposta = await fetch(endereco, { signal: controle.signal });
+        if (!resposta.ok) throw new Error('Falha na busca de produtos');
+        setResultadoBusca(await resposta.json());
+      } catch (error) {
+        if (error.name !== "AbortError") console.error("Erro ao buscar produtos:", error);
+      }
+    }, ATRASO_BUSCA_MS);
+    // Termo mudou antes da resposta: descarta a busca anterior
+    return () => {
+      clearTimeout(espera);
+      controle.abort();
+    };
+  }, [busca, categoria, productData]); // productData: refaz a busca depois de editar/excluir
+
+  // Com termo digitado, a tabela mostra o resultado do servidor (já ordenado por relevância)
+  const tableData = resultadoBusca ?? productData;
+
+  React.useEffect(() => {
+    setRowSelection({});
+  }, [resultadoBusca]);
   
   const currentStats = React.useMemo(() => {
     if (isLoading || historyData.length === 0) {
@@ -79,9 +122,9 @@ export default function ProdutosPage() {
   const selectedProducts = React.useMemo(() => {
     return Object.keys(rowSelection)
       // Converte a chave (string "0") para um número (0)
-      .map(index => productData[parseInt(index, 10)]) 
+      .map(index => tableData[parseInt(index, 10)]) 
       .filter(Boolean); // Remove qualquer 'undefined'
-  }, [rowSelection, productData]);
+  }, [rowSelection, tableData]);
 
   return (
     <ProdutosPageLayout
@@ -89,7 +132,12 @@ export default function ProdutosPage() {
         <div className="flex flex-col min-w-0 h-full">
            <ProductDataTable 
             columns={columns} 
-            data={productData}
+            data={tableData}
+            busca={busca}
+            onBuscaChange={setBusca}
+            categoria={categoria}
+            onCategoriaChange={setCategoria}
+            paginacao={resultadoBusca ? null : produtos}
             rowSelection={rowSelection}
             onRowSelectionChange={setRowSelection}
             refetchData={fetchPageData}
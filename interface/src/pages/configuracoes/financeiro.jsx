@@ -47,6 +47,7 @@ import {
 import CardBodyT from "@/components/CardBodyT"
 import { PaymentMethodModal } from "../../components/configuracoes/ModalFormPag"
 import { PixOverrideModal } from "../../components/configuracoes/ModalSubsPix"
+import { buscarTodasPaginas } from "@/lib/paginacao"
 
 const API_URL = "http://localhost:8000";
 
@@ -111,13 +112,13 @@ const handleProcessarJuros = async () => {
           const resConfig = await fetch(`${API_URL}/configuracoes/geral`);
           
           // 3. Overrides de PIX (Lista de PDVs)
-          const resOverrides = await fetch(`${API_URL}/configuracoes/financeiro/pix/overrides`);
+          // Só os que têm override configurado (filtrado no backend). Lista inteira de
+          // propósito: no máximo uma linha por PDV, todas editáveis na mesma tela
           let overridesData = [];
-          
-          if (resOverrides.ok) {
-              const allPdvs = await resOverrides.json();
-              // Filtra apenas os que têm override configurado
-              overridesData = allPdvs.filter(p => p.pix_chave_especifica);
+          try {
+              overridesData = await buscarTodasPaginas(`${API_URL}/configuracoes/financeiro/pix/overrides?somente_com_chave=true`);
+          } catch (error) {
+              console.error("Erro ao buscar overrides de PIX:", error);
           }
 
           if (resConfig.ok) {
@@ -35,6 +35,7 @@ export default function FiscalSettingsPage() {
       regime_tributario: "simples",
       inscricao_estadual: "",
       inscricao_municipal: "",
+      uf: "",
       csc_id: "",
       csc_token: "",
       ambiente_sefaz: "homologacao",
@@ -69,6 +70,7 @@ export default function FiscalSettingsPage() {
                   regime_tributario: data.regime_tributario || "simples",
                   inscricao_estadual: data.inscricao_estadual || "",
                   inscricao_municipal: data.inscricao_municipal || "",
+                  uf: data.uf || "",
                   csc_id: data.csc_id || "",
                   csc_token: data.csc_token || "",
                   ambiente_sefaz: data.ambiente_sefaz || "homologacao",
@@ -106,6 +108,7 @@ export default function FiscalSettingsPage() {
       const checks = [
           { name: "Regime Definido", valid: !!dadosFiscais.regime_tributario },
           { name: "IE Preenchida", valid: !!dadosFiscais.inscricao_estadual && dadosFiscais.inscricao_estadual.length > 2 },
+          { name: "UF Definida", valid: dadosFiscais.uf.length === 2 },
           { name: "Certificado Ativo", valid: certificados.some(c => c.ativo) },
           { name: "Token NFC-e (CSC)", valid: !!dadosFiscais.csc_id && !!dadosFiscais.csc_token },
       ];
@@ -270,8 +273,18 @@ export default function FiscalSettingsPage() {
                       </div>
                   </div>
 
-                  {/* Linha 2: Inscrições */}
-                  <div className="grid grid-cols-1 md:grid-cols-2 gap-6">
+                  {/* Linha 2: UF e Inscrições */}
+                  <div className="grid grid-cols-1 md:grid-cols-3 gap-6">
+                      <div className="space-y-2">
+                          <Label htmlFor="uf">UF</Label>
+                          <Input 
+                              id="uf" 
+                              placeholder="Ex: PR"
+                              maxLength={2}
+                              value={dadosFiscais.uf} 
+                              onChange={(e) => setDadosFiscais(p => ({...p, uf: e.target.value.toUpperCase()}))}
+                          />
+                      </div>
                       <div className="space-y-2">
                           <Label htmlFor="ie">Inscrição Estadual (IE)</Label>
                           <Input 
@@ -56,13 +56,22 @@ import {
 import CardBodyT from "@/components/CardBodyT"
 import { Avatar, AvatarFallback, AvatarImage } from "@/components/ui/avatar"
 import { UserModal } from "../../components/configuracoes/ModalCriacaoUser"
+import { useListaPaginada } from "@/lib/paginacao"
+import CarregarMais from "@/components/CarregarMais"
 
 const API_URL = "http://localhost:8000";
+// Espera parar de digitar antes de buscar no servidor
+const ATRASO_BUSCA_MS = 300;
 
 export default function PerfilSettingsPage() {
   const [isDataLoading, setIsDataLoading] = React.useState(true); 
   
-  const [users, setUsers] = React.useState([]);
+  // Usuários por páginas, busca (nome/e-mail) no servidor
+  const [busca, setBusca] = React.useState("");
+  const [buscaServidor, setBuscaServidor] = React.useState("");
+  const usuarios = useListaPaginada(`${API_URL}/usuarios/`, { busca: buscaServidor });
+  const users = usuarios.itens;
+  const setUsers = usuarios.setItens;
   const [logs, setLogs] = React.useState([]);
   
   // Estados do Modal
@@ -71,15 +80,10 @@ export default function PerfilSettingsPage() {
   const [userToDelete, setUserToDelete] = React.useState(null); // Guarda o objeto usuário a ser deletado
 
   // --- FETCH DATA ---
-  const fetchData = React.useCallback(async () => {
+  const fetchLogs = React.useCallback(async () => {
       setIsDataLoading(true);
       try {
-          const [resUsers, resLogs] = await Promise.all([
-              fetch(`${API_URL}/usuarios/`),
-              fetch(`${API_URL}/usuarios/logs/auditoria`)
-          ]);
-          
-          if (resUsers.ok) setUsers(await resUsers.json());
+          const resLogs = await fetch(`${API_URL}/usuarios/logs/auditoria`);
           if (resLogs.ok) setLogs(await resLogs.json());
 
       } catch (error) {
@@ -89,7 +93,19 @@ export default function PerfilSettingsPage() {
       }
   }, []);
 
-  React.useEffect(() => { fetchData(); }, [fetchData]);
+  // Depois de criar/editar/excluir: usuários (primeira página, busca atual) e auditoria
+  const fetchData = React.useCallback(
+      () => Promise.all([usuarios.recarregar(), fetchLogs()]),
+      [usuarios.recarregar, fetchLogs]
+  );
+
+  // A lista de usuários é carregada pelo useListaPaginada
+  React.useEffect(() => { fetchLogs(); }, [fetchLogs]);
+
+  React.useEffect(() => {
+      const espera = setTimeout(() => setBuscaServidor(busca.trim()), ATRASO_BUSCA_MS);
+      return () => clearTimeout(espera);
+  }, [busca]);
 
   // --- Handlers ---
   
@@ -184,7 +200,7 @@ export default function PerfilSettingsPage() {
               <div className="flex items-center justify-between">
                   <div className="relative w-64">
                       <Search className="absolute left-2 top-2.5 h-4 w-4 text-muted-foreground" />
-                      <Input placeholder="Buscar usuário..." className="pl-8" />
+                      <Input placeholder="Buscar usuário..." className="pl-8" value={busca} onChange={(e) => setBusca(e.target.value)} />
                   </div>
                   <Button onClick={handleNewUser} disabled={isDataLoading}>
                       <Plus className="mr-2 h-4 w-4" /> Novo Usuário
@@ -251,6 +267,7 @@ export default function PerfilSettingsPage() {
                           ))}
                       </TableBody>
                   </Table>
+                  <div className="flex justify-center p-2"><CarregarMais paginacao={usuarios} /></div>
               </div>
           </div>
       </CardBodyT>